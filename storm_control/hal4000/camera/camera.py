@@ -36,6 +36,17 @@ class Camera(halModule.HalModule):
     """
     Controller for a single camera.
     """
+    message_types = ["configuration",
+                     "configure1",
+                     "current parameters",
+                     "get functionality",
+                     "new parameters",
+                     "shutter clicked",
+                     "start camera",
+                     "start film",
+                     "stop camera",
+                     "stop film"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.film_settings = None
@@ -132,8 +143,14 @@ class Camera(halModule.HalModule):
     def updateParameters(self, message):
         message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
                                                           data = {"old parameters" : self.camera_control.getParameters().copy()}))
-        p = message.getData()["parameters"].get(self.module_name)
-        self.camera_control.newParameters(p)
+
+        # Re-configuring a camera usually means stopping and re-starting it, so
+        # we only do this if our parameters actually changed (or the last change
+        # failed).
+        data = message.getData()
+        if not ("changes" in data) or (self.module_name in data["changes"]) or not self.camera_control.camera_working:
+            p = data["parameters"].get(self.module_name)
+            self.camera_control.newParameters(p)
         message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
                                                           data = {"new parameters" : self.camera_control.getParameters()}))
 
@@ -16,6 +16,7 @@ import storm_control.sc_library.halExceptions as halExceptions
 import storm_control.sc_library.parameters as params
 
 import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.halLib.frameStats as frameStats
 
 
 class CameraException(halExceptions.HardwareException):
@@ -50,6 +51,11 @@ class CameraControl(QtCore.QThread):
         # The current frame number, this gets reset by startCamera().
         self.frame_number = 0
 
+        # Storage for the frame data. Cameras that need to copy the data
+        # from the camera into a numpy array should get the array from
+        # this pool so that we are not constantly allocating new memory.
+        self.frame_pool = frame.FramePool()
+
         # The camera parameters.
         self.parameters = params.StormXMLObject()
 
@@ -243,15 +249,21 @@ class CameraControl(QtCore.QThread):
         Data from the camera should go through this method on it's
         way to the camera functionality object.
         """
-        for frame in frames:
-            if self.film_length is not None:
+        if self.film_length is not None:
+
+            # This keeps us from emitting more than the expected number
+            # of frames.
+            if (len(frames) > 0) and (frames[-1].frame_number >= self.film_length):
+                frames = [x for x in frames if (x.frame_number < self.film_length)]
 
-                # This keeps us from emitting more than the expected number
-                # of newFrame signals.
-                if (frame.frame_number >= self.film_length):
-                    break
-                
-            self.camera_functionality.newFrame.emit(frame)
+        if frameStats.enabled:
+            stats = frameStats.getSource(self.camera_name)
+            for frame in frames:
+                # self.frame_number is the number of frames that the camera
+                # thread has created so far.
+                stats.addDelivered(frame, self.frame_number - frame.frame_number - 1)
+
+        self.camera_functionality.emitFrames(frames)
 
     def newParameters(self, parameters):
         """
@@ -365,15 +377,62 @@ class CameraControl(QtCore.QThread):
 class HWCameraControl(CameraControl):
     """
     This class implements what is common to all of the 'hardware' cameras.
+
+    By default the camera is polled for new frames every 5 milliseconds.
+    With 'adaptive_polling' the time between polls is adjusted based on
+    the frame rate so that the frames are delivered in batches of a
+    reasonable size, about 'poll_rate' batches per second. If a poll
+    returns a lot more frames than expected (the camera buffer is
+    filling up) the camera is polled again right away.
     """
-    def __init__(self, **kwds):
+    def __init__(self, config = None, **kwds):
+        kwds["config"] = config
         super().__init__(**kwds)
         self.camera_mutex = QtCore.QMutex()
 
+        self.adaptive_polling = config.get("adaptive_polling", False)
+        self.poll_expected = 1.0
+        self.poll_max_interval = 0.001 * config.get("poll_max_interval", 20.0)
+        self.poll_rate = config.get("poll_rate", 100.0)
+
+        # Sub-classes should set this to True if the camera's getFrames()
+        # method waits for the SDK's frame ready event (with a timeout)
+        # when there are no new frames.
+        self.sdk_waits = False
+
     def cleanUp(self):
         super().cleanUp()
         self.camera.shutdown()
 
+    def getPollInterval(self, n_frames):
+        """
+        Returns how long to wait (in seconds) before polling the camera
+        again. n_frames is the number of frames in the last poll.
+        """
+        if not self.adaptive_polling:
+            return 0.005
+
+        # We are falling behind, poll again right away.
+        if (n_frames > 2.0 * self.poll_expected):
+            return 0.0
+
+        interval = 1.0/self.poll_rate
+        fps = self.parameters.get("fps")
+        if (fps > 0.0):
+            frame_period = 1.0/fps
+
+            # Let the SDK wait for the next frame.
+            if self.sdk_waits and (frame_period > interval):
+                self.poll_expected = 1.0
+                return 0.0
+
+            # There is no point in polling more often than the frame rate.
+            interval = max(interval, frame_period)
+
+        interval = min(interval, self.poll_max_interval)
+        self.poll_expected = max(1.0, interval * fps)
+        return interval
+
     def run(self):
         #
         # Note: The order is important here, we need to start the camera and
@@ -384,6 +443,7 @@ class HWCameraControl(CameraControl):
         self.running = True
         self.thread_started = True
         while(self.running):
+            poll_time = time.perf_counter()
 
             # Get data from camera and create frame objects.
             self.camera_mutex.lock()
@@ -410,7 +470,11 @@ class HWCameraControl(CameraControl):
                             
                 # Emit new data signal.
                 self.newData.emit(frame_data)
-            self.msleep(5)
+
+            # Wait until the next poll, less the time it took to get the frames.
+            wait_time = self.getPollInterval(len(frames)) - (time.perf_counter() - poll_time)
+            if (wait_time > 0.0):
+                self.usleep(int(1.0e6 * wait_time))
 
         self.camera.stopAcquisition()
             
@@ -11,6 +11,7 @@ import copy
 
 from PyQt5 import QtCore
 
+import storm_control.hal4000.camera.frame as frame
 import storm_control.hal4000.halLib.halFunctionality as halFunctionality
 
 
@@ -24,9 +25,15 @@ class CameraFunctionality(halFunctionality.HalFunctionality):
 
     During a parameter change feed.feed and display.display disconnect
     from camera functionalities and then request new ones.
+
+    Frames are available both one at a time (newFrame) and in batches
+    (newFrames). The batches are frame.FrameBatch objects, consumers that
+    can process several frames at once (i.e. the film writer) should use
+    newFrames as this is a lot less overhead at high frame rates.
     """
     emccdGain = QtCore.pyqtSignal(int)
     newFrame = QtCore.pyqtSignal(object)
+    newFrames = QtCore.pyqtSignal(object)
     parametersChanged = QtCore.pyqtSignal()
     shutter = QtCore.pyqtSignal(bool)
     started = QtCore.pyqtSignal()
@@ -72,6 +79,22 @@ class CameraFunctionality(halFunctionality.HalFunctionality):
         # Not used, kept because it may be useful for enforcing invalid functionalities?
         return copy.deepcopy(self)
 
+    def emitFrames(self, frames):
+        """
+        Send a list of frames to the consumers, first as a single batch
+        to the newFrames consumers and then one at a time to the newFrame
+        consumers. The signals are only emitted if they are connected.
+        """
+        if (len(frames) == 0):
+            return
+        
+        if (self.receivers(self.newFrames) > 0):
+            self.newFrames.emit(frame.FrameBatch(frames))
+
+        if (self.receivers(self.newFrame) > 0):
+            for a_frame in frames:
+                self.newFrame.emit(a_frame)
+
     def getCameraName(self):
         return self.camera_name
 
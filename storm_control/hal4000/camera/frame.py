@@ -6,17 +6,135 @@ or the data from a feed and it's meta-information.
 Notes: 
  (1) The numpy data field (np_data) is expected to
      be of type numpy.uint16.
+
+ (2) The numpy data can come from a FramePool, in which case
+     it will be re-used for a new frame once all the consumers
+     of the frame have released it. Consumers that need to keep
+     the data around for a while are free to just hold on to
+     the frame (or the data), but they must not modify it.
  
 Hazen 3/17
 """
 
+import numpy
+import sys
+import time
+
+
+class FramePool(object):
+    """
+    A pool of numpy.uint16 frame buffers so that cameras don't have to
+    allocate new storage for every frame.
+
+    Buffers are reference counted using Python's own reference counting,
+    a buffer is free again when the pool holds the only reference to it.
+    This happens once every consumer (the film writer, the displays, the
+    feeds, the spot counter, etc.) has released the Frame that wraps the
+    buffer as well as any views of the buffer (a numpy view or a
+    memoryview holds a reference to the buffer).
+
+    Note that this test is conservative, anything that holds a reference
+    to the buffer, even temporarily (a local variable in another thread,
+    an exception traceback, a debugger), makes the buffer look busy. This
+    is safe, the pool just allocates a new buffer, but it means that the
+    pool can grow while consumers are slow. The pool is capped in bytes
+    and buffers that are not needed are dropped again every trim_interval
+    requests.
+
+    Buffers should only be checked out by a single thread, usually the
+    camera thread.
+    """
+    def __init__(self, max_bytes = 512 * 1024 * 1024, min_free = 2, trim_interval = 200, **kwds):
+        """
+        max_bytes - The maximum amount of memory in the pool. If all
+                    of the buffers are in use then new (unpooled)
+                    storage is allocated for the frame.
+        min_free - The number of free buffers to keep when the pool
+                   is trimmed.
+        trim_interval - Trim the pool every this many requests.
+        """
+        super().__init__(**kwds)
+        self.buffer_size = 0
+        self.buffers = []
+        self.index = 0
+        self.max_buffers = 0
+        self.max_bytes = max_bytes
+        self.min_free = min_free
+        self.n_requests = 0
+        self.trim_interval = trim_interval
+
+    def clear(self):
+        """
+        Drop all the buffers. Buffers that are still in use will be
+        garbage collected once their last consumer releases them.
+        """
+        self.buffers = []
+        self.index = 0
+
+    def getBuffer(self, size):
+        """
+        Returns a numpy.uint16 array of size elements that nobody
+        else is using.
+        """
+        if (size != self.buffer_size):
+            self.clear()
+            self.buffer_size = size
+            self.max_buffers = max(1, self.max_bytes // (2 * size))
+
+        self.n_requests += 1
+        if ((self.n_requests % self.trim_interval) == 0):
+            self.trim()
+
+        # Look for a free buffer, starting after the last buffer that we
+        # handed out as this is likely the one that has been free longest.
+        n_buffers = len(self.buffers)
+        for i in range(n_buffers):
+            j = (self.index + i) % n_buffers
+            if self.isFree(j):
+                self.index = (j + 1) % n_buffers
+                return self.buffers[j]
+
+        # No free buffers, allocate a new one.
+        np_data = numpy.empty(size, dtype = numpy.uint16)
+        if (n_buffers < self.max_buffers):
+            self.buffers.append(np_data)
+            self.index = 0
+        return np_data
+
+    def getNumberBuffers(self):
+        return len(self.buffers)
+
+    def isFree(self, index):
+        """
+        Returns True if the pool holds the only reference to the buffer.
+        """
+        # 2 = the reference in self.buffers + the getrefcount() argument.
+        return (sys.getrefcount(self.buffers[index]) == 2)
+
+    def trim(self):
+        """
+        Drop the free buffers in excess of min_free, for example after
+        a consumer stalled and the pool grew.
+        """
+        n_free = 0
+        buffers = []
+        for i in range(len(self.buffers)):
+            if self.isFree(i):
+                n_free += 1
+                if (n_free > self.min_free):
+                    continue
+            buffers.append(self.buffers[i])
+        self.buffers = buffers
+        self.index = 0
+
+
 class Frame(object):
     """
     Class for the storage of a single frame of camera data
     and it's meta-information.
     """
 
-    def __init__(self, np_data, frame_number, image_x, image_y, which_camera):
+    def __init__(self, np_data, frame_number, image_x, image_y, which_camera, timestamp = None):
         """
         Create a camera frame object.
         FIXME: Are we consistent in the use of master vs. camera1?
@@ -25,12 +143,18 @@ class Frame(object):
         frame_number - The frame number of this frame.
         image_x - The size of the frame in pixels in x.
         image_y - The size of the frame in pixels in y.
+        timestamp - The time (in seconds) that the camera recorded for this
+                    frame, if the camera provides this.
         """
 
+        # This is the time that the frame arrived in the computer.
+        self.arrival_time = time.time()
+
         self.image_x = image_x
         self.image_y = image_y
         self.np_data = np_data
         self.frame_number = frame_number
+        self.timestamp = timestamp
         self.which_camera = which_camera
 
     def getData(self):
@@ -47,6 +171,63 @@ class Frame(object):
         return self.np_data.ctypes.data
 
 
+class FrameBatch(object):
+    """
+    A group of consecutive frames from a single camera (or feed) that
+    are delivered together. This is what the newFrames signal of a
+    camera functionality emits. Consumers can iterate over the batch
+    frame by frame, or use getData() to process all of the frames with
+    a single numpy operation.
+
+    Cameras usually don't provide the data of the batch as a single
+    array, in which case getData() has to allocate and copy. Consumers
+    that run at the full frame rate should check hasData() first.
+    """
+    def __init__(self, frames, np_data = None, **kwds):
+        """
+        frames - A list of Frame objects.
+        np_data - (Optional) A (frames, pixels) numpy.uint16 array with
+                  the data of all the frames, for producers that already
+                  have the frames in a single array.
+        """
+        super().__init__(**kwds)
+        self.frames = frames
+        self.image_x = frames[0].image_x
+        self.image_y = frames[0].image_y
+        self.np_data = np_data
+        self.which_camera = frames[0].which_camera
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def getData(self):
+        """
+        Returns the data of all the frames as a contiguous (frames, pixels)
+        numpy array. The data is copied the first time this is called,
+        unless the producer provided it.
+        """
+        if self.np_data is None:
+            self.np_data = numpy.empty((len(self.frames), self.image_x * self.image_y), dtype = numpy.uint16)
+            for i, a_frame in enumerate(self.frames):
+                self.np_data[i,:] = a_frame.np_data.reshape(-1)
+        return self.np_data
+
+    def getFrameNumbers(self):
+        return [a_frame.frame_number for a_frame in self.frames]
+
+    def hasData(self):
+        """
+        Returns True if getData() does not need to copy the frames.
+        """
+        return self.np_data is not None
+
+
 #
 # The MIT License
 #
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+"""
+A shared memory ring buffer of frames. HAL writes each frame into the
+ring once, and any number of reader processes can attach to the ring
+and get the frames without copying them. This only needs numpy so the
+readers don't have to import Qt (or HAL).
+
+Each reader has it's own cursor, a reader that falls more than a ring's
+worth of frames behind the writer loses frames. It is told how many
+frames it lost, and then continues with the oldest frame that is still
+in the ring.
+
+Layout of the shared memory:
+ (1) A header (HEADER_DTYPE) with the ring size, the name of the feed and
+     the number of frames that have been written.
+ (2) A slot header (SLOT_DTYPE) for each slot.
+ (3) The frame data for each slot.
+
+The slots work like a sequence lock. Before the writer starts to write
+frame n into a slot it sets the sequence number of the slot to 2n+1, and
+when it is done it sets it to 2n+2. A reader checks that the sequence
+number is 2n+2 before using the frame, and it should check again (with
+isValid()) when it is done with the frame if it is using the frame data
+in place, as the writer could have re-used the slot in the mean time.
+This relies on the writes to the shared memory not being re-ordered,
+which is the case on x86.
+
+Hazen 10/26
+"""
+import numpy
+import os
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+import storm_control.hal4000.camera.frame as frame
+
+
+HEADER_DTYPE = numpy.dtype([("magic", "S4"),
+                            ("n_slots", "<u4"),
+                            ("max_pixels", "<u8"),
+                            ("write_count", "<u8"),
+                            ("feed_name", "S48")])
+
+SLOT_DTYPE = numpy.dtype([("sequence", "<u8"),
+                          ("frame_number", "<i8"),
+                          ("x_pixels", "<u4"),
+                          ("y_pixels", "<u4"),
+                          ("timestamp", "<f8"),
+                          ("arrival_time", "<f8")])
+
+MAGIC = b"HFR1"
+
+# The names of the rings that were created by this process.
+local_rings = set()
+
+
+class FrameRingException(Exception):
+    pass
+
+
+def ringSize(n_slots, max_pixels):
+    """
+    Returns the size in bytes of a ring.
+    """
+    return HEADER_DTYPE.itemsize + n_slots * (SLOT_DTYPE.itemsize + 2 * max_pixels)
+
+
+class RingFrame(frame.Frame):
+    """
+    A frame whose data is in the ring buffer.
+    """
+    def __init__(self, index = None, ring = None, **kwds):
+        super().__init__(**kwds)
+        self.index = index
+        self.ring = ring
+
+    def isValid(self):
+        """
+        Returns False if the writer has started to write another
+        frame into this frame's slot.
+        """
+        return self.ring.isValid(self)
+
+
+class FrameRing(object):
+    """
+    Base class for the writer and the reader.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.data = None
+        self.header = None
+        self.n_slots = None
+        self.shm = None
+        self.slots = None
+
+    def close(self):
+        """
+        Note that the shared memory can't be closed while there are still
+        frames (from getFrame()) that use it.
+        """
+        self.data = None
+        self.header = None
+        self.slots = None
+        if self.shm is not None:
+            self.shm.close()
+
+    def getFeedName(self):
+        return self.header[0]["feed_name"].decode()
+
+    def getWriteCount(self):
+        """
+        Returns the number of frames that have been written.
+        """
+        return int(self.header["write_count"][0])
+
+    def isValid(self, ring_frame):
+        return (self.slots["sequence"][ring_frame.index % self.n_slots] == 2 * ring_frame.index + 2)
+
+    def mapMemory(self):
+        self.header = numpy.ndarray((1,), dtype = HEADER_DTYPE, buffer = self.shm.buf)
+        self.n_slots = int(self.header[0]["n_slots"])
+        max_pixels = int(self.header[0]["max_pixels"])
+        self.slots = numpy.ndarray((self.n_slots,),
+                                   dtype = SLOT_DTYPE,
+                                   buffer = self.shm.buf,
+                                   offset = HEADER_DTYPE.itemsize)
+        self.data = numpy.ndarray((self.n_slots, max_pixels),
+                                  dtype = numpy.uint16,
+                                  buffer = self.shm.buf,
+                                  offset = HEADER_DTYPE.itemsize + self.n_slots * SLOT_DTYPE.itemsize)
+
+
+class FrameRingWriter(FrameRing):
+    """
+    Creates the ring and writes frames into it. There should only be
+    one writer for a ring.
+    """
+    def __init__(self, feed_name = "", max_pixels = None, n_slots = None, name = None, **kwds):
+        """
+        feed_name - The name of the camera or feed.
+        max_pixels - The largest frame (in pixels) that can be stored.
+        n_slots - The number of frames in the ring.
+        name - The name of the shared memory.
+        """
+        super().__init__(**kwds)
+        try:
+            self.shm = shared_memory.SharedMemory(name = name,
+                                                  create = True,
+                                                  size = ringSize(n_slots, max_pixels))
+
+        #
+        # The shared memory is left over from a HAL that crashed. Remove it
+        # and create it again. Readers that are still attached to the old
+        # ring keep it until they close it, but they won't get new frames.
+        #
+        except FileExistsError:
+            print(">> Warning, removing old shared memory '" + str(name) + "'")
+            old_shm = shared_memory.SharedMemory(name = name)
+            old_shm.close()
+            old_shm.unlink()
+            self.shm = shared_memory.SharedMemory(name = name,
+                                                  create = True,
+                                                  size = ringSize(n_slots, max_pixels))
+        header = numpy.ndarray((1,), dtype = HEADER_DTYPE, buffer = self.shm.buf)
+        header[0] = (MAGIC, n_slots, max_pixels, 0, feed_name.encode())
+        header = None
+        self.mapMemory()
+        self.slots[:] = 0
+        local_rings.add(self.shm.name)
+
+    def addFrame(self, a_frame):
+        """
+        Write a camera.frame.Frame into the ring.
+        """
+        n_pixels = a_frame.image_x * a_frame.image_y
+        if (n_pixels > self.data.shape[1]):
+            raise FrameRingException("Frame with " + str(n_pixels) + " pixels is too large for the ring buffer.")
+
+        index = self.getWriteCount()
+        i = index % self.n_slots
+        timestamp = a_frame.timestamp
+        if timestamp is None:
+            timestamp = numpy.nan
+
+        self.slots["sequence"][i] = 2 * index + 1
+        self.data[i, :n_pixels] = a_frame.getData().reshape(-1)
+        self.slots[i] = (2 * index + 1,
+                         a_frame.frame_number,
+                         a_frame.image_x,
+                         a_frame.image_y,
+                         timestamp,
+                         a_frame.arrival_time)
+        self.slots["sequence"][i] = 2 * index + 2
+        self.header["write_count"][0] = index + 1
+
+    def addFrames(self, frame_batch):
+        for a_frame in frame_batch:
+            self.addFrame(a_frame)
+
+    def close(self):
+        """
+        Close and remove the ring.
+        """
+        super().close()
+        self.shm.unlink()
+        local_rings.discard(self.shm.name)
+
+
+class FrameRingReader(FrameRing):
+    """
+    Attaches to an existing ring and reads frames from it.
+    """
+    def __init__(self, from_start = False, name = None, **kwds):
+        """
+        from_start - Start with the oldest frame in the ring instead of
+                     the next frame that is written.
+        name - The name of the shared memory.
+        """
+        super().__init__(**kwds)
+        self.n_lost = 0
+        #
+        # The writer owns the shared memory, we don't want Python's resource
+        # tracker to remove it when this process exits (POSIX only). Python
+        # 3.13 and later have an option for this.
+        #
+        try:
+            self.shm = shared_memory.SharedMemory(name = name, track = False)
+        except TypeError:
+            self.shm = shared_memory.SharedMemory(name = name)
+            if (os.name == "posix") and not (self.shm.name in local_rings):
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        if (bytes(self.shm.buf[:4]) != MAGIC):
+            self.shm.close()
+            raise FrameRingException("'" + str(name) + "' is not a frame ring buffer.")
+        self.mapMemory()
+
+        self.cursor = self.getWriteCount()
+        if from_start:
+            self.cursor = max(0, self.cursor - self.n_slots)
+
+    def getFrame(self, copy = False):
+        """
+        Returns the next frame or None if there are no new frames. The
+        frame data is a view of the ring unless copy is True.
+        """
+        while True:
+            write_count = self.getWriteCount()
+            if (self.cursor >= write_count):
+                return None
+
+            # Skip frames that have already been overwritten.
+            if ((write_count - self.cursor) > self.n_slots):
+                self.n_lost += write_count - self.n_slots - self.cursor
+                self.cursor = write_count - self.n_slots
+
+            index = self.cursor
+            slot = self.slots[index % self.n_slots].copy()
+            if (slot["sequence"] != (2 * index + 2)):
+                self.n_lost += 1
+                self.cursor += 1
+                continue
+
+            n_pixels = int(slot["x_pixels"]) * int(slot["y_pixels"])
+            np_data = self.data[index % self.n_slots, :n_pixels]
+            if copy:
+                np_data = np_data.copy()
+
+            timestamp = float(slot["timestamp"])
+            if numpy.isnan(timestamp):
+                timestamp = None
+            ring_frame = RingFrame(index = index,
+                                   ring = self,
+                                   np_data = np_data,
+                                   frame_number = int(slot["frame_number"]),
+                                   image_x = int(slot["x_pixels"]),
+                                   image_y = int(slot["y_pixels"]),
+                                   which_camera = self.getFeedName(),
+                                   timestamp = timestamp)
+            ring_frame.arrival_time = float(slot["arrival_time"])
+
+            # Check that the writer did not start to overwrite the slot while
+            # we were reading the slot header (or copying the data).
+            if not self.isValid(ring_frame):
+                self.n_lost += 1
+                self.cursor += 1
+                continue
+
+            self.cursor += 1
+            return ring_frame
+
+    def getFrames(self, copy = False):
+        """
+        Returns a list of all the new frames.
+        """
+        frames = []
+        ring_frame = self.getFrame(copy = copy)
+        while ring_frame is not None:
+            frames.append(ring_frame)
+            ring_frame = self.getFrame(copy = copy)
+        return frames
+
+    def getNumberLost(self):
+        """
+        Returns the number of frames that this reader did not get because
+        the writer overwrote them first.
+        """
+        return self.n_lost
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
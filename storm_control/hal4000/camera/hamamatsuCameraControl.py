@@ -29,6 +29,9 @@ class HamamatsuCameraControl(cameraControl.HWCameraControl):
         # Load the library and start the camera.
         self.camera = hcam.HamamatsuCameraMR(camera_id = config.get("camera_id"))
 
+        # getFrames() waits for the DCAM frame ready event.
+        self.sdk_waits = True
+
         # Dictionary of the Hamamatsu camera properties we'll support.
         self.hcam_props = {"binning" : True,
                            "defect_correct_mode" : True,
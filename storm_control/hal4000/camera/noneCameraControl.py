@@ -3,6 +3,14 @@
 This class provides software emulation of a camera for testing purposes.
 
 Hazen 02/17
+
+In benchmark mode the camera emits frames from a pool of pre-generated
+frames (sparse, blinking PSFs on a noisy background) either as fast as
+possible or at a fixed frame rate. The camera also emulates an on-board
+frame buffer, if HAL falls too far behind frames are lost just like
+they would be with a real camera.
+
+Hazen 10/26
 """
 
 import ctypes
@@ -17,14 +25,53 @@ import storm_control.hal4000.camera.cameraFunctionality as cameraFunctionality
 import storm_control.hal4000.camera.frame as frame
 
 
+def makeBenchmarkFrames(x_size, y_size, n_frames, n_emitters, background = 20.0, baseline = 100.0, on_fraction = 0.1, photons = 1000.0, seed = 0, sigma = 1.5):
+    """
+    Creates frames with emitters that randomly blink on and off.
+
+    x_size, y_size - The frame size in pixels.
+    n_frames - The number of frames.
+    n_emitters - The total number of emitters.
+    background - Background photons per pixel.
+    baseline - Camera baseline.
+    on_fraction - The fraction of the emitters that are on in each frame.
+    photons - Photons per emitter per frame.
+    seed - Random number generator seed.
+    sigma - PSF sigma in pixels.
+
+    Returns a (n_frames, y_size * x_size) numpy.uint16 array.
+    """
+    rs = numpy.random.RandomState(seed)
+    ex = rs.uniform(0, x_size, n_emitters)
+    ey = rs.uniform(0, y_size, n_emitters)
+
+    # The PSF is separable so each image is (gy.T * height) x gx.
+    gx = numpy.exp(-(numpy.arange(x_size)[None,:] - ex[:,None])**2/(2.0 * sigma * sigma))
+    gy = numpy.exp(-(numpy.arange(y_size)[None,:] - ey[:,None])**2/(2.0 * sigma * sigma))
+    height = photons/(2.0 * numpy.pi * sigma * sigma)
+
+    frames = numpy.empty((n_frames, y_size * x_size), dtype = numpy.uint16)
+    for i in range(n_frames):
+        on = (rs.uniform(size = n_emitters) < on_fraction)
+        image = numpy.dot(gy[on].transpose(), height * gx[on]) + background
+        image = rs.poisson(image) + baseline
+        frames[i,:] = numpy.clip(image, 0, 65535).reshape(-1)
+    return frames
+
+
 class NoneCameraControl(cameraControl.CameraControl):
 
     def __init__(self, config = None, is_master = False, **kwds):
         kwds["config"] = config
         super().__init__(**kwds)
-        
+
+        self.benchmark = config.get("benchmark", False)
+        self.benchmark_frames = None
+        self.benchmark_key = None
+        self.buffer_frames = config.get("buffer_frames", 100)
         self.fake_frame = 0
         self.fake_frame_size = [0,0]
+        self.last_delivered = -1
         self.pause_time = config.get("mean_pause", 0.1)
 
         #
@@ -56,7 +103,7 @@ class NoneCameraControl(cameraControl.CameraControl):
                                                                         max_value = 10.0))
         self.parameters.setv("max_intensity", 512)
         
-        chip_size = 512
+        chip_size = config.get("chip_size", 512)
         for pname in ["x_start", "x_end", "y_start", "y_end"]:
             self.parameters.getp(pname).setMaximum(chip_size)
 
@@ -92,6 +139,25 @@ class NoneCameraControl(cameraControl.CameraControl):
                                                        min_value = -50.0,
                                                        max_value = 25.0))
 
+        if self.benchmark:
+            self.parameters.add(params.ParameterRangeInt(description = "Number of emitters",
+                                                         name = "benchmark_emitters",
+                                                         value = config.get("benchmark_emitters", 200),
+                                                         min_value = 0,
+                                                         max_value = 100000))
+
+            self.parameters.add(params.ParameterRangeFloat(description = "Frame rate (0 = as fast as possible)",
+                                                           name = "benchmark_fps",
+                                                           value = config.get("benchmark_fps", 0.0),
+                                                           min_value = 0.0,
+                                                           max_value = 100000.0))
+
+            self.parameters.add(params.ParameterRangeInt(description = "Number of pre-generated frames",
+                                                         name = "benchmark_pool",
+                                                         value = config.get("benchmark_pool", 50),
+                                                         min_value = 1,
+                                                         max_value = 2000))
+
         self.newParameters(self.parameters, initialization = True)
 
     def newParameters(self, parameters, initialization = False):
@@ -132,26 +198,56 @@ class NoneCameraControl(cameraControl.CameraControl):
             p.set("fps", 1.0/p.get("exposure_time"))
 
             self.fake_frame_size = [size_x, size_y]
-            self.fake_frame = numpy.zeros(size_x * size_y, dtype = numpy.uint16)
-            for i in range(size_x):
-                for j in range(size_y):
-                    self.fake_frame[j*size_x+i] = i % 128 + j % 128
+            self.fake_frame = (numpy.arange(size_y)[:,None] % 128 + numpy.arange(size_x)[None,:] % 128).astype(numpy.uint16).reshape(-1)
+
+            if self.benchmark:
+                if (p.get("benchmark_fps") > 0.0):
+                    p.set("fps", p.get("benchmark_fps"))
+                else:
+                    p.set("fps", 1000.0)
+
+                # Only re-generate the frames if we have to as this can be slow.
+                key = (size_x, size_y, p.get("benchmark_emitters"), p.get("benchmark_pool"))
+                if (key != self.benchmark_key):
+                    self.benchmark_frames = makeBenchmarkFrames(size_x,
+                                                                size_y,
+                                                                p.get("benchmark_pool"),
+                                                                p.get("benchmark_emitters"))
+                    self.benchmark_key = key
 
             if running:
                 self.startCamera()
 
             self.camera_functionality.parametersChanged.emit()
         
+    def handleNewData(self, frames):
+        if (len(frames) > 0):
+            self.last_delivered = frames[-1].frame_number
+        super().handleNewData(frames)
+        
     def run(self):
         
         # Pause a random amount of time on start. 
         time.sleep(random.expovariate(1.0/self.pause_time))
-        
+
+        self.last_delivered = -1
         self.running = True
         self.thread_started = True
+        if self.benchmark:
+            self.runBenchmark()
+            return
+        
         while(self.running):
-            aframe = frame.Frame(numpy.roll(self.fake_frame,
-                                            int(self.frame_number * self.parameters.get("roll"))),
+
+            # This is equivalent to numpy.roll(), but without allocating
+            # a new array for each frame.
+            n_pixels = self.fake_frame.size
+            shift = int(self.frame_number * self.parameters.get("roll")) % n_pixels
+            np_data = self.frame_pool.getBuffer(n_pixels)
+            np_data[shift:] = self.fake_frame[:n_pixels-shift]
+            np_data[:shift] = self.fake_frame[n_pixels-shift:]
+            
+            aframe = frame.Frame(np_data,
                                  self.frame_number,
                                  self.fake_frame_size[0],
                                  self.fake_frame_size[1],
@@ -172,6 +268,62 @@ class NoneCameraControl(cameraControl.CameraControl):
         # Also pause on stop.
         #time.sleep(random.expovariate(1.0/self.pause_time))
 
+    def runBenchmark(self):
+        """
+        The camera thread in benchmark mode.
+
+        At a fixed frame rate frames are lost if the camera's buffer is
+        full. When running as fast as possible the camera waits for HAL
+        to catch up instead, so this measures the maximum rate that HAL
+        can sustain.
+        """
+        fps = self.parameters.get("benchmark_fps")
+        n_pixels = self.benchmark_frames.shape[1]
+        pool_size = self.benchmark_frames.shape[0]
+        start_time = time.perf_counter()
+        while(self.running):
+
+            # Figure out how many frames the camera has taken since the last time.
+            if (fps > 0.0):
+                n_frames = int((time.perf_counter() - start_time) * fps) + 1 - self.frame_number
+                if (n_frames < 1):
+                    time.sleep(max(0.0, self.frame_number/fps - (time.perf_counter() - start_time)))
+                    continue
+            else:
+                n_frames = 16
+
+            frame_data = []
+            for i in range(n_frames):
+                buffer_full = ((self.frame_number - self.last_delivered) > self.buffer_frames)
+                if buffer_full and (fps == 0.0):
+                    break
+
+                if not buffer_full:
+                    np_data = self.frame_pool.getBuffer(n_pixels)
+                    numpy.copyto(np_data, self.benchmark_frames[self.frame_number % pool_size])
+                    timestamp = None
+                    if (fps > 0.0):
+                        timestamp = self.frame_number/fps
+                    frame_data.append(frame.Frame(np_data,
+                                                  self.frame_number,
+                                                  self.fake_frame_size[0],
+                                                  self.fake_frame_size[1],
+                                                  self.camera_name,
+                                                  timestamp = timestamp))
+                self.frame_number += 1
+
+                if self.film_length is not None:
+                    if (self.frame_number == self.film_length):
+                        self.running = False
+                        break
+
+            # Emit new data signal.
+            if (len(frame_data) > 0):
+                self.newData.emit(frame_data)
+            else:
+                # Give the main thread a chance to catch up.
+                self.msleep(1)
+
 #
 # The MIT License
 #
@@ -21,6 +21,7 @@ import storm_control.sc_library.halExceptions as halExceptions
 import storm_control.sc_library.parameters as params
 
 import storm_control.hal4000.colorTables.colorTables as colorTables
+import storm_control.hal4000.halLib.frameStats as frameStats
 import storm_control.hal4000.halLib.halFunctionality as halFunctionality
 import storm_control.hal4000.halLib.halMessage as halMessage
 
@@ -351,7 +352,7 @@ class CameraFrameViewer(QtWidgets.QFrame):
         # mess..
         #
         if self.cam_fn is not None:
-            self.cam_fn.newFrame.disconnect(self.handleNewFrame)
+            self.cam_fn.newFrame.disconnect(frameStats.timedSlot(self.display_name, self.handleNewFrame))
             
         self.parameters.setv("feed_name", str(feed_name))
         self.feedChange.emit(feed_name)
@@ -395,6 +396,7 @@ class CameraFrameViewer(QtWidgets.QFrame):
 
     def handleNewScale(self, scale):
         self.setParameter("scale", scale)
+        self.camera_widget.setDisplayScale(scale)
 
     def handleRangeChange(self, scale_min, scale_max):
         if (scale_max == scale_min):
@@ -474,7 +476,7 @@ class CameraFrameViewer(QtWidgets.QFrame):
         # A sanity check that the old camera functionality is disconnected.
         if self.cam_fn is not None:
             try:
-                self.cam_fn.newFrame.disconnect(self.handleNewFrame)
+                self.cam_fn.newFrame.disconnect(frameStats.timedSlot(self.display_name, self.handleNewFrame))
             except TypeError:
                 pass
             else:
@@ -483,7 +485,7 @@ class CameraFrameViewer(QtWidgets.QFrame):
                 
         # Connect new camera functionality.
         self.cam_fn = camera_functionality
-        self.cam_fn.newFrame.connect(self.handleNewFrame)
+        self.cam_fn.newFrame.connect(frameStats.timedSlot(self.display_name, self.handleNewFrame))
 
         #
         # Add a sub-section for this camera / feed if we don't already have one.
@@ -22,6 +22,16 @@ class Display(halModule.HalModule):
     """
     Controller for one or more displays of camera / feed data.
     """
+    message_types = ["configuration",
+                     "configure1",
+                     "current parameters",
+                     "get functionality",
+                     "new parameters",
+                     "show",
+                     "start",
+                     "start film",
+                     "stop film"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
 
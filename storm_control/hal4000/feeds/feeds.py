@@ -3,6 +3,15 @@
 This module enables the processing of camera frame(s) with
 operations like averaging, slicing, etc..
 
+Feeds run at the full camera frame rate so they try not to allocate
+new arrays for every frame. Intermediate results are stored in arrays
+that are allocated when the feed is connected to it's camera, and the
+frames that the feeds emit come from a frame.FramePool.
+
+Feeds receive frames from their camera in batches (frame.FrameBatch),
+the frames that a feed creates from a batch are also sent on as a
+single batch.
+
 It is also responsible for keeping tracking of how many
 different cameras / feeds are available for each parameter
 file, whether the cameras / feeds should be saved when
@@ -21,6 +30,7 @@ import storm_control.sc_library.parameters as params
 
 import storm_control.hal4000.camera.frame as frame
 import storm_control.hal4000.camera.cameraFunctionality as cameraFunctionality
+import storm_control.hal4000.halLib.frameStats as frameStats
 import storm_control.hal4000.halLib.halMessage as halMessage
 import storm_control.hal4000.halLib.halModule as halModule
 
@@ -55,6 +65,14 @@ def checkParameters(parameters):
         if not ((x_pixels % 4) == 0):
             raise FeedException("The x size of the feed ROI must be a multiple of 4 in " + feed_name)
 
+        # Check that the binned feed size is also a multiple of 4 in x.
+        if (fp.get("feed_type") == "decimate"):
+            binning = fp.get("binning", 2)
+            if (binning < 1):
+                raise FeedException("The binning must be at least 1 in " + feed_name)
+            if not (((x_pixels // binning) % 4) == 0):
+                raise FeedException("The binned x size of the feed ROI must be a multiple of 4 in " + feed_name)
+
 
 class FeedException(halExceptions.HalException):
     pass
@@ -77,8 +95,10 @@ class FeedFunctionality(cameraFunctionality.CameraFunctionality):
         self.feed_name = feed_name
         self.feed_parameters = self.parameters
         self.frame_number = 0
+        self.frame_pool = frame.FramePool()
         self.frame_slice = None
         self.number_connections = 0
+        self.pending = []
         self.x_pixels = 0
         self.y_pixels = 0
 
@@ -96,7 +116,7 @@ class FeedFunctionality(cameraFunctionality.CameraFunctionality):
         assert(self.number_connections == 0)
         self.number_connections += 1
         
-        self.cam_fn.newFrame.connect(self.handleNewFrame)
+        self.cam_fn.newFrames.connect(frameStats.timedSlot(self.camera_name, self.handleNewFrames))
         self.cam_fn.started.connect(self.handleStarted)
         self.cam_fn.stopped.connect(self.handleStopped)
 
@@ -109,7 +129,7 @@ class FeedFunctionality(cameraFunctionality.CameraFunctionality):
         self.number_connections += 1
         
         if self.cam_fn is not None:
-            self.cam_fn.newFrame.disconnect(self.handleNewFrame)
+            self.cam_fn.newFrames.disconnect(frameStats.timedSlot(self.camera_name, self.handleNewFrames))
             self.cam_fn.started.disconnect(self.handleStarted)
             self.cam_fn.stopped.disconnect(self.handleStopped)
 
@@ -119,6 +139,32 @@ class FeedFunctionality(cameraFunctionality.CameraFunctionality):
         """
         return self.cam_fn
 
+    def batchView(self, frame_batch):
+        """
+        Returns a (frames, y, x) view of the part of the frames in the
+        batch based on self.frame_slice. Only use this if the batch has
+        it's data in a single array, see frame.FrameBatch.hasData().
+        """
+        view = frame_batch.getData().reshape(len(frame_batch), frame_batch.image_y, frame_batch.image_x)
+        if self.frame_slice is None:
+            return view
+        else:
+            return view[(slice(None),) + self.frame_slice]
+
+    def emitFrame(self, np_data, frame_number, timestamp = None):
+        """
+        Emit a new frame. np_data is a (y_pixels, x_pixels) array that is
+        copied into a frame from the frame pool.
+        """
+        frame_data = self.frame_pool.getBuffer(self.x_pixels * self.y_pixels)
+        numpy.copyto(frame_data.reshape(self.y_pixels, self.x_pixels), np_data, casting = "unsafe")
+        self.pending.append(frame.Frame(frame_data,
+                                        frame_number,
+                                        self.x_pixels,
+                                        self.y_pixels,
+                                        self.camera_name,
+                                        timestamp = timestamp))
+
     def getFeedName(self):
         """
         Return the name of the feed (as specified in the XML file).
@@ -126,12 +172,23 @@ class FeedFunctionality(cameraFunctionality.CameraFunctionality):
         return self.feed_name
 
     def handleNewFrame(self, new_frame):
+        """
+        Process a single frame, sub-classes should override this and / or
+        processFrames(). New frames should be added to self.pending.
+        """
         sliced_data = self.sliceFrame(new_frame)
-        self.newFrame.emit(frame.Frame(sliced_data,
-                                       new_frame.frame_number,
-                                       self.x_pixels,
-                                       self.y_pixels,
-                                       self.camera_name))
+        self.pending.append(frame.Frame(sliced_data,
+                                        new_frame.frame_number,
+                                        self.x_pixels,
+                                        self.y_pixels,
+                                        self.camera_name,
+                                        timestamp = new_frame.timestamp))
+
+    def handleNewFrames(self, frame_batch):
+        self.processFrames(frame_batch)
+        frames = self.pending
+        self.pending = []
+        self.emitFrames(frames)
 
     def handleStarted(self):
         self.started.emit()
@@ -160,6 +217,14 @@ class FeedFunctionality(cameraFunctionality.CameraFunctionality):
     def isMaster(self):
         return False
 
+    def processFrames(self, frame_batch):
+        """
+        Process a batch of frames. The default is to process them one
+        at a time.
+        """
+        for new_frame in frame_batch:
+            self.handleNewFrame(new_frame)
+
     def reset(self):
         self.frame_number = 0
 
@@ -226,15 +291,26 @@ class FeedFunctionality(cameraFunctionality.CameraFunctionality):
 
     def sliceFrame(self, new_frame):
         """
-        Slices out a part of the frame based on self.frame_slice.
+        Slices out a part of the frame based on self.frame_slice. If the
+        frame is sliced the slice is copied into a frame pool buffer.
         """
         if self.frame_slice is None:
             return new_frame.np_data
         else:
-            w = new_frame.image_x
-            h = new_frame.image_y
-            sliced_frame = numpy.reshape(new_frame.np_data, (h,w))[self.frame_slice]
-            return numpy.ascontiguousarray(sliced_frame)
+            sliced_data = self.frame_pool.getBuffer(self.x_pixels * self.y_pixels)
+            numpy.copyto(sliced_data.reshape(self.y_pixels, self.x_pixels), self.sliceView(new_frame))
+            return sliced_data
+
+    def sliceView(self, new_frame):
+        """
+        Returns a (y, x) view of the part of the frame based on
+        self.frame_slice. This does not copy the frame data.
+        """
+        view = new_frame.np_data.reshape(new_frame.image_y, new_frame.image_x)
+        if self.frame_slice is None:
+            return view
+        else:
+            return view[self.frame_slice]
 
     def toggleShutter(self):
         assert False
@@ -247,36 +323,117 @@ class FeedFunctionalityAverage(FeedFunctionality):
     def __init__(self, **kwds):
         super().__init__(**kwds)
 
-        self.average_frame = None
+        self.accumulator = None
         self.counts = 0
         self.frames_to_average = self.parameters.get("frames_to_average")
 
     def handleNewFrame(self, new_frame):
-        sliced_data = self.sliceFrame(new_frame)
+        sliced_view = self.sliceView(new_frame)
 
-        if self.average_frame is None:
-            self.average_frame = sliced_data.astype(numpy.uint32)
+        if (self.counts == 0):
+            numpy.copyto(self.accumulator, sliced_view)
         else:
-            self.average_frame += sliced_data
+            numpy.add(self.accumulator, sliced_view, out = self.accumulator)
         self.counts += 1
 
         if (self.counts == self.frames_to_average):
-            average_frame = self.average_frame/self.frames_to_average
-            self.newFrame.emit(frame.Frame(average_frame.astype(numpy.uint16),
-                                           self.frame_number,
-                                           self.x_pixels,
-                                           self.y_pixels,
-                                           self.camera_name))
-            self.average_frame = None
+            numpy.floor_divide(self.accumulator, self.frames_to_average, out = self.accumulator)
+            self.emitFrame(self.accumulator, self.frame_number, timestamp = new_frame.timestamp)
             self.counts = 0
             self.frame_number += 1
 
+    def processFrames(self, frame_batch):
+        #
+        # Unless the batch already has it's data in a single array it is
+        # cheaper to process the frames one at a time as this does not
+        # allocate or copy.
+        #
+        if (len(frame_batch) == 1) or not frame_batch.hasData():
+            for new_frame in frame_batch:
+                self.handleNewFrame(new_frame)
+            return
+
+        # Sum up as many frames as possible in a single step.
+        view = self.batchView(frame_batch)
+        i = 0
+        while (i < len(frame_batch)):
+            j = min(len(frame_batch), i + self.frames_to_average - self.counts)
+            if (self.counts == 0):
+                numpy.sum(view[i:j], axis = 0, dtype = numpy.uint32, out = self.accumulator)
+            else:
+                numpy.add(self.accumulator, numpy.sum(view[i:j], axis = 0, dtype = numpy.uint32), out = self.accumulator)
+            self.counts += j - i
+            i = j
+
+            if (self.counts == self.frames_to_average):
+                numpy.floor_divide(self.accumulator, self.frames_to_average, out = self.accumulator)
+                self.emitFrame(self.accumulator, self.frame_number, timestamp = frame_batch[j-1].timestamp)
+                self.counts = 0
+                self.frame_number += 1
+
     def reset(self):
         super().reset()
-        self.average_frame = None
         self.counts = 0
-        
-    
+
+    def setCameraFunctionality(self, camera_functionality):
+        super().setCameraFunctionality(camera_functionality)
+        self.accumulator = numpy.zeros((self.y_pixels, self.x_pixels), dtype = numpy.uint32)
+
+
+class FeedFunctionalityDecimate(FeedFunctionality):
+    """
+    The feed functionality for binning frames, each binning x binning
+    block of pixels is replaced by their average.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.accumulator = None
+        self.binning = self.parameters.get("binning")
+        self.sliced_x = 0
+        self.sliced_y = 0
+
+    def handleNewFrame(self, new_frame):
+        sliced_view = self.sliceView(new_frame)
+        b = self.binning
+
+        # Sum up the pixels in each block, any pixels at the edges that
+        # don't fill a complete block are ignored.
+        numpy.copyto(self.accumulator, sliced_view[0:self.sliced_y:b,0:self.sliced_x:b])
+        for i in range(b):
+            for j in range(b):
+                if (i > 0) or (j > 0):
+                    numpy.add(self.accumulator,
+                              sliced_view[i:self.sliced_y:b,j:self.sliced_x:b],
+                              out = self.accumulator)
+        numpy.floor_divide(self.accumulator, b * b, out = self.accumulator)
+        self.emitFrame(self.accumulator, new_frame.frame_number, timestamp = new_frame.timestamp)
+
+    def setCameraFunctionality(self, camera_functionality):
+        super().setCameraFunctionality(camera_functionality)
+
+        # The feed coordinates are now in units of the binned pixels.
+        b = self.binning
+        p = self.parameters
+        self.sliced_x = self.x_pixels - (self.x_pixels % b)
+        self.sliced_y = self.y_pixels - (self.y_pixels % b)
+        self.x_pixels = self.x_pixels // b
+        self.y_pixels = self.y_pixels // b
+
+        p.set("x_pixels", self.x_pixels)
+        p.set("y_pixels", self.y_pixels)
+        p.set("bytes_per_frame", 2 * self.x_pixels * self.y_pixels)
+        for pname in ["x_bin", "y_bin"]:
+            bin_p = p.getp(pname)
+            bin_p.setMaximum(bin_p.getv() * b)
+            bin_p.setv(bin_p.getv() * b)
+        p.setv("x_start", (p.get("x_start") - 1) // b + 1)
+        p.setv("x_end", p.get("x_start") + self.x_pixels - 1)
+        p.setv("y_start", (p.get("y_start") - 1) // b + 1)
+        p.setv("y_end", p.get("y_start") + self.y_pixels - 1)
+
+        self.accumulator = numpy.zeros((self.y_pixels, self.x_pixels), dtype = numpy.uint32)
+
+
 class FeedFunctionalityInterval(FeedFunctionality):
     """
     The feed functionality for picking out a sub-set of the frames.
@@ -289,16 +446,121 @@ class FeedFunctionalityInterval(FeedFunctionality):
         self.cycle_length = self.parameters.get("cycle_length")
 
     def handleNewFrame(self, new_frame):
-        sliced_data = self.sliceFrame(new_frame)
-        
         if (new_frame.frame_number % self.cycle_length) in self.capture_frames:
-            self.newFrame.emit(frame.Frame(sliced_data,
-                                           self.frame_number,
-                                           self.x_pixels,
-                                           self.y_pixels,
-                                           self.camera_name))
+            sliced_data = self.sliceFrame(new_frame)
+            self.pending.append(frame.Frame(sliced_data,
+                                            self.frame_number,
+                                            self.x_pixels,
+                                            self.y_pixels,
+                                            self.camera_name,
+                                            timestamp = new_frame.timestamp))
+            self.frame_number += 1
+
+
+class FeedFunctionalityMaxProjection(FeedFunctionality):
+    """
+    The feed functionality for the maximum projection of a group of frames.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.counts = 0
+        self.frames_to_project = self.parameters.get("frames_to_project")
+        self.projection = None
+
+    def handleNewFrame(self, new_frame):
+        sliced_view = self.sliceView(new_frame)
+
+        if (self.counts == 0):
+            numpy.copyto(self.projection, sliced_view)
+        else:
+            numpy.maximum(self.projection, sliced_view, out = self.projection)
+        self.counts += 1
+
+        if (self.counts == self.frames_to_project):
+            self.emitFrame(self.projection, self.frame_number, timestamp = new_frame.timestamp)
+            self.counts = 0
             self.frame_number += 1
 
+    def processFrames(self, frame_batch):
+        #
+        # Unless the batch already has it's data in a single array it is
+        # cheaper to process the frames one at a time as this does not
+        # allocate or copy.
+        #
+        if (len(frame_batch) == 1) or not frame_batch.hasData():
+            for new_frame in frame_batch:
+                self.handleNewFrame(new_frame)
+            return
+
+        # Project as many frames as possible in a single step.
+        view = self.batchView(frame_batch)
+        i = 0
+        while (i < len(frame_batch)):
+            j = min(len(frame_batch), i + self.frames_to_project - self.counts)
+            if (self.counts == 0):
+                numpy.amax(view[i:j], axis = 0, out = self.projection)
+            else:
+                numpy.maximum(self.projection, numpy.amax(view[i:j], axis = 0), out = self.projection)
+            self.counts += j - i
+            i = j
+
+            if (self.counts == self.frames_to_project):
+                self.emitFrame(self.projection, self.frame_number, timestamp = frame_batch[j-1].timestamp)
+                self.counts = 0
+                self.frame_number += 1
+
+    def reset(self):
+        super().reset()
+        self.counts = 0
+
+    def setCameraFunctionality(self, camera_functionality):
+        super().setCameraFunctionality(camera_functionality)
+        self.projection = numpy.zeros((self.y_pixels, self.x_pixels), dtype = numpy.uint16)
+
+
+class FeedFunctionalityRunningMean(FeedFunctionality):
+    """
+    The feed functionality for the running mean of the last N frames. Unlike
+    the average feed this emits a frame for every camera frame.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.counts = 0
+        self.frames = None
+        self.frames_to_average = self.parameters.get("frames_to_average")
+        self.index = 0
+        self.mean = None
+        self.total = None
+
+    def handleNewFrame(self, new_frame):
+        sliced_view = self.sliceView(new_frame)
+
+        # Replace the oldest frame in the ring with the new frame.
+        oldest = self.frames[self.index]
+        if (self.counts == self.frames_to_average):
+            numpy.subtract(self.total, oldest, out = self.total)
+        else:
+            self.counts += 1
+        numpy.copyto(oldest, sliced_view)
+        numpy.add(self.total, oldest, out = self.total)
+        self.index = (self.index + 1) % self.frames_to_average
+
+        numpy.floor_divide(self.total, self.counts, out = self.mean)
+        self.emitFrame(self.mean, new_frame.frame_number, timestamp = new_frame.timestamp)
+
+    def reset(self):
+        super().reset()
+        self.counts = 0
+        self.index = 0
+        if self.total is not None:
+            self.total.fill(0)
+
+    def setCameraFunctionality(self, camera_functionality):
+        super().setCameraFunctionality(camera_functionality)
+        self.frames = numpy.zeros((self.frames_to_average, self.y_pixels, self.x_pixels), dtype = numpy.uint16)
+        self.mean = numpy.zeros((self.y_pixels, self.x_pixels), dtype = numpy.uint32)
+        self.total = numpy.zeros((self.y_pixels, self.x_pixels), dtype = numpy.uint32)
+
 
 class FeedFunctionalitySlice(FeedFunctionality):
     """
@@ -381,6 +643,13 @@ class FeedController(object):
                                                     name = "frames_to_average",
                                                     value = 1))
                             
+            elif (feed_type == "decimate"):
+                fclass = FeedFunctionalityDecimate
+
+                feed_params.add(params.ParameterInt(description = "Binning in x and y.",
+                                                    name = "binning",
+                                                    value = 2))
+
             elif (feed_type == "interval"):
                 fclass = FeedFunctionalityInterval
 
@@ -392,6 +661,20 @@ class FeedController(object):
                                                        name = "capture_frames",
                                                        value = "1"))
 
+            elif (feed_type == "max_projection"):
+                fclass = FeedFunctionalityMaxProjection
+
+                feed_params.add(params.ParameterInt(description = "Number of frames in the projection.",
+                                                    name = "frames_to_project",
+                                                    value = 1))
+
+            elif (feed_type == "running_mean"):
+                fclass = FeedFunctionalityRunningMean
+
+                feed_params.add(params.ParameterInt(description = "Number of frames in the running mean.",
+                                                    name = "frames_to_average",
+                                                    value = 1))
+
             elif (feed_type == "slice"):
                 fclass = FeedFunctionalitySlice
             else:
@@ -447,17 +730,38 @@ class Feeds(halModule.HalModule):
     """
     Feeds controller.
     """
+    message_types = ["configure1",
+                     "get feed names",
+                     "get frame statistics",
+                     "get functionality",
+                     "new parameters",
+                     "start film",
+                     "stop film",
+                     "tcp message",
+                     "updated parameters"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.camera_names = []
         self.feed_controller = None
         self.feed_names = []
+        self.feeds_changed = True
+
+        # Frame rate / latency instrumentation, see halLib.frameStats.
+        frameStats.setEnabled(module_params.get("configuration.frame_statistics", False))
         
         # This message comes from the display.display when it creates a new
         # viewer.
         halMessage.addMessage("get feed names",
                               validator = {"data" : {"extra data" : [False, str]},
                                            "resp" : {"feed names" : [True, list]}})
+
+        # Request the camera / feed frame statistics. This can also be used
+        # to turn the statistics on or off, and / or to reset them.
+        halMessage.addMessage("get frame statistics",
+                              validator = {"data" : {"enable" : [False, bool],
+                                                     "reset" : [False, bool]},
+                                           "resp" : {"statistics" : [True, dict]}})
         
     def broadcastCurrentFeeds(self):
         """
@@ -472,6 +776,27 @@ class Feeds(halModule.HalModule):
         self.sendMessage(halMessage.HalMessage(m_type = "configuration",
                                                data = {"properties" : props}))
 
+    def feedsChanged(self, data):
+        """
+        Returns True if the feeds need to be re-created for the 'new
+        parameters' message data. This is the case if the feed parameters
+        changed, or the parameters of any of the cameras that the feeds
+        are using.
+        """
+        if not ("changes" in data):
+            return True
+        
+        changes = data["changes"]
+        if "feeds" in changes:
+            return True
+
+        if self.feed_controller is not None:
+            for feed in self.feed_controller.getFeeds():
+                if feed.getParameter("source") in changes:
+                    return True
+
+        return False
+
     def handleResponse(self, message, response):
         if message.isType("get functionality"):
             feed = self.feed_controller.getFeed(message.getData()["extra data"])
@@ -514,10 +839,23 @@ class Feeds(halModule.HalModule):
         elif message.isType("get feed names"):
             message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
                                                               data = {"feed names" : self.feed_names}))
+
+        elif message.isType("get frame statistics"):
+            data = message.getData()
+            message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
+                                                              data = {"statistics" : frameStats.getStatistics()}))
+            if data.get("reset", False):
+                frameStats.reset()
+            if "enable" in data:
+                frameStats.setEnabled(data["enable"])
             
         elif message.isType("new parameters"):
             params = message.getData()["parameters"]
             checkParameters(params)
+            self.feeds_changed = self.feedsChanged(message.getData())
+            if not self.feeds_changed:
+                return
+            
             if self.feed_controller is not None:
                 self.feed_controller.disconnectFeeds()
                 message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
@@ -527,6 +865,18 @@ class Feeds(halModule.HalModule):
                 self.feed_controller = FeedController(parameters = params.get("feeds"))
             
         elif message.isType("updated parameters"):
+
+            # The feeds did not change, but film.film (and others) still expect
+            # a 'configuration' message from us at the end of a parameter change.
+            if not self.feeds_changed:
+                self.broadcastCurrentFeeds()
+                if self.feed_controller is not None:
+                    self.sendMessage(halMessage.HalMessage(m_type = "parameters changed",
+                                                           data = {"new parameters" : self.feed_controller.getParameters().copy()}))
+                else:
+                    self.sendMessage(halMessage.HalMessage(m_type = "parameters changed"))
+                return
+            
             self.feed_names = copy.copy(self.camera_names)
             if self.feed_controller is not None:
                 for feed in self.feed_controller.getFeeds():
@@ -547,3 +897,15 @@ class Feeds(halModule.HalModule):
                 message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
                                                                   data = {"parameters" : self.feed_controller.getParameters()}))
 
+        elif message.isType("tcp message"):
+            tcp_message = message.getData()["tcp message"]
+            if tcp_message.isType("Get Frame Statistics"):
+                if not tcp_message.isTest():
+                    tcp_message.addResponse("statistics", frameStats.getStatistics())
+                    if tcp_message.getData("reset", default = False):
+                        frameStats.reset()
+                    if tcp_message.getData("enable") is not None:
+                        frameStats.setEnabled(bool(tcp_message.getData("enable")))
+                message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
+                                                                  data = {"handled" : True}))
+
@@ -24,6 +24,7 @@ import storm_control.sc_library.parameters as params
 
 import storm_control.hal4000.film.filmRequest as filmRequest
 import storm_control.hal4000.film.filmSettings as filmSettings
+import storm_control.hal4000.film.frameMetadataWriter as frameMetadataWriter
 import storm_control.hal4000.halLib.halMessage as halMessage
 import storm_control.hal4000.halLib.halMessageBox as halMessageBox
 import storm_control.hal4000.halLib.halModule as halModule
@@ -331,10 +332,13 @@ class Film(halModule.HalModule):
 
         self.active_cameras = 0
         self.camera_functionalities = []
+        self.dropped_frames = 0
         self.feed_names = None
         self.film_settings = None
         self.film_state = "idle"
         self.locked_out = False
+        self.metadata_sources = frameMetadataWriter.FrameMetadataSources()
+        self.metadata_writers = []
         self.number_frames = 0
         self.number_fn_requested = 0
         self.parameter_change = False
@@ -345,6 +349,16 @@ class Film(halModule.HalModule):
         self.writers = None
         self.writers_stopped_timer = QtCore.QTimer(self)
 
+        # If this is greater than zero the frames are saved by a separate
+        # thread that can buffer up to this many frames per camera.
+        self.writer_buffers = module_params.get("configuration.writer_buffers", 0)
+
+        # If this is True we also save a per-frame metadata (.fmd) file for each
+        # movie with the time stamps, stage position, focus lock and illumination
+        # powers for every frame.
+        self.frame_metadata = module_params.get("configuration.frame_metadata", False)
+        self.ilm_fn_name = module_params.get("configuration.illumination_functionality", "illumination")
+
         try:
             self.logfile_fp = open(module_params.get("directory") + "image_log.txt", "a")
         except FileNotFoundError:
@@ -449,7 +463,20 @@ class Film(halModule.HalModule):
         
     def handleResponses(self, message):
 
-        if message.isType("get functionality"):
+        if message.isType("get functionality") and ("extra data" in message.getData()):
+            for response in message.getResponses():
+                functionality = response.getData()["functionality"]
+                extra_data = message.getData()["extra data"]
+                if (extra_data == "ilm_fn"):
+                    self.metadata_sources.setIlluminationFunctionality(functionality)
+                elif (extra_data == "qpd_fn"):
+                    self.metadata_sources.setQPDFunctionality(functionality)
+                elif (extra_data == "stage_fn"):
+                    self.metadata_sources.setStageFunctionality(functionality)
+                elif (extra_data == "z_stage_fn"):
+                    self.metadata_sources.setZStageFunctionality(functionality)
+
+        elif message.isType("get functionality"):
             assert (len(message.getResponses()) == 1)
             for response in message.getResponses():
                 self.camera_functionalities.append(response.getData()["functionality"])
@@ -483,6 +510,9 @@ class Film(halModule.HalModule):
                                                  value = hgit.getVersion()))
                 acq_p.add(params.ParameterInt(name = "number_frames",
                                               value = number_frames))
+                if (self.writer_buffers > 0):
+                    acq_p.add(params.ParameterInt(name = "dropped_frames",
+                                                  value = self.dropped_frames))
                 for response in message.getResponses():
                     data = response.getData()
 
@@ -532,11 +562,25 @@ class Film(halModule.HalModule):
                                                            data = {"name" : name}))
                     self.number_fn_requested += 1
 
+            elif message.sourceIs("focuslock") and self.frame_metadata:
+                properties = message.getData()["properties"]
+                self.sendMessage(halMessage.HalMessage(m_type = "get functionality",
+                                                       data = {"name" : properties["qpd functionality name"],
+                                                               "extra data" : "qpd_fn"}))
+                self.sendMessage(halMessage.HalMessage(m_type = "get functionality",
+                                                       data = {"name" : properties["z stage functionality name"],
+                                                               "extra data" : "z_stage_fn"}))
+
             elif message.sourceIs("illumination"):
                 properties = message.getData()["properties"]
                 if "shutters filename" in properties:
                     self.view.setShutters(properties["shutters filename"])
 
+            elif message.sourceIs("stage") and self.frame_metadata:
+                self.sendMessage(halMessage.HalMessage(m_type = "get functionality",
+                                                       data = {"name" : message.getData()["properties"]["stage functionality name"],
+                                                               "extra data" : "stage_fn"}))
+
             elif message.sourceIs("mosaic"):
                 # We need to keep track of the current value so that
                 # we can save this in the tif images / stacks.
@@ -562,6 +606,11 @@ class Film(halModule.HalModule):
             self.sendMessage(halMessage.HalMessage(m_type = "wait for",
                                                    data = {"module names" : ["settings"]}))
 
+            if self.frame_metadata:
+                self.sendMessage(halMessage.HalMessage(m_type = "get functionality",
+                                                       data = {"name" : self.ilm_fn_name,
+                                                               "extra data" : "ilm_fn"}))
+
         elif message.isType("current parameters"):
             message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
                                                               data = {"parameters" : self.view.getParameters().copy()}))
@@ -605,6 +654,7 @@ class Film(halModule.HalModule):
             film_settings = self.view.getFilmSettings(message.getData()["request"])
             if film_settings is not None:
                 film_settings.setPixelSize(self.pixel_size)
+                film_settings.setWriterBuffers(self.writer_buffers)
                 self.startFilmingLevel1(film_settings)
             else:
                 self.setLockout(False)
@@ -695,6 +745,13 @@ class Film(halModule.HalModule):
             for camera in self.camera_functionalities:
                 if camera.getParameter("saved"):
                     self.writers.append(imagewriters.createFileWriter(camera, self.film_settings))
+
+        self.metadata_writers = []
+        if self.frame_metadata:
+            for writer in self.writers:
+                self.metadata_writers.append(frameMetadataWriter.FrameMetadataWriter(camera_functionality = writer.cam_fn,
+                                                                                     filename = writer.basename + ".fmd",
+                                                                                     sources = self.metadata_sources))
         if (len(self.writers) == 0):
             self.view.updateSize(0.0)
         
@@ -760,8 +817,18 @@ class Film(halModule.HalModule):
                 return
 
         # Close writers.
+        self.dropped_frames = 0
         for writer in self.writers:
             writer.closeWriter()
+            if writer.isBuffered():
+                self.dropped_frames += writer.getDroppedFrames()
+                if (writer.getDroppedFrames() > 0):
+                    print(">> Warning", writer.getDroppedFrames(), "frames were dropped saving", writer.filename,
+                          "maximum buffer usage was {0:.1f}%".format(100.0 * writer.getMaxBufferFill()))
+
+        for writer in self.metadata_writers:
+            writer.closeWriter()
+        self.metadata_writers = []
 
         # Enable the UI.
         self.view.enableUI(True)
@@ -17,6 +17,7 @@ class FilmSettings(object):
                  run_shutters = False,
                  save_film = True,
                  tcp_request = False,
+                 writer_buffers = 0,
                  **kwds):
     
         super().__init__(**kwds)
@@ -29,6 +30,7 @@ class FilmSettings(object):
         assert(isinstance(run_shutters, bool))
         assert(isinstance(save_film, bool))
         assert(isinstance(tcp_request, bool))
+        assert(isinstance(writer_buffers, int))
 
         # Either "run_till_abort" or "fixed_length"
         self.acq_mode = acq_mode
@@ -55,6 +57,10 @@ class FilmSettings(object):
         # Whether the film request came from the record button or TCP.
         self.tcp_request = tcp_request
 
+        # The number of frames to buffer when saving the film in a
+        # separate thread. 0 means the frames are saved immediately.
+        self.writer_buffers = writer_buffers
+
     def getBasename(self):
         return self.basename
 
@@ -66,6 +72,9 @@ class FilmSettings(object):
 
     def getPixelSize(self):
         return self.pixel_size
+
+    def getWriterBuffers(self):
+        return self.writer_buffers
     
     def isFixedLength(self):
         return (self.acq_mode == "fixed_length")
@@ -88,3 +97,6 @@ class FilmSettings(object):
     def setPixelSize(self, new_size):
         self.pixel_size = new_size
 
+    def setWriterBuffers(self, writer_buffers):
+        self.writer_buffers = writer_buffers
+
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Saves per-frame metadata (timestamps, stage position, focus lock
+and illumination powers) alongside a movie. See
+sc_library.frameMetadata for a description of the file format.
+
+The metadata is accumulated in a numpy array and written to disk
+in batches.
+
+Hazen 10/26
+"""
+import math
+import numpy
+
+import storm_control.sc_library.frameMetadata as frameMetadata
+
+import storm_control.hal4000.halLib.frameStats as frameStats
+
+
+class FrameMetadataSources(object):
+    """
+    Keeps track of the functionalities that the metadata comes from,
+    and the most recent focus lock QPD reading.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.ilm_fn = None
+        self.qpd_fn = None
+        self.qpd_offset = math.nan
+        self.qpd_sum = math.nan
+        self.stage_fn = None
+        self.z_stage_fn = None
+
+    def getChannelNames(self):
+        if self.ilm_fn is not None:
+            return self.ilm_fn.getChannelNames()
+        return []
+
+    def getChannelPowers(self):
+        return list(map(float, self.ilm_fn.getChannelPowers()))
+
+    def getQPD(self):
+        return [self.qpd_offset, self.qpd_sum]
+
+    def getStagePosition(self):
+        if self.stage_fn is not None:
+            pos_dict = self.stage_fn.getCurrentPosition()
+            if pos_dict is not None:
+                return [pos_dict["x"], pos_dict["y"]]
+        return [math.nan, math.nan]
+
+    def getZPosition(self):
+        if self.z_stage_fn is not None:
+            return self.z_stage_fn.getCurrentPosition()
+        return math.nan
+
+    def handleQPDUpdate(self, qpd_dict):
+        if qpd_dict["is_good"]:
+            self.qpd_offset = qpd_dict["offset"]
+            self.qpd_sum = qpd_dict["sum"]
+        else:
+            self.qpd_offset = math.nan
+            self.qpd_sum = math.nan
+
+    def setIlluminationFunctionality(self, ilm_fn):
+        self.ilm_fn = ilm_fn
+
+    def setQPDFunctionality(self, qpd_fn):
+        if self.qpd_fn is not None:
+            self.qpd_fn.qpdUpdate.disconnect(self.handleQPDUpdate)
+        self.qpd_fn = qpd_fn
+        self.qpd_fn.qpdUpdate.connect(self.handleQPDUpdate)
+
+    def setStageFunctionality(self, stage_fn):
+        self.stage_fn = stage_fn
+
+    def setZStageFunctionality(self, z_stage_fn):
+        self.z_stage_fn = z_stage_fn
+
+
+class FrameMetadataWriter(object):
+    """
+    Records the metadata for each frame from a camera (or feed).
+    """
+    def __init__(self, batch_size = 256, camera_functionality = None, filename = None, sources = None, **kwds):
+        super().__init__(**kwds)
+        self.cam_fn = camera_functionality
+        self.filename = filename
+        self.n_records = 0
+        self.sources = sources
+
+        channels = self.sources.getChannelNames()
+        self.have_powers = (len(channels) > 0)
+
+        columns = [["frame", "<i8"],
+                   ["camera_time", "<f8"],
+                   ["arrival_time", "<f8"],
+                   ["stage_x", "<f8"],
+                   ["stage_y", "<f8"],
+                   ["z", "<f4"],
+                   ["qpd_offset", "<f4"],
+                   ["qpd_sum", "<f4"]]
+        for channel in channels:
+            columns.append(["power_" + channel, "<f4"])
+
+        self.records = numpy.zeros(batch_size, dtype = frameMetadata.makeDType(columns))
+
+        self.fp = open(self.filename, "wb")
+        frameMetadata.writeHeader(self.fp, {"camera" : self.cam_fn.getCameraName(),
+                                            "channels" : channels,
+                                            "columns" : columns})
+
+        self.cam_fn.newFrame.connect(frameStats.timedSlot("frame metadata", self.handleNewFrame))
+
+    def closeWriter(self):
+        self.cam_fn.newFrame.disconnect(frameStats.timedSlot("frame metadata", self.handleNewFrame))
+        self.writeRecords()
+        self.fp.close()
+
+    def handleNewFrame(self, frame):
+        camera_time = frame.timestamp
+        if camera_time is None:
+            camera_time = math.nan
+        record = [frame.frame_number, camera_time, frame.arrival_time]
+        record.extend(self.sources.getStagePosition())
+        record.append(self.sources.getZPosition())
+        record.extend(self.sources.getQPD())
+        if self.have_powers:
+            record.extend(self.sources.getChannelPowers())
+
+        self.records[self.n_records] = tuple(record)
+        self.n_records += 1
+        if (self.n_records == self.records.size):
+            self.writeRecords()
+
+    def writeRecords(self):
+        self.records[:self.n_records].tofile(self.fp)
+        self.n_records = 0
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
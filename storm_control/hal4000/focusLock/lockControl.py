@@ -3,14 +3,32 @@
 This class handles focus lock control, i.e. updating the
 position if the focus lock is locked, etc.
 
+The QPD readings either come from polling the QPD functionality, or
+from a lockEngine.LockEngine thread if 'engine_rate' is specified in
+the configuration. In the later case the lock mode is also called
+from the engine thread, so all access to the lock mode is protected
+by self.mode_lock.
+
+The state of the lock at each QPD reading is recorded by a
+lockRecorder.LockRecorder, this is saved at the end of each
+(saved) film and summary statistics are included in the response
+to the 'Check Focus Lock' TCP message.
+
 Hazen 04/17
 """
+import threading
 
 from PyQt5 import QtCore
 import tifffile
 
+import storm_control.hal4000.halLib.frameStats as frameStats
 import storm_control.hal4000.halLib.halMessage as halMessage
 
+import storm_control.hal4000.focusLock.lockEngine as lockEngine
+import storm_control.hal4000.focusLock.lockRecorder as lockRecorder
+
+import storm_control.sc_hardware.baseClasses.hardwareModule as hardwareModule
+
 
 class LockControl(QtCore.QObject):
     controlMessage = QtCore.pyqtSignal(object)
@@ -18,7 +36,10 @@ class LockControl(QtCore.QObject):
     def __init__(self, configuration = None, **kwds):
         super().__init__(**kwds)
         self.current_state = None
+        self.engine = None
+        self.film_basename = None
         self.lock_mode = None
+        self.mode_lock = threading.RLock()
         self.offset_fp = None
         self.qpd_functionality = None
         self.timing_functionality = None
@@ -29,11 +50,32 @@ class LockControl(QtCore.QObject):
         self.diagnostics_mode = configuration.get("diagnostics_mode", False)
         self.tiff_counter = None
         self.tiff_fp = None
+
+        # Focus lock engine, a rate of 0 means poll the QPD instead.
+        self.engine_gui_rate = configuration.get("engine_gui_rate", 20.0)
+        self.engine_rate = configuration.get("engine_rate", 0.0)
+
+        # Lock state recorder, the size is the number of QPD readings to keep.
+        self.recorder = lockRecorder.LockRecorder(size = configuration.get("recorder_size", 131072))
         
         # Qt timer for checking focus lock
         self.check_focus_timer = QtCore.QTimer()
         self.check_focus_timer.setSingleShot(True)
         self.check_focus_timer.timeout.connect(self.handleCheckFocusLock)
+
+    def cleanUp(self):
+        if self.engine is not None:
+            self.engine.stopEngine()
+            print("> focus lock engine", self.engine.getStatisticsString())
+            self.engine = None
+
+    def getEngineStatistics(self):
+        """
+        Returns the focus lock engine timing statistics, or None
+        if the engine is not being used.
+        """
+        if self.engine is not None:
+            return self.engine.getStatistics()
         
     def getLockModeName(self):
         return self.lock_mode.getName()
@@ -93,11 +135,19 @@ class LockControl(QtCore.QObject):
             
             if tcp_message.isType("Check Focus Lock"):
                 tcp_message.addResponse("focus_status", success)
+                with self.mode_lock:
+                    tcp_message.addResponse("lock_statistics", self.recorder.getStatistics())
 
             elif tcp_message.isType("Find Sum"):
                 tcp_message.addResponse("focus_status", success)
                 if success:
                     tcp_message.addResponse("found_sum", self.lock_mode.getFindSumMaxSum())
+
+            elif tcp_message.isType("Tune Focus Lock"):
+                tcp_message.addResponse("focus_status", success)
+                if success:
+                    for [key, value] in self.lock_mode.getAutoTuneResults().items():
+                        tcp_message.addResponse(key, value)
                 
             else:
                 raise Exception("No response handling for " + tcp_message.getType())
@@ -112,7 +162,8 @@ class LockControl(QtCore.QObject):
             self.current_state = None
 
     def handleJump(self, delta_z):
-        self.lock_mode.handleJump(delta_z)
+        with self.mode_lock:
+            self.lock_mode.handleJump(delta_z)
 
     def handleLockStarted(self, on):
         """
@@ -124,7 +175,8 @@ class LockControl(QtCore.QObject):
             self.stopLock()
         
     def handleLockTarget(self, new_target):
-        self.lock_mode.setLockTarget(new_target)
+        with self.mode_lock:
+            self.lock_mode.moveLockTarget(new_target)
 
     def handleModeChanged(self, new_mode):
         """
@@ -134,43 +186,47 @@ class LockControl(QtCore.QObject):
               When you change lock modes the GUI will turn off the 'locked'
               behavior.
         """
-        if self.lock_mode is not None:
-            self.lock_mode.done.disconnect(self.handleDone)
+        with self.mode_lock:
+            if self.lock_mode is not None:
+                self.lock_mode.done.disconnect(self.handleDone)
+                self.lock_mode.relock.disconnect(self.handleRelock)
 
-        self.lock_mode = new_mode
-        self.lock_mode.done.connect(self.handleDone)
+            self.lock_mode = new_mode
+            self.lock_mode.done.connect(self.handleDone)
+            self.lock_mode.relock.connect(self.handleRelock)
 
-        # FIXME: We only need to do this once, maybe not that big a deal.
-        self.lock_mode.setZStageFunctionality(self.z_stage_functionality)
+            # FIXME: We only need to do this once, maybe not that big a deal.
+            self.lock_mode.setZStageFunctionality(self.z_stage_functionality)
 
-        self.z_stage_functionality.recenter()
+            self.z_stage_functionality.recenter()
 
     def handleNewFrame(self, frame):
-        if self.offset_fp is not None:
-            frame_number = frame.frame_number + 1
-            pos_dict = self.lock_mode.getQPDState()
-            is_good = int(pos_dict["is_good"])
-            offset = pos_dict["offset"]
-            power = pos_dict["sum"]
-            stage_z = self.z_stage_functionality.getCurrentPosition()
-
-            # In diagnostics mode, add a column for the current tiff image from the QPD.
-            if self.tiff_counter is not None:
-                self.offset_fp.write("{0:d} {1:.6f} {2:.6f} {3:.6f} {4:0d} {5:0d}\n".format(frame_number,
-                                                                                            offset,
-                                                                                            power,
-                                                                                            stage_z,
-                                                                                            is_good,
-                                                                                            self.tiff_counter))
-
-            # Otherwise save as normal.
-            else:
-                self.offset_fp.write("{0:d} {1:.6f} {2:.6f} {3:.6f} {4:0d}\n".format(frame_number,
-                                                                                     offset,
-                                                                                     power,
-                                                                                     stage_z,
-                                                                                     is_good))
-        self.lock_mode.handleNewFrame(frame)
+        with self.mode_lock:
+            if self.offset_fp is not None:
+                frame_number = frame.frame_number + 1
+                pos_dict = self.lock_mode.getQPDState()
+                is_good = int(pos_dict["is_good"])
+                offset = pos_dict["offset"]
+                power = pos_dict["sum"]
+                stage_z = self.z_stage_functionality.getCurrentPosition()
+
+                # In diagnostics mode, add a column for the current tiff image from the QPD.
+                if self.tiff_counter is not None:
+                    self.offset_fp.write("{0:d} {1:.6f} {2:.6f} {3:.6f} {4:0d} {5:0d}\n".format(frame_number,
+                                                                                                offset,
+                                                                                                power,
+                                                                                                stage_z,
+                                                                                                is_good,
+                                                                                                self.tiff_counter))
+
+                # Otherwise save as normal.
+                else:
+                    self.offset_fp.write("{0:d} {1:.6f} {2:.6f} {3:.6f} {4:0d}\n".format(frame_number,
+                                                                                         offset,
+                                                                                         power,
+                                                                                         stage_z,
+                                                                                         is_good))
+            self.lock_mode.handleNewFrame(frame)
 
     def handleQPDUpdate(self, qpd_dict):
         """
@@ -190,21 +246,38 @@ class LockControl(QtCore.QObject):
         # 2. If the QPD reading goes bad the mode will keep a stale value
         #    of the QPD state.
         #
-        self.lock_mode.handleQPDUpdate(qpd_dict)
-
-        # Save image if we have a valid tiff counter.
-        #
-        # There is some kind of race condition here as checking self.tiff_fp
-        # will sometimes fail. Not sure if checking self.tiff_counter will
-        # always work.
-        if self.tiff_counter is not None:
-            self.tiff_counter += 1
-            self.tiff_fp.save(self.lock_mode.getQPDState()["image"])
+        self.handleQPDReading(qpd_dict)
             
         # Poll QPD again.
         self.qpd_functionality.getOffset()
 
+    def handleQPDReading(self, qpd_dict):
+        """
+        Pass the QPD reading to the current mode. This is called by the
+        engine thread if we are using the focus lock engine.
+        """
+        with self.mode_lock:
+            self.lock_mode.handleQPDUpdate(qpd_dict)
+            self.recorder.addSample(qpd_dict,
+                                    self.z_stage_functionality.getCurrentPosition(),
+                                    self.lock_mode.getLockTarget(),
+                                    self.lock_mode.amLocked(),
+                                    self.lock_mode.isGoodLock(),
+                                    self.lock_mode.getQPDResponse())
+
+            # Save image if we have a valid tiff counter.
+            if self.tiff_counter is not None:
+                self.tiff_counter += 1
+                self.tiff_fp.save(self.lock_mode.getQPDState()["image"])
+
         
+    def handleRelock(self):
+        """
+        Called by the lock mode to restart the lock after a jump.
+        """
+        with self.mode_lock:
+            self.lock_mode.startLock()
+
     def handleTCPMessage(self, message):
         """
         Handles TCP messages from tcpControl.TCPControl.
@@ -269,9 +342,35 @@ class LockControl(QtCore.QObject):
 
             return True
 
+        elif tcp_message.isType("Tune Focus Lock"):
+            if tcp_message.isTest():
+                tcp_message.addResponse("duration", 10)
+
+            else:
+                # Record current state.
+                assert (self.current_state == None)
+                self.current_state = {"locked" : self.lock_mode.amLocked(),
+                                      "lock_target" : self.lock_mode.getLockTarget(),
+                                      "message" : message,
+                                      "tcp_message" : tcp_message}
+
+                behavior_params = {}
+                for pname in ["hold", "step_size"]:
+                    if tcp_message.getData(pname) is not None:
+                        behavior_params[pname] = tcp_message.getData(pname)
+
+                # Start auto-tune mode.
+                self.startLockBehavior("auto_tune", behavior_params)
+
+                # Increment the message reference count so that HAL
+                # knows that it has not been fully processed.
+                message.incRefCount()
+
+            return True
+
         elif tcp_message.isType("Set Lock Target"):
             if not tcp_message.isTest():
-                self.lock_mode.setLockTarget(tcp_message.getData("lock_target"))
+                self.handleLockTarget(tcp_message.getData("lock_target"))
             return True
         
         return False
@@ -286,51 +385,70 @@ class LockControl(QtCore.QObject):
     def setFunctionality(self, name, functionality):
         if (name == "qpd"):
             self.qpd_functionality = functionality
-            self.qpd_functionality.qpdUpdate.connect(self.handleQPDUpdate)
         elif (name == "z_stage"):
             self.z_stage_functionality = functionality
 
     def setTimingFunctionality(self, functionality):
         if self.working:
             self.timing_functionality = functionality.getCameraFunctionality()
-            self.timing_functionality.newFrame.connect(self.handleNewFrame)
+            self.timing_functionality.newFrame.connect(frameStats.timedSlot("focus lock", self.handleNewFrame))
 
     def start(self):
         if (self.qpd_functionality is not None) and (self.z_stage_functionality is not None):
             self.working = True
+
+            if (self.engine_rate > 0.0):
+                if not self.qpd_functionality.haveDirectRead():
+                    print(">> Warning, focus lock QPD does not support the focus lock engine.")
+                elif isinstance(self.z_stage_functionality, hardwareModule.BufferedFunctionality):
+                    print(">> Warning, focus lock z stage does not support the focus lock engine.")
+                else:
+                    self.engine = lockEngine.LockEngine(gui_rate = self.engine_gui_rate,
+                                                        qpd_functionality = self.qpd_functionality,
+                                                        rate = self.engine_rate,
+                                                        update_fn = self.handleQPDReading)
+                    self.engine.startEngine()
+                    return
+
             # Start polling the QPD.
+            self.qpd_functionality.qpdUpdate.connect(self.handleQPDUpdate)
             self.qpd_functionality.getOffset()
         
     def startFilm(self, film_settings):
         # Open file to save the lock status at each frame.
         if self.working:
-            if film_settings.isSaved():
+            with self.mode_lock:
+                if film_settings.isSaved():
 
-                # Only save images when in diagnostics mode and only for a QPDCameraFunctionality.
-                if self.diagnostics_mode and (self.qpd_functionality.getType() == "camera"):
-                    self.tiff_counter = 0
-                    self.tiff_fp = tifffile.TiffWriter(film_settings.getBasename() + "_qpd.tif",
-                                                       bigtiff = True)
+                    # Only save images when in diagnostics mode and only for a QPDCameraFunctionality.
+                    if self.diagnostics_mode and (self.qpd_functionality.getType() == "camera"):
+                        self.tiff_counter = 0
+                        self.tiff_fp = tifffile.TiffWriter(film_settings.getBasename() + "_qpd.tif",
+                                                           bigtiff = True)
 
-                self.offset_fp = open(film_settings.getBasename() + ".off", "w")
+                    self.offset_fp = open(film_settings.getBasename() + ".off", "w")
 
-                headers = ["frame", "offset", "power", "stage-z", "good-offset"]
-                if self.tiff_fp is not None:
-                    headers.append("tif-counter")
+                    headers = ["frame", "offset", "power", "stage-z", "good-offset"]
+                    if self.tiff_fp is not None:
+                        headers.append("tif-counter")
+
+                    self.offset_fp.write(" ".join(headers) + "\n")
 
-                self.offset_fp.write(" ".join(headers) + "\n")
+                    self.film_basename = film_settings.getBasename()
+                    self.recorder.startFilm()
 
-            # Check for a waveform from a hardware timed lock mode that uses the DAQ.
-            waveform = self.lock_mode.getWaveform()
-            if waveform is not None:
-                self.controlMessage.emit(halMessage.HalMessage(m_type = "daq waveforms",
-                                                               data = {"waveforms" : [waveform]}))
+                # Check for a waveform from a hardware timed lock mode that uses the DAQ.
+                waveform = self.lock_mode.getWaveform()
+                if waveform is not None:
+                    self.controlMessage.emit(halMessage.HalMessage(m_type = "daq waveforms",
+                                                                   data = {"waveforms" : [waveform]}))
                 
-            self.lock_mode.startFilm()
+                self.lock_mode.startFilm()
         
     def startLock(self, lock_target = None):
         if self.working:
-            self.lock_mode.startLock(lock_target)
+            with self.mode_lock:
+                self.lock_mode.startLock(lock_target)
 
     def startLockBehavior(self, sub_mode_name, sub_mode_params):
         """
@@ -340,24 +458,39 @@ class LockControl(QtCore.QObject):
         calling this function.
         """
         if self.working:
-            self.lock_mode.startLockBehavior(sub_mode_name, sub_mode_params)
+            with self.mode_lock:
+                self.lock_mode.startLockBehavior(sub_mode_name, sub_mode_params)
 
     def stopFilm(self):
         if self.working:
-            if self.offset_fp is not None:
-                self.offset_fp.close()
-                self.offset_fp = None
+            film_basename = None
+            film_samples = None
+            with self.mode_lock:
+                if self.offset_fp is not None:
+                    self.offset_fp.close()
+                    self.offset_fp = None
+
+                if self.film_basename is not None:
+                    film_basename = self.film_basename
+                    film_samples = self.recorder.stopFilm()
+                    self.film_basename = None
                 
-            if self.tiff_fp is not None:
-                self.tiff_counter = None
-                self.tiff_fp.close()
-                self.tiff_fp = None
+                if self.tiff_fp is not None:
+                    self.tiff_counter = None
+                    self.tiff_fp.close()
+                    self.tiff_fp = None
                 
-            self.lock_mode.stopFilm()
+                self.lock_mode.stopFilm()
+
+            # Save the recorded samples without holding the lock so that we
+            # don't stall the focus lock engine thread.
+            if film_samples is not None:
+                lockRecorder.saveSamples(film_basename, film_samples)
 
-        self.timing_functionality.newFrame.disconnect(self.handleNewFrame)
+        self.timing_functionality.newFrame.disconnect(frameStats.timedSlot("focus lock", self.handleNewFrame))
         self.timing_functionality = None
 
     def stopLock(self):
         if self.working:
-            self.lock_mode.stopLock()
+            with self.mode_lock:
+                self.lock_mode.stopLock()
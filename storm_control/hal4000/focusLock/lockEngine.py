@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+The focus lock engine. This runs the focus lock control loop, i.e.
+read the QPD, determine the offset and move the z stage, in its own
+thread at a fixed rate. The default is for this to be driven by the
+QPD functionality's qpdUpdate signal (via the Qt event loop), which
+means that the lock slows down when the GUI is busy.
+
+The QPD readings are also (re-)emitted with the QPD functionality's
+qpdUpdate signal so that the displays, etc. continue to work, but only
+at gui_rate as there is no point in updating the displays at 100Hz.
+
+Using the engine requires a QPD that supports readOffset() and a z
+stage that moves immediately (i.e. not a BufferedFunctionality) as
+the moves are made from the engine thread.
+
+Hazen 10/26
+"""
+import math
+import time
+
+from PyQt5 import QtCore
+
+
+class LockEngine(QtCore.QThread):
+    """
+    update_fn is called with each QPD reading, this is where the lock
+    mode does its thing.
+    """
+    def __init__(self, gui_rate = 20.0, qpd_functionality = None, rate = 100.0, update_fn = None, **kwds):
+        super().__init__(**kwds)
+        self.gui_rate = gui_rate
+        self.qpd_functionality = qpd_functionality
+        self.rate = rate
+        self.running = False
+        self.update_fn = update_fn
+
+        self.resetStatistics()
+
+    def getStatistics(self):
+        """
+        Returns a dictionary with the timing statistics of the
+        control loop since the last reset. The times are in
+        milliseconds.
+        """
+        stats = {"jitter" : 0.0,
+                 "max_period" : 1000.0 * self.max_period,
+                 "n_late" : self.n_late,
+                 "n_updates" : self.n_updates,
+                 "rate" : 0.0,
+                 "target_rate" : self.rate}
+
+        if (self.n_periods > 0):
+            mean = self.sum_period/self.n_periods
+            var = self.sum_period2/self.n_periods - mean*mean
+            stats["jitter"] = 1000.0 * math.sqrt(max(var, 0.0))
+            if (mean > 0.0):
+                stats["rate"] = 1.0/mean
+        return stats
+
+    def getStatisticsString(self):
+        stats = self.getStatistics()
+        return "{0:d} updates at {1:.1f}Hz (target {2:.1f}Hz), jitter {3:.2f}ms, maximum period {4:.2f}ms, {5:d} late".format(stats["n_updates"],
+                                                                                                                            stats["rate"],
+                                                                                                                            stats["target_rate"],
+                                                                                                                            stats["jitter"],
+                                                                                                                            stats["max_period"],
+                                                                                                                            stats["n_late"])
+
+    def isRunning(self):
+        return self.running
+
+    def resetStatistics(self):
+        self.last_time = None
+        self.max_period = 0.0
+        self.n_late = 0
+        self.n_periods = 0
+        self.n_updates = 0
+        self.sum_period = 0.0
+        self.sum_period2 = 0.0
+
+    def run(self):
+        period = 1.0/self.rate
+        decimate = max(1, int(round(self.rate/self.gui_rate)))
+        next_time = time.perf_counter()
+        while self.running:
+            qpd_dict = self.qpd_functionality.readOffset()
+            self.update_fn(qpd_dict)
+
+            if ((self.n_updates % decimate) == 0):
+                self.qpd_functionality.qpdUpdate.emit(qpd_dict)
+            self.n_updates += 1
+
+            # Timing statistics, 'late' is more than 50% over the target period.
+            cur_time = time.perf_counter()
+            if self.last_time is not None:
+                dt = cur_time - self.last_time
+                self.n_periods += 1
+                self.sum_period += dt
+                self.sum_period2 += dt*dt
+                if (dt > self.max_period):
+                    self.max_period = dt
+                if (dt > 1.5 * period):
+                    self.n_late += 1
+            self.last_time = cur_time
+
+            # Wait until it is time for the next update. If we have fallen
+            # more than an update behind then we start over from now rather
+            # than trying to catch up.
+            next_time += period
+            sleep_time = next_time - time.perf_counter()
+            if (sleep_time > 0.0):
+                time.sleep(sleep_time)
+            elif (sleep_time < -period):
+                next_time = time.perf_counter()
+
+    def startEngine(self):
+        self.running = True
+        self.start(QtCore.QThread.TimeCriticalPriority)
+
+    def stopEngine(self):
+        self.running = False
+        self.wait()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
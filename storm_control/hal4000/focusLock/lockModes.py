@@ -24,6 +24,137 @@ class LockModeException(halExceptions.HalException):
     pass
 
 
+#
+# Lock controllers determine how much to move the z stage given the
+# difference between the current offset and the lock target. Which
+# one is used is set by the 'locked.controller' parameter. Additional
+# controllers can be added to the lock_controllers dictionary.
+#
+class LockController(object):
+    """
+    The base class for lock controllers.
+
+    The offsets that are passed to control() have already been converted
+    to microns of stage movement using the 'qpd_response' parameter, the
+    change in the QPD offset per micron of stage movement. As this is a
+    divisor it is clamped to a magnitude of at least min_qpd_response.
+    """
+    min_qpd_response = 1.0e-3
+    
+    def __init__(self, parameters = None, **kwds):
+        super().__init__(**kwds)
+        self.feed_forward = parameters.get("feed_forward")
+        self.qpd_response = parameters.get("qpd_response")
+        if (abs(self.qpd_response) < self.min_qpd_response):
+            print(">> Warning, focus lock 'qpd_response' of", self.qpd_response, "is too small, using", self.min_qpd_response)
+            self.qpd_response = math.copysign(self.min_qpd_response, self.qpd_response)
+
+    def control(self, offset):
+        """
+        Returns how much to move the stage (in microns) given the
+        offset (also in microns).
+        """
+        return 0.0
+
+    def getQPDResponse(self):
+        return self.qpd_response
+
+    def hasFeedForward(self):
+        """
+        If this is True then changes in the lock target and jumps are
+        made by moving the stage immediately, instead of turning off
+        the lock (jumps) or waiting for the lock to get there.
+        """
+        return self.feed_forward
+
+    def reset(self):
+        """
+        Called when the lock starts.
+        """
+        pass
+
+    def stageMoved(self, dz):
+        """
+        Called when the stage was moved by something other than
+        the controller.
+        """
+        pass
+
+
+class PIDController(LockController):
+    """
+    PID control. As the output is a change in the stage position this
+    is PID control of the stage velocity, so the integral term removes
+    the lag when the focus is drifting at a constant rate.
+
+    Anti-windup is done by not integrating when the output is larger
+    than max_step, and by limiting the integral term to max_step.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        p = kwds["parameters"]
+        self.integral = 0.0
+        self.kd = p.get("pid_kd")
+        self.ki = p.get("pid_ki")
+        self.kp = p.get("pid_kp")
+        self.last_offset = None
+        self.max_step = 1.0e-3 * p.get("max_step")
+
+    def control(self, offset):
+        d_term = 0.0
+        if self.last_offset is not None:
+            d_term = self.kd * (offset - self.last_offset)
+        self.last_offset = offset
+
+        integral = self.integral + offset
+        if (self.ki > 0.0) and (abs(self.ki * integral) > self.max_step):
+            integral = math.copysign(self.max_step/self.ki, integral)
+
+        dz = -1.0 * (self.kp * offset + self.ki * integral + d_term)
+        if (abs(dz) > self.max_step):
+            dz = math.copysign(self.max_step, dz)
+        else:
+            self.integral = integral
+        return dz
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_offset = None
+
+    def stageMoved(self, dz):
+        # Don't treat the change in the offset as a derivative kick.
+        self.last_offset = None
+
+
+class ProportionalController(LockController):
+    """
+    Proportional control with a gain that increases with the size of
+    the offset.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        p = kwds["parameters"]
+        self.gain = p.get("lock_gain")
+        self.max_gain = p.get("lock_gain_max")
+        self.scale = self.max_gain - self.gain
+
+    def control(self, offset):
+        # Exponential with a sigma of 0.5 microns (2.0 * 0.5 * 0.5 = 0.5).
+        #
+        # If the offset is large than we just want to use the maximum gain
+        # to get back to the target as quickly as possible. However if we
+        # are near the target then we want to respond with a smaller gain
+        # value.
+        #
+        dx = offset * offset / 0.5
+        p_term = self.max_gain - self.scale*math.exp(-dx)
+        return -1.0 * p_term * offset
+
+
+lock_controllers = {"pid" : PIDController,
+                    "proportional" : ProportionalController}
+
+
 #
 # Mixin classes provide various locking and scanning behaviours.
 # The idea is that these are more or less self-contained and setting
@@ -38,6 +169,176 @@ class LockModeException(halExceptions.HalException):
 #        a particular method like startLock() is called. Maybe
 #        these should just have been different class of objects?
 #
+class AutoTuneMixin(object):
+    """
+    This measures the response of the QPD to moving the z stage and uses
+    it to set the gains of a PID lock controller. The stage is stepped up
+    and down by step_size around the current position, staying at each
+    position for 'hold' QPD updates.
+
+    The offsets are fit to the stage positions allowing for a delay of
+    a few updates before the QPD responds. The gains are chosen based on
+    this delay, the longer the delay the lower the gains need to be for
+    the lock to be stable.
+    """
+    atm_pname = "auto_tune"
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.atm_hold = None
+        self.atm_index = 0
+        self.atm_max_delay = 5
+        self.atm_min_sum = None
+        self.atm_mode_name = "auto_tune"
+        self.atm_offsets = []
+        self.atm_results = None
+        self.atm_step_size = None
+        self.atm_z = []
+        self.atm_z_start = None
+        self.atm_z_steps = None
+
+        if not hasattr(self, "behavior_names"):
+            self.behavior_names = []
+
+        self.behavior_names.append(self.atm_mode_name)
+
+    @staticmethod
+    def addParameters(parameters):
+        """
+        Add parameters specific to auto-tuning.
+        """
+        p = parameters.addSubSection(AutoTuneMixin.atm_pname)
+        p.add(params.ParameterRangeInt(description = "QPD updates at each z position.",
+                                       name = "hold",
+                                       value = 10,
+                                       min_value = 3,
+                                       max_value = 100))
+
+        p.add(params.ParameterRangeFloat(description = "Step size in z in nanometers.",
+                                         name = "step_size",
+                                         value = 200.0,
+                                         min_value = 10.0,
+                                         max_value = 2000.0))
+
+    def atmFit(self):
+        """
+        Fit the step response and update the lock controller. Returns
+        True if the fit worked.
+        """
+        offsets = numpy.array(self.atm_offsets)
+        z_values = numpy.array(self.atm_z)
+
+        best = None
+        for delay in range(min(self.atm_max_delay, self.atm_hold - 1) + 1):
+            y = offsets[delay:]
+            x = z_values[:z_values.size - delay]
+            mask = numpy.isfinite(y)
+            if (numpy.count_nonzero(mask) < 4):
+                continue
+            a = numpy.vstack([x[mask], numpy.ones(numpy.count_nonzero(mask))]).transpose()
+            coeffs = numpy.linalg.lstsq(a, y[mask], rcond = None)[0]
+            noise = math.sqrt(numpy.mean(numpy.square(numpy.dot(a, coeffs) - y[mask])))
+            if best is None or (noise < best[2]):
+                best = [coeffs[0], delay, noise]
+
+        if best is None:
+            print(">> Warning, focus lock auto-tune failed, not enough good QPD readings.")
+            return False
+
+        [response, delay, noise] = best
+        if (abs(response) < LockController.min_qpd_response) or (abs(response * self.atm_step_size) < 3.0 * noise):
+            print(">> Warning, focus lock auto-tune failed, no response to stage moves.")
+            return False
+
+        kp = 0.5/(1.0 + delay)
+        ki = 0.25 * kp/(1.0 + delay)
+
+        # Update the parameters, and the controller that all the modes use.
+        p = self.parameters.get(self.lm_pname)
+        p.setv("controller", "pid")
+        p.setv("pid_kd", 0.0)
+        p.setv("pid_ki", ki)
+        p.setv("pid_kp", kp)
+        p.setv("qpd_response", response)
+        LockMode.lock_controller = lock_controllers["pid"](parameters = p)
+
+        self.atm_results = {"delay" : delay,
+                            "noise" : noise,
+                            "pid_ki" : ki,
+                            "pid_kp" : kp,
+                            "qpd_response" : response}
+        print("> focus lock auto-tune, response {0:.3f}, delay {1:d}, noise {2:.1f}nm, kp {3:.3f}, ki {4:.3f}".format(response,
+                                                                                                                     delay,
+                                                                                                                     1000.0 * noise,
+                                                                                                                     kp,
+                                                                                                                     ki))
+        return True
+
+    def getAutoTuneResults(self):
+        """
+        Returns the results of the last auto-tune, or None if it failed. This
+        includes the step response as a list of [relative z, offset] pairs,
+        the offset is None if the QPD reading was not good.
+        """
+        if self.atm_results is None:
+            return None
+        results = dict(self.atm_results)
+        results["step_response"] = []
+        for z, offset in zip(self.atm_z, self.atm_offsets):
+            if not math.isfinite(offset):
+                offset = None
+            results["step_response"].append([z, offset])
+        return results
+
+    def handleQPDUpdate(self, qpd_state):
+        if hasattr(super(), "handleQPDUpdate"):
+            super().handleQPDUpdate(qpd_state)
+
+        if (self.behavior == self.atm_mode_name):
+            offset = math.nan
+            if qpd_state["is_good"] and (qpd_state["sum"] > self.atm_min_sum):
+                offset = qpd_state["offset"]
+            self.atm_offsets.append(offset)
+            self.atm_z.append(self.atm_z_steps[self.atm_index])
+
+            if ((len(self.atm_offsets) % self.atm_hold) == 0):
+                self.atm_index += 1
+
+                # Done, return to the starting position.
+                if (self.atm_index == len(self.atm_z_steps)):
+                    LockMode.z_stage_functionality.goAbsolute(self.atm_z_start)
+                    self.behaviorDone(self.atmFit())
+
+                # Move to the next position.
+                else:
+                    LockMode.z_stage_functionality.goAbsolute(self.atm_z_start + self.atm_z_steps[self.atm_index])
+
+    def startLockBehavior(self, behavior_name, behavior_params):
+        if hasattr(super(), "startLockBehavior"):
+            super().startLockBehavior(behavior_name, behavior_params)
+
+        if (behavior_name == self.atm_mode_name):
+            p = self.parameters.get(self.atm_pname)
+
+            if "hold" in behavior_params:
+                self.atm_hold = behavior_params["hold"]
+            else:
+                self.atm_hold = p.get("hold")
+
+            if "step_size" in behavior_params:
+                self.atm_step_size = 1.0e-3 * behavior_params["step_size"]
+            else:
+                self.atm_step_size = 1.0e-3 * p.get("step_size")
+
+            self.atm_index = 0
+            self.atm_min_sum = self.parameters.get(self.lm_pname + ".minimum_sum")
+            self.atm_offsets = []
+            self.atm_results = None
+            self.atm_z = []
+            self.atm_z_start = LockMode.z_stage_functionality.getCurrentPosition()
+            self.atm_z_steps = [0.0, self.atm_step_size, 0.0, -self.atm_step_size, 0.0]
+
+
 class FindSumMixin(object):
     """
     This will run a find sum scan, starting at the z stage minimum and
@@ -148,12 +449,9 @@ class LockedMixin(object):
         self.lm_buffer = None
         self.lm_buffer_length = 1
         self.lm_counter = 0
-        self.lm_gain = 0.5
-        self.lm_max_gain = 0.7
         self.lm_min_sum = 0.0
         self.lm_mode_name = "locked"
         self.lm_offset_threshold = 0.02
-        self.lm_scale = self.lm_max_gain - self.lm_gain
         self.lm_target = 0.0
 
         if not hasattr(self, "behavior_names"):
@@ -171,6 +469,15 @@ class LockedMixin(object):
                                   name = "buffer_length",
                                   value = 5))
 
+        p.add(params.ParameterSetString(description = "Lock controller.",
+                                        name = "controller",
+                                        value = "proportional",
+                                        allowed = sorted(lock_controllers.keys())))
+
+        p.add(params.ParameterSetBoolean(description = "Move the stage immediately for lock target changes and jumps.",
+                                         name = "feed_forward",
+                                         value = False))
+
         p.add(params.ParameterRangeFloat(description = "Lock response gain (near target offset).",
                                          name = "lock_gain",
                                          value = 0.5,
@@ -187,25 +494,45 @@ class LockedMixin(object):
                                     name = "offset_threshold",
                                     value = 20.0))
 
+        p.add(params.ParameterFloat(description = "Maximum z stage move per QPD update (nm), PID controller.",
+                                    name = "max_step",
+                                    value = 1000.0))
+
         p.add(params.ParameterFloat(description = "Minimum sum to be considered locked (AU).",
                                     name = "minimum_sum",
                                     value = -1.0))
 
+        p.add(params.ParameterRangeFloat(description = "Derivative gain, PID controller.",
+                                         decimals = 3,
+                                         name = "pid_kd",
+                                         value = 0.0,
+                                         min_value = 0.0,
+                                         max_value = 1.0))
+
+        p.add(params.ParameterRangeFloat(description = "Integral gain, PID controller.",
+                                         decimals = 3,
+                                         name = "pid_ki",
+                                         value = 0.05,
+                                         min_value = 0.0,
+                                         max_value = 1.0))
+
+        p.add(params.ParameterRangeFloat(description = "Proportional gain, PID controller.",
+                                         decimals = 3,
+                                         name = "pid_kp",
+                                         value = 0.5,
+                                         min_value = 0.0,
+                                         max_value = 1.0))
+
+        p.add(params.ParameterFloat(description = "Change in QPD offset per micron of z stage movement.",
+                                    name = "qpd_response",
+                                    value = 1.0))
+
     def controlFn(self, offset):
         """
         Returns how much to move the stage (in microns) given the
         offset (also in microns).
         """
-        # Exponential with a sigma of 0.5 microns (2.0 * 0.5 * 0.5 = 0.5).
-        #
-        # If the offset is large than we just want to use the maximum gain
-        # to get back to the target as quickly as possible. However if we
-        # are near the target then we want to respond with a smaller gain
-        # value.
-        #
-        dx = offset * offset / 0.5
-        p_term = self.lm_max_gain - self.lm_scale*math.exp(-dx)
-        return -1.0 * p_term * offset
+        return LockMode.lock_controller.control(offset/LockMode.lock_controller.getQPDResponse())
         
     def getLockTarget(self):
         return self.lm_target
@@ -222,8 +549,6 @@ class LockedMixin(object):
                 else:
                     self.lm_buffer[self.lm_counter] = 0
 
-                # Simple proportional control.
-                #dz = -1.0 * self.lm_gain * diff
                 dz = self.controlFn(diff)
                 LockMode.z_stage_functionality.goRelative(dz)
             else:
@@ -240,6 +565,19 @@ class LockedMixin(object):
             self.lm_counter += 1
             if (self.lm_counter == self.lm_buffer_length):
                 self.lm_counter = 0
+
+    def moveLockTarget(self, target):
+        """
+        With feed forward we move the stage by the amount that should
+        be needed to reach the new target.
+        """
+        if hasattr(super(), "moveLockTarget"):
+            super().moveLockTarget(target)
+
+        if (self.behavior == self.lm_mode_name) and LockMode.lock_controller.hasFeedForward():
+            dz = (target - self.lm_target)/LockMode.lock_controller.getQPDResponse()
+            LockMode.z_stage_functionality.goRelative(dz)
+            LockMode.lock_controller.stageMoved(dz)
             
     def newParameters(self, parameters):
         if hasattr(super(), "newParameters"):
@@ -249,15 +587,14 @@ class LockedMixin(object):
         self.lm_buffer_length = p.get("buffer_length")
         self.lm_buffer = numpy.zeros(self.lm_buffer_length, dtype = numpy.uint8)
         self.lm_counter = 0
-        self.lm_gain = p.get("lock_gain")
-        self.lm_max_gain = p.get("lock_gain_max")
         self.lm_min_sum = p.get("minimum_sum")
         self.lm_offset_threshold = 1.0e-3 * p.get("offset_threshold")
-        self.lm_scale = self.lm_max_gain - self.lm_gain
+        LockMode.lock_controller = lock_controllers[p.get("controller")](parameters = p)
 
     def startLock(self):
         self.lm_counter = 0
         self.lm_buffer = numpy.zeros(self.lm_buffer_length, dtype = numpy.uint8)
+        LockMode.lock_controller.reset()
         self.behavior = "locked"
 
     def startLockBehavior(self, behavior_name, behavior_params):
@@ -472,6 +809,15 @@ class LockMode(QtCore.QObject):
     # Emitted when the current lock target is changed.
     lockTarget = QtCore.pyqtSignal(float)
 
+    # Emitted when the lock should be restarted, for example after a
+    # jump. lockControl.LockControl restarts the lock while holding it's
+    # mode_lock as the engine thread might be using the mode.
+    relock = QtCore.pyqtSignal()
+
+    # The lock controller. This is also a class variable so that
+    # all the modes use the same one.
+    lock_controller = None
+
     # The current QPD state. This is a class rather than an instance
     # variable so it is still available even when we change lock modes.
     qpd_state = None
@@ -519,6 +865,14 @@ class LockMode(QtCore.QObject):
         """
         return self.name
 
+    def getQPDResponse(self):
+        """
+        Returns the change in the QPD offset per micron of stage movement.
+        """
+        if LockMode.lock_controller is None:
+            return 1.0
+        return LockMode.lock_controller.getQPDResponse()
+
     def getQPDState(self):
         return LockMode.qpd_state
 
@@ -539,6 +893,15 @@ class LockMode(QtCore.QObject):
     def isGoodLock(self):
         return self.good_lock
 
+    def moveLockTarget(self, target):
+        """
+        This is called when the user (or a TCP client) changes the
+        lock target.
+        """
+        if hasattr(super(), "moveLockTarget"):
+            super().moveLockTarget(target)
+        self.setLockTarget(target)
+
     def newParameters(self, parameters):
         self.parameters = parameters
         if hasattr(super(), "newParameters"):
@@ -597,7 +960,7 @@ class LockMode(QtCore.QObject):
         pass
     
         
-class JumpLockMode(LockMode, FindSumMixin, LockedMixin, ScanMixin):
+class JumpLockMode(LockMode, AutoTuneMixin, FindSumMixin, LockedMixin, ScanMixin):
     """
     Sub class for handling locks, jumps and combinations thereof. Basically
     every class that can lock is a sub-class of this class.
@@ -620,17 +983,26 @@ class JumpLockMode(LockMode, FindSumMixin, LockedMixin, ScanMixin):
         """
         Jumps the piezo stage immediately if it is not locked. Otherwise it 
         stops the lock, jumps the piezo stage and starts the relock timer.
+
+        With feed forward the lock stays on, and the lock target is
+        changed by the expected change in the offset.
         """
         if (self.behavior == "locked"):
+            if LockMode.lock_controller.hasFeedForward():
+                LockMode.z_stage_functionality.goRelative(jumpsize)
+                LockMode.lock_controller.stageMoved(jumpsize)
+                self.setLockTarget(self.lm_target + jumpsize * LockMode.lock_controller.getQPDResponse())
+                return
             self.behavior = "none"
             self.jlm_relock_timer.start()
         LockMode.z_stage_functionality.goRelative(jumpsize)
 
     def handleRelockTimer(self):
         """
-        Restarts the focus lock when the relock timer fires.
+        Asks lockControl.LockControl to restart the focus lock when
+        the relock timer fires.
         """
-        self.startLock()
+        self.relock.emit()
 
 
 #
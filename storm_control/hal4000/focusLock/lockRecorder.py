@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Records the focus lock state at every QPD update so that the lock
+behavior can be compared to (for example) the z drift measured in
+the localizations.
+
+The samples are kept in a ring buffer that is allocated once, so
+adding a sample is cheap enough to do from the focus lock engine
+thread at the full QPD rate. The samples recorded during a film are
+saved as a numpy .npy file (basename + "_lock.npy") when the film
+ends. This is a structured array with the fields in SAMPLE_DTYPE,
+which can be loaded with numpy.load().
+
+Hazen 10/26
+"""
+import numpy
+import time
+
+
+# The offset and target are in QPD offset units, qpd_response is the
+# change in the QPD offset per micron of stage movement, z is in microns
+# and time is seconds since the epoch.
+SAMPLE_DTYPE = numpy.dtype([("time", "<f8"),
+                            ("offset", "<f8"),
+                            ("sum", "<f8"),
+                            ("z", "<f8"),
+                            ("target", "<f8"),
+                            ("qpd_response", "<f8"),
+                            ("is_good", "u1"),
+                            ("locked", "u1"),
+                            ("good_lock", "u1")])
+
+
+def lockStatistics(samples):
+    """
+    Returns a dictionary with summary statistics for an array of samples.
+
+    n_samples - The number of samples.
+    n_locked - The number of samples where the lock was on and the QPD reading was good.
+    good_fraction - The fraction of the locked samples that were a good lock.
+    rms_error - The RMS difference between the offset and target in nanometers.
+    max_error - The maximum difference between the offset and target in nanometers.
+    lock_losses - The number of times the lock went from good to bad while it was on.
+    """
+    stats = {"n_samples" : int(samples.size),
+             "n_locked" : 0,
+             "good_fraction" : 0.0,
+             "rms_error" : 0.0,
+             "max_error" : 0.0,
+             "lock_losses" : 0}
+
+    locked = (samples["locked"] > 0)
+    mask = locked & (samples["is_good"] > 0)
+    n_locked = int(numpy.count_nonzero(mask))
+    if (n_locked > 0):
+        error = 1000.0 * (samples["offset"][mask] - samples["target"][mask])/samples["qpd_response"][mask]
+        stats["n_locked"] = n_locked
+        stats["good_fraction"] = float(numpy.count_nonzero(samples["good_lock"][mask]))/n_locked
+        stats["rms_error"] = float(numpy.sqrt(numpy.mean(error * error)))
+        stats["max_error"] = float(numpy.max(numpy.abs(error)))
+
+    good_lock = (samples["good_lock"] > 0)
+    lost = good_lock[:-1] & ~good_lock[1:] & locked[1:]
+    stats["lock_losses"] = int(numpy.count_nonzero(lost))
+    return stats
+
+
+def saveSamples(basename, samples):
+    """
+    Save the samples from a film, returns the file name.
+    """
+    filename = basename + "_lock.npy"
+    numpy.save(filename, samples)
+    return filename
+
+
+class LockRecorder(object):
+    """
+    Note that this is not thread safe, lockControl.LockControl only
+    uses it while holding it's mode_lock.
+    """
+    def __init__(self, size = 131072, **kwds):
+        """
+        size - The number of samples in the ring buffer.
+        """
+        super().__init__(**kwds)
+        self.film_start = None
+        self.mark = 0
+        self.n_samples = 0
+        self.samples = numpy.zeros(size, dtype = SAMPLE_DTYPE)
+        self.size = size
+
+    def addSample(self, qpd_state, z, target, locked, good_lock, qpd_response = 1.0):
+        """
+        Add a sample, qpd_state is the QPD dictionary.
+        """
+        self.samples[self.n_samples % self.size] = (time.time(),
+                                                    qpd_state["offset"],
+                                                    qpd_state["sum"],
+                                                    z,
+                                                    target,
+                                                    qpd_response,
+                                                    qpd_state["is_good"],
+                                                    locked,
+                                                    good_lock)
+        self.n_samples += 1
+
+    def getSamples(self, start):
+        """
+        Returns a copy of the samples from sample number start (or the
+        oldest sample that is still in the ring buffer) to the current
+        sample, in order.
+        """
+        start = max(start, self.n_samples - self.size)
+        indices = numpy.arange(start, self.n_samples) % self.size
+        return self.samples[indices]
+
+    def getStatistics(self):
+        """
+        Returns the lock statistics since the last call to this method.
+        """
+        stats = lockStatistics(self.getSamples(self.mark))
+        self.mark = self.n_samples
+        return stats
+
+    def startFilm(self):
+        self.film_start = self.n_samples
+
+    def stopFilm(self):
+        """
+        Returns a copy of the samples recorded during the film, or None
+        if there is no film. This is cheap, use saveSamples() to save
+        them once you are no longer holding the mode lock.
+        """
+        if self.film_start is None:
+            return
+
+        n_film = self.n_samples - self.film_start
+        if (n_film > self.size):
+            print(">> Warning, the focus lock recorder only saved the last", self.size, "of", n_film, "samples.")
+        samples = self.getSamples(self.film_start)
+        self.film_start = None
+        return samples
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+"""
+Frame tap. This streams the frames from the cameras and feeds to
+other processes on the same computer, for example for live
+localization quality control or drift tracking. See
+sc_library.frameTapClient for the protocol and the client.
+
+The frames from some of the feeds can also be written into shared
+memory ring buffers (camera.frameRing). This is more efficient when
+there are several readers, or the readers need every frame. The ring
+for a feed is called "ring_name"_"feed name", i.e. hal_frames_camera1.
+
+The frames are sent by a thread per client, all that happens in
+the thread that emits the frames (HAL's main thread) is that the
+frame is added to the client's queue. If a client is not keeping
+up then frames are dropped rather than queued without limit.
+
+Hazen 10/26
+"""
+import json
+import numpy
+import queue
+import socket
+import threading
+
+import storm_control.sc_library.frameTapClient as frameTapClient
+
+import storm_control.hal4000.halLib.frameStats as frameStats
+import storm_control.hal4000.halLib.halMessage as halMessage
+import storm_control.hal4000.halLib.halModule as halModule
+
+
+class FeedTap(object):
+    """
+    Passes the frames from a single camera or feed functionality
+    to the server.
+    """
+    def __init__(self, feed_fn = None, feed_name = None, ring_writer = None, server = None, **kwds):
+        super().__init__(**kwds)
+        self.feed_fn = feed_fn
+        self.feed_name = feed_name
+        self.ring_exception = None
+        self.ring_writer = ring_writer
+        self.server = server
+
+        if self.ring_writer is not None:
+            import storm_control.hal4000.camera.frameRing as frameRing
+            self.ring_exception = frameRing.FrameRingException
+
+        self.feed_fn.newFrames.connect(frameStats.timedSlot("frame tap", self.handleNewFrames))
+
+    def disconnect(self):
+        self.feed_fn.newFrames.disconnect(frameStats.timedSlot("frame tap", self.handleNewFrames))
+
+    def handleNewFrames(self, frame_batch):
+        if self.ring_writer is not None:
+            try:
+                self.ring_writer.addFrames(frame_batch)
+            except self.ring_exception as exception:
+                print(">> Warning, stopped writing '" + self.feed_name + "' frames to shared memory,", str(exception))
+                self.ring_writer = None
+        self.server.newFrames(self.feed_name, frame_batch)
+
+
+class Subscriber(threading.Thread):
+    """
+    Sends the frames from a single camera or feed to a single client.
+    """
+    def __init__(self,
+                 connection = None,
+                 decimate = 1,
+                 feed_name = None,
+                 max_queue = None,
+                 roi = None,
+                 **kwds):
+        super().__init__(**kwds)
+        self.daemon = True
+        self.connection = connection
+        self.decimate = decimate
+        self.feed_name = feed_name
+        self.n_dropped = 0
+        self.n_frames = 0
+        self.queue = queue.Queue(maxsize = max_queue)
+        self.roi = roi
+        self.running = True
+
+    def addFrames(self, frame_batch):
+        """
+        This is called in the thread that emits the frames, so it
+        just queues the frames.
+        """
+        if not self.running:
+            return
+
+        for a_frame in frame_batch:
+            if ((self.n_frames % self.decimate) == 0):
+                try:
+                    self.queue.put_nowait(a_frame)
+                except queue.Full:
+                    self.n_dropped += 1
+            self.n_frames += 1
+
+    def getFeedName(self):
+        return self.feed_name
+
+    def isRunning(self):
+        return self.running
+
+    def run(self):
+        try:
+            while True:
+                a_frame = self.queue.get()
+                if a_frame is None:
+                    break
+                self.sendFrame(a_frame)
+
+        # The client closed the connection.
+        except OSError:
+            pass
+
+        self.running = False
+        self.connection.close()
+
+        # Release any frames that are still in the queue.
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    def sendFrame(self, a_frame):
+        np_data = a_frame.getData().reshape(a_frame.image_y, a_frame.image_x)
+        x_start = 0
+        y_start = 0
+        if self.roi is not None:
+            [x_start, y_start, x_end, y_end] = self.roi
+            np_data = np_data[y_start:y_end, x_start:x_end]
+        np_data = numpy.ascontiguousarray(np_data, dtype = "<u2")
+
+        self.connection.sendall(frameTapClient.packHeader(a_frame.frame_number,
+                                                          self.n_dropped,
+                                                          x_start,
+                                                          y_start,
+                                                          np_data.shape[1],
+                                                          np_data.shape[0],
+                                                          a_frame.timestamp,
+                                                          a_frame.arrival_time))
+        self.connection.sendall(np_data)
+
+    def stop(self):
+        self.running = False
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        # Make room for the stop marker if the queue is full.
+        while True:
+            try:
+                self.queue.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class FrameTapServer(threading.Thread):
+    """
+    Accepts connections from clients and creates a Subscriber for
+    each one. Only connections from this computer are accepted.
+    """
+    def __init__(self, max_queue = None, port = None, **kwds):
+        super().__init__(**kwds)
+        self.daemon = True
+        self.feed_names = []
+        self.lock = threading.Lock()
+        self.max_queue = max_queue
+        self.running = True
+        self.subscribers = []
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(("127.0.0.1", port))
+        self.server_socket.listen(5)
+        self.server_socket.settimeout(0.2)
+
+    def getNumberSubscribers(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def newConnection(self, connection):
+        """
+        Read the client's request and start sending it frames if the
+        request is valid.
+        """
+        connection.settimeout(5.0)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.lock:
+            feed_names = list(self.feed_names)
+
+        error = None
+        try:
+            with connection.makefile("rb") as stream:
+                request = json.loads(stream.readline(4096).decode())
+            decimate = int(request.get("decimate", 1))
+            feed_name = request.get("feed")
+            roi = request.get("roi")
+
+            if not feed_name in feed_names:
+                error = "No feed called '" + str(feed_name) + "'."
+            elif (decimate < 1):
+                error = "Decimation must be at least 1."
+            elif roi is not None:
+                roi = list(map(int, roi))
+                if (len(roi) != 4) or (min(roi) < 0) or (roi[0] >= roi[2]) or (roi[1] >= roi[3]):
+                    error = "Invalid ROI " + str(roi) + "."
+        except (OSError, ValueError, TypeError, AttributeError) as exception:
+            error = "Invalid request, " + str(exception)
+
+        try:
+            connection.sendall((json.dumps({"error" : error, "feeds" : feed_names}) + "\n").encode())
+        except OSError:
+            error = "Connection lost."
+
+        if error is not None:
+            connection.close()
+            return
+
+        connection.settimeout(None)
+        subscriber = Subscriber(connection = connection,
+                                decimate = decimate,
+                                feed_name = feed_name,
+                                max_queue = self.max_queue,
+                                roi = roi)
+        subscriber.start()
+        with self.lock:
+            self.subscribers = list(filter(lambda x : x.isRunning(), self.subscribers))
+            self.subscribers.append(subscriber)
+
+    def newFrames(self, feed_name, frame_batch):
+        with self.lock:
+            for subscriber in self.subscribers:
+                if (subscriber.getFeedName() == feed_name):
+                    subscriber.addFrames(frame_batch)
+
+    def run(self):
+        while self.running:
+            try:
+                [connection, address] = self.server_socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.newConnection(connection)
+
+    def setFeedNames(self, feed_names):
+        with self.lock:
+            self.feed_names = feed_names
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.server_socket.close()
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.stop()
+            self.subscribers = []
+
+
+class FrameTap(halModule.HalModule):
+    """
+    The frame tap HAL module.
+    """
+    message_types = ["configuration"]
+    
+    def __init__(self, module_params = None, qt_settings = None, **kwds):
+        super().__init__(**kwds)
+        self.feed_taps = []
+        self.ring_writers = {}
+
+        configuration = module_params.get("configuration")
+        self.server = FrameTapServer(max_queue = configuration.get("max_queue", 20),
+                                     port = configuration.get("tcp_port", frameTapClient.DEFAULT_PORT))
+        self.server.start()
+
+        # Shared memory ring buffers. These exist for the lifetime of the
+        # module even if the feed goes away.
+        #
+        # frameRing is only imported if it is needed as it requires
+        # multiprocessing.shared_memory (Python 3.8+).
+        #
+        ring_feeds = configuration.get("ring_feeds", "")
+        for feed_name in filter(None, map(lambda x : x.strip(), ring_feeds.split(","))):
+            import storm_control.hal4000.camera.frameRing as frameRing
+            name = configuration.get("ring_name", "hal_frames") + "_" + feed_name
+            self.ring_writers[feed_name] = frameRing.FrameRingWriter(feed_name = feed_name,
+                                                                     max_pixels = configuration.get("ring_max_pixels", 2048*2048),
+                                                                     n_slots = configuration.get("ring_slots", 20),
+                                                                     name = name)
+
+    def cleanUp(self, qt_settings):
+        for feed_tap in self.feed_taps:
+            feed_tap.disconnect()
+        self.feed_taps = []
+        self.server.stop()
+        for ring_writer in self.ring_writers.values():
+            ring_writer.close()
+
+    def handleResponse(self, message, response):
+        if message.isType("get functionality"):
+            feed_name = message.getData()["name"]
+            self.feed_taps.append(FeedTap(feed_fn = response.getData()["functionality"],
+                                          feed_name = feed_name,
+                                          ring_writer = self.ring_writers.get(feed_name),
+                                          server = self.server))
+
+    def processMessage(self, message):
+
+        if message.isType("configuration"):
+            if message.sourceIs("feeds"):
+                for feed_tap in self.feed_taps:
+                    feed_tap.disconnect()
+                self.feed_taps = []
+
+                feed_names = message.getData()["properties"]["feed names"]
+                for name in feed_names:
+                    self.sendMessage(halMessage.HalMessage(m_type = "get functionality",
+                                                           data = {"name" : name}))
+                self.server.setFeedNames(list(feed_names))
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
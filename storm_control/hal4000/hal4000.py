@@ -33,9 +33,11 @@ import storm_control.sc_library.hgit as hgit
 import storm_control.sc_library.parameters as params
 
 import storm_control.hal4000.halLib.halDialog as halDialog
+import storm_control.hal4000.halLib.halEvents as halEvents
 import storm_control.hal4000.halLib.halMessage as halMessage
 import storm_control.hal4000.halLib.halMessageBox as halMessageBox
 import storm_control.hal4000.halLib.halModule as halModule
+import storm_control.hal4000.halLib.halProfiler as halProfiler
 import storm_control.hal4000.qtWidgets.qtAppIcon as qtAppIcon
 
 
@@ -59,6 +61,9 @@ class HalController(halModule.HalModule):
     """
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
+        self.film_start_id = None
+        self.trace_basename = None
+        self.trace_films = module_params.get("trace_films", False)
 
         if (module_params.get("ui_type") == "classic"):
             self.view = ClassicView(module_params = module_params,
@@ -71,6 +76,15 @@ class HalController(halModule.HalModule):
 
         self.view.guiMessage.connect(self.handleGuiMessage)
 
+        # Get the HAL event log (see halLib.halEvents). This can also be
+        # used to change the verbosity of the event log, and to save the
+        # event log as a trace file (see halLib.halProfiler).
+        halMessage.addMessage("event log",
+                              validator = {"data" : {"n_events" : [False, int],
+                                                     "trace_filename" : [False, str],
+                                                     "verbosity" : [False, int]},
+                                           "resp" : {"events" : [True, list]}})
+
     def cleanUp(self, qt_settings):
         self.view.cleanUp(qt_settings)
 
@@ -96,6 +110,26 @@ class HalController(halModule.HalModule):
 
         elif message.isType("change directory"):
             self.view.setFilmDirectory(message.getData()["directory"])
+
+        elif message.isType("event log"):
+            data = message.getData()
+            message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
+                                                              data = {"events" : halEvents.getEvents(data.get("n_events"))}))
+            if "trace_filename" in data:
+                halProfiler.writeTrace(data["trace_filename"])
+            if "verbosity" in data:
+                halEvents.setVerbosity(data["verbosity"])
+
+        elif message.isType("film lockout"):
+
+            # Save a trace of the messages from the start to the end of
+            # the film cycle.
+            if message.getData()["locked out"]:
+                self.film_start_id = message.m_id
+            elif self.trace_basename is not None:
+                halProfiler.writeTrace(self.trace_basename + "_trace.json",
+                                       first_id = self.film_start_id)
+                self.trace_basename = None
                         
         elif message.isType("start"):
             if message.getData()["show_gui"]:
@@ -107,7 +141,10 @@ class HalController(halModule.HalModule):
                                                    data = {"directory" : self.view.getFilmDirectory()}))
 
         elif message.isType("start film"):
-            self.view.startFilm(message.getData()["film settings"])
+            film_settings = message.getData()["film settings"]
+            if self.trace_films and film_settings.isSaved():
+                self.trace_basename = film_settings.getBasename()
+            self.view.startFilm(film_settings)
 
         elif message.isType("stop film"):
             self.view.stopFilm()
@@ -115,6 +152,19 @@ class HalController(halModule.HalModule):
                                                  value = self.view.getNotesEditText())
             message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
                                                               data = {"acquisition" : [notes_param]}))
+
+        # This message only exists if HAL is configured with TCP control.
+        elif message.isType("tcp message", check_valid = False):
+            tcp_message = message.getData()["tcp message"]
+            if tcp_message.isType("Get Message Events"):
+                if not tcp_message.isTest():
+                    tcp_message.addResponse("events", halEvents.getEvents(tcp_message.getData("n_events")))
+                    if tcp_message.getData("trace_filename") is not None:
+                        halProfiler.writeTrace(tcp_message.getData("trace_filename"))
+                    if tcp_message.getData("verbosity") is not None:
+                        halEvents.setVerbosity(int(tcp_message.getData("verbosity")))
+                message.addResponse(halMessage.HalMessageResponse(source = self.module_name,
+                                                                  data = {"handled" : True}))
             
         elif message.isType("tests done", check_valid = False):
             self.view.close()
@@ -383,25 +433,40 @@ class HalCore(QtCore.QObject):
                  **kwds):
         super().__init__(**kwds)
 
+        self.message_routing = config.get("message_routing", True)
+        self.message_routes = {}
         self.modules = []
         self.module_name = "core"
         self.qt_settings = QtCore.QSettings("storm-control", "hal4000" + config.get("setup_name").lower())
         self.queued_messages = deque()
         self.queued_messages_timer = QtCore.QTimer(self)
         self.running = True # This is solely for the benefit of unit tests.
-        self.sent_messages = []
+        self.sent_messages = {}
         self.strict = config.get("strict", False)
 
         self.queued_messages_timer.setInterval(0)
         self.queued_messages_timer.timeout.connect(self.handleSendMessage)
         self.queued_messages_timer.setSingleShot(True)
 
+        # The message events are written to the log file (and / or the
+        # console) periodically instead of as they happen.
+        halEvents.reset(size = config.get("event_buffer_size", 10000))
+        halEvents.setVerbosity(config.get("event_verbosity", halEvents.LOG))
+        self.events_timer = QtCore.QTimer(self)
+        self.events_timer.setInterval(500)
+        self.events_timer.timeout.connect(halEvents.flush)
+        self.events_timer.start()
+
         # Initialize messages.
         halMessage.initializeMessages()
 
         # In strict mode we all workers must finish in 60 seconds.
         if self.strict:
             halModule.max_job_time = 60000
+
+        # The number of threads for workers and hardware requests.
+        if config.has("worker_threads"):
+            halModule.executor.setMaxThreadCount(config.get("worker_threads"))
             
         # Load all the modules.
         print("Loading modules")
@@ -551,6 +616,8 @@ class HalCore(QtCore.QObject):
             module.cleanUp(self.qt_settings)
         print("Waiting for QThreadPool to finish.")
         halModule.threadpool.waitForDone()
+        self.events_timer.stop()
+        halEvents.flush()
         self.running = False
         print(" Dave? What are you doing Dave?")
         print("  ...")
@@ -611,8 +678,8 @@ class HalCore(QtCore.QObject):
         and performs message finalization.
         """
 
-        # Remove message from list of sent messages.
-        self.sent_messages.remove(message)
+        # Remove message from the sent messages.
+        del self.sent_messages[message.m_id]
 
         # Disconnect messages processed signal.
         message.processed.disconnect(self.handleProcessed)
@@ -620,6 +687,10 @@ class HalCore(QtCore.QObject):
         # Call message finalizer.
         message.finalize()
 
+        # Modules may decide which messages they handle during configure1.
+        if message.isType("configure1"):
+            self.message_routes = {}
+
         # Always exit on exceptions in strict mode.
         if self.strict and message.hasErrors():
             for m_error in message.getErrors():
@@ -631,7 +702,7 @@ class HalCore(QtCore.QObject):
         # Notify the sender if errors occured while processing the
         # message and exit if the sender doesn't handle the error.
         if message.hasErrors():
-            if not message.getSource().handleErrors(sent_message):
+            if not message.getSource().handleErrors(message):
                 self.cleanUp()
                 return
 
@@ -654,6 +725,19 @@ class HalCore(QtCore.QObject):
         # waiting for this message to get finalized.
         self.startMessageTimer()
 
+    def getMessageRoute(self, m_type):
+        """
+        Returns the list of the modules that handle messages of type m_type.
+        """
+        if not m_type in self.message_routes:
+            route = []
+            for module in self.modules:
+                message_types = module.getMessageTypes()
+                if (not self.message_routing) or (message_types is None) or (m_type in message_types):
+                    route.append(module)
+            self.message_routes[m_type] = route
+        return self.message_routes[m_type]
+
     def handleResponses(self, message):
         """
         This is just a place holder. There should not be any responses
@@ -663,7 +747,8 @@ class HalCore(QtCore.QObject):
 
     def handleSendMessage(self):
         """
-        Handle sending the current message to all the modules.
+        Handle sending the current message to all the modules that
+        handle this type of message.
         """
         # Process the next message.
         if (len(self.queued_messages) > 0):
@@ -674,19 +759,15 @@ class HalCore(QtCore.QObject):
             # pending messages then push it back into the queue.
             #
             if cur_message.sync and (len(self.sent_messages) > 0):
-                print("> waiting for the following to be processed:")
-                for message in self.sent_messages:
-                    text = "  '" + message.m_type + "' from " + message.getSourceName() + ", "
-                    text += str(message.getRefCount()) + " module(s) have not responded yet."
-                    print(text)
-                print("")
+                for message in self.sent_messages.values():
+                    message.logEvent("sync wait", extra = message.getRefCount())
                 self.queued_messages.appendleft(cur_message)
             
             #
             # Otherwise process the message.
             #
             else:
-                print(cur_message.source.module_name + " '" + cur_message.m_type + "'")
+                cur_message.logEvent("sent")
 
                 # Check for "closeEvent" message from the main window.
                 if cur_message.isType("close event") and (cur_message.getSourceName() == "hal"):
@@ -700,14 +781,18 @@ class HalCore(QtCore.QObject):
 
                     # Otherwise send the message.
                     else:
-                        cur_message.logEvent("sent")
-
                         cur_message.processed.connect(self.handleProcessed)
-                        self.sent_messages.append(cur_message)
-                        for module in self.modules:
+                        self.sent_messages[cur_message.m_id] = cur_message
+                        route = self.getMessageRoute(cur_message.m_type)
+                        for module in route:
                             cur_message.ref_count += 1
                             module.handleMessage(cur_message)
 
+                        # Nobody handles this type of message, so it has
+                        # already been processed.
+                        if (len(route) == 0):
+                            self.handleProcessed(cur_message)
+
                     # Process any remaining messages with immediate timeout.
                     if (len(self.queued_messages) > 0):
                         self.startMessageTimer()
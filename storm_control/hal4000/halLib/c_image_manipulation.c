@@ -10,6 +10,12 @@
  *
  * Hazen 09/15
  *
+ * Add rescaleImageLUT() which uses a pre-computed look up table, handles
+ * all the orientations, can work on a range of rows (so that the image
+ * can be split across several threads) and can decimate the image.
+ *
+ * Hazen 10/26
+ *
  *
  * Compilation (windows):
  * gcc -c c_image_manipulation.c -O3
@@ -36,6 +42,7 @@ void rescaleImage100(uint8_t*, unsigned short *, int, int, int, int, int, double
 void rescaleImage101(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
 void rescaleImage110(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
 void rescaleImage111(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
+void rescaleImageLUT(uint8_t*, unsigned short *, uint8_t *, int, int, int, int, int, int, int, int, int *, int *);
 
 /* 
  * Functions 
@@ -435,6 +442,89 @@ void rescaleImage111(uint8_t *scaled_image, unsigned short *image, int image_wid
   *image_max = cur_max;
 }
 
+/* rescaleImageLUT
+ *
+ * Converts to 8 bit for Qt using a look up table. This works on rows
+ * row_start to row_end (in the "slow" dimension) of the image, so
+ * different threads can work on different parts of the image.
+ *
+ * If decimate is greater than 1 only every decimate'th pixel in each
+ * dimension is converted, the scaled image then has size
+ * ceil(image_width/decimate) x ceil(image_height/decimate). The
+ * minimum and maximum are always calculated using all the pixels.
+ *
+ * @param scaled_image Storage for the scaled image.
+ * @param image The original image data from the camera, assumed to be 16 bit.
+ * @param lut The 65536 element look up table.
+ * @param image_width The width of the image (the "slow" dimension).
+ * @param image_height The height of the image (the "fast" dimension).
+ * @param row_start The first row to convert, a multiple of decimate.
+ * @param row_end The row after the last row to convert.
+ * @param decimate The decimation factor.
+ * @param flip_h Flip horizontal.
+ * @param flip_v Flip vertical.
+ * @param transpose Transpose.
+ * @param image_min The minimum value in the rows.
+ * @param image_max The maxiumum value in the rows.
+ */
+void rescaleImageLUT(uint8_t *scaled_image, unsigned short *image, uint8_t *lut, int image_width, int image_height, int row_start, int row_end, int decimate, int flip_h, int flip_v, int transpose, int *image_min, int *image_max)
+{
+  int cur_min,cur_max,i,j,sw,sh;
+  long i_offset,i_step,j_offset,j_step;
+  unsigned short *row;
+  uint8_t *dest;
+
+  /* Size of the scaled image. */
+  sw = (image_width + decimate - 1)/decimate;
+  sh = (image_height + decimate - 1)/decimate;
+
+  /* Work out where pixel (i,j) goes in the scaled image. */
+  if (transpose){
+    i_offset = flip_v ? (sw - 1) : 0;
+    i_step = flip_v ? -1 : 1;
+    j_offset = flip_h ? (long)(sh - 1)*sw : 0;
+    j_step = flip_h ? -sw : sw;
+  }
+  else{
+    i_offset = flip_v ? (long)(sw - 1)*sh : 0;
+    i_step = flip_v ? -sh : sh;
+    j_offset = flip_h ? (sh - 1) : 0;
+    j_step = flip_h ? -1 : 1;
+  }
+
+  cur_min = image[row_start*image_height];
+  cur_max = cur_min;
+  for(i=row_start;i<row_end;i++){
+    row = image + (long)i*image_height;
+
+    for(j=0;j<image_height;j++){
+      if(row[j]<cur_min){
+	cur_min = row[j];
+      }
+      if(row[j]>cur_max){
+	cur_max = row[j];
+      }
+    }
+
+    if ((i%decimate) == 0){
+      dest = scaled_image + i_offset + (i/decimate)*i_step + j_offset;
+      if ((decimate == 1) && (j_step == 1)){
+	for(j=0;j<image_height;j++){
+	  dest[j] = lut[row[j]];
+	}
+      }
+      else{
+	for(j=0;j<sh;j++){
+	  dest[j*j_step] = lut[row[j*decimate]];
+	}
+      }
+    }
+  }
+
+  *image_min = cur_min;
+  *image_max = cur_max;
+}
+
 /*
  * The MIT License
  *
@@ -7,6 +7,13 @@ was that for large images, such as those from a sCMOS camera, using numpy
 to do the image scaling and type conversion was not fast enough.
 
 Hazen 09/15
+
+Rescaling now uses a (cached) look up table and large images are split
+into blocks of rows that are rescaled in parallel. ctypes releases the
+GIL while the C function is running so threads are sufficient for this.
+The image can also be decimated for display when the view is zoomed out.
+
+Hazen 10/26
 """
 
 import ctypes
@@ -15,6 +22,9 @@ import numpy
 from numpy.ctypeslib import ndpointer
 import os
 import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
 
 import storm_control.c_libraries.loadclib as loadclib
 
@@ -46,11 +56,47 @@ try:
     image_manip.rescaleImage110.argtypes = rescale_fn_arg_types
     image_manip.rescaleImage111.argtypes = rescale_fn_arg_types
 
+    #
+    # Older builds of the library (such as the Windows DLL) may not have
+    # the look up table function, in which case we use the functions above.
+    #
+    if hasattr(image_manip, "rescaleImageLUT"):
+        image_manip.rescaleImageLUT.argtypes = [ctypes.c_void_p,
+                                                ndpointer(dtype=numpy.uint16),
+                                                ndpointer(dtype=numpy.uint8),
+                                                ctypes.c_int,
+                                                ctypes.c_int,
+                                                ctypes.c_int,
+                                                ctypes.c_int,
+                                                ctypes.c_int,
+                                                ctypes.c_int,
+                                                ctypes.c_int,
+                                                ctypes.c_int,
+                                                ctypes.c_void_p,
+                                                ctypes.c_void_p]
+
 except OSError:
     print("C image manipulation library not found, reverting to numpy.")
     image_manip = None
 
 
+#
+# Images with more pixels than this are split into blocks of rows
+# that are rescaled in parallel.
+#
+min_pixels_per_thread = 512 * 512
+
+#
+# Look up table cache and thread pool.
+#
+lut_cache = {}
+lut_cache_lock = threading.Lock()
+lut_cache_size = 8
+
+n_threads = max(1, min(4, os.cpu_count() or 1))
+thread_pool = None
+
+
 def compare(image1, image2):
     """
     This does a bytewise comparison of two images.
@@ -67,23 +113,111 @@ def compare(image1, image2):
     return image_manip.compare(image1, image2, image1.size)
 
 
-def rescaleImage(image, flip_h, flip_v, transpose, display_range, saturated_value, use_numpy = False):
+def getLUT(display_range, saturated_value):
     """
-    This converts a uint16 image into a uint8 image based on the display
-    range. As a side effect it also returns the minimum and maximum values
-    in the image.
+    Returns the (cached) look up table for converting a uint16 image into
+    a uint8 image given the display range and saturation value.
 
-    image - The original image as numpy.uint16 array.
-    flip_h - Flip horizontal.
-    flip_v - Flip vertical.
-    transpose - Transpose image.
     display_range - [image value that equals 0, image value that equals 255].
     saturated_value - The value above which the image has saturated the camera.
-    use_numpy - (optional) Use numpy even if the C library exists, defaults to False.
 
-    return [numpy.uint8 image, original image minimum, original image maximum]
+    return numpy.uint8 look up table with 65536 entries.
     """
-    
+    key = (int(display_range[0]), int(display_range[1]), saturated_value)
+    with lut_cache_lock:
+        if key in lut_cache:
+            return lut_cache[key]
+
+    if saturated_value is not None:
+        max_range = 254.0
+    else:
+        max_range = 255.0
+
+    lut = numpy.arange(65536, dtype = numpy.float64)
+    lut = max_range*(lut - display_range[0])/max(1, display_range[1] - display_range[0])
+    lut = numpy.clip(lut, 0.0, max_range) + 0.5
+    lut = lut.astype(numpy.uint8)
+    if saturated_value is not None:
+        lut[int(saturated_value):] = 255
+
+    with lut_cache_lock:
+        if (len(lut_cache) >= lut_cache_size):
+            lut_cache.pop(next(iter(lut_cache)))
+        lut_cache[key] = lut
+    return lut
+
+
+def getThreadPool():
+    global thread_pool
+    if thread_pool is None:
+        thread_pool = ThreadPoolExecutor(max_workers = n_threads)
+    return thread_pool
+
+
+def rescaleImageLUT(image, flip_h, flip_v, transpose, display_range, saturated_value, decimate = 1):
+    """
+    Rescale using the C library and a look up table. The image is split
+    into blocks of rows if it is large enough to benefit from multiple
+    threads.
+
+    See rescaleImage() for a description of the parameters.
+    """
+    image = numpy.ascontiguousarray(image, dtype = numpy.uint16)
+    lut = getLUT(display_range, saturated_value)
+
+    [w, h] = image.shape
+    sw = (w + decimate - 1)//decimate
+    sh = (h + decimate - 1)//decimate
+    if transpose:
+        rescaled = numpy.empty((sh, sw), dtype = numpy.uint8)
+    else:
+        rescaled = numpy.empty((sw, sh), dtype = numpy.uint8)
+
+    def rescaleRows(row_start, row_end):
+        image_min = ctypes.c_int(0)
+        image_max = ctypes.c_int(0)
+        image_manip.rescaleImageLUT(rescaled.ctypes.data,
+                                    image,
+                                    lut,
+                                    w,
+                                    h,
+                                    row_start,
+                                    row_end,
+                                    decimate,
+                                    int(flip_h),
+                                    int(flip_v),
+                                    int(transpose),
+                                    ctypes.byref(image_min),
+                                    ctypes.byref(image_max))
+        return [image_min.value, image_max.value]
+
+    # Blocks start on a multiple of decimate so that every block agrees
+    # on which rows are part of the decimated image.
+    n_blocks = max(1, min(n_threads, image.size//min_pixels_per_thread))
+    if (n_blocks == 1):
+        [image_min, image_max] = rescaleRows(0, w)
+    else:
+        block_size = decimate * int(math.ceil(sw/n_blocks))
+        starts = range(0, w, block_size)
+        results = list(getThreadPool().map(lambda x: rescaleRows(x, min(x + block_size, w)), starts))
+        image_min = min([r[0] for r in results])
+        image_max = max([r[1] for r in results])
+
+    return [rescaled, image_min, image_max]
+
+
+def rescaleImageOp(image, flip_h, flip_v, transpose, display_range, saturated_value, decimate = 1):
+    """
+    Rescale using the C library functions for each combination of flips
+    and transpose. This is used if the library does not have the look up
+    table function.
+
+    See rescaleImage() for a description of the parameters.
+    """
+    if (decimate > 1):
+        image = image[::decimate,::decimate]
+    image = numpy.ascontiguousarray(image, dtype = numpy.uint16)
+
     # Create a string specifying the operations that will be performed on the image.
     op_code = ""
     for op in [flip_h, flip_v, transpose]:
@@ -98,61 +232,93 @@ def rescaleImage(image, flip_h, flip_v, transpose, display_range, saturated_valu
     else:
         saturated_value = 65536
         max_range = 255.0
-        
-    # Use C library for image manipulation, this will be faster and less memory intensive.
-    if (image_manip is not None) and (not use_numpy):
 
-        if transpose:
-            rescaled = numpy.empty((image.shape[1], image.shape[0]), dtype = numpy.uint8)
-        else:
-            rescaled = numpy.empty((image.shape[0], image.shape[1]), dtype = numpy.uint8)
+    if transpose:
+        rescaled = numpy.empty((image.shape[1], image.shape[0]), dtype = numpy.uint8)
+    else:
+        rescaled = numpy.empty((image.shape[0], image.shape[1]), dtype = numpy.uint8)
 
-        image_min = ctypes.c_int(0)
-        image_max = ctypes.c_int(0)
+    image_min = ctypes.c_int(0)
+    image_max = ctypes.c_int(0)
 
-        # Get the appropriate C function based on the op_code.
-        image_fn = getattr(image_manip, "rescaleImage" + op_code)
+    # Get the appropriate C function based on the op_code.
+    image_fn = getattr(image_manip, "rescaleImage" + op_code)
 
-        image_fn(rescaled,
-                 image,
-                 image.shape[0],
-                 image.shape[1],
-                 display_range[0],
-                 display_range[1],
-                 saturated_value,
-                 max_range,
-                 ctypes.byref(image_min),
-                 ctypes.byref(image_max))
+    image_fn(rescaled,
+             image,
+             image.shape[0],
+             image.shape[1],
+             display_range[0],
+             display_range[1],
+             saturated_value,
+             max_range,
+             ctypes.byref(image_min),
+             ctypes.byref(image_max))
 
-        image_min = image_min.value
-        image_max = image_max.value
+    return [rescaled, image_min.value, image_max.value]
 
-    # Fall back to using numpy.
+
+def rescaleImage(image, flip_h, flip_v, transpose, display_range, saturated_value, use_numpy = False, decimate = 1):
+    """
+    This converts a uint16 image into a uint8 image based on the display
+    range. As a side effect it also returns the minimum and maximum values
+    in the image.
+
+    image - The original image as numpy.uint16 array.
+    flip_h - Flip horizontal.
+    flip_v - Flip vertical.
+    transpose - Transpose image.
+    display_range - [image value that equals 0, image value that equals 255].
+    saturated_value - The value above which the image has saturated the camera.
+    use_numpy - (optional) Use numpy even if the C library exists, defaults to False.
+    decimate - (optional) Only use every decimate'th pixel in each dimension, defaults to 1.
+
+    return [numpy.uint8 image, original image minimum, original image maximum]
+    """
+    decimate = max(1, int(decimate))
+
+    # Use C library for image manipulation, this will be faster and less memory intensive.
+    if (image_manip is not None) and (not use_numpy):
+        if hasattr(image_manip, "rescaleImageLUT"):
+            return rescaleImageLUT(image, flip_h, flip_v, transpose, display_range, saturated_value, decimate)
+        else:
+            return rescaleImageOp(image, flip_h, flip_v, transpose, display_range, saturated_value, decimate)
+
+    # Determine maximum in the rescaled image.
+    if saturated_value is not None:
+        max_range = 254.0
     else:
-        image_min = numpy.min(image)
-        image_max = numpy.max(image)
+        saturated_value = 65536
+        max_range = 255.0
+        
+    # Fall back to using numpy.
+    image_min = numpy.min(image)
+    image_max = numpy.max(image)
+
+    if (decimate > 1):
+        image = image[::decimate,::decimate]
             
-        if flip_h:
-            image = numpy.fliplr(image)
+    if flip_h:
+        image = numpy.fliplr(image)
             
-        if flip_v:
-            image = numpy.flipud(image)
+    if flip_v:
+        image = numpy.flipud(image)
 
-        if transpose:
-            image = numpy.transpose(image)
+    if transpose:
+        image = numpy.transpose(image)
         
-        rescaled = image.astype(numpy.float64)
-        rescaled = max_range*(rescaled - display_range[0])/(display_range[1] - display_range[0])
-        rescaled[(rescaled > max_range)] = max_range 
-        rescaled[(rescaled < 0.0)] = 0.0
+    rescaled = image.astype(numpy.float64)
+    rescaled = max_range*(rescaled - display_range[0])/(display_range[1] - display_range[0])
+    rescaled[(rescaled > max_range)] = max_range 
+    rescaled[(rescaled < 0.0)] = 0.0
         
-        # Check for saturated pixels
-        if saturated_value is not None:
-            rescaled[(image >= saturated_value)] = 255.0
+    # Check for saturated pixels
+    if saturated_value is not None:
+        rescaled[(image >= saturated_value)] = 255.0
 
-        # Convert to contiguous uint8 array.
-        rescaled += 0.5
-        rescaled = rescaled.astype(numpy.uint8, order='C')
+    # Convert to contiguous uint8 array.
+    rescaled += 0.5
+    rescaled = rescaled.astype(numpy.uint8, order='C')
 
     return [rescaled, image_min, image_max]
 
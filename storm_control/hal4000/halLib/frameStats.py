@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+Frame rate and latency instrumentation for the camera -> consumer
+pipeline. This is off by default, it is turned on with the feeds
+module 'frame_statistics' configuration option or at run time with
+the 'get frame statistics' message.
+
+The stages that are tracked for each source (camera or feed) are:
+
+ 1. 'acquired' - The frame was created in the camera thread, this is
+    frame.arrival_time.
+
+ 2. 'delivered' - The frame reached the main thread, i.e. the cameras
+    handleNewData() method.
+
+ 3. One stage per consumer (film, display, feeds, etc.). Consumers opt
+    in by connecting to the newFrame (or newFrames) signal with
+    timedSlot(). The time is measured when the consumer returns.
+
+For each stage we keep a histogram of the latency relative to
+'acquired', and for consumers also the time spent in the consumer and
+the number of frames where this was longer than the average time
+between frames (i.e. the consumer could not keep up).
+
+For each source we also keep track of the queue depth (frames created
+by the camera thread that have not been delivered to the main thread
+yet) and the number of dropped frames (gaps in the frame numbers).
+Consumers with their own queue, such as the buffered film writer, also
+report their queue depth and the number of frames that they dropped.
+
+Hazen 10/26
+"""
+import bisect
+import threading
+import time
+import weakref
+
+import storm_control.hal4000.camera.frame as frameModule
+
+
+# Upper edges of the histogram bins in milliseconds, the last bin is
+# everything larger than this.
+bin_edges = [0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0]
+
+enabled = False
+sources = {}
+sources_lock = threading.Lock()
+
+
+class StageStats(object):
+    """
+    Statistics for a single stage (or consumer) of a single source.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.counts = [0] * (len(bin_edges) + 1)
+        self.dropped = 0
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+        self.n_frames = 0
+        self.n_slow = 0
+        self.queue_depth = 0
+        self.queue_depth_max = 0
+        self.service_max = 0.0
+        self.service_total = 0.0
+
+    def addFrame(self, latency, service_time = None, frame_period = None):
+        """
+        latency and service_time are in milliseconds.
+        """
+        self.counts[bisect.bisect_left(bin_edges, latency)] += 1
+        self.n_frames += 1
+        self.latency_total += latency
+        if (latency > self.latency_max):
+            self.latency_max = latency
+
+        if service_time is not None:
+            self.service_total += service_time
+            if (service_time > self.service_max):
+                self.service_max = service_time
+            if frame_period is not None and (service_time > frame_period):
+                self.n_slow += 1
+
+    def getStatistics(self):
+        n = max(1, self.n_frames)
+        return {"dropped_frames" : self.dropped,
+                "frames" : self.n_frames,
+                "histogram" : list(self.counts),
+                "latency_max" : self.latency_max,
+                "latency_mean" : self.latency_total/n,
+                "queue_depth" : self.queue_depth,
+                "queue_depth_max" : self.queue_depth_max,
+                "service_max" : self.service_max,
+                "service_mean" : self.service_total/n,
+                "slow_frames" : self.n_slow}
+
+
+class SourceStats(object):
+    """
+    Statistics for a single camera or feed.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.reset()
+
+    def addConsumer(self, consumer, frame, start_time, end_time):
+        self.getStage(consumer).addFrame(1000.0 * (end_time - frame.arrival_time),
+                                       service_time = 1000.0 * (end_time - start_time),
+                                       frame_period = self.getFramePeriod())
+
+    def addConsumerBatch(self, consumer, frames, start_time, end_time):
+        """
+        For consumers of frame batches, the service time is split evenly
+        between the frames in the batch.
+        """
+        stage = self.getStage(consumer)
+        frame_period = self.getFramePeriod()
+        service_time = 1000.0 * (end_time - start_time)/len(frames)
+        for frame in frames:
+            stage.addFrame(1000.0 * (end_time - frame.arrival_time),
+                           service_time = service_time,
+                           frame_period = frame_period)
+
+    def addDelivered(self, frame, queue_depth):
+        """
+        This is called in the main thread when a frame is received from
+        the camera thread.
+        """
+        now = time.time()
+        self.stages["delivered"].addFrame(1000.0 * (now - frame.arrival_time))
+
+        self.queue_depth = queue_depth
+        if (queue_depth > self.queue_depth_max):
+            self.queue_depth_max = queue_depth
+
+        # The frame number goes back to zero when the camera is restarted.
+        if (self.last_frame_number is not None) and (frame.frame_number > self.last_frame_number):
+            if (frame.frame_number > (self.last_frame_number + 1)):
+                self.dropped += frame.frame_number - self.last_frame_number - 1
+
+            self.period_total += (frame.arrival_time - self.last_arrival_time)/(frame.frame_number - self.last_frame_number)
+            self.n_periods += 1
+
+        self.last_arrival_time = frame.arrival_time
+        self.last_frame_number = frame.frame_number
+
+    def addDroppedFrames(self, n_dropped):
+        """
+        For cameras that can detect dropped frames themselves.
+        """
+        self.dropped += n_dropped
+
+    def getStage(self, stage):
+        if not stage in self.stages:
+            self.stages[stage] = StageStats()
+        return self.stages[stage]
+
+    def getFramePeriod(self):
+        """
+        Returns the average time between frames in milliseconds.
+        """
+        if (self.n_periods > 0):
+            return 1000.0 * self.period_total/self.n_periods
+        return None
+
+    def getStatistics(self):
+        period = self.getFramePeriod()
+        fps = 0.0
+        if period is not None and (period > 0.0):
+            fps = 1000.0/period
+        return {"dropped_frames" : self.dropped,
+                "fps" : fps,
+                "queue_depth" : self.queue_depth,
+                "queue_depth_max" : self.queue_depth_max,
+                "stages" : {k : v.getStatistics() for k, v in self.stages.items()}}
+
+    def setConsumerQueue(self, consumer, queue_depth, dropped):
+        """
+        For consumers that have their own queue (i.e. a buffered film
+        writer), dropped is the total number of frames that the consumer
+        has dropped so far.
+        """
+        stage = self.getStage(consumer)
+        stage.dropped = dropped
+        stage.queue_depth = queue_depth
+        if (queue_depth > stage.queue_depth_max):
+            stage.queue_depth_max = queue_depth
+
+    def reset(self):
+        self.dropped = 0
+        self.last_arrival_time = None
+        self.last_frame_number = None
+        self.n_periods = 0
+        self.period_total = 0.0
+        self.queue_depth = 0
+        self.queue_depth_max = 0
+        self.stages = {"delivered" : StageStats()}
+
+
+def getSource(source_name):
+    with sources_lock:
+        if not source_name in sources:
+            sources[source_name] = SourceStats()
+        return sources[source_name]
+
+def getStatistics():
+    """
+    Returns a dictionary with the statistics of all the sources. This
+    dictionary only contains basic Python types so it can be sent as
+    part of a TCP message.
+    """
+    with sources_lock:
+        return {"bin_edges_ms" : list(bin_edges),
+                "enabled" : enabled,
+                "sources" : {k : v.getStatistics() for k, v in sources.items()}}
+
+def isEnabled():
+    return enabled
+
+def reset():
+    with sources_lock:
+        sources.clear()
+
+def setEnabled(flag):
+    global enabled
+    enabled = flag
+
+
+class TimedSlot(object):
+    """
+    Wraps a newFrame (or newFrames) slot so that the time spent in the
+    slot is recorded.
+
+    This only keeps a weak reference to the slot so that it does not
+    keep the consumer alive.
+    """
+    def __init__(self, consumer, slot, **kwds):
+        super().__init__(**kwds)
+        self.consumer = consumer
+        self.slot_ref = weakref.WeakMethod(slot)
+
+    def __call__(self, frame):
+        slot = self.slot_ref()
+        if slot is None:
+            return
+        if not enabled:
+            slot(frame)
+            return
+        start_time = time.time()
+        slot(frame)
+        end_time = time.time()
+        if isinstance(frame, frameModule.FrameBatch):
+            getSource(frame.which_camera).addConsumerBatch(self.consumer, frame.frames, start_time, end_time)
+        else:
+            getSource(frame.which_camera).addConsumer(self.consumer, frame, start_time, end_time)
+
+
+#
+# PyQt disconnect() needs the same object that was used for connect(),
+# so the TimedSlot objects are cached by the object that the slot is a
+# method of.
+#
+timed_slots = weakref.WeakKeyDictionary()
+
+def timedSlot(consumer, slot):
+    """
+    Use this to connect (and disconnect) a consumer to a newFrame or a
+    newFrames signal, for example:
+
+    cam_fn.newFrame.connect(frameStats.timedSlot("display", self.handleNewFrame))
+    cam_fn.newFrame.disconnect(frameStats.timedSlot("display", self.handleNewFrame))
+
+    slot must be a bound method.
+    """
+    owner_slots = timed_slots.setdefault(slot.__self__, {})
+    key = (consumer, slot.__func__)
+    if not key in owner_slots:
+        owner_slots[key] = TimedSlot(consumer, slot)
+    return owner_slots[key]
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
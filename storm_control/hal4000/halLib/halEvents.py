@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Records what happens to HAL messages (queued, sent, handled by,
+processed, etc.) in a fixed size ring buffer.
+
+Recording an event is just appending a tuple to a deque, the events
+are written to the log file (and / or the console) later by flush(),
+which HAL core calls periodically with a timer. This keeps logging
+out of the message passing critical path.
+
+What happens to the events is set by the verbosity, this can be
+changed at run time with the 'event log' message or the 'Get Message
+Events' TCP message:
+
+ 0 - Events are not recorded.
+ 1 - Events are recorded in the ring buffer only.
+ 2 - Events are also written to the log file (the default).
+ 3 - Events are also written to the log file and the messages that
+     are sent are printed on the console (this was HAL's original
+     behavior).
+
+Hazen 10/26
+"""
+import threading
+import time
+
+from collections import deque
+
+import storm_control.sc_library.hdebug as hdebug
+
+OFF = 0
+RECORD = 1
+LOG = 2
+CONSOLE = 3
+
+events = deque(maxlen = 10000)
+events_lock = threading.Lock()
+n_flushed = 0
+n_recorded = 0
+start_time = time.perf_counter()
+verbosity = LOG
+
+
+def flush():
+    """
+    Write the events that were recorded since the last call to
+    flush() to the log file and / or the console.
+    """
+    global n_flushed
+    with events_lock:
+        n_new = n_recorded - n_flushed
+        if (n_new == 0):
+            return
+        n_lost = max(0, n_new - len(events))
+        new_events = list(events)[len(events) - (n_new - n_lost):]
+        n_flushed = n_recorded
+
+    if (verbosity >= LOG) and hdebug.getDebug():
+        lines = []
+        if (n_lost > 0):
+            lines.append("lost {0:d} events".format(n_lost))
+        for event in new_events:
+            lines.append(formatEvent(event))
+        hdebug.logText("\n  ".join(lines))
+
+    if (verbosity >= CONSOLE):
+        for event in new_events:
+            if (event[1] == "sent"):
+                print(event[3] + " '" + event[4] + "'")
+            elif (event[1] == "sync wait"):
+                print("> waiting for '" + event[4] + "' from " + event[3] + ", " + str(event[5]) + " module(s) have not responded yet.")
+
+def formatEvent(event):
+    text = "{0:.3f},".format(1000.0 * (event[0] - start_time))
+    text += ",".join([event[1], str(event[2]), str(event[3]), event[4]])
+    if event[5] is not None:
+        text += "," + str(event[5])
+    return text
+
+def getEvents(n_events = None):
+    """
+    Returns the last n_events events (or all of them) as a list of
+    dictionaries. These only contain basic Python types so that they
+    can be sent as part of a TCP message. The time is in milliseconds.
+    """
+    with events_lock:
+        cur_events = list(events)
+    if n_events is not None:
+        cur_events = cur_events[max(0, len(cur_events) - n_events):]
+    return [{"time" : 1000.0 * (event[0] - start_time),
+             "event" : event[1],
+             "id" : event[2],
+             "source" : event[3],
+             "type" : event[4],
+             "extra" : event[5]} for event in cur_events]
+
+def getVerbosity():
+    return verbosity
+
+def record(event_name, m_id, source_name, m_type, extra = None):
+    """
+    Record an event, this should be fast as it is called multiple
+    times for every message.
+    """
+    global n_recorded
+    if (verbosity > OFF):
+        with events_lock:
+            events.append((time.perf_counter(), event_name, m_id, source_name, m_type, extra))
+            n_recorded += 1
+
+def reset(size = None):
+    """
+    Discard all the events, and optionally change the size of the
+    ring buffer.
+    """
+    global events, n_flushed, n_recorded
+    with events_lock:
+        if size is None:
+            size = events.maxlen
+        events = deque(maxlen = size)
+        n_flushed = 0
+        n_recorded = 0
+
+def setVerbosity(new_verbosity):
+    global verbosity
+    verbosity = new_verbosity
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""
+Runs QRunnables in a QThreadPool with optional serialization.
+
+Runnables that are started with the same key are run one at a time in
+the order that they were started, runnables with different keys can
+run in parallel. HAL uses the module name as the key for HalWorkers so
+that each module's workers are run in order, and hardware modules use
+the device mutex as the key so that requests to a (slow) device are
+queued here instead of each request tying up a thread in the pool
+while it waits for the device mutex.
+
+Hazen 10/26
+"""
+import threading
+
+from collections import deque
+
+from PyQt5 import QtCore
+
+
+class SerialRunner(QtCore.QRunnable):
+    """
+    Runs the runnables in a SerialQueue until the queue is empty.
+    """
+    def __init__(self, serial_queue = None, **kwds):
+        super().__init__(**kwds)
+        self.serial_queue = serial_queue
+        self.task_complete = False
+
+    def isFinished(self):
+        return self.task_complete
+
+    def run(self):
+        while self.serial_queue.runNext():
+            pass
+        self.task_complete = True
+
+
+class SerialQueue(object):
+    """
+    A queue of runnables that are run one at a time.
+    """
+    def __init__(self, pool = None, **kwds):
+        super().__init__(**kwds)
+        self.lock = threading.Lock()
+        self.pool = pool
+        self.queue = deque()
+        self.running = False
+
+        # We need to manage the runners ourselves because otherwise we'll
+        # experience strange/sporadic errors like the GUI freezing.
+        self.runners = []
+
+    def getQueueDepth(self):
+        with self.lock:
+            return len(self.queue)
+
+    def runNext(self):
+        """
+        Run the next runnable, returns False if the queue was empty.
+        """
+        with self.lock:
+            if (len(self.queue) == 0):
+                self.running = False
+                return False
+            runnable = self.queue.popleft()
+        runnable.run()
+        return True
+
+    def start(self, runnable):
+        with self.lock:
+            self.queue.append(runnable)
+            if self.running:
+                return
+            self.running = True
+
+            self.runners = list(filter(lambda x : not x.isFinished(), self.runners))
+            runner = SerialRunner(serial_queue = self)
+            runner.setAutoDelete(False)
+            self.runners.append(runner)
+        self.pool.start(runner)
+
+
+class Executor(object):
+    """
+    Starts runnables in a thread pool, runnables with the same key are
+    run one at a time.
+    """
+    def __init__(self, pool = None, **kwds):
+        super().__init__(**kwds)
+        self.lock = threading.Lock()
+        self.pool = pool
+        self.serial_queues = {}
+
+    def getQueueDepth(self, key):
+        """
+        Returns the number of runnables with this key that are waiting to run.
+        """
+        with self.lock:
+            if key in self.serial_queues:
+                return self.serial_queues[key].getQueueDepth()
+        return 0
+
+    def getThreadPool(self):
+        return self.pool
+
+    def setMaxThreadCount(self, max_threads):
+        self.pool.setMaxThreadCount(max_threads)
+
+    def start(self, runnable, key = None):
+        """
+        Start runnable, if key is None it is started immediately (or
+        as soon as there is a free thread in the pool). Otherwise it is
+        started after all the runnables with the same key have finished.
+
+        Note: The caller is responsible for keeping a reference to
+              the runnable and for calling setAutoDelete(False).
+        """
+        if key is None:
+            self.pool.start(runnable)
+        else:
+            with self.lock:
+                if not key in self.serial_queues:
+                    self.serial_queues[key] = SerialQueue(pool = self.pool)
+                serial_queue = self.serial_queues[key]
+            serial_queue.start(runnable)
+
+    def waitForDone(self):
+        self.pool.waitForDone()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
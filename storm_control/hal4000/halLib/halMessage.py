@@ -14,6 +14,7 @@ import storm_control.sc_library.halExceptions as halExceptions
 import storm_control.sc_library.hdebug as hdebug
 import storm_control.sc_library.parameters as params
 
+import storm_control.hal4000.halLib.halEvents as halEvents
 import storm_control.hal4000.halLib.halFunctionality as halFunctionality
 
 # This global is used to give each message a unique ID, primarily for
@@ -279,6 +280,9 @@ class HalMessage(QtCore.QObject):
         global message_id
         self.m_id = message_id
         message_id += 1
+
+        # The source is usually not known yet, it is set when the message is sent.
+        halEvents.record("created", self.m_id, None if source is None else source.module_name, m_type)
         
         # We use a mutex for the ref_count because threaded
         # modules could change this inside the thread.
@@ -293,8 +297,7 @@ class HalMessage(QtCore.QObject):
     def decRefCount(self, name = None):
 
         # This is helpful for debugging who has not responded to the message.
-        if True:
-            hdebug.logText(",".join(["handled by", str(self.m_id), str(name), self.m_type]))
+        self.logEvent("handled by", extra = name)
             
         self.ref_count -= 1
         if (self.ref_count == 0):
@@ -352,8 +355,11 @@ class HalMessage(QtCore.QObject):
                 self.istype_warned[m_type] = True
         return (self.m_type == m_type)
 
-    def logEvent(self, event_name):
-        hdebug.logText(",".join([event_name, str(self.m_id), self.source.module_name, self.m_type]))
+    def logEvent(self, event_name, extra = None):
+        """
+        Record an event in the (ring buffered) HAL event log, see halLib.halEvents.
+        """
+        halEvents.record(event_name, self.m_id, self.source.module_name, self.m_type, extra)
 
 #    def refCountIsZero(self):
 #        return (self.ref_count == 0)
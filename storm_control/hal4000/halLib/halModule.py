@@ -15,12 +15,16 @@ from PyQt5 import QtCore, QtWidgets
 
 import storm_control.sc_library.halExceptions as halExceptions
 
+import storm_control.hal4000.halLib.halExecutor as halExecutor
 import storm_control.hal4000.halLib.halMessage as halMessage
 import storm_control.hal4000.halLib.halMessageBox as halMessageBox
 
 
 threadpool = QtCore.QThreadPool.globalInstance()
 
+# HalWorkers (and hardware requests) are run using this, see halLib.halExecutor.
+executor = halExecutor.Executor(pool = threadpool)
+
 # Maximum time that workers can run in milliseconds. Set to -1
 # for no limit. Values are restricted to integers to for the
 # benefit of QT signalling.
@@ -33,8 +37,11 @@ def runWorkerTask(module, message, task, job_time_ms = None):
 
     This will also handle errors in manner that HAL expects.
 
-    Note: Only one of these can be run at a time (per module) in order 
-          to gaurantee that messages are handled serially.
+    Note: The workers of a module are run one at a time in the order
+          that they were started. Normally the module will also not
+          process any more messages until the worker has finished,
+          unless the message type is one of the module's
+          concurrent_message_types.
     """
     if job_time_ms is None:
         job_time_ms = max_job_time
@@ -44,6 +51,7 @@ def runWorkerTask(module, message, task, job_time_ms = None):
     message.incRefCount()
     ct_task = HalWorker(job_time_ms = job_time_ms,
                         message = message,
+                        module_name = module.module_name,
                         task = task)
     ct_task.hwsignaler.workerDone.connect(module.handleWorkerDone)
     ct_task.hwsignaler.workerError.connect(module.handleWorkerError)
@@ -52,10 +60,12 @@ def runWorkerTask(module, message, task, job_time_ms = None):
     # We need to manage the tasks ourselves because otherwise we'll
     # experience strange/sporadic errors like the GUI freezing.
     ct_task.setAutoDelete(False)
-    module.worker = ct_task
+    module.workers.append(ct_task)
+    if not (message.m_type in module.concurrent_message_types):
+        module.worker = ct_task
 
     # Run worker.
-    threadpool.start(ct_task)
+    executor.start(ct_task, key = module.module_name)
 
 
 class HalWorkerSignaler(QtCore.QObject):
@@ -77,10 +87,11 @@ class HalWorker(QtCore.QRunnable):
     Set a timeout for the worker by using a value for job_time_ms 
     that is greater than 0.
     """
-    def __init__(self, job_time_ms = -1, message = None, task = None, **kwds):
+    def __init__(self, job_time_ms = -1, message = None, module_name = None, task = None, **kwds):
         super().__init__(**kwds)
         self.job_time_ms = job_time_ms
         self.message = message
+        self.module_name = module_name
         self.task = task
         self.task_complete = False
             
@@ -90,15 +101,21 @@ class HalWorker(QtCore.QRunnable):
         return self.task_complete
     
     def run(self):
+        # The worker events are logged here rather than in the signal
+        # handlers so that the times are not delayed by the main thread.
+        self.message.logEvent("worker started", extra = self.module_name)
         self.hwsignaler.workerStarted.emit(self.message,
                                            self.job_time_ms)
         
         try:
             self.task()
         except Exception as exception:
+            self.message.logEvent("worker failed", extra = self.module_name)
             self.hwsignaler.workerError.emit(self.message,
                                              exception,
                                              traceback.format_exc())
+        else:
+            self.message.logEvent("worker done", extra = self.module_name)
         finally:
             self.task_complete = True
             
@@ -128,7 +145,20 @@ class HalModule(QtCore.QObject):
        1. self.view is the GUI view, if any that is associated with this module.
        2. self.control is the controller, if any.
 
+    Sub-classes should set the message_types class attribute to the list
+    of message types that their processMessage() method handles. HAL core
+    will then only send these types of messages to the module. Modules
+    that don't set message_types get all the messages.
+
+    Sub-classes can also set the concurrent_message_types class attribute
+    to the message types that it is safe to keep processing other messages
+    while a worker is handling a message of this type. The workers still
+    run one at a time, in order. This is useful for messages that are
+    handled by a slow device, such as a 'new parameters' message that
+    changes the settings of a serial port device.
     """
+    concurrent_message_types = []
+    message_types = None
     newMessage = QtCore.pyqtSignal(object)
 
     def __init__(self, module_name = "", **kwds):
@@ -136,7 +166,9 @@ class HalModule(QtCore.QObject):
         self.module_name = module_name
 
         self.queued_messages = deque()
+        self.timed_message = None
         self.worker = None
+        self.workers = []
 
         # Timer for workers.
         self.worker_timer = QtCore.QTimer(self)
@@ -158,21 +190,33 @@ class HalModule(QtCore.QObject):
         """
         pass
 
-    def cleanUpWorker(self):
+    def cleanUpWorker(self, message):
         """
-        Disconnects any workers that have finished and discard them.
+        Disconnects the worker that handled message and discards it.
         """
-        self.worker.hwsignaler.workerDone.disconnect(self.handleWorkerDone)
-        self.worker.hwsignaler.workerError.disconnect(self.handleWorkerError)
-        self.worker.hwsignaler.workerStarted.disconnect(self.handleWorkerStarted)
-        self.worker = None
+        worker = None
+        for elt in self.workers:
+            if elt.message is message:
+                worker = elt
+                break
+        if worker is None:
+            return
+        
+        worker.hwsignaler.workerDone.disconnect(self.handleWorkerDone)
+        worker.hwsignaler.workerError.disconnect(self.handleWorkerError)
+        worker.hwsignaler.workerStarted.disconnect(self.handleWorkerStarted)
+        self.workers.remove(worker)
+        if worker is self.worker:
+            self.worker = None
 
         # Stop the worker timer.
-        if self.worker_timer.isActive():
+        if (self.timed_message is message) and self.worker_timer.isActive():
             self.worker_timer.stop()
+            self.timed_message = None
 
-        # Start the timer if we still have messages left.
-        if (len(self.queued_messages) > 0):
+        # Start the timer if we still have messages left, and we are
+        # not waiting for a (different) worker.
+        if (len(self.queued_messages) > 0) and (self.worker is None):
             self.queued_messages_timer.start()
 
     def findChild(self, qt_type, name, options):
@@ -208,6 +252,24 @@ class HalModule(QtCore.QObject):
                     halMessageBox.halMessageBoxInfo(data)
         return True
 
+    def getMessageTypes(self):
+        """
+        Returns the message types that this module handles, or None if
+        the module should get all the messages.
+
+        This uses the message_types attribute of the class that provides
+        processMessage(), so a sub-class that overrides processMessage()
+        without also setting message_types will get all the messages.
+
+        HAL core caches the result, but it starts over after 'configure1',
+        so modules can also override this method and decide which message
+        types to handle during 'configure1'.
+        """
+        for a_class in type(self).__mro__:
+            if "processMessage" in vars(a_class):
+                return vars(a_class).get("message_types", None)
+        return None
+
     def handleMessage(self, message):
         """
         Don't override..
@@ -253,11 +315,8 @@ class HalModule(QtCore.QObject):
         """
         message.decRefCount(name = self.module_name)
 
-        # Log when the worker finished.
-        message.logEvent("worker done")
-
         # Cleanup the worker.
-        self.cleanUpWorker()
+        self.cleanUpWorker(message)
         
     def handleWorkerError(self, message, exception, stack_trace):
         """
@@ -271,18 +330,15 @@ class HalModule(QtCore.QObject):
         # Decrement ref count otherwise the error will hang HAL.
         message.decRefCount(name = self.module_name)
 
-        # Log when the worker failed.
-        message.logEvent("worker failed")
-
         # Cleanup the worker.
-        self.cleanUpWorker()
+        self.cleanUpWorker(message)
 
     def handleWorkerStarted(self, message, job_time_ms):
         """
         You probably don't want to override this..
         """
-        message.logEvent("worker started {0:0d}".format(job_time_ms))
         if (job_time_ms > 0):
+            self.timed_message = message
             self.worker_timer.setInterval(job_time_ms)
             self.worker_timer.start()
 
@@ -300,7 +356,7 @@ class HalModule(QtCore.QObject):
         faulthandler.dump_traceback()
         print("")
 
-        e_string = "HALWorker for '" + self.module_name + "' module timed out handling '" + self.worker.message.m_type + "'!"
+        e_string = "HALWorker for '" + self.module_name + "' module timed out handling '" + self.timed_message.m_type + "'!"
         raise halExceptions.HalException(e_string)
         
     def processMessage(self, message):
@@ -319,6 +375,7 @@ class HalModule(QtCore.QObject):
         # Get the next message from the queue.
         message = self.queued_messages.popleft()
 
+        message.logEvent("handling", extra = self.module_name)
         try:
             self.processMessage(message)
         except Exception as exception:
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Converts the HAL message events (see halLib.halEvents) into a trace
+file in the Chrome trace event format. These files can be viewed with
+chrome://tracing or https://ui.perfetto.dev.
+
+In the trace each message is shown as an (asynchronous) span from when
+it was created to when it was processed, with a 'queued' span for the
+time that it spent waiting in HAL core's queue. Each module has its
+own track that shows the time that the module spent in processMessage()
+for each message, and a second track for the time spent in the
+module's worker (runWorkerTask()).
+
+Hazen 10/26
+"""
+import json
+
+import storm_control.hal4000.halLib.halEvents as halEvents
+
+
+def makeTrace(events):
+    """
+    Returns a list of trace events given a list of HAL message events
+    as returned by halEvents.getEvents().
+    """
+    handling = {}
+    messages = {}
+    tids = {}
+    trace = []
+    workers = {}
+
+    def getTid(name):
+        if not name in tids:
+            tids[name] = len(tids) + 1
+            trace.append({"args" : {"name" : name},
+                          "name" : "thread_name",
+                          "ph" : "M",
+                          "pid" : 1,
+                          "tid" : tids[name]})
+        return tids[name]
+
+    trace.append({"args" : {"name" : "HAL"},
+                  "name" : "process_name",
+                  "ph" : "M",
+                  "pid" : 1})
+    core_tid = getTid("core")
+
+    for event in events:
+        e_name = event["event"]
+        m_id = event["id"]
+        ts = 1000.0 * event["time"]
+        args = {"id" : m_id, "source" : event["source"]}
+
+        if (e_name == "created"):
+            messages[m_id] = {"created" : ts}
+
+        elif (e_name == "queued"):
+            messages.setdefault(m_id, {"created" : ts})["queued"] = ts
+
+        elif (e_name == "sent"):
+            if m_id in messages:
+                messages[m_id]["sent"] = ts
+
+        elif (e_name == "processed"):
+            times = messages.pop(m_id, None)
+            if times is None or not ("queued" in times):
+                continue
+
+            spans = [[event["type"], times["created"], ts]]
+            if "sent" in times:
+                spans.append(["queued", times["queued"], times["sent"]])
+            for [name, start, end] in spans:
+                for [ph, t] in [["b", start], ["e", end]]:
+                    trace.append({"args" : args,
+                                  "cat" : "message",
+                                  "id" : m_id,
+                                  "name" : name,
+                                  "ph" : ph,
+                                  "pid" : 1,
+                                  "tid" : core_tid,
+                                  "ts" : t})
+
+        elif (e_name == "sync wait"):
+            trace.append({"args" : args,
+                          "name" : "sync wait " + event["type"],
+                          "ph" : "i",
+                          "pid" : 1,
+                          "s" : "t",
+                          "tid" : core_tid,
+                          "ts" : ts})
+
+        elif (e_name == "handling"):
+            handling[(m_id, event["extra"])] = ts
+
+        elif (e_name == "handled by"):
+            start = handling.pop((m_id, event["extra"]), None)
+            if start is not None:
+                trace.append({"args" : args,
+                              "dur" : ts - start,
+                              "name" : event["type"],
+                              "ph" : "X",
+                              "pid" : 1,
+                              "tid" : getTid(event["extra"]),
+                              "ts" : start})
+
+        elif (e_name == "worker started"):
+            workers[(m_id, event["extra"])] = ts
+
+        elif (e_name == "worker done") or (e_name == "worker failed"):
+            start = workers.pop((m_id, event["extra"]), None)
+            if start is not None:
+                if (e_name == "worker failed"):
+                    args["failed"] = True
+                trace.append({"args" : args,
+                              "dur" : ts - start,
+                              "name" : event["type"],
+                              "ph" : "X",
+                              "pid" : 1,
+                              "tid" : getTid(event["extra"] + " worker"),
+                              "ts" : start})
+
+    return trace
+
+def writeTrace(filename, first_id = None):
+    """
+    Write the current contents of the event ring buffer to a trace file.
+
+    first_id - (Optional) Only include the messages whose ID is greater
+               than or equal to this, message IDs increase monotonically.
+    """
+    events = halEvents.getEvents()
+    if first_id is not None:
+        events = list(filter(lambda x : (x["id"] >= first_id), events))
+    with open(filename, "w") as fp:
+        json.dump({"displayTimeUnit" : "ms",
+                   "traceEvents" : makeTrace(events)},
+                  fp)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
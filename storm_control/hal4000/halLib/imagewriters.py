@@ -5,17 +5,22 @@ Image file writers for various formats.
 Hazen 03/17
 """
 
+import collections
 import copy
 import datetime
+import numpy
 import struct
 import tifffile
 import time
 
 from PyQt5 import QtCore
 
+import storm_control.sc_library.cdax as cdax
 import storm_control.sc_library.halExceptions as halExceptions
 import storm_control.sc_library.parameters as params
 
+import storm_control.hal4000.halLib.frameStats as frameStats
+
 
 class ImageWriterException(halExceptions.HalException):
     pass
@@ -32,9 +37,9 @@ def availableFileFormats(test_mode):
     #
 
     if test_mode:
-        return [".dax", ".tif", ".big.tif", ".test"]
+        return [".dax", ".tif", ".big.tif", ".cdax", ".test"]
     else:
-        return [".dax", ".tif", ".big.tif"]
+        return [".dax", ".tif", ".big.tif", ".cdax"]
 
 def createFileWriter(camera_functionality, film_settings):
     """
@@ -43,32 +48,219 @@ def createFileWriter(camera_functionality, film_settings):
     """
     ft = film_settings.getFiletype()
     if (ft == ".dax"):
-        return DaxFile(camera_functionality = camera_functionality,
-                       film_settings = film_settings)
+        writer = DaxFile(camera_functionality = camera_functionality,
+                         film_settings = film_settings)
+    elif (ft == ".cdax"):
+        writer = CDaxFile(camera_functionality = camera_functionality,
+                          film_settings = film_settings)
     elif (ft == ".big.tif"):
-        return TIFFile(bigtiff = True,
-                       camera_functionality = camera_functionality,
-                       film_settings = film_settings)
+        writer = TIFFile(bigtiff = True,
+                         camera_functionality = camera_functionality,
+                         film_settings = film_settings)
     elif (ft == ".spe"):
-        return SPEFile(camera_functionality = camera_functionality,
-                       film_settings = film_settings)
+        writer = SPEFile(camera_functionality = camera_functionality,
+                         film_settings = film_settings)
     elif (ft == ".test"):
-        return TestFile(camera_functionality = camera_functionality,
-                       film_settings = film_settings)
+        writer = TestFile(camera_functionality = camera_functionality,
+                          film_settings = film_settings)
     elif (ft == ".tif"):
-        return TIFFile(camera_functionality = camera_functionality,
-                       film_settings = film_settings)
+        writer = TIFFile(camera_functionality = camera_functionality,
+                         film_settings = film_settings)
     else:
         raise ImageWriterException("Unknown output file format '" + ft + "'")
 
+    if (film_settings.getWriterBuffers() > 0):
+        writer.startWriterThread(film_settings.getWriterBuffers())
+    return writer
+
+def writeInfFile(basename, x_pixels, y_pixels, number_frames, data_type = "16 bit integers (binary, little endian)"):
+    """
+    Write a very simple .inf file. All the metadata is now stored in the
+    .xml file that is saved with each recording.
+    """
+    w = str(x_pixels)
+    h = str(y_pixels)
+    with open(basename + ".inf", "w") as inf_fp:
+        inf_fp.write("binning = 1 x 1\n")
+        inf_fp.write("data type = " + data_type + "\n")
+        inf_fp.write("frame dimensions = " + w + " x " + h + "\n")
+        inf_fp.write("number of frames = " + str(number_frames) + "\n")
+        if True:
+            inf_fp.write("x_start = 1\n")
+            inf_fp.write("x_end = " + w + "\n")
+            inf_fp.write("y_start = 1\n")
+            inf_fp.write("y_end = " + h + "\n")
+        inf_fp.close()
+
+
+class BufferedWriterThread(QtCore.QThread):
+    """
+    Saves frames in a separate thread so that the thread that receives
+    the frames (usually the main Qt thread) does not block on disk I/O.
+
+    Frames are copied into a ring of pre-allocated buffers. The writing
+    thread drains the ring, passing as many (contiguous) frames as are
+    available to the writer in a single call. If the ring is full when
+    a new frame arrives the frame is dropped and counted.
+    """
+    def __init__(self, frame_pixels = None, number_buffers = None, write_fn = None, **kwds):
+        """
+        frame_pixels - The number of pixels in a frame.
+        number_buffers - The number of frames in the ring.
+        write_fn - A function that takes a (frames, pixels) numpy array
+                   and saves it.
+        """
+        super().__init__(**kwds)
+        self.buffers = numpy.zeros((number_buffers, frame_pixels), dtype = numpy.uint16)
+        self.dropped = 0
+        self.error = None
+        self.max_used = 0
+        self.mutex = QtCore.QMutex()
+        self.n_filled = 0
+        self.number_buffers = number_buffers
+        self.read_index = 0
+        self.running = True
+        self.wait_condition = QtCore.QWaitCondition()
+        self.write_fn = write_fn
+        self.write_index = 0
+        self.written = 0
+
+    def addFrame(self, np_data):
+        """
+        Copy a frame into the ring. Returns False if the frame was dropped.
+        """
+        self.mutex.lock()
+        if (self.n_filled == self.number_buffers) or (self.error is not None):
+            self.dropped += 1
+            self.mutex.unlock()
+            return False
+        index = self.write_index
+        self.mutex.unlock()
+
+        # The buffer at index belongs to us until n_filled is incremented,
+        # so the copy can happen without holding the lock.
+        self.buffers[index,:] = np_data.reshape(-1)
+
+        self.mutex.lock()
+        self.write_index = (index + 1) % self.number_buffers
+        self.n_filled += 1
+        if (self.n_filled > self.max_used):
+            self.max_used = self.n_filled
+        self.wait_condition.wakeAll()
+        self.mutex.unlock()
+        return True
+
+    def addFrames(self, frames):
+        """
+        Copy a list of frames (numpy arrays) into the ring. If the ring
+        does not have space for all of them then the extra frames are
+        dropped. Returns the number of frames that were dropped.
+        """
+        n_frames = len(frames)
+        self.mutex.lock()
+        if (self.error is not None):
+            n_added = 0
+        else:
+            n_added = min(n_frames, self.number_buffers - self.n_filled)
+        self.dropped += n_frames - n_added
+        index = self.write_index
+        self.mutex.unlock()
+
+        for i in range(n_added):
+            self.buffers[(index + i) % self.number_buffers,:] = frames[i].reshape(-1)
+
+        if (n_added > 0):
+            self.mutex.lock()
+            self.write_index = (index + n_added) % self.number_buffers
+            self.n_filled += n_added
+            if (self.n_filled > self.max_used):
+                self.max_used = self.n_filled
+            self.wait_condition.wakeAll()
+            self.mutex.unlock()
+        return n_frames - n_added
+
+    def getBufferFill(self):
+        """
+        Returns the fraction of the ring that is currently in use.
+        """
+        self.mutex.lock()
+        fill = float(self.n_filled)/float(self.number_buffers)
+        self.mutex.unlock()
+        return fill
+
+    def getDropped(self):
+        return self.dropped
+
+    def getMaxFill(self):
+        """
+        Returns the maximum fraction of the ring that was ever in use.
+        """
+        return float(self.max_used)/float(self.number_buffers)
+
+    def getWritten(self):
+        return self.written
+
+    def run(self):
+        while True:
+            self.mutex.lock()
+            while (self.n_filled == 0) and self.running:
+                self.wait_condition.wait(self.mutex)
+            if (self.n_filled == 0):
+                self.mutex.unlock()
+                break
+
+            # Only write up to the end of the ring so that the
+            # frames are contiguous in memory.
+            start = self.read_index
+            count = min(self.n_filled, self.number_buffers - start)
+            self.mutex.unlock()
+
+            try:
+                self.write_fn(self.buffers[start:start+count])
+            except Exception as exception:
+                self.mutex.lock()
+                self.error = exception
+                self.dropped += self.n_filled
+                self.n_filled = 0
+                self.mutex.unlock()
+                break
+
+            self.mutex.lock()
+            self.read_index = (start + count) % self.number_buffers
+            self.n_filled -= count
+            self.written += count
+            self.mutex.unlock()
+
+    def stopThread(self):
+        """
+        Write any remaining frames and stop the thread.
+        """
+        self.mutex.lock()
+        self.running = False
+        self.wait_condition.wakeAll()
+        self.mutex.unlock()
+        self.wait()
+        if self.error is not None:
+            raise ImageWriterException("Writing failed, " + str(self.error))
+
 
 class BaseFileWriter(object):
+    """
+    Sub-classes should override writeFrame(), and optionally writeFrames()
+    if the file format allows multiple frames to be saved more efficiently
+    than one at a time.
 
+    Frames arrive in batches (the camera functionality newFrames signal),
+    so unbuffered writers also get to use writeFrames().
+    """
     def __init__(self, camera_functionality = None, film_settings = None, **kwds):
         super().__init__(**kwds)
         self.cam_fn = camera_functionality
         self.film_settings = film_settings
+        self.image_x = self.cam_fn.getParameter("x_pixels")
+        self.image_y = self.cam_fn.getParameter("y_pixels")
         self.stopped = False
+        self.writer_thread = None
 
         # This is the frame size in MB.
         self.frame_size = self.cam_fn.getParameter("bytes_per_frame") *  0.000000953674
@@ -81,25 +273,250 @@ class BaseFileWriter(object):
         self.filename = self.basename + self.film_settings.getFiletype()
 
         # Connect the camera functionality.
-        self.cam_fn.newFrame.connect(self.saveFrame)
+        self.cam_fn.newFrames.connect(frameStats.timedSlot("film", self.saveFrames))
         self.cam_fn.stopped.connect(self.handleStopped)
 
     def closeWriter(self):
         assert self.stopped
-        self.cam_fn.newFrame.disconnect(self.saveFrame)
+        self.cam_fn.newFrames.disconnect(frameStats.timedSlot("film", self.saveFrames))
         self.cam_fn.stopped.disconnect(self.handleStopped)
+        if self.writer_thread is not None:
+            self.writer_thread.stopThread()
 
+    def getBufferFill(self):
+        """
+        Returns the fraction of the buffers that are in use, this is
+        always 0.0 for unbuffered writers.
+        """
+        if self.writer_thread is not None:
+            return self.writer_thread.getBufferFill()
+        return 0.0
+
+    def getDroppedFrames(self):
+        if self.writer_thread is not None:
+            return self.writer_thread.getDropped()
+        return 0
+
+    def getMaxBufferFill(self):
+        if self.writer_thread is not None:
+            return self.writer_thread.getMaxFill()
+        return 0.0
+        
     def getSize(self):
         return self.frame_size * self.number_frames
     
     def handleStopped(self):
         self.stopped = True
 
+    def isBuffered(self):
+        return self.writer_thread is not None
+    
     def isStopped(self):
         return self.stopped
         
-    def saveFrame(self):
+    def saveFrame(self, frame):
         self.number_frames += 1
+        if self.writer_thread is not None:
+            self.writer_thread.addFrame(frame.getData())
+            if frameStats.enabled:
+                frameStats.getSource(frame.which_camera).setConsumerQueue("film",
+                                                                          self.writer_thread.n_filled,
+                                                                          self.writer_thread.getDropped())
+        else:
+            self.writeFrame(frame.getData())
+
+    def saveFrames(self, frame_batch):
+        """
+        Save a frame.FrameBatch.
+        """
+        self.number_frames += len(frame_batch)
+        if self.writer_thread is not None:
+            self.writer_thread.addFrames([x.getData() for x in frame_batch])
+            if frameStats.enabled:
+                frameStats.getSource(frame_batch.which_camera).setConsumerQueue("film",
+                                                                                self.writer_thread.n_filled,
+                                                                                self.writer_thread.getDropped())
+        else:
+            self.writeBatch(frame_batch)
+
+    def startWriterThread(self, number_buffers):
+        """
+        Save frames using a separate thread, the thread will buffer
+        up to number_buffers frames.
+        """
+        self.writer_thread = BufferedWriterThread(frame_pixels = self.image_x * self.image_y,
+                                                  number_buffers = number_buffers,
+                                                  write_fn = self.writeFrames)
+        self.writer_thread.start(QtCore.QThread.NormalPriority)
+
+    def writeBatch(self, frame_batch):
+        """
+        Save a frame.FrameBatch (unbuffered writers). Override if it is
+        worth copying the frames into a single array to use writeFrames().
+        """
+        for a_frame in frame_batch:
+            self.writeFrame(a_frame.getData())
+
+    def writeFrame(self, np_data):
+        """
+        Override to save a single frame.
+        """
+        pass
+
+    def writeFrames(self, np_frames):
+        """
+        Save multiple frames, np_frames is a (frames, pixels) array.
+        """
+        for i in range(np_frames.shape[0]):
+            self.writeFrame(np_frames[i])
+
+
+class ChunkCompressor(QtCore.QRunnable):
+    """
+    Runnable for compressing a single chunk of a .cdax file.
+    """
+    def __init__(self, frames = None, n_frames = None, x_pixels = None, y_pixels = None, level = None, **kwds):
+        super().__init__(**kwds)
+        self.data = None
+        self.done = QtCore.QSemaphore(0)
+        self.error = None
+        self.frames = frames
+        self.level = level
+        self.n_frames = n_frames
+        self.x_pixels = x_pixels
+        self.y_pixels = y_pixels
+
+    def isDone(self):
+        return (self.done.available() > 0)
+
+    def run(self):
+        try:
+            self.data = cdax.encodeChunk(self.frames[:self.n_frames],
+                                         self.x_pixels,
+                                         self.y_pixels,
+                                         level = self.level)
+        except Exception as exception:
+            self.error = exception
+        self.done.release()
+
+    def waitDone(self):
+        """
+        Wait for the compression to finish, returns the compressed data.
+        """
+        self.done.acquire()
+        if self.error is not None:
+            raise ImageWriterException("Compression failed, " + str(self.error))
+        return self.data
+
+
+class CDaxFile(BaseFileWriter):
+    """
+    Chunked, compressed .dax file writing class, see sc_library.cdax
+    for a description of the format.
+
+    Frames are copied into a chunk buffer, full chunks are compressed by
+    a pool of threads. The compressed chunks are written to the file in
+    order as they finish.
+    """
+    def __init__(self, chunk_frames = 64, compression_level = 1, compression_threads = None, **kwds):
+        super().__init__(**kwds)
+        self.chunk_frames = chunk_frames
+        self.chunk_n = 0
+        self.compression_level = compression_level
+        self.free_buffers = []
+        self.index = []
+        self.pending = collections.deque()
+
+        if compression_threads is None:
+            compression_threads = max(1, min(4, QtCore.QThread.idealThreadCount() - 1))
+
+        # Limit the number of chunks that can be waiting to be compressed.
+        self.max_pending = 2 * compression_threads
+
+        self.threadpool = QtCore.QThreadPool()
+        self.threadpool.setMaxThreadCount(compression_threads)
+
+        self.chunk = self.newChunkBuffer()
+        self.fp = open(self.filename, "wb")
+        self.fp.write(cdax.packHeader(self.image_x,
+                                      self.image_y,
+                                      self.chunk_frames,
+                                      self.compression_level))
+
+    def closeWriter(self):
+        super().closeWriter()
+        if (self.chunk_n > 0):
+            self.submitChunk()
+        self.writeChunks(wait = True)
+        self.threadpool.waitForDone()
+
+        # Add index and footer.
+        index_offset = self.fp.tell()
+        numpy.array(self.index, dtype = "<u8").reshape((-1, 3)).tofile(self.fp)
+        n_saved = sum(map(lambda x: x[2], self.index))
+        self.fp.write(cdax.packFooter(index_offset, n_saved))
+        self.fp.close()
+
+        writeInfFile(self.basename,
+                     self.image_x,
+                     self.image_y,
+                     n_saved,
+                     data_type = "16 bit integers (chunked, compressed)")
+
+    def getCompressionRatio(self):
+        """
+        Returns the (uncompressed size / compressed size) of the
+        chunks that have been written so far.
+        """
+        compressed = sum(map(lambda x: x[1], self.index))
+        if (compressed == 0):
+            return 1.0
+        return float(2 * self.image_x * self.image_y * sum(map(lambda x: x[2], self.index)))/float(compressed)
+
+    def newChunkBuffer(self):
+        if (len(self.free_buffers) > 0):
+            return self.free_buffers.pop()
+        return numpy.zeros((self.chunk_frames, self.image_x * self.image_y), dtype = numpy.uint16)
+
+    def submitChunk(self):
+        compressor = ChunkCompressor(frames = self.chunk,
+                                     n_frames = self.chunk_n,
+                                     x_pixels = self.image_x,
+                                     y_pixels = self.image_y,
+                                     level = self.compression_level)
+        compressor.setAutoDelete(False)
+        self.pending.append(compressor)
+        self.threadpool.start(compressor)
+
+        self.chunk = self.newChunkBuffer()
+        self.chunk_n = 0
+
+        # Write what we can, and block if the compression threads
+        # are falling behind.
+        self.writeChunks()
+        while (len(self.pending) > self.max_pending):
+            self.writeChunk(self.pending.popleft())
+
+    def writeChunk(self, compressor):
+        data = compressor.waitDone()
+        self.fp.write(cdax.packChunkHeader(compressor.n_frames, len(data)))
+        self.index.append([self.fp.tell(), len(data), compressor.n_frames])
+        self.fp.write(data)
+        self.free_buffers.append(compressor.frames)
+
+    def writeChunks(self, wait = False):
+        """
+        Write the compressed chunks (in order) that are finished, or
+        all of them if wait is True.
+        """
+        while (len(self.pending) > 0) and (wait or self.pending[0].isDone()):
+            self.writeChunk(self.pending.popleft())
+
+    def writeFrame(self, np_data):
+        self.chunk[self.chunk_n,:] = np_data.reshape(-1)
+        self.chunk_n += 1
+        if (self.chunk_n == self.chunk_frames):
+            self.submitChunk()
 
 
 class DaxFile(BaseFileWriter):
@@ -117,26 +534,24 @@ class DaxFile(BaseFileWriter):
         """
         super().closeWriter()
         self.fp.close()
+        writeInfFile(self.basename,
+                     self.cam_fn.getParameter("x_pixels"),
+                     self.cam_fn.getParameter("y_pixels"),
+                     self.number_frames - self.getDroppedFrames())
+
+    def writeBatch(self, frame_batch):
+        if frame_batch.hasData():
+            self.writeFrames(frame_batch.getData())
+        else:
+            for a_frame in frame_batch:
+                self.writeFrame(a_frame.getData())
 
-        w = str(self.cam_fn.getParameter("x_pixels"))
-        h = str(self.cam_fn.getParameter("y_pixels"))
-        with open(self.basename + ".inf", "w") as inf_fp:
-            inf_fp.write("binning = 1 x 1\n")
-            inf_fp.write("data type = 16 bit integers (binary, little endian)\n")
-            inf_fp.write("frame dimensions = " + w + " x " + h + "\n")
-            inf_fp.write("number of frames = " + str(self.number_frames) + "\n")
-            if True:
-                inf_fp.write("x_start = 1\n")
-                inf_fp.write("x_end = " + w + "\n")
-                inf_fp.write("y_start = 1\n")
-                inf_fp.write("y_end = " + h + "\n")
-            inf_fp.close()
-
-    def saveFrame(self, frame):
-        super().saveFrame()
-        np_data = frame.getData()
+    def writeFrame(self, np_data):
         np_data.tofile(self.fp)
 
+    def writeFrames(self, np_frames):
+        np_frames.tofile(self.fp)
+
 
 class SPEFile(BaseFileWriter):
     """
@@ -176,12 +591,10 @@ class SPEFile(BaseFileWriter):
     def closeWriter(self):
         super().closeWriter()
         self.fp.seek(1446)
-        self.fp.write(struct.pack("i", self.number_frames))
+        self.fp.write(struct.pack("i", self.number_frames - self.getDroppedFrames()))
 
-    def saveFrame(self, frame):
-        super().saveFrame()
-        np_data = frame.getData()
-        np_data.tofile(self.file_ptrs[index])
+    def writeFrame(self, np_data):
+        np_data.tofile(self.fp)
 
 
 class TestFile(DaxFile):
@@ -201,6 +614,9 @@ class TestFile(DaxFile):
     def saveFrame(self, frame):
         if (self.number_frames < 1):
             super().saveFrame(frame)
+
+    def saveFrames(self, frame_batch):
+        self.saveFrame(frame_batch[0])
     
     
 class TIFFile(BaseFileWriter):
@@ -224,10 +640,8 @@ class TIFFile(BaseFileWriter):
         super().closeWriter()
         self.tif.close()
         
-    def saveFrame(self, frame):
-        super().saveFrame()
-        image = frame.getData()
-        self.tif.save(image.reshape((frame.image_y, frame.image_x)),
+    def writeFrame(self, np_data):
+        self.tif.save(np_data.reshape((self.image_y, self.image_x)),
                       metadata = self.metadata,
                       resolution = self.resolution)
 
@@ -29,16 +29,19 @@ class IlluminationFunctionality(halFunctionality.HalFunctionality):
 
     def __init__(self,
                  get_channel_names = None,
+                 get_channel_powers = None,
                  remote_inc_power = None,
                  remote_set_power = None,
                  **kwds):
         super().__init__(**kwds)
         
         assert(callable(get_channel_names))
+        assert(callable(get_channel_powers))
         assert(callable(remote_inc_power))
         assert(callable(remote_set_power))
         
         self.getChannelNames = get_channel_names
+        self.getChannelPowers = get_channel_powers
         self.remoteIncPower = remote_inc_power
         self.remoteSetPower = remote_set_power
         
@@ -302,6 +305,16 @@ class IlluminationView(halDialog.HalDialog):
 
 
 class Illumination(halModule.HalModule):
+    message_types = ["configuration",
+                     "configure1",
+                     "current parameters",
+                     "get functionality",
+                     "new parameters",
+                     "new shutters file",
+                     "show",
+                     "start",
+                     "start film",
+                     "stop film"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
@@ -315,6 +328,7 @@ class Illumination(halModule.HalModule):
         self.view.guiMessage.connect(self.handleGuiMessage)
 
         self.ilm_functionality = IlluminationFunctionality(get_channel_names = self.view.getChannelNames,
+                                                           get_channel_powers = self.view.getChannelPowers,
                                                            remote_inc_power = self.view.remoteIncPower,
                                                            remote_set_power = self.view.remoteSetPower)
 
@@ -424,6 +424,10 @@ class BluetoothControl(QtCore.QThread):
                             
 
 class BlueToothModule(halModule.HalModule):
+    message_types = ["configuration",
+                     "configure1",
+                     "film lockout",
+                     "new parameters"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
@@ -86,6 +86,10 @@ class FilterWheelView(halDialog.HalDialog):
 
 
 class FilterWheel(halModule.HalModule):
+    message_types = ["configure1",
+                     "new parameters",
+                     "show",
+                     "start"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
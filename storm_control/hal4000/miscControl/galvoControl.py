@@ -106,6 +106,9 @@ class GalvoView(halDialog.HalDialog):
 
 
 class Galvo(halModule.HalModule):
+    message_types = ["configure1",
+                     "show",
+                     "start"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
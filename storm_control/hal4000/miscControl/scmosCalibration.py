@@ -247,6 +247,11 @@ class SCMOSCalibrationView(halDialog.HalDialog):
 
 
 class SCMOSCalibration(halModule.HalModule):
+    message_types = ["change directory",
+                     "configuration",
+                     "configure1",
+                     "show",
+                     "start"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
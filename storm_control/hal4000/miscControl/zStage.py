@@ -111,6 +111,10 @@ class ZStageView(halDialog.HalDialog):
 
 
 class ZStage(halModule.HalModule):
+    message_types = ["configure1",
+                     "new parameters",
+                     "show",
+                     "start"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
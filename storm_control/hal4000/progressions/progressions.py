@@ -508,6 +508,15 @@ class ProgressionsView(halDialog.HalDialog):
 
 
 class Progressions(halModule.HalModule):
+    message_types = ["change directory",
+                     "configuration",
+                     "configure1",
+                     "new parameters",
+                     "show",
+                     "start",
+                     "start film",
+                     "stop film",
+                     "tcp message"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
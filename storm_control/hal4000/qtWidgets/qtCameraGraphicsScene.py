@@ -23,6 +23,10 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
 
     If the image is binned then the rendered image needs to be
     up-sampled appropriately to compensate for the binning.
+
+    If the view is zoomed out then the image is decimated before it
+    is rendered as there is no point in rescaling pixels that won't
+    be visible.
     """
     def __init__(self, **kwds):
         super().__init__(**kwds)
@@ -33,6 +37,7 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
         self.click_x = 0
         self.click_y = 0
         self.colortable = None
+        self.decimate = 1
         self.display_range = [0, 200]
         self.display_saturated_pixels = False
         self.draw_grid = False
@@ -42,10 +47,12 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
         self.image_max = 0
         self.image_min = 0
         self.intensity_info = 0
+        self.last_frame = None
         self.max_intensity = None
         self.q_image = None
         self.scale_x = 1
         self.scale_y = 1
+        self.view_scale = 0
 
     def boundingRect(self):
         chip_rect = QtCore.QRectF(0, 0, self.chip_x, self.chip_y)
@@ -67,6 +74,7 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
         
     def newColorTable(self, colortable):
         self.colortable = colortable
+        self.last_frame = None
         if "_sat.ctbl" in colortable:
             self.display_saturated_pixels = True
         else:
@@ -77,6 +85,8 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
         [self.frame_x_offset, self.frame_y_offset] = camera_functionality.getFrameZeroZero()
         self.max_intensity = camera_functionality.getParameter("max_intensity")
         [self.scale_x, self.scale_y] = camera_functionality.getFrameScale()
+        self.setDisplayScale(self.view_scale)
+        self.last_frame = None
         
         # Check if we need to notify the scene of a change in the chip size.
         if (chip_x != self.chip_x) or (chip_y != self.chip_y):
@@ -87,13 +97,17 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
 
     def newRange(self, d_min, d_max):
         self.display_range = [d_min, d_max]
+        self.last_frame = None
 
     def paint(self, painter, option, widget):
         if self.q_image is not None:
 
-            # Draw the image.
-            painter.drawImage(self.frame_x_offset,
-                              self.frame_y_offset,
+            # Draw the image, Qt takes care of compensating for binning
+            # and / or decimation.
+            painter.drawImage(QtCore.QRectF(self.frame_x_offset,
+                                            self.frame_y_offset,
+                                            self.q_image.frame_w * self.scale_x,
+                                            self.q_image.frame_h * self.scale_y),
                               self.q_image)
             
             # Draw the grid into the buffer.
@@ -131,6 +145,19 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
             for i in range(256):
                 self.q_image.setColor(i,QtGui.qRgb(i,i,i))        
 
+    def setDisplayScale(self, view_scale):
+        """
+        The scale of the QtCameraGraphicsView, if this is less than 0 then
+        the view is zoomed out by a factor of (-view_scale + 1).
+        """
+        self.view_scale = view_scale
+        decimate = 1
+        if (view_scale < 0):
+            decimate = max(1, (-view_scale + 1)//min(self.scale_x, self.scale_y))
+        if (decimate != self.decimate):
+            self.decimate = decimate
+            self.last_frame = None
+
     def setShowGrid(self, show):
         self.draw_grid = show
         
@@ -140,6 +167,9 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
     def updateImageWithFrame(self, frame):
         """
         Convert the frame to a QImage, then call update() to display it.
+
+        Nothing is done if this is the frame that is already being
+        displayed and the display settings have not changed.
         """
         #
         # For reasons lost in the mists of time 'frame' is a 1D numpy array
@@ -154,38 +184,50 @@ class QtCameraGraphicsItem(QtWidgets.QGraphicsItem):
             print("Got an image with an unexpected size, ", image_data.shape, "expected [", w, ",", h, "]")
             return
 
+        # Record the intensity where the user last clicked on the image.
+        # self.click_x and self.click_y are in frame coordinates.
+        xl = self.click_x
+        yl = self.click_y
+        if ((xl >= 0) and (xl < w) and (yl >= 0) and (yl < h)):
+            self.intensity_info = image_data[yl, xl]
+        else:
+            self.intensity_info = 0
+
+        if frame is self.last_frame:
+            return
+        self.last_frame = frame
+
         max_intensity = self.max_intensity
         if not self.display_saturated_pixels:
             max_intensity = None
 
-        # Rescale the image & record it's minimum and maximum.
+        # Rescale (and decimate) the image & record it's minimum and maximum.
         [temp, self.image_min, self.image_max] = c_image.rescaleImage(image_data,
                                                                       False,
                                                                       False,
                                                                       False,
                                                                       self.display_range,
-                                                                      max_intensity)
+                                                                      max_intensity,
+                                                                      decimate = self.decimate)
         
-        # Create QImage & re-scale to compensate for binning, if any.
-        temp_image = QtGui.QImage(temp.data, w, h, QtGui.QImage.Format_Indexed8)
-        if (self.scale_x != 1) or (self.scale_y != 1):
-            self.q_image = temp_image.scaled(w * self.scale_x, h * self.scale_y)
-        else:
-            self.q_image = temp_image
+        # Create QImage, paint() will scale this to compensate for binning, if any.
+        #
+        # Qt assumes that the rows of the image are padded to 4 bytes unless
+        # it is told otherwise, so we pass the row stride explicitly. This
+        # matters when the (decimated) width is not a multiple of 4.
+        #
+        self.q_image = QtGui.QImage(temp.data,
+                                    temp.shape[1],
+                                    temp.shape[0],
+                                    temp.strides[0],
+                                    QtGui.QImage.Format_Indexed8)
+        self.q_image.frame_h = h
+        self.q_image.frame_w = w
         self.q_image.ndarray = temp
 
         # Set the images color table.
         self.setColorTable()
 
-        # Record the intensity where the user last clicked on the image.
-        # self.click_x and self.click_y are in frame coordinates.
-        xl = self.click_x
-        yl = self.click_y
-        if ((xl >= 0) and (xl < w) and (yl >= 0) and (yl < h)):
-            self.intensity_info = image_data[yl, xl]
-        else:
-            self.intensity_info = 0
-
         # Force re-paint.
         self.update()
 
@@ -38,11 +38,42 @@ import storm_control.hal4000.halLib.halModule as halModule
 import storm_control.hal4000.settings.parametersBox as parametersBox
 
 
+def changesBySection(new_parameters, old_parameters):
+    """
+    Returns a dictionary of the parameters that are different in
+    new_parameters, or that were removed from old_parameters, keyed
+    by the (top-level) section that they are in. Parameters that are
+    not in a section are ignored.
+    """
+    changes = {}
+    pnames = params.difference(new_parameters, old_parameters)
+    for pname in params.difference(old_parameters, new_parameters):
+        if not pname in pnames:
+            pnames.append(pname)
+
+    for pname in pnames:
+        section = pname.split(".", 1)
+        if (len(section) > 1):
+            changes.setdefault(section[0], []).append(section[1])
+        else:
+            if new_parameters.has(pname):
+                prop = new_parameters.get(pname)
+            else:
+                prop = old_parameters.get(pname)
+            if isinstance(prop, params.StormXMLObject):
+                changes[pname] = []
+    return changes
+
+
 class Settings(halModule.HalModule):
     
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.locked_out = False
+
+        # The last parameters that we sent in a 'new parameters' message,
+        # or None if we don't know what state the modules are in.
+        self.sent_parameters = None
         self.wait_for = []
         self.waiting_on = []
 
@@ -113,8 +144,16 @@ class Settings(halModule.HalModule):
         #
         #   3. The 'new parameters' response does not need to be a copy.
         #
+        #   4. "changes" is a dictionary of the parameters that are different
+        #      from the previous 'new parameters' message, keyed by section
+        #      (module) name. If a module's section is not in this dictionary
+        #      then the module can skip re-configuring itself. This is not
+        #      included if we don't know what the previous parameters were,
+        #      for example after an error.
+        #
         halMessage.addMessage("new parameters",
-                              validator = {"data" : {"parameters" : [True, params.StormXMLObject],
+                              validator = {"data" : {"changes" : [False, dict],
+                                                     "parameters" : [True, params.StormXMLObject],
                                                      "is_edit" : [True, bool]},
                                            "resp" : {"new parameters" : [False, params.StormXMLObject],
                                                      "old parameters" : [False, params.StormXMLObject]}})
@@ -183,9 +222,14 @@ class Settings(halModule.HalModule):
         self.setLockout(True)
         
         # is_edit means we are sending a modified version of the current parameters.
+        data = {"parameters" : parameters.copy(),
+                "is_edit" : is_edit}
+        if self.sent_parameters is not None:
+            data["changes"] = changesBySection(parameters, self.sent_parameters)
+        self.sent_parameters = parameters.copy()
+        
         self.sendMessage(halMessage.HalMessage(m_type = "new parameters",
-                                               data = {"parameters" : parameters.copy(),
-                                                       "is_edit" : is_edit}))
+                                               data = data))
 
     def handleResponses(self, message):
 
@@ -213,6 +257,9 @@ class Settings(halModule.HalModule):
                 msg += "Attempting to revert to the last known good parameters."
                 halMessageBox.halMessageBoxInfo(msg)
 
+                # We don't know what state the modules are in now.
+                self.sent_parameters = None
+
                 # Attempt reversion.
 
                 # Replace the 'bad' parameters with their previous 'good' values.
@@ -1,15 +1,22 @@
 #!/usr/bin/env python
 """
-Analyze frames using QRunnables and QThreadPool.
+Analyze frames using QRunnables and QThreadPool (SpotCounter), or
+in batches using a pool of processes (ProcessSpotCounter).
 
 Hazen 05/17
 """
+import concurrent.futures
+import functools
+import multiprocessing
+import sys
 import time
 
 from PyQt5 import QtCore
 
+import storm_control.hal4000.camera.frame as frame
 import storm_control.hal4000.halLib.halModule as halModule
 import storm_control.hal4000.spotCounter.lmmObjectFinder as lmmObjectFinder
+import storm_control.hal4000.spotCounter.npObjectFinder as npObjectFinder
 
 
 class AnalysisWorker(QtCore.QRunnable):
@@ -79,8 +86,102 @@ class FrameAnalysis(QtCore.QObject):
     def getLocalizations(self):
         return [self.x_locs[:self.locs_count],
                 self.y_locs[:self.locs_count]]
+
+    def setLocalizations(self, x_locs, y_locs, locs_count):
+        self.x_locs = x_locs
+        self.y_locs = y_locs
+        self.locs_count = locs_count
         
 
+class ProcessSpotCounter(QtCore.QObject):
+    """
+    Analyzes the frames in batches in a pool of processes using the
+    numpy object finder, which gives the same results as LMMoment.
+
+    This has the same interface as SpotCounter. Frames are only
+    dropped if the processes fall more than max_pending batches
+    behind.
+    """
+    batchDone = QtCore.pyqtSignal(object)
+    imageProcessed = QtCore.pyqtSignal(object)
+
+    def __init__(self, max_batch = 10, max_pending = 4, max_processes = None, max_size = 0, **kwds):
+        super().__init__(**kwds)
+
+        self.dropped = 0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_size = max_size
+        self.n_pending = 0
+        self.total = 0
+
+        #
+        # The processes are started with 'spawn' on all platforms as
+        # the HAL process has a lot of threads and Qt state that
+        # should not be forked. Python 3.6 does not support choosing
+        # the start method, so there we use the default.
+        #
+        if (sys.version_info >= (3, 7)):
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers = max_processes,
+                                                                   mp_context = multiprocessing.get_context("spawn"))
+        else:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers = max_processes)
+
+        # The futures complete in an executor thread, this signal moves
+        # the results to the thread that this object lives in.
+        self.batchDone.connect(self.handleBatchDone)
+
+    def cleanUp(self):
+        self.executor.shutdown(wait = True)
+        print("> spot counter dropped", self.dropped, "images out of", self.total, "total images")
+
+    def handleBatchDone(self, batch):
+        [camera_name, frames, threshold, future] = batch
+        self.n_pending -= 1
+
+        if (future.exception() is not None):
+            print(">> Warning, spot counter analysis failed", str(future.exception()))
+            self.dropped += len(frames)
+            return
+
+        for a_frame, [x_locs, y_locs, locs_count] in zip(frames, future.result()):
+            frame_analysis = FrameAnalysis(camera_name = camera_name,
+                                           frame = a_frame,
+                                           threshold = threshold)
+            frame_analysis.setLocalizations(x_locs, y_locs, locs_count)
+            self.imageProcessed.emit(frame_analysis)
+
+    def handleFutureDone(self, camera_name, frames, threshold, future):
+        self.batchDone.emit([camera_name, frames, threshold, future])
+
+    def newFramesToAnalyze(self, camera_name, frames, threshold):
+        """
+        Send the frames (a list or a frame.FrameBatch) to the pool in
+        batches of at most max_batch frames.
+        """
+        if (len(frames) == 0):
+            return
+
+        if ((frames[0].image_x * frames[0].image_y) > self.max_size):
+            return
+
+        self.total += len(frames)
+
+        for i in range(0, len(frames), self.max_batch):
+            batch = frame.FrameBatch(list(frames[i:i+self.max_batch]))
+            if (self.n_pending >= self.max_pending):
+                self.dropped += len(batch)
+                continue
+
+            self.n_pending += 1
+            future = self.executor.submit(npObjectFinder.findObjectsStack,
+                                          batch.getData(),
+                                          batch.image_x,
+                                          batch.image_y,
+                                          threshold)
+            future.add_done_callback(functools.partial(self.handleFutureDone, camera_name, batch.frames, threshold))
+
+
 class SpotCounter(QtCore.QObject):
     imageProcessed = QtCore.pyqtSignal(object)
 
@@ -125,28 +226,35 @@ class SpotCounter(QtCore.QObject):
     def handleAnalysisDone(self, frame_analysis):
         self.imageProcessed.emit(frame_analysis)
         
-    def newFrameToAnalyze(self, camera_name, frame, threshold):
+    def newFramesToAnalyze(self, camera_name, frames, threshold):
+        """
+        Analyze as many of the frames (a list or a frame.FrameBatch) as
+        we have available threads for, the rest are dropped.
+        """
+        if (len(frames) == 0):
+            return
         
         # Check if the current camera image is small
         # enough that we can analyze it.
-        if ((frame.image_x * frame.image_y) > self.max_size):
+        if ((frames[0].image_x * frames[0].image_y) > self.max_size):
             return
         
-        self.total += 1
+        self.total += len(frames)
 
-        # Check if there is a thread available to analyze the image.
-        was_dropped = True
+        # Give each available thread a frame to analyze, starting with
+        # the most recent frame.
+        n_started = 0
         for worker in self.workers:
+            if (n_started == len(frames)):
+                break
             if not worker.isBusy():
+                n_started += 1
                 worker.setFrameAnalysis(FrameAnalysis(camera_name = camera_name,
-                                                      frame = frame,
+                                                      frame = frames[-n_started],
                                                       threshold = threshold))
                 self.threadpool.start(worker)
-                was_dropped = False
-                break
 
-        if was_dropped:
-            self.dropped += 1
+        self.dropped += len(frames) - n_started
 
 
 #
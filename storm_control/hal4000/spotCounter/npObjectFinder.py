@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+A numpy version of the LMMoment object finder (see LMMoment.c) that
+gives the same results. It can analyze a stack of frames in one call,
+which is how the process pool spot counter uses it.
+
+As in LMMoment.c an object is a local maxima that is at least threshold
+above all the pixels on a ring around it. The position of the object is
+the first moment of the (background subtracted) pixels inside the ring.
+
+Note that the maximum number of objects found per image is limited to
+max_locs, the objects are found in row (y) order.
+
+Hazen 10/26
+"""
+import numpy
+
+import storm_control.hal4000.spotCounter.lmmObjectFinder as lmmObjectFinder
+
+# Peak definition, 1 is the boundary and 2 is the center. This
+# is the same as in LMMoment.c.
+bsize = 5
+peak = numpy.array([[0, 0, 0, 1, 1, 1, 0, 0, 0],
+                    [0, 0, 1, 2, 2, 2, 1, 0, 0],
+                    [0, 1, 2, 2, 2, 2, 2, 1, 0],
+                    [1, 2, 2, 2, 2, 2, 2, 2, 1],
+                    [1, 2, 2, 2, 2, 2, 2, 2, 1],
+                    [1, 2, 2, 2, 2, 2, 2, 2, 1],
+                    [0, 1, 2, 2, 2, 2, 2, 1, 0],
+                    [0, 0, 1, 2, 2, 2, 1, 0, 0],
+                    [0, 0, 0, 1, 1, 1, 0, 0, 0]])
+
+[bdy_dy, bdy_dx] = numpy.nonzero(peak == 1)
+bdy_dx -= bsize - 1
+bdy_dy -= bsize - 1
+
+[cnt_dy, cnt_dx] = numpy.nonzero(peak == 2)
+cnt_dx -= bsize - 1
+cnt_dy -= bsize - 1
+
+# Local maxima test, [dy, dx, strict]. This matches LMMoment.c, where
+# the pixel must be greater than some of it's neighbors and only greater
+# than or equal to the others.
+neighbors = [[-1, -1, True], [-1, 0, True], [-1, 1, True], [0, -1, True],
+             [0, 1, False], [1, -1, True], [1, 0, False], [1, 1, False]]
+
+max_locs = lmmObjectFinder.max_locs
+
+
+def findObjects(frame, threshold):
+    """
+    Find the objects in the image, this has the same signature as
+    lmmObjectFinder.findObjects().
+    """
+    return findObjectsStack(frame.getData(), frame.image_x, frame.image_y, threshold)[0]
+
+def findObjectsStack(np_data, image_x, image_y, threshold):
+    """
+    Find the objects in a stack of images.
+
+    np_data - The image data, anything that can be re-shaped to
+              (frames, image_y, image_x) numpy.uint16.
+    image_x - The image size in x.
+    image_y - The image size in y.
+    threshold - Peak height above the background.
+
+    Returns a list with [x, y, n] for each frame, x and y are numpy.float32
+    arrays of size max_locs and n is the number of objects.
+    """
+    #
+    # LMMoment.c treats the images as signed shorts, so we
+    # do the same so that the results are identical.
+    #
+    images = numpy.ascontiguousarray(np_data, dtype = numpy.uint16).view(numpy.int16)
+    images = images.reshape(-1, image_y, image_x).astype(numpy.int32)
+    n_frames = images.shape[0]
+    b = bsize
+
+    def shifted(dy, dx):
+        return images[:, b+dy:image_y-b+dy, b+dx:image_x-b+dx]
+
+    #
+    # The pixels left and right of the center are on the boundary ring,
+    # so we can quickly remove most of the pixels by checking these
+    # first. This also means that we only need to do the other checks
+    # on a small number of pixels.
+    #
+    center = shifted(0, 0)
+    is_cand = (center >= (shifted(0, 1 - b) + threshold))
+    is_cand &= (center >= (shifted(0, b - 1) + threshold))
+    [fi, yi, xi] = numpy.nonzero(is_cand)
+    yi += b
+    xi += b
+    cur = images[fi, yi, xi]
+
+    # Check that the candidates are local maxima.
+    is_max = numpy.ones(cur.size, dtype = bool)
+    for [dy, dx, strict] in neighbors:
+        other = images[fi, yi + dy, xi + dx]
+        if strict:
+            is_max &= (cur > other)
+        else:
+            is_max &= (cur >= other)
+    [fi, yi, xi, cur] = [fi[is_max], yi[is_max], xi[is_max], cur[is_max]]
+
+    # Check the boundary ring around each local maxima.
+    bdy = images[fi[:,None], yi[:,None] + bdy_dy[None,:], xi[:,None] + bdy_dx[None,:]]
+    is_peak = numpy.all(cur[:,None] >= (bdy + threshold), axis = 1)
+
+    # C style integer division (round towards zero).
+    bdy_sum = numpy.sum(bdy, axis = 1)
+    mean = numpy.sign(bdy_sum) * (numpy.abs(bdy_sum) // len(bdy_dx))
+    is_peak &= (mean > 0)
+
+    [fi, yi, xi, mean] = [fi[is_peak], yi[is_peak], xi[is_peak], mean[is_peak]]
+
+    # Peak positions.
+    cnt = images[fi[:,None], yi[:,None] + cnt_dy[None,:], xi[:,None] + cnt_dx[None,:]] - mean[:,None]
+    c_sum = numpy.sum(cnt, axis = 1)
+    c_sumx = numpy.sum(cnt * cnt_dx[None,:], axis = 1)
+    c_sumy = numpy.sum(cnt * cnt_dy[None,:], axis = 1)
+
+    good = (c_sum > 0)
+    c_sum[~good] = 1
+    px = numpy.where(good,
+                     xi.astype(numpy.float32) + c_sumx.astype(numpy.float32)/c_sum.astype(numpy.float32),
+                     numpy.float32(-1.0))
+    py = numpy.where(good,
+                     yi.astype(numpy.float32) + c_sumy.astype(numpy.float32)/c_sum.astype(numpy.float32),
+                     numpy.float32(-1.0))
+
+    # Split the results by frame.
+    results = []
+    starts = numpy.searchsorted(fi, numpy.arange(n_frames + 1))
+    for i in range(n_frames):
+        n = min(starts[i+1] - starts[i], max_locs)
+        x = numpy.zeros(max_locs, dtype = numpy.float32)
+        y = numpy.zeros(max_locs, dtype = numpy.float32)
+        x[:n] = px[starts[i]:starts[i]+n]
+        y[:n] = py[starts[i]:starts[i]+n]
+        results.append([x, y, int(n)])
+
+    return results
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
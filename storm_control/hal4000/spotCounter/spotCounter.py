@@ -15,6 +15,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 
 import storm_control.sc_library.parameters as params
 
+import storm_control.hal4000.halLib.frameStats as frameStats
 import storm_control.hal4000.halLib.halDialog as halDialog
 import storm_control.hal4000.halLib.halMessage as halMessage
 import storm_control.hal4000.halLib.halModule as halModule
@@ -54,11 +55,11 @@ class Analyzer(QtCore.QObject):
                                                      scale_bar_len = parameters.get("scale_bar_len"),
                                                      shutters_info = shutters_info)
 
-        self.camera_fn.newFrame.connect(self.handleNewFrame)
+        self.camera_fn.newFrames.connect(frameStats.timedSlot("spot counter", self.handleNewFrames))
         self.spot_counter.imageProcessed.connect(self.handleProcessedImage)
 
     def cleanUp(self):
-        self.camera_fn.newFrame.disconnect(self.handleNewFrame)
+        self.camera_fn.newFrames.disconnect(frameStats.timedSlot("spot counter", self.handleNewFrames))
         self.spot_counter.imageProcessed.disconnect(self.handleProcessedImage)
         
     def getCameraName(self):
@@ -73,10 +74,10 @@ class Analyzer(QtCore.QObject):
     def getSpotPicture(self):
         return self.spot_picture
     
-    def handleNewFrame(self, frame):
-        self.spot_counter.newFrameToAnalyze(self.camera_fn.getCameraName(),
-                                            frame,
-                                            self.threshold)
+    def handleNewFrames(self, frame_batch):
+        self.spot_counter.newFramesToAnalyze(self.camera_fn.getCameraName(),
+                                             frame_batch,
+                                             self.threshold)
         
     def handleProcessedImage(self, frame_analysis):
         if (frame_analysis.getCameraName() == self.camera_fn.getCameraName()):
@@ -205,6 +206,14 @@ class SpotCounterView(halDialog.HalDialog):
         
         
 class SpotCounter(halModule.HalModule):
+    message_types = ["changing parameters",
+                     "configuration",
+                     "configure1",
+                     "new parameters",
+                     "show",
+                     "start",
+                     "start film",
+                     "stop film"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
@@ -217,8 +226,19 @@ class SpotCounter(halModule.HalModule):
 
         configuration = module_params.get("configuration")
 
-        self.spot_counter = findSpots.SpotCounter(max_threads = configuration.get("max_threads"),
-                                                  max_size = configuration.get("max_size"))
+        #
+        # The 'processes' backend analyzes every frame (unless it falls
+        # too far behind), the default 'threads' backend drops the frames
+        # that arrive while all of the threads are busy.
+        #
+        if (configuration.get("backend", "threads") == "processes"):
+            self.spot_counter = findSpots.ProcessSpotCounter(max_batch = configuration.get("max_batch", 10),
+                                                             max_pending = configuration.get("max_pending", 4),
+                                                             max_processes = configuration.get("max_processes", 2),
+                                                             max_size = configuration.get("max_size"))
+        else:
+            self.spot_counter = findSpots.SpotCounter(max_threads = configuration.get("max_threads"),
+                                                      max_size = configuration.get("max_size"))
 
         self.view = SpotCounterView(module_name = self.module_name,
                                     configuration = configuration)
@@ -6,6 +6,7 @@ Hazen 05/17
 """
 
 import os
+from collections import deque
 from PyQt5 import QtCore
 
 import storm_control.sc_library.halExceptions as halExceptions
@@ -96,13 +97,107 @@ class TCPAction(QtCore.QObject):
         """
         return False
         
-    def sendResponse(self, server):
+    def sendResponse(self, controller):
         if not self.was_handled:
             print(">> Warning no response to '" + self.tcp_message.getType() + "'")
             self.tcp_message.setError(True, "This message was not handled.")
-        server.sendMessage(self.tcp_message)
+        controller.sendMessage(self.tcp_message)
 
 
+class TCPBatch(object):
+    """
+    The commands in a 'Batch' TCP message. The response to the batch
+    message is sent when all of the commands have been handled, the
+    commands themselves are in the "responses" field of the response.
+
+    Commands can list the (earlier) commands that they depend on in
+    their "depends_on" field, if one of these fails the command is
+    skipped.
+
+    A batch whose commands are not a list of messages, with invalid
+    dependencies or that contains another batch is rejected as a whole,
+    see getError().
+    """
+    def __init__(self, tcp_message = None, **kwds):
+        super().__init__(**kwds)
+        self.commands = []
+        self.depends_on = []
+        self.done = []
+        self.error = None
+        self.tcp_message = tcp_message
+
+        commands = tcp_message.getData("commands", default = [])
+        if not isinstance(commands, list):
+            self.error = "Batch 'commands' is not a list."
+            return
+
+        for index, command in enumerate(commands):
+            if not isinstance(command, dict):
+                self.error = "Command " + str(index) + " is not a message."
+                break
+
+            command = dict(command)
+            depends_on = command.pop("depends_on", [])
+            sub_message = tcpMessage.TCPMessage.fromDict(command)
+            if tcp_message.isTest():
+                sub_message.setTestMode(True)
+
+            if sub_message.isType("Batch"):
+                self.error = "Command " + str(index) + " is a 'Batch', batches cannot be nested."
+            elif not isinstance(depends_on, list):
+                self.error = "Command " + str(index) + " 'depends_on' is not a list."
+            else:
+                # Commands can only depend on earlier commands.
+                for elt in depends_on:
+                    if isinstance(elt, bool) or not isinstance(elt, int) or (elt < 0) or (elt >= index):
+                        self.error = "Command " + str(index) + " has an invalid dependency " + str(elt) + "."
+                        break
+
+            if self.error is not None:
+                break
+
+            self.depends_on.append(depends_on)
+            self.commands.append(sub_message)
+            self.done.append(False)
+
+    def commandDone(self, index):
+        """
+        Returns True if all the commands are done.
+        """
+        self.done[index] = True
+        return all(self.done)
+
+    def failedDependency(self, index):
+        """
+        Returns the index of the first command that command index 
+        depends on that failed, or None.
+        """
+        for elt in self.depends_on[index]:
+            if self.done[elt] and self.commands[elt].hasError():
+                return elt
+        return None
+    
+    def getCommands(self):
+        return self.commands
+
+    def getError(self):
+        """
+        Returns why the batch was rejected, or None if it is valid.
+        """
+        return self.error
+
+    def getResponse(self):
+        """
+        Returns the batch TCP message with the responses to all the commands.
+        """
+        for i, command in enumerate(self.commands):
+            if command.hasError():
+                self.tcp_message.setError(True, "Command " + str(i) + " ('" + command.getType() + "') failed, " + str(command.getErrorMessage()))
+                break
+        self.tcp_message.addResponse("responses", [x.toDict() for x in self.commands])
+        return self.tcp_message
+
+    
 class TCPActionGetMovieStats(TCPAction):
     """
     This is used to calculate the stats of a movie request that 
@@ -358,6 +453,7 @@ class Controller(QtCore.QObject):
     2. 'Find Sum'
     3. 'Set Parameters'
     4. 'Take Movie'
+    5. 'Tune Focus Lock'
 
     The recommended order of TCP messages for maximum throughput in a standard 
     imaging cycle is:
@@ -367,8 +463,15 @@ class Controller(QtCore.QObject):
     4. 'Take Movie'
     In this sequence 1 and 2 can happen in parallel.
 
-    Note also the expectation that the TCP client does not send another message
-    until it gets a response to the first message.
+    The TCP client can send more messages without waiting for the response
+    to the previous message. Messages are handled in the order in which
+    they are received, a message that arrives while an action is in progress
+    is not handled until the action completes. The responses can be matched
+    to the requests with the message ID.
+
+    The 'Batch' message contains a list of messages that are handled as if
+    they were sent one after the other (see TCPBatch). This saves a round
+    trip for each message.
     """
     controlAction = QtCore.pyqtSignal(object)
     controlMessage = QtCore.pyqtSignal(object)
@@ -376,7 +479,10 @@ class Controller(QtCore.QObject):
     
     def __init__(self, parallel_mode = None, server = None, verbose = True, **kwds):
         super().__init__(**kwds)
+        self.action_running = False
+        self.batch_commands = {}
         self.parallel_mode = None
+        self.pending = deque()
         self.server = server
         self.test_directory = None
         self.test_parameters = None
@@ -393,36 +499,60 @@ class Controller(QtCore.QObject):
         data = tcp_action.getData()
         if "parameters" in data:
             self.test_parameters = data["parameters"]
-        tcp_action.sendResponse(self.server)
+        tcp_action.sendResponse(self)
+
+        self.action_running = False
+        self.nextMessage()
 
     def cleanUp(self):
         self.server.close()
         
     def handleLostConnection(self):
+        self.action_running = False
+        self.batch_commands = {}
+        self.pending.clear()
         self.gotConnection.emit(False)
 
-    def handleMessageReceived(self, tcp_message):
+    def handleMessage(self, tcp_message):
         """
         TCP message handling.
         """
-        if self.verbose:
-            print(">TCP message received:")
-            print(tcp_message)
-            print("")
+        if tcp_message.isType("Batch"):
+            batch = TCPBatch(tcp_message = tcp_message)
+            if batch.getError() is not None:
+                tcp_message.setError(True, batch.getError())
+                self.sendMessage(tcp_message)
+                return
 
-        if tcp_message.isType('Check Focus Lock'):
+            if (len(batch.getCommands()) == 0):
+                tcp_message.setError(True, "Batch message has no commands.")
+                self.sendMessage(tcp_message)
+                return
+
+            # The commands go to the front of the queue, in order.
+            for i, command in reversed(list(enumerate(batch.getCommands()))):
+                self.batch_commands[id(command)] = [batch, i]
+                self.pending.appendleft(command)
+
+        elif tcp_message.isType('Check Focus Lock'):
             # This is supposed to ensure that everything else, like stage moves is complete.
             self.controlMessage.emit(halMessage.SyncMessage())
             
             action = TCPAction(tcp_message = tcp_message)
-            self.controlAction.emit(action)
+            self.startAction(action)
 
         elif tcp_message.isType('Find Sum'):
             # This is supposed to ensure that everything else, like stage moves is complete.
             self.controlMessage.emit(halMessage.SyncMessage())
             
             action = TCPAction(tcp_message = tcp_message)
-            self.controlAction.emit(action)            
+            self.startAction(action)
+
+        elif tcp_message.isType('Tune Focus Lock'):
+            self.controlMessage.emit(halMessage.SyncMessage())
+
+            action = TCPAction(tcp_message = tcp_message)
+            self.startAction(action)
                 
         elif tcp_message.isType("Set Directory"):
             print(">> Warning the 'Set Directory' message is deprecated.")
@@ -440,23 +570,23 @@ class Controller(QtCore.QObject):
                     #
                     self.controlMessage.emit(halMessage.HalMessage(m_type = "change directory",
                                                                    data = {"directory" : directory},
-                                                                   finalizer = lambda : self.server.sendMessage(tcp_message)))
+                                                                   finalizer = lambda : self.sendMessage(tcp_message)))
                     return
-            self.server.sendMessage(tcp_message)
+            self.sendMessage(tcp_message)
 
         elif tcp_message.isType("Set Parameters"):
             if tcp_message.isTest():
                 action = TCPActionGetParameters(tcp_message = tcp_message)
             else:
                 action = TCPActionSetParameters(tcp_message = tcp_message)
-            self.controlAction.emit(action)
+            self.startAction(action)
                     
         elif tcp_message.isType("Take Movie"):
 
             # Check that movie length is valid.
             if (tcp_message.getData("length") is None) or (tcp_message.getData("length") < 1):
-                tcp_message.setError(True, str(message.getData("length")) + " is an invalid movie length.")
-                self.server.sendMessage(tcp_message)
+                tcp_message.setError(True, str(tcp_message.getData("length")) + " is an invalid movie length.")
+                self.sendMessage(tcp_message)
                 return
 
             # Some messy logic here to check if we will over-write a existing films? For now, just
@@ -469,7 +599,7 @@ class Controller(QtCore.QObject):
                 filename = os.path.join(directory, tcp_message.getData("name")) + ".xml"
                 if os.path.exists(filename):
                     tcp_message.setError(True, "The movie file '" + filename + "' already exists.")
-                    self.server.sendMessage(tcp_message)
+                    self.sendMessage(tcp_message)
                     return
 
             # More messy logic here to return film size, time, etc..
@@ -478,34 +608,81 @@ class Controller(QtCore.QObject):
                 # If the movie has parameters specified, we'll request them specially.
                 if tcp_message.getData("parameters") is not None:
                     action = TCPActionGetMovieStats(tcp_message = tcp_message)
-                    self.controlAction.emit(action)
+                    self.startAction(action)
 
                 # Otherwise calculate based on the current parameters.
                 else:
                     calculateMovieStats(tcp_message, self.test_parameters)
-                    self.server.sendMessage(tcp_message)                    
+                    self.sendMessage(tcp_message)                    
             else:
                 action = TCPActionTakeMovie(tcp_message = tcp_message)
-                self.controlAction.emit(action)
+                self.startAction(action)
 
         else:
             if tcp_message.isTest() or (not self.parallel_mode):
                 action = TCPAction(tcp_message = tcp_message)
-                self.controlAction.emit(action)
+                self.startAction(action)
             else:
                 msg = halMessage.HalMessage(m_type = "tcp message",
                                             data = {"tcp message" : tcp_message})
                 self.controlMessage.emit(msg)
-                self.server.sendMessage(tcp_message)
+                self.sendMessage(tcp_message)
                 
+    def handleMessageReceived(self, tcp_message):
+        if self.verbose:
+            print(">TCP message received:")
+            print(tcp_message)
+            print("")
+
+        self.pending.append(tcp_message)
+        self.nextMessage()
+        
     def handleNewConnection(self):
         self.gotConnection.emit(True)
 
+    def nextMessage(self):
+        """
+        Handle queued messages until we get to one that is handled 
+        with an action, or the queue is empty.
+        """
+        while (len(self.pending) > 0) and not self.action_running:
+            tcp_message = self.pending.popleft()
+
+            # Check batch command dependencies.
+            if id(tcp_message) in self.batch_commands:
+                [batch, index] = self.batch_commands[id(tcp_message)]
+                failed = batch.failedDependency(index)
+                if failed is not None:
+                    tcp_message.setError(True, "Skipped because command " + str(failed) + " failed.")
+                    self.sendMessage(tcp_message)
+                    continue
+
+            self.handleMessage(tcp_message)
+
+    def sendMessage(self, tcp_message):
+        """
+        Send the response to a TCP message, responses to the commands in a
+        batch are sent (together) when all the commands have been handled.
+        """
+        if id(tcp_message) in self.batch_commands:
+            [batch, index] = self.batch_commands.pop(id(tcp_message))
+            if batch.commandDone(index):
+                self.server.sendMessage(batch.getResponse())
+        else:
+            self.server.sendMessage(tcp_message)
+        
     def setDirectory(self, directory):
         self.test_directory = directory
 
     def setParameters(self, parameters):
         self.test_parameters = parameters
+
+    def startAction(self, tcp_action):
+        """
+        Other messages are not handled until tcp_action completes.
+        """
+        self.action_running = True
+        self.controlAction.emit(tcp_action)
         
         
 class TCPControl(halModule.HalModule):
@@ -522,6 +699,7 @@ class TCPControl(halModule.HalModule):
                                      parent = self)
         self.control = Controller(parallel_mode = configuration.get("parallel_mode"),
                                   server = server,
+                                  verbose = configuration.get("verbose", True),
                                   parent = self)
         self.control.controlAction.connect(self.handleControlAction)
         self.control.controlMessage.connect(self.handleControlMessage)
@@ -540,9 +718,14 @@ class TCPControl(halModule.HalModule):
         self.control.cleanUp()
 
     def finalizeControlAction(self):
-        self.control.actionDone(self.control_action)
+        #
+        # Clear the current action first as the controller will start
+        # the next (pending) action, if any, in actionDone().
+        #
+        control_action = self.control_action
         self.control_action.actionMessage.disconnect(self.sendMessage)
         self.control_action = None
+        self.control.actionDone(control_action)
         
     def handleControlAction(self, action):
         #
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+"""
+Benchmarks HAL using the emulated camera(s) in benchmark mode (see
+camera.noneCameraControl). This runs HAL without the GUI, records a
+movie and reports the sustained frame rate, the film writer throughput
+and the latency of each of the consumers of the camera frames.
+
+Usage:
+
+python benchmark.py --config none_config.xml --directory /tmp/ --frames 2000
+
+Hazen 10/26
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+from PyQt5 import QtWidgets
+
+import storm_control.sc_library.hdebug as hdebug
+import storm_control.sc_library.parameters as params
+
+import storm_control.hal4000.testing.testActions as testActions
+import storm_control.hal4000.testing.testing as testing
+
+
+class FrameStatistics(testActions.TestAction):
+    """
+    Get (and optionally enable and / or reset) the frame statistics.
+    """
+    def __init__(self, enable = None, reset = False, **kwds):
+        super().__init__(**kwds)
+        self.enable = enable
+        self.m_type = "get frame statistics"
+        self.reset = reset
+        self.statistics = None
+
+    def getMessageData(self):
+        data = {"reset" : self.reset}
+        if self.enable is not None:
+            data["enable"] = self.enable
+        return data
+
+    def handleResponses(self, message):
+        self.statistics = message.getResponses()[0].getData()["statistics"]
+        self.actionDone.emit()
+
+
+class TimedRecord(testActions.Record):
+    """
+    Record a movie and measure how long this took.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.start_time = None
+        self.stop_time = None
+
+    def handleMessage(self, message):
+        if message.getData()["locked out"]:
+            self.start_time = time.perf_counter()
+        else:
+            self.stop_time = time.perf_counter()
+        super().handleMessage(message)
+
+    def getFilmTime(self):
+        return self.stop_time - self.start_time
+
+
+class BenchmarkReport(testActions.TestAction):
+    """
+    Create (and print) the benchmark report.
+    """
+    def __init__(self, directory = None, filename = None, frames = None, record = None, report = None, statistics = None, **kwds):
+        super().__init__(**kwds)
+        self.directory = directory
+        self.filename = filename
+        self.frames = frames
+        self.record = record
+        self.report = report
+        self.statistics = statistics
+
+    def makeReport(self):
+        film_time = self.record.getFilmTime()
+
+        film_bytes = 0
+        for name in glob.glob(os.path.join(self.directory, self.filename + "*")):
+            if not name.endswith(".xml"):
+                film_bytes += os.path.getsize(name)
+
+        return {"film_frames" : self.frames,
+                "film_fps" : self.frames/film_time,
+                "film_time" : film_time,
+                "writer_mb_per_second" : film_bytes/(film_time * 1024.0 * 1024.0),
+                "statistics" : self.statistics.statistics}
+
+    def start(self):
+        report = self.makeReport()
+        printReport(report)
+        if self.report is not None:
+            with open(self.report, "w") as fp:
+                json.dump(report, fp, indent = 1)
+        self.startActionTimer(0)
+
+
+class Benchmark(testing.Testing):
+    """
+    The HAL testing module that runs the benchmark.
+    """
+    def __init__(self, module_params = None, **kwds):
+        kwds["module_params"] = module_params
+        super().__init__(**kwds)
+
+        configuration = module_params.get("configuration")
+        directory = configuration.get("directory")
+        filename = configuration.get("filename", "benchmark")
+        frames = configuration.get("frames", 1000)
+
+        report = None
+        if configuration.has("report"):
+            report = configuration.get("report")
+
+        record = TimedRecord(filename = filename, length = frames)
+        statistics = FrameStatistics()
+        self.test_actions = [testActions.SetDirectory(directory = directory),
+                             FrameStatistics(enable = True, reset = True),
+                             record,
+                             statistics,
+                             BenchmarkReport(directory = directory,
+                                             filename = filename,
+                                             frames = frames,
+                                             record = record,
+                                             report = report,
+                                             statistics = statistics)]
+
+
+def printReport(report):
+    print("")
+    print("Benchmark:")
+    print("  film: {0:d} frames in {1:.2f} seconds, {2:.1f} fps, {3:.1f} MB/s".format(report["film_frames"],
+                                                                                    report["film_time"],
+                                                                                    report["film_fps"],
+                                                                                    report["writer_mb_per_second"]))
+    for source_name, source in sorted(report["statistics"]["sources"].items()):
+        print("  " + source_name + ": {0:.1f} fps, {1:d} dropped, max queue depth {2:d}".format(source["fps"],
+                                                                                               source["dropped_frames"],
+                                                                                               source["queue_depth_max"]))
+        for stage_name, stage in sorted(source["stages"].items()):
+            print("    {0:20s} {1:6d} frames, latency {2:.2f}/{3:.2f} ms, service {4:.2f}/{5:.2f} ms, {6:d} slow".format(stage_name,
+                                                                                                                         stage["frames"],
+                                                                                                                         stage["latency_mean"],
+                                                                                                                         stage["latency_max"],
+                                                                                                                         stage["service_mean"],
+                                                                                                                         stage["service_max"],
+                                                                                                                         stage["slow_frames"]))
+    print("")
+
+def runBenchmark(config_xml = None, directory = None, emitters = None, fps = None, frames = 1000, log_directory = None, pool = None, report = None):
+    """
+    Run the benchmark. The camera(s) in config_xml should be emulated
+    (NoneCameraControl) cameras, they will be put in benchmark mode.
+
+    config_xml - The HAL configuration file.
+    directory - Where to save the movie.
+    emitters - (Optional) The number of emitters.
+    fps - (Optional) The camera frame rate, 0.0 is as fast as possible.
+    frames - The length of the movie in frames.
+    log_directory - (Optional) Where to save the HAL log file.
+    pool - (Optional) The number of pre-generated frames.
+    report - (Optional) Save the report in this (JSON) file.
+    """
+    app = QtWidgets.QApplication(sys.argv)
+
+    config = params.config(config_xml)
+
+    # Put the camera(s) in benchmark mode.
+    for module_name in config.get("modules").getAttrs():
+        module_params = config.get("modules." + module_name)
+        if module_params.has("camera.parameters"):
+            if (module_params.get("camera.class_name") != "NoneCameraControl"):
+                continue
+            cam_params = module_params.get("camera.parameters")
+            for [pname, pvalue] in [["benchmark", True],
+                                    ["benchmark_emitters", emitters],
+                                    ["benchmark_fps", fps],
+                                    ["benchmark_pool", pool]]:
+                if pvalue is not None:
+                    if cam_params.has(pname):
+                        cam_params.setv(pname, pvalue)
+                    else:
+                        cam_params.add(pname, pvalue)
+
+    # Add the benchmarking module.
+    c_test = config.addSubSection("modules.testing")
+    c_test.add("class_name", "Benchmark")
+    c_test.add("module_name", "storm_control.hal4000.testing.benchmark")
+    c_test.add("configuration.directory", directory)
+    c_test.add("configuration.frames", frames)
+    if report is not None:
+        c_test.add("configuration.report", report)
+
+    if log_directory is not None:
+        hdebug.startLogging(log_directory, "hal4000")
+
+    # Imported here as hal4000 needs the QApplication.
+    import storm_control.hal4000.hal4000 as hal4000
+    hal = hal4000.HalCore(config = config,
+                          testing_mode = True,
+                          show_gui = False)
+    app.exec_()
+    if hal.running:
+        print(">> Warning, HAL did not shut down cleanly.")
+    app = None
+
+
+if (__name__ == "__main__"):
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'HAL benchmark.')
+
+    parser.add_argument('--config', dest='config', type=str, required=True,
+                        help = "The name of the configuration file.")
+    parser.add_argument('--directory', dest='directory', type=str, required=True,
+                        help = "The directory to save the movie in.")
+    parser.add_argument('--emitters', dest='emitters', type=int, required=False,
+                        help = "The number of emitters.")
+    parser.add_argument('--fps', dest='fps', type=float, required=False,
+                        help = "The camera frame rate, 0 is as fast as possible.")
+    parser.add_argument('--frames', dest='frames', type=int, required=False, default=1000,
+                        help = "The length of the movie in frames.")
+    parser.add_argument('--pool', dest='pool', type=int, required=False,
+                        help = "The number of pre-generated frames.")
+    parser.add_argument('--report', dest='report', type=str, required=False,
+                        help = "Save the report in this JSON file.")
+
+    args = parser.parse_args()
+
+    runBenchmark(config_xml = args.config,
+                 directory = args.directory,
+                 emitters = args.emitters,
+                 fps = args.fps,
+                 frames = args.frames,
+                 pool = args.pool,
+                 report = args.report)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
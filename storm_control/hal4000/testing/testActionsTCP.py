@@ -25,6 +25,12 @@ class TestActionTCP(testActions.TestAction):
         message is as expected.
         """
         pass
+
+    def getTCPMessages(self):
+        """
+        The TCP messages to send to HAL.
+        """
+        return [self.tcp_message]
         
     def handleMessageReceived(self, tcp_message):
         """
@@ -35,6 +41,17 @@ class TestActionTCP(testActions.TestAction):
         self.actionDone.emit()
 
 
+class Batch(TestActionTCP):
+    """
+    Send HAL several messages in a single 'Batch' message.
+    """
+    def __init__(self, tcp_messages = None, depends_on = None, **kwds):
+        super().__init__(**kwds)
+        self.tcp_message = tcpMessage.batchMessage(tcp_messages,
+                                                   depends_on = depends_on,
+                                                   test_mode = self.test_mode)
+
+        
 class CheckFocusLock(TestActionTCP):
     """
     Check the focus lock and do a scan if it has lost lock.
@@ -67,6 +84,36 @@ class FindSum(TestActionTCP):
                                                  test_mode = self.test_mode)
 
         
+class GetFrameStatistics(TestActionTCP):
+    """
+    Query HAL for the camera / feed frame statistics.
+    """
+    def __init__(self, enable = None, reset = False, **kwds):
+        super().__init__(**kwds)
+        message_data = {"reset" : reset}
+        if enable is not None:
+            message_data["enable"] = enable
+        self.tcp_message = tcpMessage.TCPMessage(message_type = "Get Frame Statistics",
+                                                 message_data = message_data,
+                                                 test_mode = self.test_mode)
+
+        
+class GetMessageEvents(TestActionTCP):
+    """
+    Query HAL for the most recent message events.
+    """
+    def __init__(self, n_events = None, verbosity = None, **kwds):
+        super().__init__(**kwds)
+        message_data = {}
+        if n_events is not None:
+            message_data["n_events"] = n_events
+        if verbosity is not None:
+            message_data["verbosity"] = verbosity
+        self.tcp_message = tcpMessage.TCPMessage(message_type = "Get Message Events",
+                                                 message_data = message_data,
+                                                 test_mode = self.test_mode)
+
+
 class GetMosaicSettings(TestActionTCP):
     """
     Query HAL for the current mosaic settings.
@@ -119,6 +166,32 @@ class NoSuchMessage(TestActionTCP):
                                                  test_mode = self.test_mode)
 
         
+class Pipeline(TestActionTCP):
+    """
+    Send HAL several messages without waiting for the responses.
+    """
+    def __init__(self, tcp_messages = None, **kwds):
+        super().__init__(**kwds)
+        self.responses = []
+        self.tcp_messages = tcp_messages
+
+    def checkResponses(self, responses):
+        """
+        Sub-class this to check that the TCP response 
+        messages are as expected.
+        """
+        pass
+
+    def getTCPMessages(self):
+        return self.tcp_messages
+
+    def handleMessageReceived(self, tcp_message):
+        self.responses.append(tcp_message)
+        if (len(self.responses) == len(self.tcp_messages)):
+            self.checkResponses(self.responses)
+            self.actionDone.emit()
+
+        
 class SetFocusLockMode(TestActionTCP):
     """
     Technically this is only supposed to be used for testing.
@@ -194,3 +267,15 @@ class TakeMovie(TestActionTCP):
         self.tcp_message = tcpMessage.TCPMessage(message_type = "Take Movie",
                                                  message_data = data_dict,
                                                  test_mode = self.test_mode)
+
+
+class TuneFocusLock(TestActionTCP):
+    """
+    Measure the focus lock response and set the lock controller gains.
+    """
+    def __init__(self, hold = None, step_size = None, **kwds):
+        super().__init__(**kwds)
+        self.tcp_message = tcpMessage.TCPMessage(message_type = "Tune Focus Lock",
+                                                 message_data = {"hold" : hold,
+                                                                 "step_size" : step_size},
+                                                 test_mode = self.test_mode)
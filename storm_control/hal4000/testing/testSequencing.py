@@ -61,3 +61,23 @@ class TestSimpleSequencing(halModule.HalModule):
         assert not ("tss1" in self.processed_messages)
         self.processed_messages.remove("tss2")
         
+
+
+class TestConcurrentSequencing(TestSimpleSequencing):
+    """
+    Like TestSimpleSequencing, but 'tss1' and 'tss2' are declared as
+    safe to process concurrently, so 'tss3' should be processed while
+    the workers are still running. The workers should still run in
+    order.
+    """
+    concurrent_message_types = ["tss1", "tss2"]
+
+    def processMessage(self, message):
+        if message.isType("tss3"):
+            assert ("tss1" in self.processed_messages)
+            assert ("tss2" in self.processed_messages)
+            print(">> Okay", self.processed_messages)
+            self.newMessage.emit(halMessage.HalMessage(source = self,
+                                                       m_type = "tests done"))
+        else:
+            super().processMessage(message)
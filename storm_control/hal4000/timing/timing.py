@@ -10,6 +10,7 @@ from PyQt5 import QtCore
 import storm_control.sc_library.parameters as params
 
 import storm_control.hal4000.film.filmSettings as filmSettings
+import storm_control.hal4000.halLib.frameStats as frameStats
 import storm_control.hal4000.halLib.halFunctionality as halFunctionality
 import storm_control.hal4000.halLib.halMessage as halMessage
 import storm_control.hal4000.halLib.halModule as halModule
@@ -36,11 +37,11 @@ class TimingFunctionality(halFunctionality.HalFunctionality):
         assert (camera_functionality.getCameraName() == self.time_base)
         
         self.cam_fn = camera_functionality
-        self.cam_fn.newFrame.connect(self.handleNewFrame)
+        self.cam_fn.newFrame.connect(frameStats.timedSlot("timing", self.handleNewFrame))
         self.cam_fn.stopped.connect(self.handleStopped)
 
     def disconnectCameraFunctionality(self):
-        self.cam_fn.newFrame.disconnect(self.handleNewFrame)
+        self.cam_fn.newFrame.disconnect(frameStats.timedSlot("timing", self.handleNewFrame))
         self.cam_fn.stopped.disconnect(self.handleStopped)
 
     def getCameraFunctionality(self):
@@ -70,6 +71,12 @@ class Timing(halModule.HalModule):
     frame of a film are expected to time themselves using the timing
     functionality provided by this module.
     """
+    message_types = ["configuration",
+                     "configure1",
+                     "new parameters",
+                     "start film",
+                     "stop film"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.timing_functionality = None
@@ -119,6 +119,11 @@ class TigerZStageFunctionality(stageZModule.ZStageFunctionalityBuffered):
 # have to duplicate most of the stage stuff, particularly the TCP control.
 #
 class TigerController(stageModule.StageModule):
+    message_types = ["configuration",
+                     "get functionality",
+                     "start film",
+                     "stop film",
+                     "tcp message"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
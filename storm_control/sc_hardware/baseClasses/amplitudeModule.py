@@ -98,6 +98,10 @@ class AmplitudeModule(hardwareModule.HardwareModule):
     name 'module_name.amplitude_modulation'. This functionality is
     primarily used by illumination.illumination.
     """
+    message_types = ["get functionality",
+                     "start film",
+                     "stop film"]
+
     def __init__(self, **kwds):
         super().__init__(**kwds)
         self.device_mutex = QtCore.QMutex()
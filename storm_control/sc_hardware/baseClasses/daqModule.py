@@ -87,7 +87,13 @@ class DaqFunctionality(hardwareModule.HardwareFunctionality):
 
 
 class DaqModule(hardwareModule.HardwareModule):
-    
+    message_types = ["configuration",
+                     "configure1",
+                     "daq waveforms",
+                     "get functionality",
+                     "start film",
+                     "stop film"]
+
     def __init__(self, **kwds):
         super().__init__(**kwds)
         self.run_shutters = False
@@ -61,6 +61,8 @@ class FilterWheelModule(hardwareModule.HardwareModule):
     to one that is controlled in combination with another device
     such as a XY stage.
     """
+    message_types = ["get functionality"]
+
     def __init__(self, **kwds):
         super().__init__(**kwds)
 
@@ -190,8 +190,10 @@ class BufferedFunctionality(HardwareFunctionality):
         # experience strange/sporadic errors like the GUI freezing.
         worker.setAutoDelete(False)
         self.workers.append(worker)
-        
-        getThreadPool().start(worker)
+
+        # Requests to the same device are queued in the executor so that
+        # they don't tie up threads while they wait for the device mutex.
+        halModule.executor.start(worker, key = self.device_mutex)
         
     def wait(self):
         """
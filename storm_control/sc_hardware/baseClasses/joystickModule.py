@@ -251,6 +251,11 @@ class JoystickControl(QtCore.QObject):
 
 
 class JoystickModule(halModule.HalModule):
+    message_types = ["configuration",
+                     "configure1",
+                     "film lockout",
+                     "new parameters",
+                     "stop film"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
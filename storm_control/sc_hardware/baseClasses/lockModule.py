@@ -53,6 +53,22 @@ class QPDFunctionalityMixin(LockFunctionalityMixin):
     
     def getType(self):
         return "qpd"
+
+    def haveDirectRead(self):
+        """
+        Return True/False if the QPD supports readOffset(). This is
+        required by the focus lock engine (focusLock.lockEngine).
+        """
+        return False
+
+    def readOffset(self):
+        """
+        Perform a reading and return it (the same dictionary as the
+        qpdUpdate signal). Unlike getOffset() this blocks until the
+        reading is done, and it is called from the focus lock engine
+        thread.
+        """
+        pass
     
 
 class QPDCameraFunctionalityMixin(QPDFunctionalityMixin):
@@ -198,6 +198,12 @@ class StageModule(hardwareModule.HardwareModule):
     Some stage controllers can also control additional peripherals.
     Functionalities for these will have names like 'module_name.peripheral'.
     """
+    message_types = ["configuration",
+                     "get functionality",
+                     "start film",
+                     "stop film",
+                     "tcp message"]
+
     def __init__(self, **kwds):
         super().__init__(**kwds)
         self.stage = None
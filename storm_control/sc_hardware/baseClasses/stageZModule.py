@@ -78,6 +78,8 @@ class ZStage(hardwareModule.HardwareModule):
     """
     This is a Z stage under software control.
     """
+    message_types = ["get functionality"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.configuration = module_params.get("configuration")
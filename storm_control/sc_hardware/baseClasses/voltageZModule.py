@@ -90,6 +90,9 @@ class VoltageZ(hardwareModule.HardwareModule):
     """
     This is a Z-piezo stage in analog control mode.
     """
+    message_types = ["configure1",
+                     "get functionality"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.configuration = module_params.get("configuration")
@@ -38,6 +38,9 @@ class CoherentModule(amplitudeModule.AmplitudeModule):
     """
     The functionality name is just the module name.
     """    
+    concurrent_message_types = ["start film",
+                                "stop film"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.film_mode = False
@@ -11,6 +11,7 @@ import storm_control.sc_hardware.baseClasses.hardwareModule as hardwareModule
 
 
 class PulseDelay(hardwareModule.HardwareModule):
+    message_types = ["configure1"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
@@ -33,6 +34,9 @@ class PulseDelayCamera(PulseDelay):
     Pulse delay where the task is armed when we see 
     the 'start camera' message for the specified camera.
     """
+    message_types = ["configure1",
+                     "start camera"]
+
     def __init__(self, module_params = None, **kwds):
         kwds["module_params"] = module_params
         super().__init__(**kwds)
@@ -229,12 +229,15 @@ class HCamData(object):
 
     Using numpy makes a lot more sense anyways..
     """
-    def __init__(self, size = None, **kwds):
+    def __init__(self, size = None, np_array = None, **kwds):
         """
-        Create a data object of the appropriate size.
+        Create a data object of the appropriate size. If np_array is
+        specified it will be used as the storage for the data.
         """
         super().__init__(**kwds)
-        self.np_array = numpy.ascontiguousarray(numpy.empty(int(size/2), dtype=numpy.uint16))
+        if np_array is None:
+            np_array = numpy.empty(int(size/2), dtype=numpy.uint16)
+        self.np_array = numpy.ascontiguousarray(np_array)
         self.size = size
 
     def __getitem__(self, slice):
@@ -273,6 +276,7 @@ class HamamatsuCamera(object):
         self.debug = False
         self.encoding = 'utf-8'
         self.frame_bytes = 0
+        self.frame_pool = None
         self.frame_x = 0
         self.frame_y = 0
         self.last_frame_number = 0
@@ -409,8 +413,13 @@ class HamamatsuCamera(object):
                                                 ctypes.byref(paramlock)),
                              "dcambuf_lockframe")
 
-            # Create storage for the frame & copy into this storage.
-            hc_data = HCamData(self.frame_bytes)
+            # Create storage for the frame & copy into this storage. Use
+            # the frame pool (if we have one) for the storage.
+            if self.frame_pool is not None:
+                hc_data = HCamData(self.frame_bytes,
+                                   np_array = self.frame_pool.getBuffer(int(self.frame_bytes/2)))
+            else:
+                hc_data = HCamData(self.frame_bytes)
             hc_data.copyData(paramlock.buf)
 
             frames.append(hc_data)
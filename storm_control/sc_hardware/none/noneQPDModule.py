@@ -35,12 +35,20 @@ class NoneQPDFunctionality(hardwareModule.BufferedFunctionality, lockModule.QPDF
         self.mustRun(task = self.scan,
                      ret_signal = self.qpdUpdate)
 
-    def scan(self):
-        if self.first_scan:
-            self.first_scan = False
-        else:
-            time.sleep(0.1)
-
+    def haveDirectRead(self):
+        return True
+
+    def readOffset(self):
+        """
+        The focus lock engine sets the rate, so there is no
+        pause here.
+        """
+        self.device_mutex.lock()
+        qpd_dict = self.reading()
+        self.device_mutex.unlock()
+        return qpd_dict
+
+    def reading(self):
         #
         # Determine current z offset. This is the offset of the z stage from
         # it's center position adjusted by xy stage tilt (if any).
@@ -77,6 +85,13 @@ class NoneQPDFunctionality(hardwareModule.BufferedFunctionality, lockModule.QPDF
                 "x" : 100.0 * z_offset,
                 "y" : 0.0}
 
+    def scan(self):
+        if self.first_scan:
+            self.first_scan = False
+        else:
+            time.sleep(0.1)
+        return self.reading()
+
     def setFunctionality(self, name, functionality):
         if (name == "xy_stage"):
             self.xy_stage_fn = functionality
@@ -89,6 +104,8 @@ class NoneQPDFunctionality(hardwareModule.BufferedFunctionality, lockModule.QPDF
             print(">> Warning unknown function", name)
 
 class NoneQPDModule(hardwareModule.HardwareModule):
+    message_types = ["configure2",
+                     "get functionality"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
@@ -36,6 +36,7 @@ class NoneZStageFunctionality(hardwareModule.HardwareFunctionality, lockModule.Z
 
 
 class NoneZStageModule(hardwareModule.HardwareModule):
+    message_types = ["get functionality"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
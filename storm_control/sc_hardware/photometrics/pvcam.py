@@ -98,6 +98,7 @@ class PVCAMCamera(object):
         self.buffer_len = None
         self.data_buffer = None
         self.frame_bytes = None
+        self.frame_pool = None
         self.frame_x = None
         self.frame_y = None
         self.n_captured = pvc.uns32(0) # No more than 4 billion frames in a single capture..
@@ -173,7 +174,13 @@ class PVCAMCamera(object):
                                                 ctypes.byref(data_ptr)),
                   "pl_exp_get_oldest_frame")
 
-            pv_data = PVCAMFrameData(self.frame_bytes)
+            # Use storage from the frame pool (if we have one) so that
+            # we are not allocating memory for every frame.
+            if self.frame_pool is not None:
+                pv_data = PVCAMFrameData(self.frame_bytes,
+                                         np_array = self.frame_pool.getBuffer(int(self.frame_bytes/2)))
+            else:
+                pv_data = PVCAMFrameData(self.frame_bytes)
             pv_data.copyData(data_ptr)
             frames.append(pv_data)
             
@@ -427,12 +434,15 @@ class PVCAMFrameData(object):
 
     By now you'd think we'd have a generic base class for this..
     """
-    def __init__(self, size = None, **kwds):
+    def __init__(self, size = None, np_array = None, **kwds):
         """
-        Create a data object of the appropriate size.
+        Create a data object of the appropriate size. If np_array is
+        specified it will be used as the storage for the data.
         """
         super().__init__(**kwds)
-        self.np_array = numpy.ascontiguousarray(numpy.empty(int(size/2), dtype=numpy.uint16))
+        if np_array is None:
+            np_array = numpy.empty(int(size/2), dtype=numpy.uint16)
+        self.np_array = numpy.ascontiguousarray(np_array)
         self.size = size
 
     def copyData(self, address):
@@ -39,6 +39,8 @@ class PhreshQPDFunctionality(hardwareModule.BufferedFunctionality, lockModule.QP
 
 
 class PhreshQPDModule(hardwareModule.HardwareModule):
+    message_types = ["configure1",
+                     "get functionality"]
 
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
@@ -34,6 +34,9 @@ class LDCIRLaserModule(hardwareModule.HardwareModule):
     """
     Thorlabs diode laser control module with power controlled by PWM.
     """
+    message_types = ["configure1",
+                     "get functionality"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.configuration = module_params.get("configuration")
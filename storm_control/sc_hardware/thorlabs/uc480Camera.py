@@ -127,6 +127,14 @@ def loadDLL(dll_name):
     if uc480 is None:
         uc480 = ctypes.cdll.LoadLibrary(dll_name)
 
+def weightedMedian(values, weights):
+    """
+    The median of values with weights, values with zero weight are ignored.
+    """
+    order = numpy.argsort(values)
+    cum_weights = numpy.cumsum(weights[order])
+    return values[order][numpy.searchsorted(cum_weights, 0.5 * cum_weights[-1])]
+
 
 class Camera(Handle):
     """
@@ -177,6 +185,16 @@ class Camera(Handle):
         check(uc480.is_FreezeVideo(self, IS_WAIT), "is_FreezeVideo")
         return self.getImage()
 
+    def captureImages(self, images):
+        """
+        Capture a burst of images.shape[0] frames, the frames are copied
+        straight into images, a (frames, height, width) numpy.uint8 array.
+        """
+        for i in range(images.shape[0]):
+            check(uc480.is_FreezeVideo(self, IS_WAIT), "is_FreezeVideo")
+            check(uc480.is_CopyImageMem(self, self.image, self.id, ctypes.c_char_p(images[i].ctypes.data)), "is_CopyImageMem")
+        return images
+
     def captureImageTest(self):
         """
         For testing..
@@ -311,10 +329,15 @@ class CameraQPD(object):
     The distance between these spots is fit and the difference between this distance and the
     zero distance is returned as the focus lock offset. The maximum value of the camera
     pixels is returned as the focus lock sum.
+
+    In batch mode qpdScan() captures all the frames into a stack first and then
+    analyzes the stack in one go. The offset is the (weighted) median of the
+    offsets of the frames rather than the average.
     """
     def __init__(self,
                  allow_single_fits = False,
                  background = None,                 
+                 batch = False,
                  camera_id = 1,
                  ini_file = None,
                  offset_file = None,
@@ -327,12 +350,15 @@ class CameraQPD(object):
 
         self.allow_single_fits = allow_single_fits
         self.background = background
+        self.batch = batch
         self.fit_mode = 1
         self.fit_size = int(1.5 * sigma)
         self.image = None
+        self.last_frame = None
         self.last_power = 0
         self.offset_file = offset_file
         self.sigma = sigma
+        self.stack = None
         self.x_off1 = 0.0
         self.y_off1 = 0.0
         self.x_off2 = 0.0
@@ -390,6 +416,16 @@ class CameraQPD(object):
         self.image = self.cam.captureImage()
         return self.image
 
+    def captureStack(self, reps):
+        """
+        Get the next reps images from the camera.
+        """
+        if (self.stack is None) or (self.stack.shape[0] != reps):
+            self.stack = numpy.zeros((reps, self.y_width, self.x_width), dtype = numpy.uint8)
+        self.cam.captureImages(self.stack)
+        self.image = self.stack[-1]
+        return self.stack
+
     def changeFitMode(self, mode):
         """
         mode 1 = gaussian fit, any other value = first moment calculation.
@@ -435,6 +471,48 @@ class CameraQPD(object):
         
         return [total_good, dist1, dist2]
 
+    def doFitStack(self, stack):
+        """
+        Fit all the images in a stack. Returns [total_good, dist1, dist2]
+        where each is an array with the results for each image.
+        """
+        results = numpy.zeros((3, stack.shape[0]))
+        for i in range(stack.shape[0]):
+            results[:,i] = self.doFit(stack[i])
+        return list(results)
+
+    def doMomentsStack(self, stack):
+        """
+        Perform a moment based calculation of the distances for all the
+        images in a stack. This does not need to slow things down like
+        doMoments() as the camera is busy capturing the stack.
+        """
+        band = stack[:,self.half_y-15:self.half_y+15,:]
+        x = numpy.arange(self.half_x)
+
+        # Moment for the object in the left half of the pictures.
+        data_ave = numpy.average(band[:,:,:self.half_x], axis = 1)
+        power1 = numpy.sum(data_ave, axis = 1)
+        good1 = (power1 > 0.0)
+        y_off1 = numpy.sum(x * data_ave, axis = 1)/numpy.where(good1, power1, 1.0) - self.half_x
+
+        # Moment for the object in the right half of the pictures.
+        data_ave = numpy.average(band[:,:,self.half_x:], axis = 1)
+        power2 = numpy.sum(data_ave, axis = 1)
+        good2 = (power2 > 0.0)
+        y_off2 = numpy.sum(x * data_ave, axis = 1)/numpy.where(good2, power2, 1.0)
+
+        # Offsets for the display from the last image.
+        self.x_off1 = 1.0e-6
+        self.y_off1 = y_off1[-1] if good1[-1] else 0.0
+        self.x_off2 = 1.0e-6
+        self.y_off2 = y_off2[-1] if good2[-1] else 0.0
+
+        total_good = good1.astype(numpy.int64) + good2.astype(numpy.int64)
+        dist1 = numpy.where(good1, numpy.abs(y_off1), 0.0)
+        dist2 = numpy.where(good2, numpy.abs(y_off2), 0.0)
+        return [total_good, dist1, dist2]
+
     def getImage(self):
         return [self.image, self.x_off1, self.y_off1, self.x_off2, self.y_off2, self.sigma]
 
@@ -445,6 +523,9 @@ class CameraQPD(object):
         """
         Returns [power, offset, is_good]
         """
+        if self.batch:
+            return self.qpdScanBatch(reps)
+        
         power_total = 0.0
         offset_total = 0.0
         good_total = 0.0
@@ -459,6 +540,49 @@ class CameraQPD(object):
         else:
             return [power_total, 0, False]
 
+    def qpdScanBatch(self, reps):
+        """
+        Returns [power, offset, is_good]
+        """
+        stack = self.captureStack(reps)
+
+        # Check for duplicate frames by comparing each frame to the previous frame.
+        is_new = numpy.ones(reps, dtype = bool)
+        is_new[1:] = numpy.any(stack[1:] != stack[:-1], axis = (1, 2))
+        if self.last_frame is None:
+            self.last_frame = stack[-1].copy()
+        else:
+            is_new[0] = not numpy.array_equal(stack[0], self.last_frame)
+            self.last_frame[:] = stack[-1]
+
+        if not numpy.all(is_new):
+            if not numpy.any(is_new):
+                time.sleep(0.05)
+                return [self.last_power, 0, False]
+            stack = stack[is_new]
+
+        # The power number is the average of the sums over the camera AOI minus the background.
+        power = numpy.mean(numpy.sum(stack, axis = (1, 2), dtype = numpy.int64)) - self.background
+        self.last_power = power
+
+        if (self.fit_mode == 1):
+            [total_good, dist1, dist2] = self.doFitStack(stack)
+        else:
+            [total_good, dist1, dist2] = self.doMomentsStack(stack)
+
+        # Calculate offsets, as in singleQpdScan() two good fits get twice
+        # the weight of one good fit.
+        offsets = (dist1 + dist2) - self.zero_dist
+        weights = numpy.where((total_good == 2), 2.0, 0.0)
+        if self.allow_single_fits:
+            single = (total_good == 1)
+            offsets[single] += 0.5*self.zero_dist
+            weights[single] = 1.0
+
+        if not numpy.any(weights > 0.0):
+            return [power, 0, False]
+        return [power, weightedMedian(offsets, weights), True]
+
     def setAOI(self):
         """
         Set the camera AOI to current AOI.
@@ -534,14 +658,18 @@ class CameraQPDCorrFit(CameraQPD):
     """
     This version uses storm-analyis to do the peak finding and
     image correlation to do the peak fitting.
+
+    If tracking is True the fitters only search near the spot
+    positions in the previous image.
     """
-    def __init__(self, **kwds):
+    def __init__(self, tracking = False, **kwds):
         super().__init__(**kwds)
 
         assert (cl2DG is not None), "Correlation fitting not available."
 
         self.fit_hl = None
         self.fit_hr = None
+        self.tracking = tracking
 
     def doFit(self, data):
         dist1 = 0
@@ -555,10 +683,12 @@ class CameraQPDCorrFit(CameraQPD):
             roi_size = int(3.0 * self.sigma)
             self.fit_hl = cl2DG.CorrLockFitter(roi_size = roi_size,
                                                sigma = self.sigma,
-                                               threshold = 10)
+                                               threshold = 10,
+                                               tracking = self.tracking)
             self.fit_hr = cl2DG.CorrLockFitter(roi_size = roi_size,
                                                sigma = self.sigma,
-                                               threshold = 10)
+                                               threshold = 10,
+                                               tracking = self.tracking)
 
         total_good = 0
         [x1, y1, status] = self.fit_hl.findFitPeak(data[:,:self.half_x])
@@ -588,14 +718,18 @@ class CameraQPDCorrFit(CameraQPD):
 class CameraQPDSAFit(CameraQPD):
     """
     This version uses the storm-analysis project to do the fitting.
+
+    If tracking is True the fitters only search near the spot
+    positions in the previous image.
     """
-    def __init__(self, **kwds):
+    def __init__(self, tracking = False, **kwds):
         super().__init__(**kwds)
 
         assert (saLPF is not None), "Storm-analysis fitting not available."
 
         self.fit_hl = None
         self.fit_hr = None
+        self.tracking = tracking
 
     def doFit(self, data):
         dist1 = 0
@@ -608,10 +742,12 @@ class CameraQPDSAFit(CameraQPD):
         if self.fit_hl is None:
             self.fit_hl = saLPF.LockPeakFinder(offset = 5.0,
                                                sigma = self.sigma,
-                                               threshold = 10)
+                                               threshold = 10,
+                                               tracking = self.tracking)
             self.fit_hr = saLPF.LockPeakFinder(offset = 5.0,
                                                sigma = self.sigma,
-                                               threshold = 10)
+                                               threshold = 10,
+                                               tracking = self.tracking)
 
         total_good = 0
         [x1, y1, status] = self.fit_hl.findFitPeak(data[:,:self.half_x])
@@ -675,6 +811,29 @@ class CameraQPDScipyFit(CameraQPD):
             dist2 = abs(self.y_off2)
 
         return [total_good, dist1, dist2]
+
+    def doFitStack(self, stack):
+        """
+        This estimates the positions of the spots in all the images at
+        once with npLPF.fitGaussianCenters() instead of fitting each
+        image. This is much faster and nearly as accurate.
+        """
+        [max_x1, max_y1, dx1, dy1, good1] = self.fitGaussianStack(stack[:,:,:self.half_x])
+        [max_x2, max_y2, dx2, dy2, good2] = self.fitGaussianStack(stack[:,:,-self.half_x:])
+
+        x_off1 = max_x1 + dx1 - self.half_y
+        y_off1 = max_y1 + dy1 - self.half_x
+        x_off2 = max_x2 + dx2 - self.half_y
+        y_off2 = max_y2 + dy2
+
+        # Offsets for the display from the last image.
+        [self.x_off1, self.y_off1] = [x_off1[-1], y_off1[-1]] if good1[-1] else [0.0, 0.0]
+        [self.x_off2, self.y_off2] = [x_off2[-1], y_off2[-1]] if good2[-1] else [0.0, 0.0]
+
+        total_good = good1.astype(numpy.int64) + good2.astype(numpy.int64)
+        dist1 = numpy.where(good1, numpy.abs(y_off1), 0.0)
+        dist2 = numpy.where(good2, numpy.abs(y_off2), 0.0)
+        return [total_good, dist1, dist2]
         
     def fitGaussian(self, data):
         if (numpy.max(data) < 25):
@@ -698,6 +857,31 @@ class CameraQPDScipyFit(CameraQPD):
         else:
             return [False, False, False, False]
 
+    def fitGaussianStack(self, stack):
+        """
+        The stack version of fitGaussian(), returns [max_x, max_y, dx, dy, status]
+        where each is an array with the results for each image.
+        """
+        [n_images, x_width, y_width] = stack.shape
+        flat = stack.reshape(n_images, -1)
+        max_i = numpy.argmax(flat, axis = 1)
+        max_x = max_i // y_width
+        max_y = max_i % y_width
+
+        fs = self.fit_size
+        status = (flat[numpy.arange(n_images), max_i] >= 25)
+        status &= (max_x > (fs-1)) & (max_x < (x_width - fs)) & (max_y > (fs-1)) & (max_y < (y_width - fs))
+
+        # Fit windows around the maximums (clipped so that they are
+        # inside the image even when the status is False).
+        d = numpy.arange(-fs, fs)
+        wx = numpy.clip(max_x, fs, x_width - fs)[:,None] + d
+        wy = numpy.clip(max_y, fs, y_width - fs)[:,None] + d
+        windows = stack[numpy.arange(n_images)[:,None,None], wx[:,:,None], wy[:,None,:]]
+
+        [dx, dy, good] = npLPF.fitGaussianCenters(windows)
+        return [max_x, max_y, dx, dy, (status & good)]
+
 class CameraQPDScipyFitSingleSpot(CameraQPD):
     """
     This version uses scipy to do the fitting.
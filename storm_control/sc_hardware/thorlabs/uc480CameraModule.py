@@ -14,6 +14,23 @@ import storm_control.sc_hardware.baseClasses.lockModule as lockModule
 import storm_control.sc_hardware.thorlabs.uc480Camera as uc480Camera
 
 
+def qpdReading(camera, reps, units_to_microns):
+    """
+    Returns a single reading from the camera as a qpdUpdate dictionary.
+    """
+    [power, offset, is_good] = camera.qpdScan(reps = reps)
+    [image, x_off1, y_off1, x_off2, y_off2, sigma] = camera.getImage()
+    return {"is_good" : is_good, # This is the flag for good fit values.
+            "image" : image,
+            "offset" : offset * units_to_microns,
+            "sigma" : sigma,
+            "sum" : power,
+            "x_off1" : x_off1,
+            "y_off1" : y_off1,
+            "x_off2" : x_off2,
+            "y_off2" : y_off2}
+
+
 class UC480QPDCameraFunctionality(hardwareModule.BufferedFunctionality, lockModule.QPDCameraFunctionalityMixin):
     qpdUpdate = QtCore.pyqtSignal(dict)
     threadUpdate = QtCore.pyqtSignal(dict)
@@ -21,6 +38,7 @@ class UC480QPDCameraFunctionality(hardwareModule.BufferedFunctionality, lockModu
     def __init__(self, camera = None, reps = None, **kwds):
         super().__init__(**kwds)
         self.camera = camera
+        self.reps = reps
         self.scan_thread = UC480ScanThread(camera = self.camera,
                                            device_mutex = self.device_mutex,
                                            qpd_update_signal = self.threadUpdate,
@@ -58,6 +76,15 @@ class UC480QPDCameraFunctionality(hardwareModule.BufferedFunctionality, lockModu
         #
         if not self.scan_thread.isRunning():
             self.scan_thread.startScan()
+
+    def haveDirectRead(self):
+        return True
+
+    def readOffset(self):
+        self.device_mutex.lock()
+        qpd_dict = qpdReading(self.camera, self.reps, self.units_to_microns)
+        self.device_mutex.unlock()
+        return qpd_dict
             
     def wait(self):
         super().wait()
@@ -91,17 +118,7 @@ class UC480ScanThread(QtCore.QThread):
     def run(self):
         self.running = True
         while(self.running):
-            [power, offset, is_good] = self.camera.qpdScan(reps = self.reps)
-            [image, x_off1, y_off1, x_off2, y_off2, sigma] = self.camera.getImage()
-            self.qpd_update_signal.emit({"is_good" : is_good, # This is the flag for good fit values.
-                                         "image" : image,
-                                         "offset" : offset * self.units_to_microns,
-                                         "sigma" : sigma,
-                                         "sum" : power,
-                                         "x_off1" : x_off1,
-                                         "y_off1" : y_off1,
-                                         "x_off2" : x_off2,
-                                         "y_off2" : y_off2})
+            self.qpd_update_signal.emit(qpdReading(self.camera, self.reps, self.units_to_microns))
 
     def startScan(self):
         self.start(QtCore.QThread.NormalPriority)
@@ -115,6 +132,8 @@ class UC480Camera(hardwareModule.HardwareModule):
     """
     HAL module that interfaces with a Thorlabs UC480 camera.
     """
+    message_types = ["get functionality"]
+
     def __init__(self, module_params = None, qt_settings = None, **kwds):
         super().__init__(**kwds)
         self.camera = None
@@ -131,11 +150,13 @@ class UC480Camera(hardwareModule.HardwareModule):
             print("> using correlation for fitting.")
             self.camera = uc480Camera.CameraQPDCorrFit(allow_single_fits = configuration.get("allow_single_fits", False),
                                                        background = configuration.get("background"),
+                                                       batch = configuration.get("batch", False),
                                                        camera_id = configuration.get("camera_id"),
                                                        ini_file = configuration.get("ini_file"),
                                                        offset_file = configuration.get("offset_file"),
                                                        pixel_clock = configuration.get("pixel_clock", 30),
                                                        sigma = configuration.get("sigma"),
+                                                       tracking = configuration.get("tracking", False),
                                                        x_width = configuration.get("x_width"),
                                                        y_width = configuration.get("y_width"))
             
@@ -146,11 +167,13 @@ class UC480Camera(hardwareModule.HardwareModule):
             print("> using storm-analysis for fitting.")
             self.camera = uc480Camera.CameraQPDSAFit(allow_single_fits = configuration.get("allow_single_fits", False),
                                                      background = configuration.get("background"),
+                                                     batch = configuration.get("batch", False),
                                                      camera_id = configuration.get("camera_id"),
                                                      ini_file = configuration.get("ini_file"),
                                                      offset_file = configuration.get("offset_file"),
                                                      pixel_clock = configuration.get("pixel_clock", 30),
                                                      sigma = configuration.get("sigma"),
+                                                     tracking = configuration.get("tracking", False),
                                                      x_width = configuration.get("x_width"),
                                                      y_width = configuration.get("y_width"))
 
@@ -163,6 +186,7 @@ class UC480Camera(hardwareModule.HardwareModule):
             #self.camera = uc480Camera.CameraQPDScipyFit(allow_single_fits = configuration.get("allow_single_fits", False),
             self.camera = uc480Camera.CameraQPDScipyFitSingleSpot(allow_single_fits = configuration.get("allow_single_fits", False),
                                                         background = configuration.get("background"),
+                                                        batch = configuration.get("batch", False),
                                                         camera_id = configuration.get("camera_id"),
                                                         ini_file = configuration.get("ini_file"),
                                                         offset_file = configuration.get("offset_file"),
@@ -176,6 +200,7 @@ class UC480Camera(hardwareModule.HardwareModule):
             print("> using numpy/scipy for fitting.")
             self.camera = uc480Camera.CameraQPDScipyFit(allow_single_fits = configuration.get("allow_single_fits", False),
                                                         background = configuration.get("background"),
+                                                        batch = configuration.get("batch", False),
                                                         camera_id = configuration.get("camera_id"),
                                                         ini_file = configuration.get("ini_file"),
                                                         offset_file = configuration.get("offset_file"),
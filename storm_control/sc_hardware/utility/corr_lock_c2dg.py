@@ -2,6 +2,10 @@
 """
 Fit spots for the focus lock using a correlation based approach.
 
+In tracking mode the peak finding is only done in a small window
+around the peak in the previous image. The whole image is only
+searched if the peak is not found in the window.
+
 Hazen 04/18
 """
 import numpy
@@ -12,17 +16,21 @@ import storm_analysis.sa_library.matched_filter_c as matchedFilterC
 import storm_analysis.simulator.draw_gaussians_c as dg
 
 import storm_control.sc_hardware.utility.corr_2d_gauss_c as corr2DGauss
+import storm_control.sc_hardware.utility.lock_tracking_window as lockTrackingWindow
 
 
 class CorrLockFitter(object):
 
-    def __init__(self, roi_size = None, sigma = None, threshold = None, **kwds):
+    def __init__(self, roi_size = None, sigma = None, threshold = None, tracking = False, **kwds):
         super().__init__(**kwds)
 
 
         self.fg_filter = None
+        self.image = None
+        self.last_peak = None
         self.roi_size = roi_size
         self.sigma = sigma
+        self.tracking_window = None
 
         size = (2*self.roi_size, 2*self.roi_size)
         #self.c2dg = corr2DGauss.Corr2DGaussPyNCG(size = size, sigma = sigma)
@@ -33,6 +41,12 @@ class CorrLockFitter(object):
                                          threshold = threshold,
                                          z_values = [0.0])
 
+        if tracking:
+            self.tracking_window = lockTrackingWindow.TrackingWindow(roi_size = self.roi_size,
+                                                                     sigma = self.sigma,
+                                                                     size = 2 * self.roi_size,
+                                                                     threshold = threshold)
+
     def cleanup(self):
         self.c2dg.cleanup()
         
@@ -41,15 +55,43 @@ class CorrLockFitter(object):
         Returns the optimal alignment (based on the correlation score) between
         a Gaussian and the brightest peak in the image.
         """
-        image = numpy.ascontiguousarray(image, dtype = numpy.float64)
+        # Tracking, look for the peak near the last peak.
+        if self.tracking_window is not None and self.last_peak is not None:
+            result = self.findFitPeakTracking(image)
+            if result[2]:
+                return result
+
+        # Copy the image into our (float64) image buffer.
+        if (self.image is None) or (self.image.shape != image.shape):
+            self.image = numpy.zeros(image.shape)
+        numpy.copyto(self.image, image, casting = "unsafe")
 
         # Find ROI.
-        [mx, my, roi] = self.findROI(image)
+        [mx, my, roi] = self.findROI(self.image)
         if (mx == 0) and (my == 0):
+            self.last_peak = None
             return [0, 0, False]
 
         # Fit for peak location in the ROI.
-        return self.fitROI(mx, my, roi)
+        return self.updateLastPeak(self.fitROI(mx, my, roi))
+
+    def findFitPeakTracking(self, image):
+        """
+        Find and fit the peak in the tracking window.
+        """
+        peak = self.tracking_window.findPeak(image, self.last_peak[1], self.last_peak[0])
+        if peak is None:
+            return [0, 0, False]
+
+        # Slice out ROI, this is the same as findROI().
+        mx = int(round(peak[0])) + 1
+        my = int(round(peak[1])) + 1
+        rs = self.roi_size
+        roi = self.tracking_window.getWindow()[my-rs:my+rs,mx-rs:mx+rs]
+        roi -= numpy.min(roi)
+
+        [x_start, y_start] = self.tracking_window.getStart()
+        return self.updateLastPeak(self.fitROI(mx + x_start, my + y_start, roi))
 
     def findROI(self, image):
         """
@@ -96,6 +138,13 @@ class CorrLockFitter(object):
         else:
             return [0, 0, False]
 
+    def updateLastPeak(self, result):
+        if result[2]:
+            self.last_peak = result[:2]
+        else:
+            self.last_peak = None
+        return result
+
 
 if (__name__ == "__main__"):
     #
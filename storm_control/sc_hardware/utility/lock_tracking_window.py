@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Peak finding in a small window around the last peak. This is used by
+the camera based focus lock fitters in tracking mode, as the spots
+usually only move a few pixels from one frame to the next there is no
+need to search the whole image.
+
+Hazen 10/26
+"""
+import numpy
+
+import storm_analysis.sa_library.fitting as fitting
+import storm_analysis.sa_library.ia_utilities_c as iaUtilsC
+import storm_analysis.sa_library.matched_filter_c as matchedFilterC
+
+
+class TrackingWindow(object):
+    """
+    The window is 2 * size pixels square, peaks within roi_size pixels
+    of the edge of the window are ignored, so a peak can move by up
+    to (size - roi_size) pixels and still be found.
+
+    The window is clamped to the size of the image, for example the
+    AOI of a uc480 camera is often only a few tens of pixels high. If
+    the image is too small to find peaks in a window then tracking is
+    not used.
+    """
+    def __init__(self, offset = 0.0, roi_size = None, sigma = None, size = None, threshold = None, **kwds):
+        super().__init__(**kwds)
+        self.fg_filter = None
+        self.offset = offset
+        self.roi_size = roi_size
+        self.sigma = sigma
+        self.size = size
+        self.warned = False
+        self.window = numpy.zeros((2 * self.size, 2 * self.size))
+        self.x_start = 0
+        self.y_start = 0
+
+        self.mxf = iaUtilsC.MaximaFinder(margin = roi_size,
+                                         radius = 2 * self.sigma,
+                                         threshold = threshold,
+                                         z_values = [0.0])
+
+    def findPeak(self, image, last_x, last_y):
+        """
+        Find the brightest peak in the window around last_x, last_y. The
+        window is copied from image (any dtype) into self.window (plus
+        the offset).
+
+        Returns [x, y] in window coordinates, or None if there is no
+        peak in the window or the image is too small for tracking.
+        """
+        w_y = min(2 * self.size, image.shape[0])
+        w_x = min(2 * self.size, image.shape[1])
+        if (w_y <= 2 * self.roi_size) or (w_x <= 2 * self.roi_size):
+            if not self.warned:
+                print(">> Warning, focus lock image", image.shape, "is too small for tracking, not using tracking.")
+                self.warned = True
+            return None
+
+        if (self.window.shape != (w_y, w_x)):
+            self.fg_filter = None
+            self.window = numpy.zeros((w_y, w_x))
+
+        self.x_start = min(max(int(round(last_x)) - w_x//2, 0), image.shape[1] - w_x)
+        self.y_start = min(max(int(round(last_y)) - w_y//2, 0), image.shape[0] - w_y)
+        numpy.copyto(self.window,
+                     image[self.y_start:self.y_start + w_y, self.x_start:self.x_start + w_x],
+                     casting = "unsafe")
+        if (self.offset != 0.0):
+            self.window += self.offset
+
+        # Create convolution object, if we have not already done this.
+        if self.fg_filter is None:
+            fg_psf = fitting.gaussianPSF(self.window.shape, self.sigma)
+            self.fg_filter = matchedFilterC.MatchedFilter(fg_psf)
+
+        self.mxf.resetTaken()
+        smoothed_window = self.fg_filter.convolve(self.window)
+        [x, y, z, h] = self.mxf.findMaxima([smoothed_window], want_height = True)
+        if (x.size == 0):
+            return None
+
+        max_index = numpy.argmax(h)
+        return [x[max_index], y[max_index]]
+
+    def getStart(self):
+        """
+        Returns the position of the window in the image, [x_start, y_start].
+        """
+        return [self.x_start, self.y_start]
+
+    def getWindow(self):
+        return self.window
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -78,6 +78,35 @@ def fitFixedEllipticalGaussian(data, sigma):
               2.0 * sigma]
     return fitAFunctionLS(data, params, fixedEllipticalGaussian)
 
+def fitGaussianCenters(windows):
+    """
+    Estimates the center of a gaussian in each of a stack of windows
+    centered (to the nearest pixel) on the peak. This fits a gaussian
+    (a parabola to the log of the intensity) to the 3 pixels around the
+    center of the x and y profiles of each window, so it is a lot faster
+    than least squares fitting and it works on all of the windows at once.
+
+    windows - (N, 2*n, 2*n) numpy array, the peaks are at [n, n].
+
+    Returns [dx, dy, status], the center of each peak relative to [n, n]
+    and whether or not the estimate is good.
+    """
+    windows = windows.astype(numpy.float64)
+    windows -= numpy.min(windows, axis = (1, 2), keepdims = True)
+    c = int(windows.shape[1]/2)
+
+    def center(profiles):
+        p = numpy.log(numpy.maximum(profiles[:, c-1:c+2], 1.0e-6))
+        den = p[:,0] - 2.0 * p[:,1] + p[:,2]
+        good = (den < 0.0)
+        delta = 0.5 * (p[:,0] - p[:,2])/numpy.where(good, den, -1.0)
+        good &= (numpy.abs(delta) < 1.0)
+        return [numpy.where(good, delta, 0.0), good]
+
+    [dx, good_x] = center(numpy.sum(windows, axis = 2))
+    [dy, good_y] = center(numpy.sum(windows, axis = 1))
+    return [dx, dy, (good_x & good_y)]
+
 """
 
 def gaussian1D(x, background, height, center_x, width):
@@ -3,6 +3,10 @@
 Peak finder for use by the camera based focus locks. This 
 version requires the storm-analysis project.
 
+In tracking mode the peak finding is only done in a small window
+around the peak in the previous image. The whole image is only
+searched if the peak is not found in the window.
+
 Hazen 11/17
 """
 import numpy
@@ -15,16 +19,21 @@ import storm_analysis.sa_library.matched_filter_c as matchedFilterC
 
 import storm_analysis.simulator.draw_gaussians_c as dg
 
+import storm_control.sc_hardware.utility.lock_tracking_window as lockTrackingWindow
+
 
 class LockPeakFinder(object):
 
-    def __init__(self, offset = None, sigma = None, threshold = None, **kwds):
+    def __init__(self, offset = None, sigma = None, threshold = None, tracking = False, **kwds):
         super().__init__(**kwds)
 
+        self.image = None
+        self.last_peak = None
         self.mfit = None
         self.offset = offset
         self.roi_size = int(4.0 * sigma)
         self.sigma = sigma
+        self.tracking_window = None
 
         # Filter for smoothing the image for peak finding.
         #
@@ -35,6 +44,13 @@ class LockPeakFinder(object):
                                          threshold = threshold + self.offset,
                                          z_values = [0.0])
 
+        if tracking:
+            self.tracking_window = lockTrackingWindow.TrackingWindow(offset = self.offset,
+                                                                     roi_size = self.roi_size,
+                                                                     sigma = self.sigma,
+                                                                     size = 2 * self.roi_size,
+                                                                     threshold = threshold + self.offset)
+
     def cleanup(self):
         if self.mfit is not None:
             self.mfit.cleanup(verbose = False)
@@ -47,10 +63,12 @@ class LockPeakFinder(object):
         # Convert image and add offset, this is to keep the MLE fitter from
         # overfitting the background and/or taking logs of zero.
         #
-        image = numpy.ascontiguousarray(image, dtype = numpy.float64)
-        image += self.offset
-        
-        self.mxf.resetTaken()
+        raw_image = image
+        if (self.image is None) or (self.image.shape != image.shape):
+            self.image = numpy.zeros(image.shape)
+        numpy.copyto(self.image, image, casting = "unsafe")
+        self.image += self.offset
+        image = self.image
 
         # Create the peak fitter object, if we have not already done this.
         #
@@ -72,19 +90,35 @@ class LockPeakFinder(object):
         else:
             self.mfit.newImage(image)
 
+        # Tracking, look for the peak near the last peak.
+        if self.tracking_window is not None and self.last_peak is not None:
+            peak = self.tracking_window.findPeak(raw_image, self.last_peak[1], self.last_peak[0])
+            if peak is not None:
+                [x_start, y_start] = self.tracking_window.getStart()
+                result = self.fitPeak(peak[0] + x_start, peak[1] + y_start)
+                if result[2]:
+                    return result
+
         # Find peaks.
+        self.mxf.resetTaken()
         smoothed_image = self.fg_filter.convolve(image)
         [x, y, z, h] = self.mxf.findMaxima([smoothed_image], want_height = True)
 
         # No peaks found check
         if(x.size == 0):
+            self.last_peak = None
             return [0, 0, False]
 
         max_index = numpy.argmax(h)
+        return self.fitPeak(x[max_index], y[max_index])
 
-        peaks = {"x" : numpy.array([x[max_index]]),
-                 "y" : numpy.array([y[max_index]]),
-                 "z" : numpy.array([z[max_index]]),
+    def fitPeak(self, x, y):
+        """
+        Fit a single peak starting at x, y.
+        """
+        peaks = {"x" : numpy.array([x]),
+                 "y" : numpy.array([y]),
+                 "z" : numpy.array([0.0]),
                  "sigma" : numpy.array([self.sigma])}
 
         # Pass peaks to fitter & fit.
@@ -96,7 +130,9 @@ class LockPeakFinder(object):
             # Return peak location.
             x = self.mfit.getPeakProperty("x")
             y = self.mfit.getPeakProperty("y")
+            self.last_peak = [y[0], x[0]]
             return [y[0], x[0], True]
         else:
+            self.last_peak = None
             return [0, 0, False]
 
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+The chunked, compressed .dax (.cdax) format.
+
+Frames are stored in fixed size chunks of (up to) chunk_frames frames,
+each chunk is compressed independently so that chunks can be compressed
+in parallel when writing and so that any frame can be read by only
+decompressing the chunk that contains it.
+
+Chunks are compressed by:
+ 1. Taking the difference between neighboring pixels in each row
+    (as uint16, so this wraps). For the mostly dark background of a
+    STORM movie this gives lots of small values.
+ 2. Byte shuffling, so all the high bytes are stored together, followed
+    by all the low bytes. The high bytes are then mostly zero.
+ 3. zlib compression.
+
+All numbers are little endian. The layout of the file is:
+
+ header  - "<4sIIIII", "CDAX", version, x_pixels, y_pixels,
+           chunk_frames, compression level.
+
+ chunks  - Each chunk is "<II", number of frames, compressed size,
+           followed by the compressed data.
+
+ index   - A (number of chunks, 3) uint64 array of file offset (of the
+           compressed data), compressed size and number of frames.
+
+ footer  - "<QQ4s", index offset, number of frames, "CDAX".
+
+If the file does not end with a footer (i.e. the program recording it
+crashed) the index can be rebuilt by walking the chunk headers.
+
+Hazen 10/26
+"""
+import numpy
+import os
+import struct
+import zlib
+
+
+chunk_header_format = "<II"
+chunk_header_size = struct.calcsize(chunk_header_format)
+footer_format = "<QQ4s"
+footer_size = struct.calcsize(footer_format)
+header_format = "<4sIIIII"
+header_size = struct.calcsize(header_format)
+magic = b"CDAX"
+version = 1
+
+
+class CDaxException(Exception):
+    pass
+
+
+def decodeChunk(data, n_frames, x_pixels, y_pixels):
+    """
+    Decompress a chunk, returns a (frames, y, x) numpy.uint16 array.
+    """
+    n_pixels = n_frames * x_pixels * y_pixels
+    shuffled = numpy.frombuffer(zlib.decompress(data), dtype = numpy.uint8)
+    if (shuffled.size != 2 * n_pixels):
+        raise CDaxException("Chunk has the wrong size " + str(shuffled.size))
+
+    # Un-shuffle.
+    delta = numpy.empty(n_pixels, dtype = numpy.uint16)
+    delta.view(numpy.uint8).reshape((n_pixels, 2))[:,:] = shuffled.reshape((2, n_pixels)).transpose()
+
+    # Undo the difference (uint16 arithmetic wraps, so this is exact).
+    delta = delta.reshape((n_frames, y_pixels, x_pixels))
+    return numpy.cumsum(delta, axis = 2, dtype = numpy.uint16)
+
+def encodeChunk(frames, x_pixels, y_pixels, level = 1):
+    """
+    Compress a (frames, pixels) (or (frames, y, x)) numpy.uint16 array,
+    returns the compressed data as bytes.
+
+    zlib releases the GIL so this can be run in parallel on several threads.
+    """
+    frames = frames.reshape((-1, y_pixels, x_pixels))
+    delta = numpy.empty(frames.shape, dtype = numpy.uint16)
+    delta[:,:,0] = frames[:,:,0]
+    numpy.subtract(frames[:,:,1:], frames[:,:,:-1], out = delta[:,:,1:])
+
+    shuffled = delta.reshape(-1).view(numpy.uint8).reshape((-1, 2)).transpose().copy()
+    return zlib.compress(shuffled, level)
+
+def packChunkHeader(n_frames, size):
+    return struct.pack(chunk_header_format, n_frames, size)
+
+def packFooter(index_offset, number_frames):
+    return struct.pack(footer_format, index_offset, number_frames, magic)
+
+def packHeader(x_pixels, y_pixels, chunk_frames, level):
+    return struct.pack(header_format, magic, version, x_pixels, y_pixels, chunk_frames, level)
+
+def readHeader(fp):
+    """
+    Returns [x_pixels, y_pixels, chunk_frames].
+    """
+    fp.seek(0)
+    data = fp.read(header_size)
+    if (len(data) != header_size):
+        raise CDaxException("File is too short")
+    [file_magic, file_version, x_pixels, y_pixels, chunk_frames, level] = struct.unpack(header_format, data)
+    if (file_magic != magic):
+        raise CDaxException("Not a .cdax file")
+    if (file_version != version):
+        raise CDaxException("Unsupported .cdax version " + str(file_version))
+    return [x_pixels, y_pixels, chunk_frames]
+
+def readIndex(fp):
+    """
+    Returns the index of the file as a (chunks, 3) numpy.uint64 array.
+    """
+    fp.seek(0, os.SEEK_END)
+    file_size = fp.tell()
+
+    # Try the index at the end of the file.
+    if (file_size >= (header_size + footer_size)):
+        fp.seek(file_size - footer_size)
+        [index_offset, number_frames, file_magic] = struct.unpack(footer_format, fp.read(footer_size))
+        if (file_magic == magic) and (index_offset < file_size):
+            fp.seek(index_offset)
+            n_chunks = (file_size - footer_size - index_offset)//24
+            index = numpy.fromfile(fp, dtype = "<u8", count = 3 * n_chunks).reshape((-1, 3))
+            if (int(numpy.sum(index[:,2])) == number_frames):
+                return index.astype(numpy.uint64)
+
+    # The file was not closed properly, so rebuild the index from the
+    # chunk headers, ignoring any incomplete chunk at the end.
+    index = []
+    offset = header_size
+    while ((offset + chunk_header_size) <= file_size):
+        fp.seek(offset)
+        [n_frames, size] = struct.unpack(chunk_header_format, fp.read(chunk_header_size))
+        offset += chunk_header_size
+        if ((offset + size) > file_size):
+            break
+        index.append([offset, size, n_frames])
+        offset += size
+    return numpy.array(index, dtype = numpy.uint64).reshape((-1, 3))
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -19,6 +19,7 @@ import os
 from PIL import Image
 import re
 
+import storm_control.sc_library.cdax as cdax
 import storm_control.sc_library.parameters as parameters
 
 
@@ -52,12 +53,14 @@ def infToXmlObject(filename):
     no_ext_name = os.path.splitext(filename)[0]
     if os.path.exists(no_ext_name + ".dax"):
         xml.set("film.filetype", ".dax")
+    elif os.path.exists(no_ext_name + ".cdax"):
+        xml.set("film.filetype", ".cdax")
     elif os.path.exists(no_ext_name + ".spe"):
         xml.set("film.filetype", ".spe")
     elif os.path.exists(no_ext_name + ".tif"):
         xml.set("film.filetype", ".tif")
     else:
-        raise IOError("only .dax, .spe and .tif are supported (case sensitive..)")        
+        raise IOError("only .dax, .cdax, .spe and .tif are supported (case sensitive..)")        
         
     # Extract the movie information from the associated inf file.
     size_re = re.compile(r'frame dimensions = ([\d]+) x ([\d]+)')
@@ -112,10 +115,12 @@ def infToXmlObject(filename):
     return xml
 
 
-def reader(filename):
+def reader(filename, use_mmap = False):
     """
     Returns the appropriate object based on the file type as
     saved in the corresponding XML file.
+
+    If use_mmap is True then .dax files are memory mapped.
     """
     no_ext_name = os.path.splitext(filename)[0]
 
@@ -140,7 +145,11 @@ def reader(filename):
 
     if (file_type == ".dax"):
         return DaxReader(filename = filename,
+                         use_mmap = use_mmap,
                          xml = xml)
+    elif (file_type == ".cdax"):
+        return CDaxReader(filename = filename,
+                          xml = xml)
     elif (file_type == ".spe"):
         return SpeReader(filename = filename,
                          xml = xml)
@@ -149,7 +158,7 @@ def reader(filename):
                          xml = xml)
     else:
         print(file_type, "is not a recognized file type")
-    raise IOError("only .dax, .spe and .tif are supported (case sensitive..)")
+    raise IOError("only .dax, .cdax, .spe and .tif are supported (case sensitive..)")
 
 
 class DataReader(object):
@@ -165,6 +174,9 @@ class DataReader(object):
 
      2. loadAFrame(self, frame_number)
         Load the requested frame and return it as numpy array.
+
+    Subclasses can also implement loadFrames() if they can do
+    this more efficiently than one frame at a time.
     """
     def __init__(self, filename = None, xml = None, **kwds):
         super().__init__(**kwds)
@@ -213,13 +225,106 @@ class DataReader(object):
     def filmSize(self):
         return [self.image_width, self.image_height, self.number_frames]
 
+    def loadFrames(self, start = 0, stop = None, step = 1, roi = None):
+        """
+        Load frames start to stop (exclusive) in steps of step and return
+        them as a (frames, y, x) numpy array. The frames are cropped to
+        roi if it is specified as [y_start, y_end, x_start, x_end].
+        """
+        frame_numbers = range(*slice(start, stop, step).indices(self.number_frames))
+        frames = []
+        for i in frame_numbers:
+            frame = self.loadAFrame(i)
+            if roi is not None:
+                frame = frame[roi[0]:roi[1],roi[2]:roi[3]]
+            frames.append(frame)
+        if (len(frames) == 0):
+            return numpy.zeros((0, self.image_height, self.image_width), dtype = numpy.uint16)
+        return numpy.stack(frames)
+
+
+class CDaxReader(DataReader):
+    """
+    Chunked, compressed .dax reader class, see cdax.py for a description
+    of the format.
+
+    The frame size comes from the file header. The most recently used
+    chunk is cached, so reading the frames in order only decompresses
+    each chunk once.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.cache = None
+        self.cache_chunk = None
+        self.fileptr = open(self.filename, "rb")
+
+        try:
+            [self.image_width, self.image_height, self.chunk_frames] = cdax.readHeader(self.fileptr)
+            self.index = cdax.readIndex(self.fileptr)
+        except cdax.CDaxException as exception:
+            raise IOError(str(exception))
+        self.number_frames = int(numpy.sum(self.index[:,2]))
+
+    def closeFilePtr(self):
+        self.cache = None
+        super().closeFilePtr()
+
+    def loadAFrame(self, frame_number):
+        if self.fileptr:
+            self.checkFrameNumber(frame_number)
+            return self.loadChunk(frame_number//self.chunk_frames)[frame_number % self.chunk_frames].copy()
+
+    def loadChunk(self, chunk):
+        """
+        Returns a chunk as a (frames, y, x) numpy array.
+        """
+        if (chunk != self.cache_chunk):
+            [offset, size, n_frames] = map(int, self.index[chunk])
+            self.fileptr.seek(offset)
+            frames = cdax.decodeChunk(self.fileptr.read(size),
+                                      n_frames,
+                                      self.image_width,
+                                      self.image_height)
+
+            # Same orientation as DaxReader.
+            self.cache = numpy.transpose(frames.reshape((n_frames, self.image_width, self.image_height)), (0, 2, 1))
+            self.cache_chunk = chunk
+        return self.cache
+
+    def loadFrames(self, start = 0, stop = None, step = 1, roi = None):
+        """
+        This decompresses each of the chunks that are needed once.
+        """
+        frame_numbers = range(*slice(start, stop, step).indices(self.number_frames))
+        if roi is None:
+            roi = [0, self.image_height, 0, self.image_width]
+        frames = numpy.zeros((len(frame_numbers),
+                              len(range(*slice(roi[0], roi[1]).indices(self.image_height))),
+                              len(range(*slice(roi[2], roi[3]).indices(self.image_width)))),
+                             dtype = numpy.uint16)
+        for i, fn in enumerate(frame_numbers):
+            chunk = self.loadChunk(fn//self.chunk_frames)
+            frames[i] = chunk[fn % self.chunk_frames, roi[0]:roi[1], roi[2]:roi[3]]
+        return frames
+
 
 class DaxReader(DataReader):
     """
     Dax reader class. This is a Zhuang lab custom format.
+
+    If use_mmap is True the file is memory mapped and frames are read
+    from the memory map. In this mode movieData() returns the entire
+    movie as a lazily mapped (frames, y, x) array, so only the parts
+    of the movie that are actually used are read from disk.
+
+    If the file is shorter than the number of frames in the xml (for
+    example because HAL crashed while recording), only the complete
+    frames in the file are used.
     """
-    def __init__(self, **kwds):
+    def __init__(self, use_mmap = False, **kwds):
         super().__init__(**kwds)
+        self.movie_data = None
+        self.use_mmap = use_mmap
 
         self.bigendian = self.xml.get("film.want_big_endian", False)
         self.image_height = self.xml.get(self.camera + ".y_pixels")
@@ -234,10 +339,24 @@ class DaxReader(DataReader):
         # open the dax file
         self.fileptr = open(self.filename, "rb")
 
+        # Check that the file actually contains this many frames.
+        frame_size = self.image_height * self.image_width * 2
+        if (frame_size > 0):
+            file_frames = os.path.getsize(self.filename)//frame_size
+            if (file_frames < self.number_frames):
+                print(">> Warning", self.filename, "only contains", file_frames, "of", self.number_frames, "frames")
+                self.number_frames = file_frames
+
+    def closeFilePtr(self):
+        self.movie_data = None
+        super().closeFilePtr()
+
     # load a frame & return it as a numpy array
     def loadAFrame(self, frame_number):
         if self.fileptr:
             self.checkFrameNumber(frame_number)
+            if self.use_mmap:
+                return self.toNative(self.movieData()[frame_number])
             self.fileptr.seek(frame_number * self.image_height * self.image_width * 2)
             image_data = numpy.fromfile(self.fileptr, dtype=numpy.uint16, count = self.image_height * self.image_width)
             image_data = numpy.transpose(numpy.reshape(image_data, [self.image_width, self.image_height]))
@@ -245,6 +364,62 @@ class DaxReader(DataReader):
                 image_data.byteswap(True)
             return image_data
 
+    def loadFrames(self, start = 0, stop = None, step = 1, roi = None):
+        """
+        If use_mmap is True this only reads the requested frames (and if
+        roi is specified only the parts of the frames in the roi) from
+        disk. Otherwise consecutive frames are read with a single read.
+        """
+        if self.use_mmap:
+            frames = self.movieData()[start:stop:step]
+        else:
+            frame_numbers = range(*slice(start, stop, step).indices(self.number_frames))
+            if (frame_numbers.step != 1) or (len(frame_numbers) < 2):
+                return super().loadFrames(start, stop, step, roi)
+
+            frame_size = self.image_height * self.image_width
+            self.fileptr.seek(frame_numbers[0] * frame_size * 2)
+            frames = numpy.fromfile(self.fileptr, dtype = self.movieDtype(), count = len(frame_numbers) * frame_size)
+            frames = numpy.transpose(numpy.reshape(frames, (len(frame_numbers), self.image_width, self.image_height)), (0, 2, 1))
+
+        if roi is not None:
+            frames = frames[:,roi[0]:roi[1],roi[2]:roi[3]]
+        return self.toNative(frames)
+
+    def movieData(self):
+        """
+        Returns the movie as a memory mapped (frames, y, x) numpy array.
+        
+        Note that this is the raw data, so it will be big endian if
+        the movie was saved as big endian.
+        """
+        if self.movie_data is None:
+            dtype = self.movieDtype()
+            shape = (self.number_frames, self.image_width, self.image_height)
+            if (self.number_frames > 0):
+                movie_data = numpy.memmap(self.filename, dtype = dtype, mode = "r", shape = shape)
+            else:
+                movie_data = numpy.zeros(shape, dtype = dtype)
+
+            # Transpose to match loadAFrame().
+            self.movie_data = numpy.transpose(movie_data, (0, 2, 1))
+        return self.movie_data
+
+    def movieDtype(self):
+        """
+        Returns the numpy dtype of the data in the file.
+        """
+        if self.bigendian:
+            return numpy.dtype(">u2")
+        else:
+            return numpy.dtype("<u2")
+
+    def toNative(self, image_data):
+        """
+        Return a copy of image_data as native endian numpy.uint16.
+        """
+        return numpy.array(image_data, dtype = numpy.uint16)
+
 
 class SpeReader(DataReader):
     """
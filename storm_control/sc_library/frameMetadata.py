@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Reading and writing of the per-frame metadata (.fmd) files that
+HAL can save alongside a movie.
+
+The file is a small header followed by one fixed size record per
+frame. The record layout is a numpy structured dtype, so reading the
+whole file is a single numpy.fromfile() and each column (i.e.
+data["stage_x"]) is then available as a numpy array.
+
+Header:
+ "FMD1", uint32 length of the JSON description, JSON description.
+
+The JSON description is a dictionary with a "columns" entry that
+is a list of [name, numpy dtype string] pairs, and any other
+information that the writer wanted to include.
+
+Values that were not available when the frame was recorded (i.e.
+there is no focus lock) are saved as NaN.
+
+Hazen 10/26
+"""
+import json
+import numpy
+import struct
+
+
+magic = b"FMD1"
+
+
+def makeDType(columns):
+    return numpy.dtype([(name, dtype) for [name, dtype] in columns])
+
+def readFrameMetadata(filename):
+    """
+    Returns [data, description] where data is a numpy structured array
+    and description is the JSON description dictionary.
+    """
+    with open(filename, "rb") as fp:
+        [file_magic, size] = struct.unpack("<4sI", fp.read(8))
+        if (file_magic != magic):
+            raise IOError(filename + " is not a frame metadata file")
+        description = json.loads(fp.read(size).decode())
+        dtype = makeDType(description["columns"])
+
+        # Ignore any partial record at the end of the file.
+        data = numpy.fromfile(fp, dtype = numpy.uint8)
+        n_records = data.size//dtype.itemsize
+        data = data[:n_records * dtype.itemsize].view(dtype)
+    return [data, description]
+
+def writeHeader(fp, description):
+    """
+    Write the header to a file opened in binary mode.
+    """
+    header = json.dumps(description).encode()
+    fp.write(struct.pack("<4sI", magic, len(header)))
+    fp.write(header)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""
+Client for HAL's frame tap (hal4000.frameTap.frameTap). The frame tap
+streams the frames from a camera or feed to other processes on the
+same computer so that they can do live analysis without reading the
+movie file.
+
+This is plain Python (no Qt) so that it can be used from any process.
+
+Protocol:
+ (1) The client connects and sends a request, a single line of JSON
+     with the fields:
+       "feed" - The name of the camera or feed, i.e. "camera1".
+       "decimate" - (Optional) Only send every Nth frame, default 1.
+       "roi" - (Optional) [x_start, y_start, x_end, y_end] in pixels,
+               the end is exclusive. Default is the whole frame.
+
+ (2) The server responds with a single line of JSON with the fields
+     "error" (None if the request was okay) and "feeds" (the names
+     of the feeds that can be tapped).
+
+ (3) If the request was okay the server then sends frames until the
+     connection is closed. Each frame is a fixed size binary header
+     (see HEADER) followed by the frame data as little-endian uint16
+     in (y, x) order.
+
+Frames are dropped (and counted in the header) if the client does
+not keep up with the camera.
+
+Hazen 10/26
+"""
+import json
+import numpy
+import socket
+import struct
+
+
+DEFAULT_PORT = 9010
+
+#
+# magic, frame number, frames dropped (total), roi x start, roi y start,
+# x pixels, y pixels, camera timestamp (NaN if not available), arrival time.
+#
+HEADER = struct.Struct("<4sqIIIIIdd")
+MAGIC = b"HFT1"
+
+
+class FrameTapException(Exception):
+    pass
+
+
+class TapFrame(object):
+    """
+    A single frame from the frame tap.
+    """
+    def __init__(self,
+                 arrival_time = None,
+                 frame_number = None,
+                 n_dropped = None,
+                 np_data = None,
+                 timestamp = None,
+                 x_start = None,
+                 y_start = None,
+                 **kwds):
+        super().__init__(**kwds)
+        self.arrival_time = arrival_time
+        self.frame_number = frame_number
+        self.n_dropped = n_dropped
+        self.np_data = np_data
+        self.timestamp = timestamp
+        self.x_start = x_start
+        self.y_start = y_start
+
+    def getData(self):
+        """
+        Returns a (y_pixels, x_pixels) numpy.uint16 array.
+        """
+        return self.np_data
+
+
+def packHeader(frame_number, n_dropped, x_start, y_start, x_pixels, y_pixels, timestamp, arrival_time):
+    if timestamp is None:
+        timestamp = float("nan")
+    return HEADER.pack(MAGIC,
+                       frame_number,
+                       n_dropped,
+                       x_start,
+                       y_start,
+                       x_pixels,
+                       y_pixels,
+                       timestamp,
+                       arrival_time)
+
+
+class FrameTapClient(object):
+    """
+    Connects to the frame tap and returns frames, i.e.
+
+    with FrameTapClient(feed = "camera1", decimate = 2) as client:
+        for tap_frame in client:
+            ...
+    """
+    def __init__(self,
+                 decimate = 1,
+                 feed = "camera1",
+                 host = "127.0.0.1",
+                 port = DEFAULT_PORT,
+                 roi = None,
+                 timeout = None,
+                 **kwds):
+        super().__init__(**kwds)
+        self.feeds = None
+        self.socket = socket.create_connection((host, port), timeout = timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.socket.makefile("rb")
+
+        request = {"decimate" : decimate, "feed" : feed, "roi" : roi}
+        self.socket.sendall((json.dumps(request) + "\n").encode())
+
+        response = self.stream.readline()
+        if (len(response) == 0):
+            self.close()
+            raise FrameTapException("Frame tap closed the connection.")
+        response = json.loads(response.decode())
+        self.feeds = response["feeds"]
+        if response["error"] is not None:
+            self.close()
+            raise FrameTapException(response["error"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            tap_frame = self.getFrame()
+            if tap_frame is None:
+                return
+            yield tap_frame
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def getFeeds(self):
+        """
+        Returns the names of the feeds that the frame tap has.
+        """
+        return self.feeds
+
+    def getFrame(self):
+        """
+        Returns the next frame, or None if the frame tap closed the connection.
+        """
+        header = self.stream.read(HEADER.size)
+        if (len(header) < HEADER.size):
+            return None
+        [magic, frame_number, n_dropped, x_start, y_start, x_pixels, y_pixels, timestamp, arrival_time] = HEADER.unpack(header)
+        if (magic != MAGIC):
+            raise FrameTapException("Unexpected frame header " + str(magic))
+
+        # Read directly into the numpy array.
+        np_data = numpy.empty((y_pixels, x_pixels), dtype = "<u2")
+        if (self.stream.readinto(memoryview(np_data).cast("B")) < np_data.nbytes):
+            return None
+
+        return TapFrame(arrival_time = arrival_time,
+                        frame_number = frame_number,
+                        n_dropped = n_dropped,
+                        np_data = np_data,
+                        timestamp = timestamp,
+                        x_start = x_start,
+                        y_start = y_start)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2026 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -3,15 +3,14 @@
 This parses a log file series (i.e. log, log.1, log.2, etc..) and
 outputs timing and call frequency information for HAL messages.
 
+The message events are in the format described in halLib.halEvents,
+see also halLib.halProfiler for a live alternative to this.
+
 Hazen 5/18
 """
-from datetime import datetime
 import os
 
 
-pattern = '%Y-%m-%d %H:%M:%S,%f'
-
-
 class Message(object):
     """
     Storage for the timing of a single message.
@@ -26,12 +25,11 @@ class Message(object):
         self.queued_time = None
         self.source = source
         
-        self.temp = self.parseTime(time)
+        self.temp = time
         self.created(zero_time)
 
     def created(self, time):
-        t_time = self.parseTime(time)
-        self.created_time = (self.temp - t_time).total_seconds()
+        self.created_time = self.temp - time
 
     def handledBy(self, module_name):
         if module_name in self.handled_by:
@@ -92,17 +90,12 @@ class Message(object):
         """
         return (self.processing_time != None)
 
-    def parseTime(self, time):
-        return datetime.strptime(time, pattern)
-
     def processed(self, time):
-        t_time = self.parseTime(time)
-        self.processing_time = (t_time - self.temp).total_seconds()
+        self.processing_time = time - self.temp
         
     def sent(self, time):
-        t_time = self.parseTime(time)
-        self.queued_time = (t_time - self.temp).total_seconds()
-        self.temp = t_time
+        self.queued_time = time - self.temp
+        self.temp = time
 
 
 def getIterable(dict_or_list):
@@ -170,42 +163,47 @@ def logTiming(basename, ignore_incomplete = True):
         with open(fname) as fp:
             for line in fp:
 
+                #
+                # The events are logged in blocks, only the first line in
+                # a block has the logging prefix. Each event is 'time (ms),
+                # event, message id, source, message type, extra'.
+                #
+                command = line.split(":hal4000:INFO:")[-1].strip()
+                fields = command.split(",")
+                if (len(fields) < 5):
+                    continue
                 try:
-                    [time, command] = map(lambda x: x.strip(), line.split(":hal4000:INFO:"))
+                    time = 0.001 * float(fields[0])
                 except ValueError:
                     continue
+                [event, m_id, source, m_type] = fields[1:5]
 
                 if zero_time is None:
                     zero_time = time
 
                 # Message handled by.
-                if (command.startswith("handled by,")):
-                    [m_id, module_name, m_type] = command.split(",")[1:]
-                    if m_id in messages:
-                        messages[m_id].handledBy(module_name)
+                if (event == "handled by"):
+                    if (m_id in messages) and (len(fields) > 5):
+                        messages[m_id].handledBy(fields[5])
 
                 # Message queued.
-                elif (command.startswith("queued,")):
-                    [m_id, source, m_type] = command.split(",")[1:]
+                elif (event == "queued"):
                     messages[m_id] = Message(m_type = m_type,
                                              source = source,
                                              time = time,
                                              zero_time = zero_time)
                               
                 # Message sent.
-                elif (command.startswith("sent,")):
-                    m_id = command.split(",")[1]
+                elif (event == "sent"):
                     if m_id in messages:
                         messages[m_id].sent(time)
 
                 # Message processed.
-                elif (command.startswith("processed,")):
-                    m_id = command.split(",")[1]
+                elif (event == "processed"):
                     if m_id in messages:
                         messages[m_id].processed(time)
 
-                elif (command.startswith("worker done,")):
-                    m_id = command.split(",")[1]
+                elif (event == "worker done"):
                     if m_id in messages:
                         messages[m_id].incNWorkers()
 
@@ -3,33 +3,52 @@
 Handles parsing settings xml files and getting/setting 
 the resulting settings.
 
+Parsed files are cached (keyed by a hash of the file contents) so
+loading the same file again only costs a copy, and copies share
+their (unchanged) sub-sections and Parameters with the original
+until they are modified (copy-on-write).
+
 Hazen 06/15
 """
 
 import copy
+import hashlib
 import os
+import threading
 import traceback
 import xml
 
+from collections import OrderedDict
 from xml.dom import minidom
 from xml.etree import ElementTree
 
 
+#
+# Parsed files, keyed by the type of file, a hash of the file contents
+# and whether or not the file was parsed recursively. The StormXMLObjects
+# in the cache are never returned directly, only copies of them.
+#
+parse_cache = OrderedDict()
+parse_cache_lock = threading.Lock()
+parse_cache_size = 32
+
+
 #
 # Functions.
 #
-def config(config_file):
+def clearCache():
     """
-    Parse a configuration file for a setup.
+    Remove all the parsed files from the cache.
     """
-    xml = ElementTree.parse(config_file).getroot()
-    if (xml.tag != "config"):
-        raise ParametersException(config_file + " is not a configuration file.")
+    with parse_cache_lock:
+        parse_cache.clear()
 
-    # Create the configuration object.
-    config = StormXMLObject(nodes = xml, recurse = True)
 
-    return config
+def config(config_file):
+    """
+    Parse a configuration file for a setup.
+    """
+    return parseFile(config_file, "config", True)
 
 
 def copyParameters(original_parameters, new_parameters):
@@ -107,49 +126,72 @@ def copyParametersReplace(root, original, new):
     from new, if new has a corresponding value. The idea is that
     the new parameters only need to specify what is different.
 
+    Only the parameters whose values actually change are set, so
+    the parts of original that new does not change remain shared
+    with the object that original was copied from.
+
     Note: This no longer supports flat parameter trees for new.
     """
-    for attr in original.getAttrs():
-
-        prop = original.get(attr)
+    if (len(root) > 0):
+        try:
+            [section, key] = new.lookup(root)
+        except ParametersExceptionGet:
+            return
+        new = section.parameters[key]
+        if not isinstance(new, StormXMLObject):
+            return
 
-        # Recurse if this a branch.
-        if isinstance(prop, StormXMLObject):
-            if (len(root) > 0):
-                copyParametersReplace(root + "." + attr, prop, new)
-            else:
-                copyParametersReplace(attr, prop, new)
+    changes = []
+    
+    def replaceRecurse(prefix, p1, p2):
+        for attr, prop in p1.parameters.items():
+            new_prop = p2.parameters.get(attr)
+            if new_prop is None or new_prop is prop:
+                continue
+            if isinstance(prop, StormXMLObject):
+                if isinstance(new_prop, StormXMLObject):
+                    replaceRecurse(prefix + attr + ".", prop, new_prop)
+            elif not isinstance(new_prop, StormXMLObject):
+                value = new_prop.getv()
+                if not isEqual(prop.getv(), value):
+                    if not isImmutable(value):
+                        value = copy.deepcopy(value)
+                    changes.append([prefix + attr, value])
 
-        # Otherwise check for the corresponding node in new.
-        else:
-            attr_fullname = attr
-            if (len(root) > 0):
-                attr_fullname = root + "." + attr
-            if new.has(attr_fullname):
-                original.set(attr, new.get(attr_fullname))
+    replaceRecurse("", original, new)
+    for [pname, value] in changes:
+        original.set(pname, value)
 
 
 def difference(params1, params2):
     """
     Return which parameters in params1 are different / don't 
     exist in params2.
+
+    Sub-sections and Parameters that params1 and params2 share
+    (because one is a copy of the other) are not checked.
     """
     differences = []
     
     def diffRecurse(root, p1, p2):
-        for attr in p1.getAttrs():
-            prop = p1.get(attr)
-
+        for attr, prop in p1.parameters.items():
+            if not attr in p2.parameters:
+                differences.append(root + attr)
+                continue
+
+            prop2 = p2.parameters[attr]
+            if prop is prop2:
+                continue
+            
             if isinstance(prop, StormXMLObject):
-                if p2.has(attr):
-                    diffRecurse(root + attr + ".", prop, p2.get(attr))
+                if isinstance(prop2, StormXMLObject):
+                    diffRecurse(root + attr + ".", prop, prop2)
                 else:
                     differences.append(root + attr)
-            else:
-                if not p2.has(attr):
-                    differences.append(root + attr)
-                elif (prop != p2.get(attr)):
-                    differences.append(root + attr)
+            elif isinstance(prop2, StormXMLObject):
+                differences.append(root + attr)
+            elif (prop.getv() != prop2.getv()):
+                differences.append(root + attr)
 
     diffRecurse("", params1, params2)
     return differences
@@ -190,22 +232,70 @@ def halParameters(parameters_file):
     return xml_object
 
 
+def isImmutable(value):
+    """
+    Returns True if value is a type that cannot be modified.
+    """
+    return (value is None) or isinstance(value, (bool, float, int, str))
+
+
+def isEqual(value1, value2):
+    """
+    Returns True if value1 and value2 have the same type and value.
+    """
+    if (type(value1) != type(value2)):
+        return False
+    try:
+        return bool(value1 == value2)
+    except ValueError:
+        # Comparing numpy arrays (for example) does not return a bool.
+        return False
+
+
 def parameters(parameters_file, recurse = False, add_filename_param = True):
     """
     Parses a parameters file to create a parameters object.
     """
-    xml = ElementTree.parse(parameters_file).getroot()
-    if (xml.tag != "settings"):
-        raise ParametersException(parameters_file + " is not a setting file.")
-
-    # Create XML object.
-    xml_object = StormXMLObject(xml, recurse)
+    xml_object = parseFile(parameters_file, "settings", recurse)
     if add_filename_param:
         xml_object.set("parameters_file", parameters_file)
     
     return xml_object
 
 
+def parseFile(xml_file, tag, recurse):
+    """
+    Returns a copy of the (cached) StormXMLObject for xml_file.
+
+    The copy is made while holding parse_cache_lock as copy() modifies
+    the object that is being copied. After the first copy the cached
+    object and it's sub-sections are shared with every copy and are
+    not modified again.
+    """
+    with open(xml_file, "rb") as fp:
+        data = fp.read()
+    key = (tag, hashlib.sha1(data).hexdigest(), recurse)
+
+    with parse_cache_lock:
+        if key in parse_cache:
+            parse_cache.move_to_end(key)
+            return parse_cache[key].copy()
+
+    xml = ElementTree.fromstring(data)
+    if (xml.tag != tag):
+        if (tag == "config"):
+            raise ParametersException(xml_file + " is not a configuration file.")
+        else:
+            raise ParametersException(xml_file + " is not a setting file.")
+    xml_object = StormXMLObject(nodes = xml, recurse = recurse)
+
+    with parse_cache_lock:
+        parse_cache[key] = xml_object
+        while (len(parse_cache) > parse_cache_size):
+            parse_cache.popitem(last = False)
+        return xml_object.copy()
+
+
 #
 # Classes.
 # 
@@ -527,12 +617,35 @@ class StormXMLObject(object):
     A collection of Parameters objects that are (usually) created 
     dynamically by parsing an XML file. All parameter names must 
     be unique for each section.
+
+    Copies are copy-on-write. A copy shares the sub-sections and
+    Parameters of the original, the first time a shared value is
+    modified, or a reference to it is returned (by getp() for
+    example), it is replaced with a private copy. Values that a
+    reference was already returned for are copied immediately
+    by copy() as they could be changed without us knowing.
+
+    self.owned - The names of the values that are not shared.
+    self.exposed - The names of the values that a reference was
+                   returned for, these are always in self.owned.
+    self.index - Dotted names (i.e. 'a.b.c') and the section 
+                 that contains them, so that we don't have to
+                 walk the tree every time.
+    self.version - This changes whenever a sub-section of this object
+                   is replaced or removed, or this object is copied.
+                   The index entries record the versions of all the
+                   sections on the path to the name so that we can
+                   check whether they are still valid.
     """
     def __init__(self, nodes = None, recurse = False, validate = True, **kwds):
         super().__init__(**kwds)
 
         self._validate_ = validate
+        self.exposed = set()
+        self.index = {}
+        self.owned = set()
         self.parameters = {}
+        self.version = 0
 
         if nodes is None:
             return
@@ -633,10 +746,14 @@ class StormXMLObject(object):
             # This handles sub-nodes.
             elif recurse and (len(node) > 0):
                 self.parameters[node.tag] = StormXMLObject(node, True)
+                self.owned.add(node.tag)
 
             # If we were able to make a parameter object add it to the record.
             if param is not None:
-                self.addParameter(node.tag, param)
+                if node.tag in self.parameters:
+                    raise ParametersException("Parameter " + node.tag + " already exists.")
+                self.parameters[node.tag] = param
+                self.owned.add(node.tag)
 
     def add(self, pname, pvalue = None):
         """
@@ -655,11 +772,9 @@ class StormXMLObject(object):
 
         pnames = pname.split(".")
         if (len(pnames) > 1):
-            try:
-                prop = self.get(pnames[0])
-            except ParametersExceptionGet:
+            if not pnames[0] in self.parameters:
                 self.addSubSection(pnames[0])
-            prop = self.get(pnames[0])
+            prop = self.ownValue(pnames[0], True)
             prop.add(".".join(pnames[1:]), pvalue)
         else:
             self.addParameter(pname, pvalue)
@@ -673,8 +788,10 @@ class StormXMLObject(object):
         else:
             if isinstance(pvalue, Parameter):
                 self.parameters[pname] = pvalue
+                self.exposed.add(pname)
             else:
                 self.parameters[pname] = ParameterSimple(pname, pvalue)
+            self.owned.add(pname)
 
     def addSubSection(self, sname, svalue = None, overwrite = False):
         """
@@ -689,9 +806,9 @@ class StormXMLObject(object):
         snames = sname.split(".")
         if (len(snames) > 1):
             if not snames[0] in self.parameters:
-                cur_section = self.parameters[snames[0]] = StormXMLObject()
-            else:
-                cur_section = self.parameters[snames[0]]
+                self.parameters[snames[0]] = StormXMLObject()
+                self.owned.add(snames[0])
+            cur_section = self.ownValue(snames[0], True)
             return cur_section.addSubSection(".".join(snames[1:]),
                                              svalue = svalue,
                                              overwrite = overwrite)
@@ -706,24 +823,45 @@ class StormXMLObject(object):
                     raise ParametersException("Section " + sname + " already exists")
                 if isinstance(svalue, StormXMLObject):
                     self.parameters[sname] = svalue
+                    self.version += 1
                 else:
                     raise ParametersException("Object is a " + type(svalue) + " not a StormXMLObject")
 
+            self.owned.add(sname)
+            self.exposed.add(sname)
             return self.parameters[sname]
 
     def copy(self):
-        return copy.deepcopy(self)
+        """
+        Returns a (copy-on-write) copy of this object.
+        """
+        new_object = StormXMLObject(validate = self._validate_)
+        new_object.parameters = self.parameters.copy()
+        for key in self.exposed:
+            new_object.parameters[key] = self.parameters[key].copy()
+        new_object.owned = self.exposed.copy()
+
+        # Everything that is not exposed is now shared with new_object. If
+        # this was already the case (i.e. this object is only shared) then
+        # nothing changes, so shared objects are not modified by copies.
+        if (self.owned != self.exposed):
+            self.owned = self.exposed.copy()
+            self.version += 1
+        return new_object
 
     def delete(self, name):
         """
         Remove a sub-section or parameter (if it exists).
         """
-        if self.has(name):
-            names = name.split(".")
-            if (len(names) > 1):
-                self.get(".".join(names[:-1])).delete(names[-1])
-            else:
-                del self.parameters[name]
+        try:
+            [section, key] = self.lookup(name, own = True)
+        except ParametersExceptionGet:
+            return
+        
+        del section.parameters[key]
+        section.exposed.discard(key)
+        section.owned.discard(key)
+        section.version += 1
 
     def get(self, pname, default = None):
         """
@@ -731,13 +869,23 @@ class StormXMLObject(object):
         the corresponding StormXMLObject.
         """
         try:
-            prop = self.getp(pname)
+            [section, key] = self.lookup(pname)
         except ParametersException:
             if default is not None:
                 return default
             else:
                 raise ParametersExceptionGet("Requested property " + pname + " not found and no default was specified.")
         else:
+            prop = section.parameters[key]
+            if not isinstance(prop, StormXMLObject):
+                value = prop.getv()
+
+                # Values that can't be modified can be returned without
+                # making a private copy of the Parameter.
+                if isImmutable(value):
+                    return value
+
+            prop = self.getp(pname)
             if isinstance(prop, StormXMLObject):
                 return prop
             else:
@@ -759,22 +907,15 @@ class StormXMLObject(object):
         """
         Return the property specified by pname.
         """
-        # Check for sub-property.
-        pnames = pname.split(".")
-        if (len(pnames) > 1):
-            xml_object = self.getp(pnames[0])
-            #print pnames, type(xml_object)
-            return xml_object.getp(".".join(pnames[1:]))
-
-        if pname in self.parameters:
-            return self.parameters[pname]
-        else:
-            raise ParametersExceptionGet("Requested property " + pname + " not found")
+        [section, key] = self.lookup(pname, own = True, expose = True)
+        return section.ownValue(key, True)
 
     def getProps(self):
         """
         Return all the properties.
         """
+        for key in self.parameters:
+            self.ownValue(key, True)
         return self.parameters.values()
 
     def getSortedAttrs(self):
@@ -789,11 +930,85 @@ class StormXMLObject(object):
         Return true if this object has a particular Parameter.
         """
         try:
-            prop = self.getp(pname)
+            self.lookup(pname)
         except ParametersExceptionGet:
             return False
         return True
 
+    def lookup(self, pname, own = False, expose = False):
+        """
+        Returns [section, key] for pname where section is the
+        StormXMLObject that contains pname.
+
+        own - Replace any shared sections on the path to pname with
+              private copies, this is necessary to modify pname.
+        expose - Also mark the sections on the path as exposed, this
+                 is necessary to return a reference to pname.
+        """
+        if not "." in pname:
+            if pname in self.parameters:
+                return [self, pname]
+            raise ParametersExceptionGet("Requested property " + pname + " not found")
+
+        level = 0
+        if expose:
+            level = 2
+        elif own:
+            level = 1
+
+        # Check the index.
+        entry = self.index.get(pname)
+        if entry is not None and (entry[2] >= level):
+            for [path_section, version] in entry[3]:
+                if (path_section.version != version):
+                    break
+            else:
+                return [entry[0], entry[1]]
+
+        # Walk the tree.
+        path = []
+        pnames = pname.split(".")
+        section = self
+        for key in pnames[:-1]:
+            if not key in section.parameters:
+                raise ParametersExceptionGet("Requested property " + pname + " not found")
+            if own or expose:
+                next_section = section.ownValue(key, expose)
+            else:
+                next_section = section.parameters[key]
+            path.append([section, section.version])
+            section = next_section
+            if not isinstance(section, StormXMLObject):
+                raise ParametersExceptionGet("Requested property " + pname + " not found")
+                
+        key = pnames[-1]
+        if not key in section.parameters:
+            raise ParametersExceptionGet("Requested property " + pname + " not found")
+        path.append([section, section.version])
+
+        # Update the index.
+        self.index[pname] = [section, key, level, path]
+            
+        return [section, key]
+
+    def ownValue(self, key, expose):
+        """
+        Returns the value of key, first replacing it with a private
+        copy if it is shared with other StormXMLObjects.
+
+        expose - The caller will return a reference to the value.
+        """
+        value = self.parameters[key]
+        if not key in self.owned:
+            value = value.copy()
+            self.parameters[key] = value
+            self.owned.add(key)
+            if isinstance(value, StormXMLObject):
+                self.version += 1
+        if expose:
+            self.exposed.add(key)
+        return value
+
     def saveToFile(self, filename, all_params = False):
         """
         Save the Parameters as XML in a file.
@@ -819,13 +1034,15 @@ class StormXMLObject(object):
         # If the parameter does not already exist a ParameterSimple
         # is created to hold the value of the parameter.
         try:
-            temp = self.getp(pname)
+            [section, key] = self.lookup(pname, own = True)
+        except ParametersExceptionGet:
+            self.add(pname, pvalue)
+        else:
+            temp = section.ownValue(key, False)
             if isinstance(pvalue, Parameter):
                 temp.setv(pvalue.getv())
             else:
                 temp.setv(pvalue)
-        except ParametersExceptionGet:
-            self.add(pname, pvalue)
 
     def setv(self, pname, value):
         """
@@ -845,7 +1062,8 @@ class StormXMLObject(object):
                 raise ParametersException(msg)
             return
 
-        self.getp(pname).setv(value)
+        [section, key] = self.lookup(pname, own = True)
+        section.ownValue(key, False).setv(value)
 
     def toString(self, all_params = False):
         """
@@ -888,8 +1106,6 @@ if (__name__ == "__main__"):
 
     import sys
 
-    from xml.dom import minidom
-
     if True:
         p1 = halParameters(sys.argv[1])
         p2 = halParameters(sys.argv[2])
@@ -56,22 +56,28 @@ class TCPCommunicationsMixin(object):
 
     def handleReadyRead(self):
         """
-        Create TCP message class from JSON message and forward as appropriate
+        Create TCP message class from JSON message and forward as appropriate.
+
+        Each message is a single line, there could be more than one message
+        available if the other side sent several messages without waiting
+        for a response. Incomplete lines stay in the socket buffer until the
+        rest of the line arrives.
         """
-        message_str = ""
         while self.socket.canReadLine():
             # Read data line
-            message_str += str(self.socket.readLine(), self.encoding)
+            message_str = str(self.socket.readLine(), self.encoding)
+            if (len(message_str.strip()) == 0):
+                continue
 
-        # Create message.
-        message = TCPMessage.fromJSON(message_str)
-        if self.verbose:
-            print("Received: \n" + str(message))
+            # Create message.
+            message = TCPMessage.fromJSON(message_str)
+            if self.verbose:
+                print("Received: \n" + str(message))
 
-        if (message.getType() == "Busy"):
-            self.handleBusy()
-        else:
-            self.messageReceived.emit(message)
+            if (message.getType() == "Busy"):
+                self.handleBusy()
+            else:
+                self.messageReceived.emit(message)
     
     def isConnected(self):
         """
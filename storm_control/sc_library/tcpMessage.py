@@ -13,6 +13,28 @@ import copy
 import json
 
 
+def batchMessage(messages, depends_on = None, test_mode = False):
+    """
+    Creates a 'Batch' message from a list of TCPMessages. The messages
+    are handled in order, and a single response is returned when they
+    have all been handled.
+
+    depends_on - (Optional) A list with an entry for each message, each
+                 entry is a list of the indices of the (earlier) messages
+                 that must succeed for this message to be handled. If
+                 one of them fails the message is skipped.
+    """
+    commands = []
+    for i, message in enumerate(messages):
+        command = message.toDict()
+        if depends_on is not None:
+            command["depends_on"] = depends_on[i]
+        commands.append(command)
+    return TCPMessage(message_type = "Batch",
+                      message_data = {"commands" : commands},
+                      test_mode = test_mode)
+
+
 class TCPMessage(object):
     """
     Contains the contents and status of a TCP message.
@@ -52,14 +74,21 @@ class TCPMessage(object):
         self.response[key_name] = value
 
     @staticmethod
-    def fromJSON(json_string):
+    def fromDict(message_dict):
         """
-        Creates a Message from a JSON string.
+        Creates a Message from a dictionary.
         """
         message = TCPMessage(message_type = True)
-        message.__dict__.update(json.loads(json_string))
+        message.__dict__.update(message_dict)
         return message
 
+    @staticmethod
+    def fromJSON(json_string):
+        """
+        Creates a Message from a JSON string.
+        """
+        return TCPMessage.fromDict(json.loads(json_string))
+
     def getData(self, key_name, default = None):
         """
         Access elements of the message data by name.
@@ -136,6 +165,12 @@ class TCPMessage(object):
         """
         self.test_mode = test_boolean
 
+    def toDict(self):
+        """
+        Return a (JSON serializable) dictionary version of the message.
+        """
+        return json.loads(self.toJSON())
+
     def toJSON(self):
         """
         Serialize using JSON.
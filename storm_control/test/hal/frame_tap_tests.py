@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+import threading
+
+import storm_control.sc_library.frameTapClient as frameTapClient
+
+import storm_control.hal4000.testing.testActions as testActions
+import storm_control.hal4000.testing.testing as testing
+
+
+class TapFrames(testActions.TestAction):
+    """
+    Read frames from the frame tap (in another thread).
+    """
+    def __init__(self, decimate = 1, feed = None, n_frames = None, roi = None, **kwds):
+        super().__init__(**kwds)
+        self.decimate = decimate
+        self.feed = feed
+        self.n_frames = n_frames
+        self.roi = roi
+        self.tap_frames = []
+        self.thread = None
+
+    def checkFrames(self, tap_frames):
+        """
+        Sub-class this to check the frames.
+        """
+        pass
+
+    def handleActionTimer(self):
+        if self.thread.is_alive():
+            self.startActionTimer(50)
+        else:
+            self.checkFrames(self.tap_frames)
+            self.actionDone.emit()
+            
+    def readFrames(self):
+        with frameTapClient.FrameTapClient(decimate = self.decimate,
+                                           feed = self.feed,
+                                           roi = self.roi,
+                                           timeout = 5.0) as client:
+            for tap_frame in client:
+                self.tap_frames.append(tap_frame)
+                if (len(self.tap_frames) == self.n_frames):
+                    break
+
+    def start(self):
+        self.thread = threading.Thread(target = self.readFrames)
+        self.thread.start()
+        self.startActionTimer(50)
+
+
+class ReadRing(testActions.TestAction):
+    """
+    Read frames from a shared memory ring buffer.
+    """
+    def __init__(self, n_frames = None, ring_name = None, **kwds):
+        super().__init__(**kwds)
+        self.n_frames = n_frames
+        self.reader = None
+        self.ring_frames = []
+        self.ring_name = ring_name
+
+    def checkFrames(self, ring_frames):
+        """
+        Sub-class this to check the frames.
+        """
+        pass
+
+    def handleActionTimer(self):
+        self.ring_frames.extend(self.reader.getFrames(copy = True))
+        if (len(self.ring_frames) < self.n_frames):
+            self.startActionTimer(50)
+        else:
+            self.checkFrames(self.ring_frames)
+            self.reader.close()
+            self.actionDone.emit()
+
+    def start(self):
+        import storm_control.hal4000.camera.frameRing as frameRing
+        self.reader = frameRing.FrameRingReader(name = self.ring_name)
+        self.startActionTimer(50)
+
+        
+#
+# Test reading a part of every other frame.
+#
+class TapFramesAction1(TapFrames):
+
+    def checkFrames(self, tap_frames):
+        assert (len(tap_frames) == self.n_frames)
+        for tap_frame in tap_frames:
+            assert (tap_frame.getData().shape == (32, 64))
+            assert (tap_frame.x_start == 16)
+        frame_numbers = [x.frame_number for x in tap_frames]
+        assert (frame_numbers == sorted(frame_numbers))
+
+class FrameTap1(testing.Testing):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [testActions.SetLiveMode(live_mode = True),
+                             TapFramesAction1(decimate = 2,
+                                              feed = "camera1",
+                                              n_frames = 5,
+                                              roi = [16, 0, 80, 32]),
+                             testActions.SetLiveMode(live_mode = False)]
+
+#
+# Test reading frames from shared memory.
+#
+class ReadRingAction1(ReadRing):
+
+    def checkFrames(self, ring_frames):
+        frame_numbers = [x.frame_number for x in ring_frames]
+        assert (frame_numbers == list(range(frame_numbers[0], frame_numbers[0] + len(frame_numbers))))
+        for ring_frame in ring_frames:
+            assert (ring_frame.getData().size == 512*512)
+            assert (ring_frame.which_camera == "camera1")
+
+class FrameTap2(testing.Testing):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [testActions.SetLiveMode(live_mode = True),
+                             ReadRingAction1(n_frames = 10,
+                                             ring_name = "hal_frames_camera1"),
+                             testActions.SetLiveMode(live_mode = False)]
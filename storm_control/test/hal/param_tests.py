@@ -111,3 +111,59 @@ class ParamTest5(testing.Testing):
         self.test_actions = [testActions.LoadParameters(filename = test.halXmlFilePathAndName(fname + ".xml")),
                              testActions.LoadParameters(filename = test.halXmlFilePathAndName(fname + ".xml")),
                              ParamTest5Action(p_name = fname)]
+
+#
+# Check that only the sections that changed are in the 'new parameters'
+# changes, so that the camera is not re-configured.
+#
+class ParamTest6Action(testActions.SetParameters):
+
+    def getMessageFilter(self):
+        return "new parameters"
+
+    def handleMessage(self, message):
+        changes = message.getData()["changes"]
+        assert ("display00" in changes)
+        assert not ("camera1" in changes)
+        assert (sorted(changes["display00"]) == ["camera1.display_max", "camera1.display_min"])
+        self.actionDone.emit()
+
+class ParamTest6(testing.Testing):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        fname1 = "256x512"
+        fname2 = "256x512_display"
+        self.test_actions = [testActions.LoadParameters(filename = test.halXmlFilePathAndName(fname1 + ".xml")),
+                             testActions.LoadParameters(filename = test.halXmlFilePathAndName(fname2 + ".xml")),
+                             testActions.SetParameters(p_name = fname1),
+                             ParamTest6Action(p_name = fname2),
+                             testActions.Timer(timeout = 1000)]
+
+#
+# Check that removing a feed is a change to the 'feeds' section.
+#
+class ParamTest7Action(testActions.SetParameters):
+
+    def getMessageFilter(self):
+        return "new parameters"
+
+    def handleMessage(self, message):
+        changes = message.getData()["changes"]
+        assert ("feeds" in changes)
+        assert ("slice2" in changes["feeds"])
+        self.actionDone.emit()
+
+class ParamTest7(testing.Testing):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        fname1 = "feed_test_2"
+        fname2 = "feed_test"
+        self.test_actions = [testActions.LoadParameters(filename = test.halXmlFilePathAndName(fname1 + ".xml")),
+                             testActions.LoadParameters(filename = test.halXmlFilePathAndName(fname2 + ".xml")),
+                             testActions.SetParameters(p_name = fname1),
+                             ParamTest7Action(p_name = fname2),
+                             testActions.Timer(timeout = 1000)]
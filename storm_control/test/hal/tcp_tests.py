@@ -4,6 +4,7 @@ import os
 import storm_analysis.sa_library.datareader as datareader
 
 import storm_control.sc_library.halExceptions as halExceptions
+import storm_control.sc_library.tcpMessage as tcpMessage
 
 import storm_control.hal4000.testing.testActions as testActions
 import storm_control.hal4000.testing.testActionsTCP as testActionsTCP
@@ -12,6 +13,104 @@ import storm_control.hal4000.testing.testing as testing
 import storm_control.test as test
 
 
+#
+# Test "Batch" message.
+#
+class BatchAction1(testActionsTCP.Batch):
+
+    def checkMessage(self, tcp_message):
+        assert tcp_message.hasError()
+        responses = tcp_message.getResponse("responses")
+        assert (len(responses) == 4)
+        assert (responses[0]["message_type"] == "Move Stage")
+        assert not responses[0]["error"]
+        assert responses[1]["error"]
+        assert not responses[2]["error"]
+        assert (responses[2]["response"]["stage_x"] == 10.0)
+        assert responses[3]["error"]
+        assert (responses[3]["error_message"].startswith("Skipped"))
+
+class Batch1(testing.TestingTCP):
+    """
+    Test a batch of messages, with a message that is skipped because
+    a message that it depends on failed.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        tcp_messages = [testActionsTCP.MoveStage(x = 10.0, y = 10.0).tcp_message,
+                        testActionsTCP.SetParameters(name_or_index = "256x512").tcp_message,
+                        testActionsTCP.GetStagePosition().tcp_message,
+                        testActionsTCP.TakeMovie(directory = test.dataDirectory(),
+                                                 length = 5,
+                                                 name = "movie_01").tcp_message]
+        self.test_actions = [BatchAction1(tcp_messages = tcp_messages,
+                                          depends_on = [[], [], [0], [1]])]
+
+class BatchAction2(testActionsTCP.Batch):
+
+    def checkMessage(self, tcp_message):
+        assert tcp_message.hasError()
+        assert (tcp_message.getResponse("responses") is None)
+
+class Batch2(testing.TestingTCP):
+    """
+    Test that batches with invalid dependencies are rejected.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        tcp_messages = [testActionsTCP.MoveStage(x = 10.0, y = 10.0).tcp_message,
+                        testActionsTCP.GetStagePosition().tcp_message]
+        self.test_actions = [BatchAction2(tcp_messages = tcp_messages,
+                                          depends_on = [[], [5]]),
+                             BatchAction2(tcp_messages = tcp_messages,
+                                          depends_on = [[], [1]]),
+                             BatchAction2(tcp_messages = tcp_messages,
+                                          depends_on = [[1], []]),
+                             BatchAction2(tcp_messages = tcp_messages,
+                                          depends_on = [[], [-1]]),
+                             BatchAction2(tcp_messages = tcp_messages,
+                                          depends_on = [[], ["0"]])]
+
+class Batch3(testing.TestingTCP):
+    """
+    Test that nested batches are rejected.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        inner = testActionsTCP.Batch(tcp_messages = [testActionsTCP.GetStagePosition().tcp_message])
+        tcp_messages = [testActionsTCP.MoveStage(x = 10.0, y = 10.0).tcp_message,
+                        inner.tcp_message]
+        self.test_actions = [BatchAction2(tcp_messages = tcp_messages)]
+
+class BatchAction4(testActionsTCP.TestActionTCP):
+
+    def __init__(self, commands = None, **kwds):
+        super().__init__(**kwds)
+        self.tcp_message = tcpMessage.TCPMessage(message_type = "Batch",
+                                                 message_data = {"commands" : commands},
+                                                 test_mode = self.test_mode)
+
+    def checkMessage(self, tcp_message):
+        assert tcp_message.hasError()
+        assert (tcp_message.getResponse("responses") is None)
+
+class Batch4(testing.TestingTCP):
+    """
+    Test that batches whose commands are not a list of messages are rejected.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        move_stage = testActionsTCP.MoveStage(x = 10.0, y = 10.0).tcp_message.toDict()
+        self.test_actions = [BatchAction4(commands = "Move Stage"),
+                             BatchAction4(commands = move_stage),
+                             BatchAction4(commands = [move_stage, "Move Stage"]),
+                             BatchAction4(commands = [move_stage, [["x", 10.0]]])]
+
+
 #
 # Test "Check Focus Lock" message.
 #
@@ -158,6 +257,33 @@ class CheckFocusLock7(testing.TestingTCP):
                              CheckFocusLockAction1(focus_scan = False,
                                                    num_focus_checks = 6)]
 
+class CheckFocusLockAction4(testActionsTCP.CheckFocusLock):
+
+    def checkMessage(self, tcp_message):
+        assert(tcp_message.getResponse("focus_status"))
+        stats = tcp_message.getResponse("lock_statistics")
+        assert(stats["n_locked"] > 0)
+        assert(stats["lock_losses"] == 0)
+        assert(stats["rms_error"] < 20.0)
+
+class CheckFocusLock8(testing.TestingTCP):
+    """
+    Check that the focus lock returns the lock statistics.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [testActions.ShowGUIControl(control_name = "focus lock"),
+                             testActions.Timer(100),
+                             SetFocusLockModeAction1(mode_name = "Always On",
+                                                     locked = True),
+                             testActions.Timer(100),
+                             CheckFocusLockAction1(focus_scan = False,
+                                                   num_focus_checks = 6),
+                             testActions.Timer(500),
+                             CheckFocusLockAction4(focus_scan = False,
+                                                   num_focus_checks = 6)]
+
 
 #
 # Test "Find Sum" message.
@@ -238,6 +364,83 @@ class FindSum4(testing.TestingTCP):
                                             test_mode = True)]
 
 
+#
+# Test "Get Frame Statistics" message.
+#
+class GetFrameStatisticsAction1(testActionsTCP.GetFrameStatistics):
+
+    def checkMessage(self, tcp_message):
+        stats = tcp_message.getResponse("statistics")
+        assert not stats["enabled"]
+
+class GetFrameStatisticsAction2(testActionsTCP.GetFrameStatistics):
+
+    def checkMessage(self, tcp_message):
+        stats = tcp_message.getResponse("statistics")
+        assert stats["enabled"]
+        camera1 = stats["sources"]["camera1"]
+        assert (camera1["stages"]["delivered"]["frames"] > 0)
+        assert (sum(camera1["stages"]["delivered"]["histogram"]) == camera1["stages"]["delivered"]["frames"])
+        assert (camera1["fps"] > 0.0)
+
+class GetFrameStatistics1(testing.TestingTCP):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [GetFrameStatisticsAction1(enable = True, reset = True),
+                             testActions.SetLiveMode(live_mode = True),
+                             testActions.Timer(500),
+                             GetFrameStatisticsAction2()]
+
+class GetFrameStatisticsAction3(testActionsTCP.GetFrameStatistics):
+
+    def checkMessage(self, tcp_message):
+        assert not tcp_message.hasError()
+
+class GetFrameStatistics2(testing.TestingTCP):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [GetFrameStatisticsAction3(test_mode = True)]
+
+
+#
+# Test "Get Message Events" message.
+#
+class GetMessageEventsAction1(testActionsTCP.GetMessageEvents):
+
+    def checkMessage(self, tcp_message):
+        events = tcp_message.getResponse("events")
+        assert (len(events) == 20)
+        assert ("sent" in [event["event"] for event in events])
+        for event in events:
+            for key in ["event", "extra", "id", "source", "time", "type"]:
+                assert key in event
+
+class GetMessageEvents1(testing.TestingTCP):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [testActions.SetLiveMode(live_mode = True),
+                             testActions.Timer(100),
+                             GetMessageEventsAction1(n_events = 20, verbosity = 1)]
+
+class GetMessageEventsAction2(testActionsTCP.GetMessageEvents):
+
+    def checkMessage(self, tcp_message):
+        assert not tcp_message.hasError()
+
+class GetMessageEvents2(testing.TestingTCP):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [GetMessageEventsAction2(test_mode = True)]
+
+        
 #
 # Test "Get Mosaic Settings" message.
 #
@@ -379,6 +582,33 @@ class NoSuchMessage1(testing.TestingTCP):
         self.test_actions = [NoSuchMessageAction1()]
 #                             test_mode = True]
 
+#
+# Test sending messages without waiting for the responses.
+#
+class PipelineAction1(testActionsTCP.Pipeline):
+
+    def checkResponses(self, responses):
+        assert ([x.getID() for x in responses] == [x.getID() for x in self.tcp_messages])
+        assert not responses[0].hasError()
+        assert (responses[1].getResponse("stage_x") == 10.0)
+        assert (responses[2].getResponse("duration") == 1)
+        assert responses[3].hasError()
+
+class Pipeline1(testing.TestingTCP):
+    """
+    Test that messages are handled in order when the client does not 
+    wait for the response to a message before sending the next message.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        tcp_messages = [testActionsTCP.MoveStage(x = 10.0, y = 10.0).tcp_message,
+                        testActionsTCP.GetStagePosition().tcp_message,
+                        testActionsTCP.MoveStage(test_mode = True, x = 0.0, y = 0.0).tcp_message,
+                        testActionsTCP.NoSuchMessage().tcp_message]
+        self.test_actions = [PipelineAction1(tcp_messages = tcp_messages)]
+
+        
 #
 # Test "Set Focus Lock Mode" message.
 #
@@ -869,3 +1099,51 @@ class TakeMovie11(testing.TestingTCP):
                                                    length = 5,
                                                    name = filename)]
 
+
+
+#
+# Test "Tune Focus Lock" message.
+#
+class TuneFocusLockAction1(testActionsTCP.TuneFocusLock):
+
+    def checkMessage(self, tcp_message):
+        assert(tcp_message.getResponse("focus_status"))
+        assert(abs(tcp_message.getResponse("qpd_response") - 1.0) < 0.1)
+        assert(len(tcp_message.getResponse("step_response")) == 5 * self.tcp_message.getData("hold"))
+        
+class TuneFocusLock1(testing.TestingTCP):
+    """
+    Test that auto-tuning works and that the focus lock relocks
+    when it is done.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [testActions.ShowGUIControl(control_name = "focus lock"),
+                             testActions.Timer(100),
+                             SetFocusLockModeAction1(mode_name = "Always On",
+                                                     locked = True),
+                             testActions.Timer(100),
+                             TuneFocusLockAction1(hold = 5,
+                                                  step_size = 500.0),
+                             testActions.Timer(200),
+                             CheckFocusLockAction1(focus_scan = False,
+                                                   num_focus_checks = 6)]
+
+class TuneFocusLockAction2(testActionsTCP.TuneFocusLock):
+
+    def checkMessage(self, tcp_message):
+        assert (tcp_message.getResponse("duration") is not None)
+        
+class TuneFocusLock2(testing.TestingTCP):
+    """
+    Test that we get a 'duration' response in test mode.
+    """
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+
+        self.test_actions = [testActions.ShowGUIControl(control_name = "focus lock"),
+                             testActions.Timer(100),
+                             SetFocusLockModeAction1(mode_name = "Always On",
+                                                     locked = True),
+                             TuneFocusLockAction2(test_mode = True)]
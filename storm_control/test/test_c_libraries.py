@@ -37,6 +37,42 @@ def testCImageManipulation():
             assert(numpy.allclose(c_nim, py_nim, atol = 1.1))
 
 
+def testCImageManipulationDecimate():
+    import storm_control.hal4000.halLib.c_image_manipulation_c as cIM
+
+    # This image is large enough that it will be split up between threads.
+    nim = numpy.random.randint(200, size = (1031,1024)).astype(numpy.uint16)
+
+    for decimate in [1, 2, 3]:
+        for ori in [[False, False, False], [True, False, True], [False, True, True]]:
+            [flip_h, flip_v, transpose] = ori
+            [c_nim, c_image_min, c_image_max] = cIM.rescaleImage(nim, flip_h, flip_v, transpose, [10, 100], None, decimate = decimate)
+            [py_nim, py_image_min, py_image_max] = cIM.rescaleImage(nim, flip_h, flip_v, transpose, [10, 100], None, True, decimate = decimate)
+
+            assert(c_nim.shape == py_nim.shape)
+            assert(c_image_min == py_image_min)
+            assert(c_image_max == py_image_max)
+            assert(numpy.allclose(c_nim.astype(numpy.int64), py_nim.astype(numpy.int64), atol = 1.1))
+
+
+def testCImageManipulationOp():
+    """
+    The functions that are used when the library has no look up table function.
+    """
+    import storm_control.hal4000.halLib.c_image_manipulation_c as cIM
+
+    nim = numpy.random.randint(200, size = (171,203)).astype(numpy.uint16)
+
+    for decimate in [1, 3]:
+        for ori in [[False, False, False], [True, False, True], [False, True, True]]:
+            [flip_h, flip_v, transpose] = ori
+            [c_nim, c_image_min, c_image_max] = cIM.rescaleImageOp(nim, flip_h, flip_v, transpose, [10, 100], 150, decimate = decimate)
+            [py_nim, py_image_min, py_image_max] = cIM.rescaleImage(nim, flip_h, flip_v, transpose, [10, 100], 150, True, decimate = decimate)
+
+            assert(c_nim.shape == py_nim.shape)
+            assert(numpy.allclose(c_nim.astype(numpy.int64), py_nim.astype(numpy.int64), atol = 1.1))
+
+
 
 def testFocusQuality():
     import storm_control.hal4000.camera.frame as frame
@@ -86,9 +122,46 @@ def testLMMoment():
     lof.cleanUp()
 
 
+def testLMMomentNumpy():
+    """
+    Check that the numpy version of LMMoment gives the same results.
+    """
+    import storm_control.hal4000.camera.frame as frame
+    import storm_control.hal4000.spotCounter.lmmObjectFinder as lof
+    import storm_control.hal4000.spotCounter.npObjectFinder as npof
+
+    lof.initialize()
+
+    image_x = 256
+    image_y = 128
+    rs = numpy.random.RandomState(0)
+    [yy, xx] = numpy.mgrid[0:image_y, 0:image_x]
+
+    frames = []
+    for i in range(3):
+        image = rs.poisson(100, size = (image_y, image_x)).astype(numpy.float64)
+        for j in range(100 * (i + 1)):
+            [x, y] = [rs.uniform(0, image_x), rs.uniform(0, image_y)]
+            image += rs.uniform(200, 2000) * numpy.exp(-((xx - x)**2 + (yy - y)**2)/4.5)
+        frames.append(frame.Frame(image.astype(numpy.uint16), i, image_x, image_y, "na"))
+
+    for threshold in [1, 250]:
+        results = npof.findObjectsStack(numpy.stack([x.getData() for x in frames]), image_x, image_y, threshold)
+        for a_frame, [x, y, n] in zip(frames, results):
+            [c_x, c_y, c_n] = lof.findObjects(a_frame, threshold)
+            assert(c_n > 0)
+            assert(n == c_n)
+            assert(numpy.array_equal(x, c_x))
+            assert(numpy.array_equal(y, c_y))
+
+    lof.cleanUp()
+
+
 if (__name__ == "__main__"):
     testCImageManipulation()
+    testCImageManipulationDecimate()
     testFocusQuality()
     testLMMoment()
+    testLMMomentNumpy()
     
     
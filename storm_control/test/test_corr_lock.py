@@ -36,7 +36,64 @@ def test_cl_1():
 
     cl_fit.cleanup()
 
+def test_cl_2():
+    """
+    Tracking mode, including finding the peak again after
+    it moves outside of the tracking window.
+    """
+    sigma = 2.0
+    cl_fit = clf.CorrLockFitter(roi_size = 8,
+                                sigma = sigma,
+                                threshold = 10,
+                                tracking = True)
+    im_size = (50, 200)
+
+    tx = 0.5 * im_size[0]
+    for ty in [80.0, 80.7, 81.9, 82.4, 150.3, 149.2]:
+        image = dg.drawGaussiansXY(im_size,
+                                   numpy.array([tx]),
+                                   numpy.array([ty]),
+                                   sigma = sigma,
+                                   height = 50.0)
+
+        [mx, my, success] = cl_fit.findFitPeak(image)
+        assert success
+        assert (numpy.abs(mx-tx) < 1.0e-2)
+        assert (numpy.abs(my-ty) < 1.0e-2)
+
+    cl_fit.cleanup()
+
+def test_cl_3():
+    """
+    Tracking mode with an image that is smaller than the tracking
+    window in one direction.
+    """
+    sigma = 2.0
+    cl_fit = clf.CorrLockFitter(roi_size = 8,
+                                sigma = sigma,
+                                threshold = 10,
+                                tracking = True)
+    im_size = (24, 200)
+
+    tx = 0.5 * im_size[0]
+    for ty in [80.0, 80.7, 81.9, 150.3]:
+        image = dg.drawGaussiansXY(im_size,
+                                   numpy.array([tx]),
+                                   numpy.array([ty]),
+                                   sigma = sigma,
+                                   height = 50.0)
+
+        [mx, my, success] = cl_fit.findFitPeak(image)
+        assert success
+        assert (numpy.abs(mx-tx) < 1.0e-2)
+        assert (numpy.abs(my-ty) < 1.0e-2)
+
+    assert (cl_fit.tracking_window.getWindow().shape == (24, 32))
+    cl_fit.cleanup()
+
 
 if (__name__ == "__main__"):
     test_cl_1()
+    test_cl_2()
+    test_cl_3()
     
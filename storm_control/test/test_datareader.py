@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Tests of the movie readers.
+"""
+import numpy
+import os
+
+import storm_control.sc_library.cdax as cdax
+import storm_control.sc_library.datareader as datareader
+import storm_control.sc_library.parameters as params
+import storm_control.test as test
+
+
+def makeDaxMovie(basename, x_size, y_size, n_frames, bigendian = False):
+    movie = numpy.random.randint(65535, size = (n_frames, y_size, x_size)).astype(numpy.uint16)
+    if bigendian:
+        movie.astype(">u2").tofile(basename + ".dax")
+    else:
+        movie.tofile(basename + ".dax")
+
+    xml = params.StormXMLObject()
+    xml.set("acquisition.camera", "camera1")
+    xml.set("acquisition.number_frames", n_frames)
+    xml.set("camera1.x_pixels", x_size)
+    xml.set("camera1.y_pixels", y_size)
+    xml.set("film.filetype", ".dax")
+    xml.set("film.want_big_endian", bigendian)
+    return xml
+
+
+def test_dax_reader_1():
+    """
+    Test that the memory mapped reader returns the same frames as the
+    standard reader.
+    """
+    basename = os.path.join(test.dataDirectory(), "dr_test_1")
+    for bigendian in [False, True]:
+        xml = makeDaxMovie(basename, 24, 16, 12, bigendian = bigendian)
+
+        dax1 = datareader.DaxReader(filename = basename + ".dax", xml = xml)
+        dax2 = datareader.DaxReader(filename = basename + ".dax", use_mmap = True, xml = xml)
+
+        for i in range(dax1.filmSize()[2]):
+            assert numpy.array_equal(dax1.loadAFrame(i), dax2.loadAFrame(i))
+
+        # Frame ranges, strides and ROIs.
+        for [start, stop, step] in [[0, None, 1], [2, 9, 3], [5, 6, 1], [10, 20, 2]]:
+            for roi in [None, [2, 7, 3, 15]]:
+                assert numpy.array_equal(dax1.loadFrames(start, stop, step, roi),
+                                         dax2.loadFrames(start, stop, step, roi))
+
+        assert (dax2.movieData().shape == (12, 16, 24))
+
+        # The standard reader does not memory map the file.
+        assert dax1.movie_data is None
+
+        dax1.closeFilePtr()
+        dax2.closeFilePtr()
+
+
+def test_dax_reader_2():
+    """
+    Test reading a .dax file that is shorter than the xml says.
+    """
+    basename = os.path.join(test.dataDirectory(), "dr_test_3")
+    xml = makeDaxMovie(basename, 24, 16, 12)
+    with open(basename + ".dax", "rb+") as fp:
+        fp.truncate(7 * 24 * 16 * 2 + 100)
+
+    for use_mmap in [False, True]:
+        dax = datareader.DaxReader(filename = basename + ".dax", use_mmap = use_mmap, xml = xml)
+        assert (dax.filmSize() == [24, 16, 7])
+        assert (dax.loadFrames().shape == (7, 16, 24))
+        assert (dax.loadFrames(5, 20).shape == (2, 16, 24))
+        dax.closeFilePtr()
+
+
+def test_cdax_reader_1():
+    """
+    Test reading a .cdax file that was not closed properly.
+    """
+    basename = os.path.join(test.dataDirectory(), "dr_test_2")
+    movie = numpy.random.randint(100, size = (10, 8, 8)).astype(numpy.uint16)
+    with open(basename + ".cdax", "wb") as fp:
+        fp.write(cdax.packHeader(8, 8, 4, 1))
+        for i in range(0, 10, 4):
+            data = cdax.encodeChunk(movie[i:i+4], 8, 8)
+            fp.write(cdax.packChunkHeader(movie[i:i+4].shape[0], len(data)))
+            fp.write(data)
+
+        # Partial chunk.
+        fp.write(cdax.packChunkHeader(4, 1000))
+        fp.write(b"12345")
+
+    reader = datareader.CDaxReader(filename = basename + ".cdax", xml = params.StormXMLObject())
+    assert (reader.filmSize() == [8, 8, 10])
+
+    # The reader returns frames in the same orientation as DaxReader.
+    assert numpy.array_equal(reader.loadFrames(), numpy.transpose(movie, (0, 2, 1)))
+    reader.closeFilePtr()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Tests of feeds processing batches of frames.
+"""
+import numpy
+
+import storm_control.sc_library.parameters as params
+
+import storm_control.hal4000.camera.cameraFunctionality as cameraFunctionality
+import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.feeds.feeds as feeds
+
+
+def makeCameraFunctionality(x_size, y_size):
+    parameters = params.StormXMLObject()
+    for [pname, value] in [["default_max", 2000],
+                           ["default_min", 100],
+                           ["fps", 100.0],
+                           ["max_intensity", 65535],
+                           ["x_bin", 1],
+                           ["x_chip", x_size],
+                           ["x_end", x_size],
+                           ["x_pixels", x_size],
+                           ["x_start", 1],
+                           ["y_bin", 1],
+                           ["y_chip", y_size],
+                           ["y_end", y_size],
+                           ["y_pixels", y_size],
+                           ["y_start", 1]]:
+        parameters.add(pname, value)
+    for pname in ["flip_horizontal", "flip_vertical", "transpose"]:
+        parameters.add(pname, False)
+    return cameraFunctionality.CameraFunctionality(camera_name = "camera1",
+                                                   parameters = parameters)
+
+def runFeed(feed_params, batch_sizes, x_size = 16, y_size = 12, batch_data = False):
+    """
+    Send random frames to a feed in batches, returns the frames
+    and the frames that the feed created. If batch_data is True the
+    batches also have the data of all their frames in a single array.
+    """
+    cam_fn = makeCameraFunctionality(x_size, y_size)
+    fp = params.StormXMLObject()
+    fp.addSubSection("test", feed_params)
+    feed_fn = feeds.FeedController(parameters = fp).getFeeds()[0]
+    feed_fn.setCameraFunctionality(cam_fn)
+
+    feed_frames = []
+    feed_fn.newFrame.connect(lambda x : feed_frames.append(numpy.copy(x.getData())))
+
+    images = []
+    for batch_size in batch_sizes:
+        frames = []
+        np_data = numpy.random.randint(1000, size = (batch_size, x_size * y_size)).astype(numpy.uint16)
+        for image in np_data:
+            frames.append(frame.Frame(image, len(images), x_size, y_size, "camera1"))
+            images.append(image.reshape(y_size, x_size))
+        if batch_data:
+            cam_fn.newFrames.emit(frame.FrameBatch(frames, np_data = np_data))
+        else:
+            cam_fn.emitFrames(frames)
+    feed_fn.disconnectCameraFunctionality()
+    return [numpy.array(images), feed_frames]
+
+
+def test_feeds_1():
+    """
+    Average feed.
+    """
+    fp = params.StormXMLObject()
+    fp.add("feed_type", "average")
+    fp.add("frames_to_average", 3)
+    fp.add("source", "camera1")
+    fp.add("x_start", 5)
+    fp.add("x_end", 12)
+
+    for batch_data in [False, True]:
+        [images, feed_frames] = runFeed(fp, [1, 4, 2, 5, 1], batch_data = batch_data)
+
+        assert(len(feed_frames) == 4)
+        for i, feed_frame in enumerate(feed_frames):
+            expected = numpy.sum(images[3*i:3*i+3,:,4:12], axis = 0)//3
+            assert numpy.array_equal(feed_frame.reshape(expected.shape), expected)
+
+def test_feeds_2():
+    """
+    Max projection feed.
+    """
+    fp = params.StormXMLObject()
+    fp.add("feed_type", "max_projection")
+    fp.add("frames_to_project", 4)
+    fp.add("source", "camera1")
+
+    for batch_data in [False, True]:
+        [images, feed_frames] = runFeed(fp, [7, 1, 1, 3], batch_data = batch_data)
+
+        assert(len(feed_frames) == 3)
+        for i, feed_frame in enumerate(feed_frames):
+            expected = numpy.amax(images[4*i:4*i+4], axis = 0)
+            assert numpy.array_equal(feed_frame.reshape(expected.shape), expected)
+
+def test_feeds_3():
+    """
+    Running mean feed, this processes the frames in a batch one at a time.
+    """
+    fp = params.StormXMLObject()
+    fp.add("feed_type", "running_mean")
+    fp.add("frames_to_average", 2)
+    fp.add("source", "camera1")
+    [images, feed_frames] = runFeed(fp, [3, 2])
+
+    assert(len(feed_frames) == 5)
+    assert numpy.array_equal(feed_frames[0].reshape(images[0].shape), images[0])
+    for i in range(1, 5):
+        expected = (images[i-1].astype(numpy.uint32) + images[i])//2
+        assert numpy.array_equal(feed_frames[i].reshape(expected.shape), expected)
+
+
+if (__name__ == "__main__"):
+    test_feeds_1()
+    test_feeds_2()
+    test_feeds_3()
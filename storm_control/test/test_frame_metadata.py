@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Tests of the per-frame metadata writer.
+"""
+import numpy
+import os
+
+import storm_control.sc_library.frameMetadata as frameMetadata
+import storm_control.test as test
+
+import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.film.frameMetadataWriter as frameMetadataWriter
+
+from storm_control.test.test_imagewriters import makeCameraFunctionality
+
+
+def test_frame_metadata_1():
+    """
+    Test writing metadata in batches and reading it back.
+    """
+    filename = os.path.join(test.dataDirectory(), "fm_test_1.fmd")
+    cam_fn = makeCameraFunctionality(4, 4)
+    sources = frameMetadataWriter.FrameMetadataSources()
+    writer = frameMetadataWriter.FrameMetadataWriter(batch_size = 4,
+                                                     camera_functionality = cam_fn,
+                                                     filename = filename,
+                                                     sources = sources)
+
+    for i in range(10):
+        if (i == 5):
+            sources.handleQPDUpdate({"is_good" : True, "offset" : 0.5, "sum" : 100.0})
+        cam_fn.newFrame.emit(frame.Frame(numpy.zeros(16, dtype = numpy.uint16), i, 4, 4, "camera1",
+                                         timestamp = 0.1 * i))
+    writer.closeWriter()
+
+    [data, description] = frameMetadata.readFrameMetadata(filename)
+    assert (description["camera"] == "camera1")
+    assert numpy.array_equal(data["frame"], numpy.arange(10))
+    assert numpy.allclose(data["camera_time"], 0.1 * numpy.arange(10))
+    assert numpy.all(numpy.diff(data["arrival_time"]) >= 0.0)
+
+    # No stage or focus lock, so these should be NaN.
+    assert numpy.all(numpy.isnan(data["stage_x"]))
+    assert numpy.all(numpy.isnan(data["z"]))
+    assert numpy.all(numpy.isnan(data["qpd_offset"][:5]))
+    assert numpy.allclose(data["qpd_offset"][5:], 0.5)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Tests of the camera frame pool.
+"""
+import numpy
+
+import storm_control.hal4000.camera.frame as frame
+
+
+def test_frame_pool_1():
+    """
+    Test that buffers are only re-used once nobody is using them.
+    """
+    pool = frame.FramePool()
+
+    # Buffers that are held by a frame are not re-used.
+    f1 = frame.Frame(pool.getBuffer(100), 0, 10, 10, "camera1")
+    f2 = frame.Frame(pool.getBuffer(100), 1, 10, 10, "camera1")
+    assert not (f1.getData() is f2.getData())
+    assert (pool.getNumberBuffers() == 2)
+
+    # Views of the buffer also keep it from being re-used.
+    view = f1.getData().reshape((10, 10))
+    data1 = f1.getData()
+    f1 = None
+    data1 = None
+    np_data = pool.getBuffer(100)
+    assert not (np_data is view.base)
+    assert (pool.getNumberBuffers() == 3)
+
+    # Once all the references are gone the buffers are re-used.
+    old_id = id(view.base)
+    view = None
+    np_data = None
+    assert (id(pool.getBuffer(100)) in [old_id, id(pool.buffers[2])])
+    assert (pool.getNumberBuffers() == 3)
+
+    # The buffer that is still held by a frame is not.
+    for i in range(5):
+        assert not (pool.getBuffer(100) is f2.getData())
+    assert (pool.getNumberBuffers() == 3)
+
+
+def test_frame_pool_2():
+    """
+    Test a steady stream of frames and a change in frame size.
+    """
+    pool = frame.FramePool(max_bytes = 4 * 64 * 2)
+
+    # Hold on to the last two frames (like a display might).
+    held = []
+    for i in range(100):
+        held.append(frame.Frame(pool.getBuffer(64), i, 8, 8, "camera1"))
+        if (len(held) > 2):
+            held.pop(0)
+    assert (pool.getNumberBuffers() == 3)
+
+    # More frames in use than pool buffers.
+    for i in range(10):
+        held.append(frame.Frame(pool.getBuffer(64), i, 8, 8, "camera1"))
+    assert (pool.getNumberBuffers() == 4)
+    assert (len(set([id(f.getData()) for f in held])) == len(held))
+
+    # Changing the frame size drops the old buffers.
+    np_data = pool.getBuffer(16)
+    assert (np_data.size == 16)
+    assert (np_data.dtype == numpy.uint16)
+    assert (pool.getNumberBuffers() == 1)
+
+
+def test_frame_pool_3():
+    """
+    Test that views of a buffer keep it from being re-used.
+    """
+    pool = frame.FramePool()
+    pool.getBuffer(100)
+
+    for makeView in [lambda x : x[10:20], lambda x : x.reshape((10, 10)), memoryview]:
+        view = makeView(pool.buffers[0])
+        assert not (pool.getBuffer(100) is pool.buffers[0])
+        assert (pool.getNumberBuffers() == 2)
+
+        # Dropping the view frees the buffer again.
+        view = None
+        assert (pool.getBuffer(100) is pool.buffers[0])
+
+
+def test_frame_pool_4():
+    """
+    Test that the pool shrinks again after a consumer stall.
+    """
+    pool = frame.FramePool(max_bytes = 20 * 64 * 2, min_free = 2, trim_interval = 50)
+
+    # A stalled consumer, the pool grows to its limit.
+    held = []
+    for i in range(30):
+        held.append(pool.getBuffer(64))
+    assert (pool.getNumberBuffers() == 20)
+
+    # Once the consumer catches up the pool is trimmed to min_free
+    # buffers plus the buffer that is in use.
+    held = None
+    for i in range(20):
+        np_data = pool.getBuffer(64)
+    assert (pool.getNumberBuffers() == 3)
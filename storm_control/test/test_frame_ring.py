@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Tests of the shared memory frame ring buffer.
+"""
+import multiprocessing
+import numpy
+import pytest
+import sys
+
+if (sys.version_info < (3, 8)):
+    pytest.skip("requires multiprocessing.shared_memory", allow_module_level = True)
+
+import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.camera.frameRing as frameRing
+
+
+def makeFrame(i):
+    return frame.Frame(numpy.full(48, i, dtype = numpy.uint16), i, 8, 6, "camera1")
+
+def readFrames(name, n_frames, results):
+    reader = frameRing.FrameRingReader(from_start = True, name = name)
+    sums = []
+    while (len(sums) < n_frames):
+        for ring_frame in reader.getFrames():
+            sums.append(int(numpy.sum(ring_frame.getData())))
+    ring_frame = None
+    reader.close()
+    results.put(sums)
+
+def test_frame_ring_1():
+    """
+    Reading frames and overruns.
+    """
+    writer = frameRing.FrameRingWriter(feed_name = "camera1", max_pixels = 64, n_slots = 4, name = "hal_test_ring_1")
+    reader = frameRing.FrameRingReader(name = "hal_test_ring_1")
+    try:
+        for i in range(3):
+            writer.addFrame(makeFrame(i))
+        frames = reader.getFrames()
+        assert ([x.frame_number for x in frames] == [0, 1, 2])
+        assert (frames[1].getData().shape == (48,))
+        assert (frames[1].getData()[0] == 1)
+        assert (frames[1].which_camera == "camera1")
+        assert all(x.isValid() for x in frames)
+
+        # Overwrite all the slots, the reader should skip to the oldest frame.
+        for i in range(3, 13):
+            writer.addFrame(makeFrame(i))
+        assert not frames[0].isValid()
+        frames = reader.getFrames(copy = True)
+        assert ([x.frame_number for x in frames] == [9, 10, 11, 12])
+        assert (reader.getNumberLost() == 6)
+        assert (reader.getFrame() is None)
+        frames = None
+    finally:
+        reader.close()
+        writer.close()
+
+def test_frame_ring_2():
+    """
+    Reading frames in another process.
+    """
+    writer = frameRing.FrameRingWriter(feed_name = "camera1", max_pixels = 64, n_slots = 10, name = "hal_test_ring_2")
+    try:
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(target = readFrames, args = ("hal_test_ring_2", 5, results))
+        process.start()
+        for i in range(5):
+            writer.addFrame(makeFrame(i))
+        assert (results.get(timeout = 30) == [48 * i for i in range(5)])
+        process.join()
+    finally:
+        writer.close()
+
+def test_frame_ring_3():
+    """
+    Creating a ring when the shared memory was left over from a crash.
+    """
+    old_shm = frameRing.shared_memory.SharedMemory(name = "hal_test_ring_3", create = True, size = 100)
+    old_shm.close()
+    writer = frameRing.FrameRingWriter(feed_name = "camera1", max_pixels = 64, n_slots = 4, name = "hal_test_ring_3")
+    reader = frameRing.FrameRingReader(name = "hal_test_ring_3")
+    try:
+        writer.addFrame(makeFrame(1))
+        frames = reader.getFrames()
+        assert ([x.frame_number for x in frames] == [1])
+        frames = None
+    finally:
+        reader.close()
+        writer.close()
+
+
+if (__name__ == "__main__"):
+    test_frame_ring_1()
+    test_frame_ring_2()
+    test_frame_ring_3()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Tests of the frame statistics.
+"""
+import numpy
+
+from PyQt5 import QtCore
+
+import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.halLib.frameStats as frameStats
+
+
+class FrameSource(QtCore.QObject):
+    newFrame = QtCore.pyqtSignal(object)
+
+
+class FrameConsumer(object):
+
+    def __init__(self, **kwds):
+        super().__init__(**kwds)
+        self.n_frames = 0
+
+    def handleNewFrame(self, new_frame):
+        self.n_frames += 1
+
+
+def test_frame_stats_1():
+    """
+    Test delivery / consumer statistics.
+    """
+    frameStats.reset()
+    frameStats.setEnabled(True)
+
+    source = FrameSource()
+    consumer = FrameConsumer()
+    source.newFrame.connect(frameStats.timedSlot("test", consumer.handleNewFrame))
+
+    stats = frameStats.getSource("camera1")
+    for i in [0, 1, 2, 5, 6]:
+        a_frame = frame.Frame(numpy.zeros(16, dtype = numpy.uint16), i, 4, 4, "camera1")
+        stats.addDelivered(a_frame, 6 - i)
+        source.newFrame.emit(a_frame)
+
+    source.newFrame.disconnect(frameStats.timedSlot("test", consumer.handleNewFrame))
+    source.newFrame.emit(a_frame)
+    assert (consumer.n_frames == 5)
+
+    camera1 = frameStats.getStatistics()["sources"]["camera1"]
+    assert (camera1["dropped_frames"] == 2)
+    assert (camera1["queue_depth_max"] == 6)
+    assert (camera1["stages"]["delivered"]["frames"] == 5)
+    assert (camera1["stages"]["test"]["frames"] == 5)
+    assert (sum(camera1["stages"]["test"]["histogram"]) == 5)
+
+    # Not recorded when statistics are disabled.
+    frameStats.setEnabled(False)
+    source.newFrame.connect(frameStats.timedSlot("test", consumer.handleNewFrame))
+    source.newFrame.emit(a_frame)
+    assert (consumer.n_frames == 6)
+    assert (frameStats.getStatistics()["sources"]["camera1"]["stages"]["test"]["frames"] == 5)
+
+    frameStats.reset()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Tests of the frame tap server and client.
+"""
+import numpy
+import pytest
+import time
+
+import storm_control.sc_library.frameTapClient as frameTapClient
+
+import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.frameTap.frameTap as frameTap
+
+
+def makeBatch(first, n_frames, x_size = 8, y_size = 6):
+    frames = []
+    for i in range(first, first + n_frames):
+        np_data = numpy.arange(x_size * y_size, dtype = numpy.uint16) + i
+        frames.append(frame.Frame(np_data, i, x_size, y_size, "camera1"))
+    return frame.FrameBatch(frames)
+
+def test_frame_tap_1():
+    """
+    Decimation and ROI.
+    """
+    server = frameTap.FrameTapServer(max_queue = 20, port = 9011)
+    server.setFeedNames(["camera1"])
+    server.start()
+    try:
+        client = frameTapClient.FrameTapClient(decimate = 2,
+                                               feed = "camera1",
+                                               port = 9011,
+                                               roi = [2, 1, 6, 4],
+                                               timeout = 5.0)
+        assert (client.getFeeds() == ["camera1"])
+
+        # Wait for the server to add the subscriber.
+        while (server.getNumberSubscribers() == 0):
+            time.sleep(0.01)
+        server.newFrames("camera1", makeBatch(0, 6))
+        server.newFrames("camera2", makeBatch(0, 6))
+
+        for i in range(3):
+            tap_frame = client.getFrame()
+            assert (tap_frame.frame_number == 2*i)
+            assert (tap_frame.n_dropped == 0)
+            assert ((tap_frame.x_start == 2) and (tap_frame.y_start == 1))
+
+            expected = (numpy.arange(48, dtype = numpy.uint16) + 2*i).reshape(6, 8)[1:4,2:6]
+            assert numpy.array_equal(tap_frame.getData(), expected)
+        client.close()
+    finally:
+        server.stop()
+
+def test_frame_tap_2():
+    """
+    Requests for feeds that don't exist are refused.
+    """
+    server = frameTap.FrameTapServer(max_queue = 20, port = 9011)
+    server.setFeedNames(["camera1"])
+    server.start()
+    try:
+        with pytest.raises(frameTapClient.FrameTapException):
+            frameTapClient.FrameTapClient(feed = "camera2", port = 9011, timeout = 5.0)
+    finally:
+        server.stop()
+
+
+if (__name__ == "__main__"):
+    test_frame_tap_1()
+    test_frame_tap_2()
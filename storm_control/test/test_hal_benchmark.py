@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Benchmark tests.
+"""
+import json
+import numpy
+import os
+
+import storm_control.test as test
+
+import storm_control.hal4000.camera.noneCameraControl as noneCameraControl
+import storm_control.hal4000.testing.benchmark as benchmark
+
+
+def test_benchmark_frames_1():
+    frames = noneCameraControl.makeBenchmarkFrames(64, 32, 5, 20)
+    assert (frames.shape == (5, 64*32))
+    assert (frames.dtype == numpy.uint16)
+
+    # Baseline + background.
+    assert (numpy.min(frames) > 50)
+    assert (abs(numpy.median(frames) - 120.0) < 10.0)
+
+
+def test_hal_benchmark_1():
+    report = os.path.join(test.dataDirectory(), "benchmark.json")
+    if os.path.exists(report):
+        os.remove(report)
+        
+    benchmark.runBenchmark(config_xml = test.halXmlFilePathAndName("none_classic_config.xml"),
+                           directory = test.dataDirectory(),
+                           fps = 200.0,
+                           frames = 100,
+                           report = report)
+
+    with open(report) as fp:
+        results = json.load(fp)
+
+    assert (results["film_frames"] == 100)
+    camera1 = results["statistics"]["sources"]["camera1"]
+    assert (camera1["stages"]["film"]["frames"] == 100)
+    assert (camera1["fps"] > 150.0)
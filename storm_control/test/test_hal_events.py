@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Tests of the HAL message event recorder.
+"""
+import storm_control.hal4000.halLib.halEvents as halEvents
+
+
+def test_hal_events_1():
+    """
+    Ring buffer.
+    """
+    halEvents.reset(size = 5)
+    halEvents.setVerbosity(halEvents.RECORD)
+    for i in range(8):
+        halEvents.record("sent", i, "test", "start film")
+    events = halEvents.getEvents()
+    assert (len(events) == 5)
+    assert ([event["id"] for event in events] == [3, 4, 5, 6, 7])
+    assert ([event["id"] for event in halEvents.getEvents(2)] == [6, 7])
+    halEvents.flush()
+    halEvents.reset(size = 10000)
+    halEvents.setVerbosity(halEvents.LOG)
+
+def test_hal_events_2():
+    """
+    Verbosity.
+    """
+    halEvents.reset()
+    halEvents.setVerbosity(halEvents.OFF)
+    halEvents.record("sent", 1, "test", "start film")
+    assert (len(halEvents.getEvents()) == 0)
+
+    halEvents.setVerbosity(halEvents.RECORD)
+    halEvents.record("handled by", 1, "test", "start film", "camera1")
+    events = halEvents.getEvents()
+    assert (len(events) == 1)
+    assert (events[0]["event"] == "handled by")
+    assert (events[0]["extra"] == "camera1")
+    halEvents.reset()
+    halEvents.setVerbosity(halEvents.LOG)
+
+
+if (__name__ == "__main__"):
+    test_hal_events_1()
+    test_hal_events_2()
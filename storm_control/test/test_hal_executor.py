@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Tests of the HAL worker executor.
+"""
+import threading
+import time
+
+from PyQt5 import QtCore
+
+import storm_control.hal4000.halLib.halExecutor as halExecutor
+
+
+class TestRunnable(QtCore.QRunnable):
+
+    def __init__(self, name = None, results = None, sleep = 0.0, **kwds):
+        super().__init__(**kwds)
+        self.name = name
+        self.results = results
+        self.sleep = sleep
+        self.setAutoDelete(False)
+
+    def run(self):
+        self.results.append(["start", self.name, threading.get_ident()])
+        time.sleep(self.sleep)
+        self.results.append(["end", self.name, threading.get_ident()])
+
+
+def test_hal_executor_1():
+    """
+    Runnables with the same key are run one at a time, in order.
+    """
+    pool = QtCore.QThreadPool()
+    pool.setMaxThreadCount(4)
+    executor = halExecutor.Executor(pool = pool)
+
+    results = []
+    runnables = []
+    for i in range(5):
+        runnables.append(TestRunnable(name = i, results = results, sleep = 0.01))
+        executor.start(runnables[-1], key = "test")
+    executor.waitForDone()
+
+    assert ([x[:2] for x in results] == [[y, i] for i in range(5) for y in ["start", "end"]])
+    assert (executor.getQueueDepth("test") == 0)
+
+def test_hal_executor_2():
+    """
+    Runnables with different keys run in parallel.
+    """
+    pool = QtCore.QThreadPool()
+    pool.setMaxThreadCount(4)
+    executor = halExecutor.Executor(pool = pool)
+
+    results = []
+    runnables = []
+    for key in ["a", "b", None]:
+        runnables.append(TestRunnable(name = key, results = results, sleep = 0.1))
+        executor.start(runnables[-1], key = key)
+    executor.waitForDone()
+
+    # All the runnables should have started before any of them finished.
+    assert ([x[0] for x in results] == ["start", "start", "start", "end", "end", "end"])
+
+
+if (__name__ == "__main__"):
+    test_hal_executor_1()
+    test_hal_executor_2()
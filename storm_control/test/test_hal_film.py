@@ -41,7 +41,10 @@ def test_hal_film_2():
     for name, size in [["movie_02.dax", [512, 512, 10]],
                        ["movie_02_average.dax", [512, 512, 1]],
                        ["movie_02_interval.dax", [508, 256, 2]],
-                       ["movie_02_slice1.dax", [64, 65, 10]]]:
+                       ["movie_02_slice1.dax", [64, 65, 10]],
+                       ["movie_02_running_mean.dax", [512, 512, 10]],
+                       ["movie_02_max_projection.dax", [512, 512, 2]],
+                       ["movie_02_decimate.dax", [256, 256, 10]]]:
         movie = datareader.inferReader(os.path.join(test.dataDirectory(), name))
         assert(movie.filmSize() == size)
 
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+"""
+Frame tap tests.
+"""
+import pytest
+import sys
+
+from storm_control.test.hal.standardHalTest import halTest
+
+def test_hal_frame_tap_1():
+
+    halTest(config_xml = "none_frame_tap_config.xml",
+            class_name = "FrameTap1",
+            test_module = "storm_control.test.hal.frame_tap_tests")
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason = "requires multiprocessing.shared_memory")
+def test_hal_frame_tap_2():
+
+    halTest(config_xml = "none_frame_tap_ring_config.xml",
+            class_name = "FrameTap2",
+            test_module = "storm_control.test.hal.frame_tap_tests")
+
@@ -33,3 +33,15 @@ def test_hal_params_5():
     halTest(config_xml = "none_classic_config.xml",
             class_name = "ParamTest5",
             test_module = "storm_control.test.hal.param_tests")
+
+
+def test_hal_params_6():
+    halTest(config_xml = "none_classic_config.xml",
+            class_name = "ParamTest6",
+            test_module = "storm_control.test.hal.param_tests")
+
+
+def test_hal_params_7():
+    halTest(config_xml = "none_classic_config.xml",
+            class_name = "ParamTest7",
+            test_module = "storm_control.test.hal.param_tests")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Tests of the HAL message trace.
+"""
+import json
+
+import storm_control.hal4000.halLib.halEvents as halEvents
+import storm_control.hal4000.halLib.halProfiler as halProfiler
+
+import storm_control.test as test
+
+
+def test_hal_profiler_1():
+    halEvents.reset()
+    halEvents.setVerbosity(halEvents.RECORD)
+    for [event, module_name] in [["created", None],
+                                 ["queued", None],
+                                 ["sent", None],
+                                 ["handling", "camera1"],
+                                 ["handled by", "camera1"],
+                                 ["handling", "film"],
+                                 ["worker started", "film"],
+                                 ["handled by", "film"],
+                                 ["worker done", "film"],
+                                 ["handled by", "film"],
+                                 ["processed", None]]:
+        halEvents.record(event, 1, "hal", "start film", module_name)
+
+    trace_file = test.dataDirectory() + "test_trace.json"
+    halProfiler.writeTrace(trace_file)
+    with open(trace_file) as fp:
+        trace = json.load(fp)["traceEvents"]
+
+    threads = {}
+    for elt in trace:
+        if (elt["name"] == "thread_name"):
+            threads[elt["tid"]] = elt["args"]["name"]
+    assert (sorted(threads.values()) == ["camera1", "core", "film", "film worker"])
+
+    spans = list(filter(lambda x : (x["ph"] == "X"), trace))
+    assert (sorted([threads[x["tid"]] for x in spans]) == ["camera1", "film", "film worker"])
+    for span in spans:
+        assert (span["name"] == "start film")
+        assert (span["dur"] >= 0.0)
+
+    # Message and queued, beginning and end.
+    assert (len(list(filter(lambda x : (x["ph"] in ["b", "e"]), trace))) == 4)
+
+    halEvents.reset()
+    halEvents.setVerbosity(halEvents.LOG)
+
+
+if (__name__ == "__main__"):
+    test_hal_profiler_1()
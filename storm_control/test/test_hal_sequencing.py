@@ -32,3 +32,17 @@ def test_hal_sequencing_1(qtbot):
 
     assert not hal.running
 
+
+def test_hal_sequencing_2(qtbot):
+    """
+    Test module.processMessage() sequencing with concurrent message types.
+    """
+    hdebug.startLogging(test.logDirectory(), "hal4000")
+        
+    config = params.config(test.halXmlFilePathAndName("none_hal_sequencing_2.xml"))
+    hal = hal4000.HalCore(config = config, show_gui = False)
+
+    qtbot.addWidget(hal)
+    qtbot.wait(2000)
+
+    assert not hal.running
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+Batch message tests.
+"""
+from storm_control.test.hal.standardHalTest import halTest
+
+def test_hal_batch_1():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "Batch1",
+            test_module = "storm_control.test.hal.tcp_tests")
+
+def test_hal_batch_2():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "Batch2",
+            test_module = "storm_control.test.hal.tcp_tests")
+
+def test_hal_batch_3():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "Batch3",
+            test_module = "storm_control.test.hal.tcp_tests")
+
+def test_hal_batch_4():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "Batch4",
+            test_module = "storm_control.test.hal.tcp_tests")
@@ -60,6 +60,47 @@ def test_hal_tcp_cfl_7():
             test_module = "storm_control.test.hal.tcp_tests")
 
 
+
+def test_hal_tcp_cfl_8():
+
+    halTest(config_xml = "none_tcp_config_lock_engine.xml",
+            class_name = "CheckFocusLock1",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_tcp_cfl_9():
+
+    halTest(config_xml = "none_tcp_config_lock_engine.xml",
+            class_name = "CheckFocusLock3",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_tcp_cfl_10():
+
+    halTest(config_xml = "none_tcp_config_lock_engine.xml",
+            class_name = "CheckFocusLock4",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_tcp_cfl_11():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "CheckFocusLock8",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_tcp_cfl_12():
+
+    halTest(config_xml = "none_tcp_config_lock_engine.xml",
+            class_name = "CheckFocusLock8",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
 if (__name__ == "__main__"):
 #    test_hal_tcp_cfl_1()
 #    test_hal_tcp_cfl_2()
@@ -68,3 +109,8 @@ if (__name__ == "__main__"):
 #    test_hal_tcp_cfl_5()
     test_hal_tcp_cfl_6()
     test_hal_tcp_cfl_7()
+    test_hal_tcp_cfl_8()
+    test_hal_tcp_cfl_9()
+    test_hal_tcp_cfl_10()
+    test_hal_tcp_cfl_11()
+    test_hal_tcp_cfl_12()
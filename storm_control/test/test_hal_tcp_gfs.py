@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+"""
+Frame statistics tests.
+"""
+from storm_control.test.hal.standardHalTest import halTest
+
+def test_hal_gfs_1():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "GetFrameStatistics1",
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_gfs_2():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "GetFrameStatistics2",
+            test_module = "storm_control.test.hal.tcp_tests")
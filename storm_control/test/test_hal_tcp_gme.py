@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+"""
+Message events tests.
+"""
+from storm_control.test.hal.standardHalTest import halTest
+
+def test_hal_gme_1():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "GetMessageEvents1",
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_gme_2():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "GetMessageEvents2",
+            test_module = "storm_control.test.hal.tcp_tests")
@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+"""
+Pipelined message tests.
+"""
+from storm_control.test.hal.standardHalTest import halTest
+
+def test_hal_pipeline_1():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "Pipeline1",
+            test_module = "storm_control.test.hal.tcp_tests")
+
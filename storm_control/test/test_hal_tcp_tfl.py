@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+Focus lock auto-tune tests.
+"""
+from storm_control.test.hal.standardHalTest import halTest
+
+def test_hal_tcp_tfl_1():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "TuneFocusLock1",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_tcp_tfl_2():
+
+    halTest(config_xml = "none_tcp_config.xml",
+            class_name = "TuneFocusLock2",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+def test_hal_tcp_tfl_3():
+
+    halTest(config_xml = "none_tcp_config_lock_engine.xml",
+            class_name = "TuneFocusLock1",
+            show_gui = True,
+            test_module = "storm_control.test.hal.tcp_tests")
+
+
+if (__name__ == "__main__"):
+    test_hal_tcp_tfl_1()
+    test_hal_tcp_tfl_2()
+    test_hal_tcp_tfl_3()
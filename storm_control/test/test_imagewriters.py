@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Tests of the image writers.
+"""
+import numpy
+import os
+
+import storm_control.sc_library.datareader as datareader
+import storm_control.sc_library.parameters as params
+import storm_control.test as test
+
+import storm_control.hal4000.camera.cameraFunctionality as cameraFunctionality
+import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.film.filmSettings as filmSettings
+import storm_control.hal4000.halLib.imagewriters as imagewriters
+
+
+def makeCameraFunctionality(x_size, y_size):
+    parameters = params.StormXMLObject()
+    parameters.add(params.ParameterInt(name = "bytes_per_frame", value = 2 * x_size * y_size))
+    parameters.add(params.ParameterString(name = "extension", value = ""))
+    parameters.add(params.ParameterInt(name = "x_pixels", value = x_size))
+    parameters.add(params.ParameterInt(name = "y_pixels", value = y_size))
+    return cameraFunctionality.CameraFunctionality(camera_name = "camera1",
+                                                   parameters = parameters)
+
+
+def writeMovie(basename, writer_buffers, n_frames = 20, filetype = ".dax"):
+    [x_size, y_size] = [16, 12]
+    cam_fn = makeCameraFunctionality(x_size, y_size)
+    film_settings = filmSettings.FilmSettings(basename = basename,
+                                              filetype = filetype,
+                                              writer_buffers = writer_buffers)
+    writer = imagewriters.createFileWriter(cam_fn, film_settings)
+
+    # The frames are sent in batches of different sizes.
+    frames = []
+    images = []
+    for i in range(n_frames):
+        image = numpy.random.randint(1000, size = x_size * y_size).astype(numpy.uint16)
+        images.append(image)
+        frames.append(frame.Frame(image, i, x_size, y_size, "camera1"))
+        if (len(frames) > (i % 4)):
+            cam_fn.emitFrames(frames)
+            frames = []
+    cam_fn.emitFrames(frames)
+    cam_fn.stopped.emit()
+    writer.closeWriter()
+    return [writer, images]
+
+
+def test_imagewriters_1():
+    """
+    Test that the buffered writer saves the same movie as the unbuffered writer.
+    """
+    for writer_buffers in [0, 4, 64]:
+        basename = os.path.join(test.dataDirectory(), "iw_test_{0:d}".format(writer_buffers))
+        [writer, images] = writeMovie(basename, writer_buffers)
+
+        assert(writer.isBuffered() == (writer_buffers > 0))
+
+        n_saved = writer.number_frames - writer.getDroppedFrames()
+        saved = numpy.fromfile(basename + ".dax", dtype = numpy.uint16)
+        assert(saved.size == n_saved * images[0].size)
+
+        # Frames are only ever dropped from the end of a run of full
+        # buffers, so check that all the frames that were saved match
+        # one of the frames that were sent, in order.
+        saved = saved.reshape((n_saved, -1))
+        j = 0
+        for i in range(n_saved):
+            while not numpy.array_equal(saved[i], images[j]):
+                j += 1
+            j += 1
+
+        # Check the .inf file.
+        with open(basename + ".inf") as fp:
+            assert("number of frames = " + str(n_saved) in fp.read())
+
+
+def test_imagewriters_2():
+    """
+    Test that .cdax movies read back the same as .dax movies.
+    """
+    for writer_buffers in [0, 8]:
+        basename = os.path.join(test.dataDirectory(), "iw_test_cdax_{0:d}".format(writer_buffers))
+        [writer, images] = writeMovie(basename, writer_buffers, n_frames = 150, filetype = ".cdax")
+        n_saved = writer.number_frames - writer.getDroppedFrames()
+
+        # Background plus noise should compress.
+        assert(writer.getCompressionRatio() > 1.0)
+
+        xml = params.StormXMLObject()
+        cdax = datareader.CDaxReader(filename = basename + ".cdax", xml = xml)
+        assert(cdax.filmSize() == [16, 12, n_saved])
+
+        # Write the same frames as a .dax movie and compare.
+        dax_name = basename + "_check"
+        numpy.concatenate(images).tofile(dax_name + ".dax")
+        xml.set("acquisition.number_frames", len(images))
+        xml.set("camera1.x_pixels", 16)
+        xml.set("camera1.y_pixels", 12)
+        dax = datareader.DaxReader(filename = dax_name + ".dax", xml = xml)
+
+        if (writer_buffers == 0):
+            assert(n_saved == len(images))
+            for i in range(n_saved):
+                assert numpy.array_equal(cdax.loadAFrame(i), dax.loadAFrame(i))
+            assert numpy.array_equal(cdax.loadFrames(3, 140, 7, [1, 10, 2, 15]),
+                                     dax.loadFrames(3, 140, 7, [1, 10, 2, 15]))
+        else:
+            j = 0
+            for i in range(n_saved):
+                while not numpy.array_equal(cdax.loadAFrame(i), dax.loadAFrame(j)):
+                    j += 1
+                j += 1
+
+        cdax.closeFilePtr()
+        dax.closeFilePtr()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+Tests of the focus lock controllers and auto-tuning, using a
+simulated z stage and QPD.
+"""
+import collections
+import math
+import pytest
+
+from PyQt5 import QtCore
+
+import storm_control.sc_library.parameters as params
+
+import storm_control.hal4000.focusLock.lockModes as lockModes
+
+# The lock modes are QObjects.
+app = QtCore.QCoreApplication.instance()
+if app is None:
+    app = QtCore.QCoreApplication([])
+
+
+class ZStage(object):
+    """
+    Simulated z stage.
+    """
+    def __init__(self):
+        self.z = 50.0
+
+    def getCenterPosition(self):
+        return 50.0
+
+    def getCurrentPosition(self):
+        return self.z
+
+    def goAbsolute(self, z_pos):
+        self.z = min(max(z_pos, 0.0), 100.0)
+
+    def goRelative(self, z_delta):
+        self.goAbsolute(self.z + z_delta)
+
+    def recenter(self):
+        self.goAbsolute(self.getCenterPosition())
+
+
+class QPD(object):
+    """
+    Simulated QPD, the offset lags the stage position by delay updates.
+    """
+    def __init__(self, delay = 0, response = 1.0, z_stage = None):
+        self.focus = 50.0
+        self.response = response
+        self.z_stage = z_stage
+        self.z_history = collections.deque([z_stage.z] * (delay + 1), maxlen = delay + 1)
+
+    def reading(self):
+        self.z_history.append(self.z_stage.z)
+        return {"is_good" : True,
+                "offset" : self.response * (self.z_history[0] - self.focus),
+                "sum" : 1000.0}
+
+
+def makeMode(**kwds):
+    parameters = params.StormXMLObject()
+    lockModes.AutoTuneMixin.addParameters(parameters)
+    lockModes.FindSumMixin.addParameters(parameters)
+    lockModes.LockedMixin.addParameters(parameters)
+    lockModes.ScanMixin.addParameters(parameters)
+    for pname in kwds:
+        parameters.setv(pname, kwds[pname])
+
+    z_stage = ZStage()
+    lock_mode = lockModes.AlwaysOnLockMode(parameters = parameters)
+    lock_mode.newParameters(parameters)
+    lock_mode.setZStageFunctionality(z_stage)
+    return [lock_mode, z_stage]
+
+def trackDrift(controller):
+    """
+    Returns the QPD offset with the focus drifting at 5nm per update.
+    """
+    [lock_mode, z_stage] = makeMode(**{"locked.controller" : controller})
+    qpd = QPD(z_stage = z_stage)
+
+    lock_mode.handleQPDUpdate(qpd.reading())
+    lock_mode.startLock()
+    for i in range(200):
+        qpd.focus += 0.005
+        qpd_state = qpd.reading()
+        lock_mode.handleQPDUpdate(qpd_state)
+    return abs(qpd_state["offset"])
+
+
+def test_pid_drift():
+    """
+    The integral term removes the lag of the proportional controller.
+    """
+    assert (trackDrift("proportional") > 0.005)
+    assert (trackDrift("pid") < 0.001)
+
+def test_pid_anti_windup():
+    """
+    A large offset does not wind up the integral.
+    """
+    [lock_mode, z_stage] = makeMode(**{"locked.controller" : "pid",
+                                       "locked.max_step" : 100.0})
+    controller = lockModes.LockMode.lock_controller
+
+    for i in range(50):
+        assert (abs(controller.control(10.0)) <= 0.1 + 1.0e-9)
+    assert (abs(controller.ki * controller.integral) <= 0.1 + 1.0e-9)
+
+    # Once the offset is zero the output is small again.
+    controller.reset()
+    assert (controller.control(0.0) == pytest.approx(0.0))
+
+@pytest.mark.parametrize("delay", [0, 1, 2, 3])
+def test_auto_tune(delay):
+    """
+    Auto-tune measures the QPD response and the delay, and the
+    resulting lock is stable.
+    """
+    [lock_mode, z_stage] = makeMode(**{"auto_tune.hold" : 10})
+    qpd = QPD(delay = delay, response = -0.8, z_stage = z_stage)
+    done = []
+    lock_mode.done.connect(done.append)
+
+    lock_mode.handleQPDUpdate(qpd.reading())
+    lock_mode.startLockBehavior("auto_tune", {})
+    while not done:
+        lock_mode.handleQPDUpdate(qpd.reading())
+
+    assert done[0]
+    assert (z_stage.z == pytest.approx(50.0))
+    results = lock_mode.getAutoTuneResults()
+    assert (results["delay"] == delay)
+    assert (results["qpd_response"] == pytest.approx(-0.8))
+    assert (len(results["step_response"]) == 50)
+    assert (lock_mode.parameters.get("locked.controller") == "pid")
+
+    # Lock, then move the focus.
+    lock_mode.startLockBehavior("locked", {})
+    qpd.focus += 1.0
+    for i in range(100):
+        lock_mode.handleQPDUpdate(qpd.reading())
+    assert (z_stage.z == pytest.approx(qpd.focus, abs = 1.0e-3))
+    assert lock_mode.isGoodLock()
+
+def test_auto_tune_no_response():
+    """
+    Auto-tune fails if the QPD does not respond to the stage.
+    """
+    [lock_mode, z_stage] = makeMode()
+    qpd = QPD(response = 0.0, z_stage = z_stage)
+    done = []
+    lock_mode.done.connect(done.append)
+
+    lock_mode.handleQPDUpdate(qpd.reading())
+    lock_mode.startLockBehavior("auto_tune", {"hold" : 5})
+    while not done:
+        lock_mode.handleQPDUpdate(qpd.reading())
+
+    assert not done[0]
+    assert lock_mode.getAutoTuneResults() is None
+    assert (lock_mode.parameters.get("locked.controller") == "proportional")
+
+def test_feed_forward():
+    """
+    With feed forward changing the lock target and jumps move the
+    stage immediately and the lock stays on.
+    """
+    [lock_mode, z_stage] = makeMode(**{"locked.controller" : "pid",
+                                       "locked.feed_forward" : True,
+                                       "locked.qpd_response" : 2.0})
+    qpd = QPD(response = 2.0, z_stage = z_stage)
+    lock_mode.handleQPDUpdate(qpd.reading())
+    lock_mode.startLockBehavior("locked", {})
+
+    lock_mode.moveLockTarget(1.0)
+    assert (z_stage.z == pytest.approx(50.5))
+    assert (lock_mode.getLockTarget() == pytest.approx(1.0))
+
+    lock_mode.handleJump(-0.25)
+    assert lock_mode.amLocked()
+    assert (z_stage.z == pytest.approx(50.25))
+    assert (lock_mode.getLockTarget() == pytest.approx(0.5))
+
+    # The stage is already where it should be.
+    lock_mode.handleQPDUpdate(qpd.reading())
+    assert (z_stage.z == pytest.approx(50.25))
+
+def test_zero_qpd_response():
+    """
+    A QPD response of zero is clamped, so the lock does not divide by zero.
+    """
+    for controller in ["pid", "proportional"]:
+        [lock_mode, z_stage] = makeMode(**{"locked.controller" : controller,
+                                           "locked.qpd_response" : 0.0})
+        assert (lock_mode.getQPDResponse() == lockModes.LockController.min_qpd_response)
+
+        qpd = QPD(z_stage = z_stage)
+        lock_mode.handleQPDUpdate(qpd.reading())
+        lock_mode.startLockBehavior("locked", {})
+        qpd.focus += 0.1
+        lock_mode.handleQPDUpdate(qpd.reading())
+        assert math.isfinite(z_stage.z)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Tests of the focus lock recorder.
+"""
+import numpy
+import pytest
+
+import storm_control.hal4000.focusLock.lockRecorder as lockRecorder
+
+
+def addSamples(recorder, offsets, locked = True, good_lock = True, target = 0.0, qpd_response = 1.0):
+    for offset in offsets:
+        recorder.addSample({"is_good" : True, "offset" : offset, "sum" : 100.0},
+                           50.0 + offset,
+                           target,
+                           locked,
+                           good_lock,
+                           qpd_response)
+
+
+def test_lock_recorder_1():
+    """
+    The ring buffer keeps the most recent samples in order.
+    """
+    recorder = lockRecorder.LockRecorder(size = 10)
+    addSamples(recorder, numpy.arange(25))
+
+    samples = recorder.getSamples(0)
+    assert (samples.size == 10)
+    assert numpy.allclose(samples["offset"], numpy.arange(15, 25))
+    assert numpy.allclose(samples["z"], 50.0 + numpy.arange(15, 25))
+    assert numpy.all(numpy.diff(samples["time"]) >= 0.0)
+
+    samples = recorder.getSamples(20)
+    assert numpy.allclose(samples["offset"], numpy.arange(20, 25))
+
+def test_lock_recorder_2():
+    """
+    Statistics, these are since the last call to getStatistics().
+    """
+    recorder = lockRecorder.LockRecorder(size = 100)
+    addSamples(recorder, [1.0, 1.0], locked = False, good_lock = False, target = 0.0)
+    addSamples(recorder, [0.01, -0.01, 0.01, -0.01], target = 0.0)
+    addSamples(recorder, [0.1], good_lock = False)
+    addSamples(recorder, [0.01], good_lock = True)
+    addSamples(recorder, [0.1], good_lock = False)
+
+    stats = recorder.getStatistics()
+    assert (stats["n_samples"] == 9)
+    assert (stats["n_locked"] == 7)
+    assert (stats["lock_losses"] == 2)
+    assert (stats["good_fraction"] == pytest.approx(5.0/7.0))
+    assert (stats["max_error"] == pytest.approx(100.0))
+    assert (stats["rms_error"] == pytest.approx(numpy.sqrt((5 * 100.0 + 2 * 10000.0)/7.0)))
+
+    addSamples(recorder, [0.0, 0.0])
+    stats = recorder.getStatistics()
+    assert (stats["n_samples"] == 2)
+    assert (stats["lock_losses"] == 0)
+    assert (stats["rms_error"] == 0.0)
+
+    # The errors are converted to nanometers using the QPD response.
+    addSamples(recorder, [0.08, -0.04], qpd_response = -0.8)
+    stats = recorder.getStatistics()
+    assert (stats["max_error"] == pytest.approx(100.0))
+    assert (stats["rms_error"] == pytest.approx(numpy.sqrt((10000.0 + 2500.0)/2.0)))
+
+def test_lock_recorder_3(tmp_path):
+    """
+    Saving the samples recorded during a film.
+    """
+    recorder = lockRecorder.LockRecorder(size = 100)
+    addSamples(recorder, [1.0, 2.0])
+    recorder.startFilm()
+    addSamples(recorder, [3.0, 4.0, 5.0])
+    samples = recorder.stopFilm()
+    addSamples(recorder, [6.0])
+    filename = lockRecorder.saveSamples(str(tmp_path / "movie_01"), samples)
+
+    samples = numpy.load(filename)
+    assert (samples.dtype == lockRecorder.SAMPLE_DTYPE)
+    assert numpy.allclose(samples["offset"], [3.0, 4.0, 5.0])
+
+    # No film, nothing is recorded.
+    assert recorder.stopFilm() is None
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Tests of which message types a HAL module handles.
+"""
+import storm_control.hal4000.halLib.halModule as halModule
+
+
+class AllMessages(halModule.HalModule):
+    def processMessage(self, message):
+        pass
+
+
+class SomeMessages(halModule.HalModule):
+    message_types = ["configure1", "start film"]
+
+    def processMessage(self, message):
+        pass
+
+
+class SomeMessagesNoOverride(SomeMessages):
+    pass
+
+
+class SomeMessagesOverride(SomeMessages):
+    def processMessage(self, message):
+        super().processMessage(message)
+
+
+class SomeMessagesOverrideTypes(SomeMessages):
+    message_types = SomeMessages.message_types + ["stop film"]
+
+    def processMessage(self, message):
+        super().processMessage(message)
+
+
+def test_message_routing_1():
+    assert (halModule.HalModule().getMessageTypes() is None)
+    assert (AllMessages().getMessageTypes() is None)
+    assert (SomeMessages().getMessageTypes() == ["configure1", "start film"])
+    assert (SomeMessagesNoOverride().getMessageTypes() == ["configure1", "start film"])
+
+    # Sub-classes that override processMessage() without also setting
+    # message_types get all the messages.
+    assert (SomeMessagesOverride().getMessageTypes() is None)
+    assert (SomeMessagesOverrideTypes().getMessageTypes() == ["configure1", "start film", "stop film"])
+
+
+if (__name__ == "__main__"):
+    test_message_routing_1()
@@ -155,6 +155,100 @@ def test_parameters_8():
 
     assert(s1.getSortedAttrs() == ['dd', 'bb', 'aa', 'cc'])
 
+def test_parameters_9():
+    """
+    Parsed files are cached, but each call returns an independent object.
+    """
+    p1 = params.parameters(test.xmlFilePathAndName("test_parameters.xml"), recurse = True)
+    p2 = params.parameters(test.xmlFilePathAndName("test_parameters.xml"), recurse = True)
+
+    p1.set("camera1.flip_horizontal", True)
+    assert (p2.get("camera1.flip_horizontal") == False)
+    assert not (p1.getp("camera1.flip_horizontal") is p2.getp("camera1.flip_horizontal"))
+
+    p2.delete("camera1")
+    assert p1.has("camera1.flip_horizontal")
+    assert not p2.has("camera1.flip_horizontal")
+    
+
+def test_parameters_10():
+    """
+    Copy-on-write, changes made with references that were obtained
+    before the copy should not change the copy.
+    """
+    p1 = params.parameters(test.xmlFilePathAndName("test_parameters.xml"), recurse = True)
+    camera1 = p1.get("camera1")
+    default_max = p1.getp("camera1.default_max")
+    
+    p2 = p1.copy()
+    camera1.set("flip_horizontal", True)
+    default_max.setv(200)
+    assert p1.get("camera1.flip_horizontal")
+    assert (p1.get("camera1.default_max") == 200)
+    assert not p2.get("camera1.flip_horizontal")
+    assert (p2.get("camera1.default_max") == 300)
+
+    # And the other way.
+    p2.get("camera1").set("flip_horizontal", 0)
+    assert p1.get("camera1.flip_horizontal")
+    assert (params.difference(p1, p2) == ["camera1.default_max", "camera1.flip_horizontal"])
+    assert (params.difference(p1, p1.copy()) == [])
+
+
+def test_parameters_11():
+    """
+    Dotted names after the structure changes.
+    """
+    p1 = params.StormXMLObject()
+    p1.add("a.b.c", 1)
+    assert (p1.get("a.b.c") == 1)
+
+    p2 = params.StormXMLObject()
+    p2.add("b.c", 2)
+    p1.addSubSection("a", p2, overwrite = True)
+    assert (p1.get("a.b.c") == 2)
+    
+    p1.set("a.b.c", 3)
+    assert (p2.get("b.c") == 3)
+
+    p1.delete("a.b")
+    assert not p1.has("a.b.c")
+    assert (p1.get("a.b.c", 4) == 4)
+
+
+def test_parameters_12():
+    """
+    Copying an object does not change the objects that it shares with
+    other objects, including the parsed files in the cache.
+    """
+    params.clearCache()
+    file_name = test.xmlFilePathAndName("test_parameters.xml")
+    p1 = params.parameters(file_name, recurse = True)
+    assert not p1.get("camera1.flip_horizontal")
+
+    # Once p1 shares everything it does not expose, more copies of p1
+    # don't invalidate p1's index entries or change p1.
+    camera1 = p1.get("camera1")
+    p2 = p1.copy()
+    version = p1.version
+    p3 = p1.copy()
+    p3 = p3.copy()
+    assert (p1.version == version)
+    assert (p1.get("camera1") is camera1)
+
+    p3.set("camera1.flip_horizontal", True)
+    assert not p1.get("camera1.flip_horizontal")
+    assert not p2.get("camera1.flip_horizontal")
+    assert p3.get("camera1.flip_horizontal")
+
+    # The cached object is not changed by copies.
+    [cached] = list(params.parse_cache.values())
+    owned = cached.owned.copy()
+    p4 = params.parameters(file_name, recurse = True)
+    assert (cached.owned == owned)
+    p4.set("camera1.flip_horizontal", True)
+    assert not params.parameters(file_name, recurse = True).get("camera1.flip_horizontal")
+    
         
 if (__name__ == "__main__"):
     test_parameters_1()
@@ -165,3 +259,7 @@ if (__name__ == "__main__"):
     test_parameters_6()
     test_parameters_7()
     test_parameters_8()
+    test_parameters_9()
+    test_parameters_10()
+    test_parameters_11()
+    test_parameters_12()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Tests of the process pool spot counter.
+"""
+import numpy
+import time
+
+from PyQt5 import QtCore
+
+import storm_control.hal4000.camera.frame as frame
+import storm_control.hal4000.spotCounter.findSpots as findSpots
+
+
+def test_spot_counter_1():
+    """
+    All of the frames are analyzed.
+    """
+    app = QtCore.QCoreApplication.instance()
+    if app is None:
+        app = QtCore.QCoreApplication([])
+
+    spot_counter = findSpots.ProcessSpotCounter(max_batch = 4,
+                                                max_pending = 10,
+                                                max_processes = 2,
+                                                max_size = 256*256)
+    results = {}
+    spot_counter.imageProcessed.connect(lambda x : results.update({x.getFrameNumber() : x.getCounts()}))
+
+    image_x = 64
+    image_y = 64
+    frames = []
+    for i in range(10):
+        image = numpy.ones((image_y, image_x), dtype = numpy.uint16)
+        for j in range(i % 3):
+            image[10 + 20*j, 32] = 200
+        frames.append(frame.Frame(image.reshape(-1), i, image_x, image_y, "camera1"))
+    spot_counter.newFramesToAnalyze("camera1", frame.FrameBatch(frames), 100)
+
+    start = time.time()
+    while (len(results) < 10) and ((time.time() - start) < 60.0):
+        app.processEvents()
+        time.sleep(0.01)
+    spot_counter.cleanUp()
+
+    assert (results == {i : (i % 3) for i in range(10)})
+    assert (spot_counter.dropped == 0)
+
+
+if (__name__ == "__main__"):
+    test_spot_counter_1()
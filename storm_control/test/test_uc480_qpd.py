@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Tests of the uc480 camera QPD offset calculation, using a
+simulated camera.
+"""
+import numpy
+import pytest
+
+import storm_control.sc_hardware.thorlabs.uc480Camera as uc480Camera
+
+
+class Camera(object):
+    """
+    Simulated camera, returns the images in self.images in order.
+    """
+    def __init__(self, camera_id, ini_file = None):
+        self.images = []
+        self.index = 0
+
+    def captureImage(self):
+        image = self.images[self.index % len(self.images)]
+        self.index += 1
+        return image
+
+    def captureImages(self, images):
+        for i in range(images.shape[0]):
+            images[i] = self.captureImage()
+        return images
+
+    def setAOI(self, x_start, y_start, width, height):
+        pass
+
+    def setFrameRate(self, frame_rate = 1000, verbose = True):
+        pass
+
+    def setPixelClock(self, pixel_clock_MHz):
+        pass
+
+    def setTimeout(self, timeout):
+        pass
+
+
+def makeImage(x1, x2, x_width = 120, y_width = 40, sigma = 3.0):
+    """
+    An image with spots at x1 and x2 (on the center line), the
+    offset is zero when the spots are 60 pixels apart.
+    """
+    [yy, xx] = numpy.mgrid[0:y_width, 0:x_width]
+    image = numpy.zeros((y_width, x_width))
+    for x in [x1, x2]:
+        image += 200.0 * numpy.exp(-((xx - x)**2 + (yy - 0.5*y_width)**2)/(2.0*sigma*sigma))
+    return numpy.round(image).astype(numpy.uint8)
+
+def makeQPD(tmp_path, monkeypatch, batch = False, images = None):
+    monkeypatch.setattr(uc480Camera, "Camera", Camera)
+    offset_file = str(tmp_path / "offsets.txt")
+    with open(offset_file, "w") as fp:
+        fp.write("0,0")
+
+    qpd = uc480Camera.CameraQPDScipyFit(background = 0,
+                                        batch = batch,
+                                        ini_file = "none.ini",
+                                        offset_file = offset_file,
+                                        sigma = 3.0,
+                                        x_width = 120,
+                                        y_width = 40)
+    qpd.cam.images = images
+    return qpd
+
+
+@pytest.mark.parametrize("fit_mode", [0, 1])
+def test_uc480_qpd_batch(tmp_path, monkeypatch, fit_mode):
+    """
+    Batch mode gives the same answer.
+    """
+    images = [makeImage(30.3 - 0.1*i, 89.7 + 0.1*i) for i in range(5)]
+
+    offsets = []
+    for batch in [False, True]:
+        qpd = makeQPD(tmp_path, monkeypatch, batch = batch, images = images)
+        qpd.changeFitMode(fit_mode)
+        [power, offset, is_good] = qpd.qpdScan(reps = 5)
+        assert is_good
+        assert (power == numpy.mean([numpy.sum(x, dtype = numpy.int64) for x in images]))
+        offsets.append(offset)
+
+    assert (offsets[0] == pytest.approx(offsets[1], abs = 0.05))
+    if (fit_mode == 1):
+        assert (offsets[1] == pytest.approx(-0.2, abs = 0.05))
+
+def test_uc480_qpd_duplicates(tmp_path, monkeypatch):
+    """
+    Duplicate frames are ignored.
+    """
+    qpd = makeQPD(tmp_path, monkeypatch, batch = True, images = [makeImage(30.0, 90.0)])
+    [power, offset, is_good] = qpd.qpdScan(reps = 3)
+    assert is_good
+    assert (power > 0)
+
+    [power, offset, is_good] = qpd.qpdScan(reps = 3)
+    assert not is_good
+    assert (power == qpd.last_power)
+
+def test_uc480_qpd_outlier(tmp_path, monkeypatch):
+    """
+    A single bad frame does not change the offset.
+    """
+    images = [makeImage(30.0 - 0.01*i, 90.0) for i in range(4)]
+    images.append(makeImage(20.0, 100.0))
+    qpd = makeQPD(tmp_path, monkeypatch, batch = True, images = images)
+    [power, offset, is_good] = qpd.qpdScan(reps = 5)
+    assert is_good
+    assert (offset == pytest.approx(0.0, abs = 0.05))